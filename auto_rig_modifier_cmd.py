@@ -0,0 +1,48 @@
+"""
+Maya plugin command used by build_backend.ModifierBackend. It commits the next queued API modifier, so the modifier
+edits are recorded in the undo queue like any other command.
+
+The plugin is loaded from its file path and doesn't import the backend, the backend passes its own module name to the
+command, so the queue is found whether the tool is installed as top level modules or as a package.
+"""
+import sys
+import maya.api.OpenMaya as opm
+
+# Same name as build_backend.MODIFIER_CMD_NAME
+MODIFIER_CMD_NAME = "autoRigCommitModifier"
+
+
+def maya_useNewAPI():
+    pass
+
+
+class CommitModifierCmd(opm.MPxCommand):
+    def __init__(self):
+        super(CommitModifierCmd, self).__init__()
+        self.modifier = None
+
+    def doIt(self, args):
+        backend_module = sys.modules[args.asString(0)]
+        self.modifier = backend_module.PENDING_MODIFIER_LIST.pop(0)
+        self.modifier.doIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def cmd_creator():
+    return CommitModifierCmd()
+
+
+def initializePlugin(plugin):
+    opm.MFnPlugin(plugin).registerCommand(MODIFIER_CMD_NAME, cmd_creator)
+
+
+def uninitializePlugin(plugin):
+    opm.MFnPlugin(plugin).deregisterCommand(MODIFIER_CMD_NAME)
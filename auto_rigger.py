@@ -1,6 +1,15 @@
 import maya.cmds as mc
 import utility as util, joint_placement_helper
+import orient_solver
+import node_registry
+import build_backend
+import build_plan
+import build_profiler
+import build_session
+import rig_math
+import rig_mirror
 import string
+import copy
 reload(util)
 
 MISC_GRP = "mics"
@@ -27,10 +36,43 @@ NURBS_SURF_SUFFIX = "surf"
 IK_HANDLE_SUFFIX = "ikh"
 GRP_SUFFIX = "grp"
 BLEND_COLORS_SUFFIX = "bc"
+PAIR_BLEND_SUFFIX = "pb"
 REVERSE_NODE_SUFFIX = "rev"
 LOCATOR_SUFFIX = "loc"
 DRIVER_SUFFIX = "drv"
-DISTANCE_DIMEN_SUFFIX = "dm"
+DISTANCE_BETWEEN_SUFFIX = "dist"
+# The pair blend translate channels are distances, they only carry the scale without unit conversion in centimeters
+PAIR_BLEND_SCALE_UNIT = "cm"
+UNDO_CHUNK_NAME = "autoRigCreateRig"
+REBUILD_UNDO_CHUNK_NAME = "autoRigRebuildRig"
+
+# Ribbon spine surface, degree 3 with two spans along the spine. The root and end controls move two cv rows each and the
+# middle control one row, the controls are at the center of their rows.
+RIBBON_DEGREE = 3
+RIBBON_KNOT_LIST = [0.0, 0.0, 0.0, 0.0, 0.5, 1.0, 1.0, 1.0, 1.0]
+RIBBON_CTR_CV_LIST = [[0, 1], [2], [3, 4]]
+RIBBON_CTR_PARAM_LIST = [1.0/12, 0.5, 11.0/12]
+
+# Limb data keys set by the limb build steps, they are cleared when the step is torn down
+LIMB_STEP_DATA_DICT = {"ik_arms": ("arm", ["ik_chain", "ik_ctrs_grp", "ik_ctr"]),
+                       "ik_legs": ("leg", ["ik_chain", "ik_ctrs_grp", "ik_ctr", "ik_hdl"]),
+                       "ik_feet": ("leg", ["ik_foot_chain"]),
+                       "fk_arms": ("arm", ["fk_chain", "fk_ctrs_grp"]),
+                       "fk_legs": ("leg", ["fk_chain", "fk_ctrs_grp"])}
+
+# Root, middle and end joints of the IK limbs, the pole vectors of all of them are solved together. A straight limb
+# gets its pole on the side it should bend to, the elbows bend backward and the knees forward.
+IK_LIMB_JNT_DICT = {"arm": ["shoulder", "elbow", "wrist"],
+                    "leg": ["thigh", "knee", "ankle"]}
+POLE_VEC_FALLBACK_DICT = {"arm": [0.0, 0.0, -1.0],
+                          "leg": [0.0, 0.0, 1.0]}
+
+# The right joints have to be this close to the mirrored left joints for the mirror build
+MIRROR_TOLERANCE = 1e-3
+
+# Error Msg
+NO_BUILD_ERR = "The rig was not built by this rigger, it can't be rebuilt."
+FULL_REBUILD_ERR = "The changed options need a full rebuild of the rig, affected steps: {0}"
 
 
 class AutoRigger:
@@ -49,57 +91,290 @@ class AutoRigger:
         self.r_finger_root_jnt_key = ["r_thumb01", "r_index01", "r_middle01", "r_ring01", "r_pinky01"]
         self.l_toe_root_jnt_key = []
         self.r_toe_root_jnt_key = []
+        self.jnt_registry = node_registry.NodeRegistry()
+        self.backend = build_backend.CmdsBackend()
+        self.build_data = {}
+        self.build_plan = None
+        # (orientation input, solved orientation) of prepare_build, used by the orientation step if the input matches
+        self.prepared_orientation = None
+        # step name: {"node_list": created node uuids, "attr_list": attributes added to the global control,
+        #             "connection_list": connections between nodes of other steps}
+        self.step_record_dict = {}
+        self.step_connection_list = []
 
     def create_rig(self, spine_jnt_count=5, neck_jnt_count=3, upper_arm_twist_count=3, lower_arm_twist_count=3,
                    upper_leg_twist_count=3, lower_leg_twist_count=3, finger_count=5, toe_count=0, mirror_behavior=True,
-                   stretch_arm=True, stretch_leg=True, fk_arm=True, ik_arm=True, fk_leg=True, ik_leg=False):
+                   stretch_arm=True, stretch_leg=True, fk_arm=True, ik_arm=True, fk_leg=True, ik_leg=False,
+                   compact_twist=False, compact_blend=False, light_spine=False, mirror_build=False, use_api_modifier=False, dry_run=False,
+                   profile=False, profile_path=None, profile_log=True, managed_session=True, disable_undo=False):
         """
-        Main function, coordinating with other functions
+        Main function, compile the build plan of the options and execute it, the whole rig is built in one undo chunk.
+        If use_api_modifier is True, the DG operations are queued in API modifiers and committed in one batch per build
+        step instead of running one by one. If dry_run is True, nothing is built and the predicted cost report of the
+        plan is returned. If compact_twist is True, every multiply divide node of the twist joints drives three twist
+        joints with its X, Y and Z channels instead of one. If compact_blend is True, limbs with IK and FK chains are
+        blended with one pair blend node per joint, and limbs with only one chain are connected to the animate joints
+        directly. If light_spine is True, the spine joints are constrained to the spine controls instead of following
+        a ribbon surface through follicles. If mirror_build is True, the limb steps build the left side only and copy
+        it to the right side, this needs mirror_behavior and a symmetric skeleton, otherwise both sides are built.
+        If profile is True, the time, commands and nodes of every build stage are recorded and the profile report is
+        returned, it is also written to profile_path if given and logged in one line if profile_log is True.
+        The rig is built in a build session(see build_session.BuildSession) suspending the refresh, the auto-key and
+        the evaluation manager, unless managed_session is False. If disable_undo is True, undo is turned off during the
+        build instead of recording it in one chunk.
+        """
+        plan = self.compile_build_plan(spine_jnt_count=spine_jnt_count, neck_jnt_count=neck_jnt_count,
+                                       upper_arm_twist_count=upper_arm_twist_count,
+                                       lower_arm_twist_count=lower_arm_twist_count,
+                                       upper_leg_twist_count=upper_leg_twist_count,
+                                       lower_leg_twist_count=lower_leg_twist_count,
+                                       finger_count=finger_count, toe_count=toe_count, mirror_behavior=mirror_behavior,
+                                       stretch_arm=stretch_arm, stretch_leg=stretch_leg, fk_arm=fk_arm, ik_arm=ik_arm,
+                                       fk_leg=fk_leg, ik_leg=ik_leg, compact_twist=compact_twist,
+                                       compact_blend=compact_blend, light_spine=light_spine,
+                                       mirror_build=mirror_build)
+        if dry_run:
+            return plan.get_cost_report()
+
+        profiler = None
+        if profile or profile_path is not None:
+            profiler = build_profiler.BuildProfiler(log=profile_log)
+
+        for step in self.iter_create_rig(plan, use_api_modifier=use_api_modifier, profiler=profiler,
+                                         managed_session=managed_session, disable_undo=disable_undo):
+            pass
+
+        if profiler is not None:
+            if profile_path is not None:
+                profiler.write_report(profile_path)
+            return profiler.get_report()
+
+    def iter_create_rig(self, plan, use_api_modifier=False, profiler=None, managed_session=True, disable_undo=False,
+                        session_per_step=False):
+        """
+        Build the compiled plan one step at a time, the generator yields every built step. The whole build is one build
+        session, it ends when the generator ends or is closed, so a caller running the steps from an event loop can
+        stop the build between two steps by closing the generator.
+        If session_per_step is True, the refresh, auto-key and evaluation state is only suspended while a step runs and
+        restored before the step is yielded, only the undo chunk stays open between the steps. Use it when the event
+        loop runs between the steps, so the viewport redraws and the user settings are back in the meantime.
+        """
+        self.backend = build_backend.get_backend(use_api_modifier=use_api_modifier)
+        if profiler is not None:
+            profiler.start()
+
+        try:
+            with build_session.BuildSession(UNDO_CHUNK_NAME, managed=managed_session and not session_per_step,
+                                            disable_undo=disable_undo):
+                step_iter = self.iter_build_plan(plan, profiler=profiler)
+                while True:
+                    with build_session.BuildSession(UNDO_CHUNK_NAME, managed=managed_session and session_per_step):
+                        step = next(step_iter, None)
+                    if step is None:
+                        break
+                    yield step
+            self.build_plan = plan
+        finally:
+            if profiler is not None:
+                profiler.stop()
+
+    def compile_build_plan(self, **options):
+        """
+        Compile the options and the bind joints to a build plan, the scene is not touched.
+        """
+        return build_plan.compile_plan(self.bind_jnt_info_dict.keys(), **options)
+
+    def prepare_build(self, options, orientation_input=None):
+        """
+        Run the pure math of a build before the build: compile the build plan of the options, solve the joint
+        orientation of the orientation input(see get_orientation_input) and compute the control shape cvs. Nothing in
+        the scene is read or changed, so it can run on a worker thread. Return the build plan.
+        """
+        plan = self.compile_build_plan(**options)
+        if orientation_input is not None:
+            jnt_key_list, pos_dict, parent_dict, rule_dict, flip_key_list = orientation_input
+            self.prepared_orientation = (orientation_input,
+                                         orient_solver.solve_skeleton(pos_dict, parent_dict, rule_dict,
+                                                                      flip_key_list=flip_key_list))
+        util.warm_ctr_cuv_cache()
+        return plan
+
+    def rebuild_rig(self, use_api_modifier=False, **options):
+        """
+        Change some create_rig options of the built rig, only the build steps affected by the changed options are torn
+        down and built again, in one build session. Return the names of the rebuilt steps.
+        Only the twist, IK/FK limb, blend and stretch steps can be rebuilt, a RuntimeError is raised if the options
+        change other steps. The rebuilt twist joints are new bind joints, skin clusters have to be bound again.
+        If a step fails, the rebuild is undone and the rig and its step records are kept as they were.
+        """
+        if self.build_plan is None:
+            raise RuntimeError(NO_BUILD_ERR)
+
+        new_options = dict(self.build_plan.options)
+        new_options.update(options)
+        plan = self.compile_build_plan(**new_options)
+
+        dirty_step_list = build_plan.get_dirty_steps(self.build_plan, plan)
+        full_build_step_list = [step_name for step_name in dirty_step_list
+                                if step_name not in build_plan.REBUILD_STEP_LIST]
+        if full_build_step_list:
+            raise RuntimeError(FULL_REBUILD_ERR.format(", ".join(full_build_step_list)))
+
+        self.backend = build_backend.get_backend(use_api_modifier=use_api_modifier)
+
+        step_record_dict = copy.deepcopy(self.step_record_dict)
+        build_data = copy.deepcopy(self.build_data)
+        try:
+            with build_session.BuildSession(REBUILD_UNDO_CHUNK_NAME):
+                for step_name in reversed(dirty_step_list):
+                    self.teardown_build_step(step_name)
+                self.execute_build_plan(plan, step_name_list=dirty_step_list)
+        except Exception:
+            # The torn down steps are in the closed undo chunk, without undo the scene is left as the failed step left it
+            if mc.undoInfo(query=True, state=True):
+                mc.undo()
+            self.step_record_dict = step_record_dict
+            self.build_data = build_data
+            raise
+        self.build_plan = plan
+
+        return dirty_step_list
+
+    def execute_build_plan(self, plan, profiler=None, step_name_list=None):
+        """
+        Run the build steps of the plan in order, see iter_build_plan.
+        """
+        for step in self.iter_build_plan(plan, profiler=profiler, step_name_list=step_name_list):
+            pass
+
+    def iter_build_plan(self, plan, profiler=None, step_name_list=None):
+        """
+        Run the build steps of the plan in order and yield every built step, the queued backend operations are
+        committed after every step. Every step is recorded as a stage of the profiler if one is given. If
+        step_name_list is given, only these steps are run on top of the existing build data.
+        The nodes created by every step are recorded, so the step can be torn down by rebuild_rig.
+        """
+        if step_name_list is None:
+            self.build_data = {}
+            self.step_record_dict = {}
+
+        for step in plan.step_list:
+            if step_name_list is not None and step.name not in step_name_list:
+                continue
+
+            attr_set = set(self.get_global_ctr_attrs())
+            self.step_connection_list = []
+
+            if profiler is not None:
+                profiler.start_stage(step.name, step.subsystem)
+            with node_registry.NodeRecorder() as node_recorder:
+                getattr(self, step.method_name)(**step.kwargs)
+                self.backend.commit()
+            if profiler is not None:
+                profiler.end_stage()
+
+            self.step_record_dict[step.name] = {"node_list": node_recorder.get_uuids(),
+                                                "attr_list": [attr for attr in self.get_global_ctr_attrs()
+                                                              if attr not in attr_set],
+                                                "connection_list": self.step_connection_list}
+            yield step
+
+    def teardown_build_step(self, step_name):
+        """
+        Delete the nodes created by the build step and the attributes it added to the global control, and break the
+        connections it made between nodes of other steps
+        """
+        step_record = self.step_record_dict.pop(step_name, None)
+        if step_record is None:
+            return
+
+        for source_plug, dest_plug in step_record["connection_list"]:
+            if mc.objExists(source_plug) and mc.objExists(dest_plug) and mc.isConnected(source_plug, dest_plug):
+                mc.disconnectAttr(source_plug, dest_plug)
+
+        global_ctr_attr_list = self.get_global_ctr_attrs()
+        for attr in step_record["attr_list"]:
+            if attr in global_ctr_attr_list:
+                mc.deleteAttr(self.global_ctr, attribute=attr)
+
+        # Delete the top dag nodes first, their children and the history nodes of their shapes go with them
+        node_list = mc.ls(step_record["node_list"], long=True) or []
+        dag_node_list = [node for node in node_list if node.startswith(PATH_SLASH)]
+        top_node_list = [node for node in dag_node_list
+                         if not [parent for parent in dag_node_list if node.startswith(parent + PATH_SLASH)]]
+        if top_node_list:
+            mc.delete(top_node_list)
+        node_list = mc.ls(step_record["node_list"]) or []
+        if node_list:
+            mc.delete(node_list)
+
+        if step_name in LIMB_STEP_DATA_DICT:
+            limb_name, data_key_list = LIMB_STEP_DATA_DICT[step_name]
+            for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+                limb_data = self.get_limb_data(left_or_right, limb_name)
+                for data_key in data_key_list:
+                    limb_data.pop(data_key, None)
+
+    def connect_step_attr(self, source_plug, dest_plug):
+        """
+        Connect two nodes the running build step didn't create, the connection is recorded so teardown_build_step can
+        break it, it doesn't go away with the nodes of the step.
+        """
+        self.backend.connect_attr(source_plug, dest_plug)
+        self.step_connection_list.append((source_plug, dest_plug))
+
+    def get_global_ctr_attrs(self):
+        if not self.global_ctr or not mc.objExists(self.global_ctr):
+            return []
+        return mc.listAttr(self.global_ctr, userDefined=True) or []
+
+    def build_groups(self, finger_count=5, toe_count=0):
+        """
+        Create the rig groups and update the digit root joint lists
         """
         self.misc_grp = mc.group(name=MISC_GRP, empty=True, parent=self.rig_grp)
         self.ctr_grp = mc.group(name=CTR_GRP, empty=True, parent=self.rig_grp)
         self.bind_jnt_grp = mc.group(name=BIND_JNT_GRP, empty=True, parent=self.rig_grp)
         self.anim_jnt_grp = mc.group(name=ANIM_JNT_GRP, empty=True, parent=self.rig_grp)
 
-        prefix = util.clear_path(self.rig_grp)
+        self.set_digit_root_keys(finger_count=finger_count, toe_count=toe_count)
 
-        # Update finger root jnt list if finger count is not default value
-        if finger_count > 5:
-            extra_finger_count = finger_count - 5
-            self.l_finger_root_jnt_key += self.get_extra_digit(digit_count=extra_finger_count,
-                                                               left_or_right=LEFT_PREFIX, name="extraFinger")
-            self.r_finger_root_jnt_key += self.get_extra_digit(digit_count=extra_finger_count,
-                                                               left_or_right=RIGHT_PREFIX, name="extraFinger")
-        elif 5 >= finger_count > 1:
-            self.l_finger_root_jnt_key = self.l_finger_root_jnt_key[:finger_count]
-            self.r_finger_root_jnt_key = self.r_finger_root_jnt_key[:finger_count]
-        else:
-            self.l_finger_root_jnt_key = [self.l_finger_root_jnt_key[1]]
-            self.r_finger_root_jnt_key = [self.r_finger_root_jnt_key[1]]
-
-        if toe_count > 0:
-            self.l_toe_root_jnt_key = self.get_extra_digit(digit_count=toe_count,
-                                                           left_or_right=LEFT_PREFIX, name="toe")
-            self.r_toe_root_jnt_key = self.get_extra_digit(digit_count=toe_count,
-                                                           left_or_right=RIGHT_PREFIX, name="toe")
+    def set_digit_root_keys(self, finger_count=5, toe_count=0):
+        """
+        Set the finger and toe root joint lists of the digit counts. The orientation rules read them, so they are set
+        before get_orientation_input, setting them again with the same counts doesn't change them.
+        """
+        self.l_finger_root_jnt_key = build_plan.get_finger_root_keys(LEFT_PREFIX, finger_count=finger_count)
+        self.r_finger_root_jnt_key = build_plan.get_finger_root_keys(RIGHT_PREFIX, finger_count=finger_count)
+        self.l_toe_root_jnt_key = build_plan.get_toe_root_keys(LEFT_PREFIX, toe_count=toe_count)
+        self.r_toe_root_jnt_key = build_plan.get_toe_root_keys(RIGHT_PREFIX, toe_count=toe_count)
 
+    def build_orientation(self, mirror_behavior=True):
         self.init_jnt_orientation(mirror_behavior=mirror_behavior)
 
-        # Create spine and neck bind joints
+    def build_spine_neck(self, spine_jnt_count=5, neck_jnt_count=3):
+        """
+        Create spine, neck and pelvis bind joints
+        """
         spine_jnt_key_list = self.create_spine(spine_jnt_count=spine_jnt_count)
         neck_jnt_key_list = self.create_neck(neck_jnt_count=neck_jnt_count)
 
         mc.parent(self.get_bnd_jnt_name(spine_jnt_key_list[0]), self.get_bnd_jnt_name("c_root"))
         mc.parent(self.get_bnd_jnt_name(neck_jnt_key_list[0]), self.get_bnd_jnt_name(spine_jnt_key_list[-1]))
         spine_bnd_jnt_chain = self.get_bnd_jnt_name(spine_jnt_key_list)
-        neck_bnd_jnt_chain = self.get_bnd_jnt_name(neck_jnt_key_list)
         mc.parent(self.get_bnd_jnt_name("l_clavicle"), spine_bnd_jnt_chain[-2])
         mc.parent(self.get_bnd_jnt_name("r_clavicle"), spine_bnd_jnt_chain[-2])
 
         # Create pelvis bind joint
         self.create_pelvis_jnt()
 
-        # Create anim joints
+        self.build_data["spine_jnt_key_list"] = spine_jnt_key_list
+        self.build_data["neck_jnt_key_list"] = neck_jnt_key_list
+
+    def build_anim_skeleton(self):
+        """
+        Create anim joints, put the bind and anim skeletons to their groups
+        """
         self.create_anim_skeleton()
 
         # Put all bind joints to bind skeleton group
@@ -108,182 +383,290 @@ class AutoRigger:
         # Put all anim joints to anim skeleton group
         mc.parent(self.get_anim_jnt_name("c_root"), self.anim_jnt_grp)
 
-        # Create clavicle controls
+    def build_upper_body_ctrs(self):
+        """
+        Create clavicle and neck controls
+        """
         l_clavicle_ctr_space, l_clavicle_ctr = self.create_general_ctr(jnt = self.get_anim_jnt_name("l_clavicle"), ctr_type="clavicle",
                                                                        ctr_scale=[7, 7, 7], ctr_move=[0, 10, 0])
         r_clavicle_ctr_space, r_clavicle_ctr = self.create_general_ctr(jnt = self.get_anim_jnt_name("r_clavicle"), ctr_type="clavicle",
                                                                        ctr_scale=[7, 7, 7], ctr_move=[0, 10, 0] , flip_ctr=True)
 
-        # Create neck controls
-        neck_ctr_space_list, neck_ctr_list = self.create_neck_ctr(neck_jnt_chain=self.get_anim_jnt_name(neck_jnt_key_list),
+        neck_ctr_space_list, neck_ctr_list = self.create_neck_ctr(neck_jnt_chain=self.get_anim_jnt_name(self.build_data["neck_jnt_key_list"]),
                                                                   ctr_scale=[7,7,7])
 
-        # Create twist bind joints
+        self.build_data["clavicle_ctr_space"] = {LEFT_PREFIX: l_clavicle_ctr_space, RIGHT_PREFIX: r_clavicle_ctr_space}
+        self.build_data["clavicle_ctr"] = {LEFT_PREFIX: l_clavicle_ctr, RIGHT_PREFIX: r_clavicle_ctr}
+        self.build_data["neck_ctr_space_list"] = neck_ctr_space_list
+
+    def build_twist(self, upper_arm_twist_count=3, lower_arm_twist_count=3, upper_leg_twist_count=3,
+                    lower_leg_twist_count=3, compact_twist=False, mirror_build=False):
+        """
+        Create twist bind joints
+        """
+        self.build_limb_sides(self.build_side_twist, mirror_build=mirror_build,
+                              upper_arm_twist_count=upper_arm_twist_count, lower_arm_twist_count=lower_arm_twist_count,
+                              upper_leg_twist_count=upper_leg_twist_count, lower_leg_twist_count=lower_leg_twist_count,
+                              compact_twist=compact_twist)
+
+    def build_side_twist(self, left_or_right, upper_arm_twist_count=3, lower_arm_twist_count=3,
+                         upper_leg_twist_count=3, lower_leg_twist_count=3, compact_twist=False):
+        """
+        Create twist bind joints of one side
+        """
+        side_prefix = left_or_right + SEPARATOR
         if upper_arm_twist_count > 0:
             upper_arm_twist_rate = self.get_default_twist_rate(upper_arm_twist_count, counter_twist=True)
-            self.create_twist_jnts(self.get_bnd_jnt_name("l_shoulder"), self.get_bnd_jnt_name("l_elbow"),
-                                   twist_rate_list=upper_arm_twist_rate)
-            self.create_twist_jnts(self.get_bnd_jnt_name("r_shoulder"), self.get_bnd_jnt_name("r_elbow"),
-                                   twist_rate_list=upper_arm_twist_rate)
+            self.create_twist_jnts(self.get_bnd_jnt_name(side_prefix+"shoulder"), self.get_bnd_jnt_name(side_prefix+"elbow"),
+                                   twist_rate_list=upper_arm_twist_rate, compact=compact_twist)
 
         if lower_arm_twist_count > 0:
             lower_arm_twist_rate = self.get_default_twist_rate(lower_arm_twist_count, counter_twist=False)
-            self.create_twist_jnts(self.get_bnd_jnt_name("l_wrist"), self.get_bnd_jnt_name("l_elbow"),
-                                   twist_rate_list=lower_arm_twist_rate, parent_to_end_jnt=True)
-            self.create_twist_jnts(self.get_bnd_jnt_name("r_wrist"), self.get_bnd_jnt_name("r_elbow"),
-                                   twist_rate_list=lower_arm_twist_rate, parent_to_end_jnt=True)
+            self.create_twist_jnts(self.get_bnd_jnt_name(side_prefix+"wrist"), self.get_bnd_jnt_name(side_prefix+"elbow"),
+                                   twist_rate_list=lower_arm_twist_rate, parent_to_end_jnt=True, compact=compact_twist)
 
         if upper_leg_twist_count > 0:
             upper_leg_twist_rate = self.get_default_twist_rate(upper_leg_twist_count, counter_twist=True)
-            self.create_twist_jnts(self.get_bnd_jnt_name("l_thigh"), self.get_bnd_jnt_name("l_knee"),
-                                   twist_rate_list=upper_leg_twist_rate)
-            self.create_twist_jnts(self.get_bnd_jnt_name("r_thigh"), self.get_bnd_jnt_name("r_knee"),
-                                   twist_rate_list=upper_leg_twist_rate)
+            self.create_twist_jnts(self.get_bnd_jnt_name(side_prefix+"thigh"), self.get_bnd_jnt_name(side_prefix+"knee"),
+                                   twist_rate_list=upper_leg_twist_rate, compact=compact_twist)
         if lower_leg_twist_count > 0:
             lower_leg_twist_rate = self.get_default_twist_rate(lower_leg_twist_count, counter_twist=False)
-            self.create_twist_jnts(self.get_bnd_jnt_name("l_ankle"), self.get_bnd_jnt_name("l_knee"), twist_axis="y",
-                                   twist_rate_list=lower_leg_twist_rate, parent_to_end_jnt=True)
-            self.create_twist_jnts(self.get_bnd_jnt_name("r_ankle"), self.get_bnd_jnt_name("r_knee"), twist_axis="y",
-                                   twist_rate_list=lower_leg_twist_rate, parent_to_end_jnt=True)
+            self.create_twist_jnts(self.get_bnd_jnt_name(side_prefix+"ankle"), self.get_bnd_jnt_name(side_prefix+"knee"), twist_axis="y",
+                                   twist_rate_list=lower_leg_twist_rate, parent_to_end_jnt=True, compact=compact_twist)
 
-        # Create global control
+    def build_main_ctrs(self):
+        """
+        Create global, COG and hip controls
+        """
         global_ctr_space, self.global_ctr = self.create_general_ctr(ctr_type="circle", ctr_scale=[50, 50, 50], ctr_rot=[0,0,90],
                                                                     mid_name="global")
 
-        # Create COG control
         cog_ctr_space, self.cog_ctr = self.create_general_ctr(jnt=self.get_anim_jnt_name("c_root"), ctr_type="cog",
                                                               ctr_scale=[50, 50, 50], mid_name="cog",
                                                               ctr_move=[0, -5, 0], parent=self.global_ctr)
 
-        # Create hip control
         hip_ctr_space, hip_ctr= self.create_general_ctr(jnt=self.get_anim_jnt_name("c_pelvis"), ctr_type="hip",
                                                         ctr_scale=[20, 20, 15], mid_name="hip",
                                                         ctr_move=[0, -20, 0], parent=self.cog_ctr)
 
-        # Create ribbon spine base on the animate spine joints
-        spine_ctr_space_list, spine_ctr_list, spine_fk_ctr_space_list, spine_fk_ctr_list = self.create_ribbon_spine(self.get_anim_jnt_name(spine_jnt_key_list))
+        self.build_data["hip_ctr"] = hip_ctr
 
-        l_clavicle_ctr_space = mc.parent(l_clavicle_ctr_space, spine_ctr_list[-1])[0]
-        r_clavicle_ctr_space = mc.parent(r_clavicle_ctr_space, spine_ctr_list[-1])[0]
+    def build_ribbon_spine(self, light_spine=False):
+        """
+        Create ribbon spine base on the animate spine joints, the clavicle and neck controls follow the spine end
+        """
+        create_spine = self.create_light_spine if light_spine else self.create_ribbon_spine
+        spine_ctr_space_list, spine_ctr_list, spine_fk_ctr_space_list, spine_fk_ctr_list = create_spine(self.get_anim_jnt_name(self.build_data["spine_jnt_key_list"]))
+
+        clavicle_ctr_space = self.build_data["clavicle_ctr_space"]
+        neck_ctr_space_list = self.build_data["neck_ctr_space_list"]
+        for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+            clavicle_ctr_space[left_or_right] = mc.parent(clavicle_ctr_space[left_or_right], spine_ctr_list[-1])[0]
         neck_ctr_space_list[0] = mc.parent(neck_ctr_space_list[0], spine_ctr_list[-1])[0]
         spine_fk_ctr_space_list[0] = mc.parent(spine_fk_ctr_space_list[0], self.cog_ctr)[0]
 
-        # Create ik arms and legs:
-        if ik_arm is True:
-            l_ik_arm_chain, l_ik_arm_ctrs_grp, l_ik_arm_ctr, l_ik_arm_hdl = self.create_ik_limb(root_jnt_key="l_shoulder", mid_jnt_key="l_elbow",
-                                                                                                end_jnt_key="l_wrist", main_name="arm",
-                                                                                                match_jnt_orient=True, ik_ctr_rotate=[0,0,90],
-                                                                                                pv_ctr_rotate=[90,0,0])
-            r_ik_arm_chain, r_ik_arm_ctrs_grp, r_ik_arm_ctr, r_ik_arm_hdl = self.create_ik_limb(root_jnt_key="r_shoulder", mid_jnt_key="r_elbow",
-                                                                                                end_jnt_key="r_wrist", main_name="arm",
-                                                                                                match_jnt_orient=True, ik_ctr_rotate=[0,0,90],
-                                                                                                pv_ctr_rotate=[90,0,0])
-
-        if ik_leg is True:
-            # ---Will constraint the ik hdl to the ik control later(when creating ik foot),
-            # so set the constraint_ik_ctr to false now.
-            l_ik_leg_chain, l_ik_leg_ctrs_grp, l_ik_leg_ctr, l_ik_leg_hdl = self.create_ik_limb(root_jnt_key="l_thigh", mid_jnt_key="l_knee", end_jnt_key="l_ankle",
-                                                                                                main_name="leg", constraint_ik_ctr=False, pv_ctr_rotate=[90,0,0])
-            r_ik_leg_chain, r_ik_leg_ctrs_grp, r_ik_leg_ctr, r_ik_leg_hdl = self.create_ik_limb(root_jnt_key="r_thigh", mid_jnt_key="r_knee", end_jnt_key="r_ankle",
-                                                                                                main_name="leg", constraint_ik_ctr=False, pv_ctr_rotate=[90,0,0])
-
-            # Create ik feet:
-            l_ik_foot_chain = self.create_ik_foot(ankle_jnt_key="l_ankle", ball_jnt_key="l_ball", toe_jnt_key="l_footTip",
-                                                  leg_ik_ctr=l_ik_leg_ctr, leg_ik_hdl=l_ik_leg_hdl)[0]
-            r_ik_foot_chain = self.create_ik_foot(ankle_jnt_key="r_ankle", ball_jnt_key="r_ball", toe_jnt_key="r_footTip",
-                                                  leg_ik_ctr=r_ik_leg_ctr, leg_ik_hdl=r_ik_leg_hdl)[0]
-
-            # Parent the ik feet to the ik leg end joints:
-            l_ik_foot_chain[0] = mc.parent(l_ik_foot_chain[0], l_ik_leg_chain[-1])[0]
-            r_ik_foot_chain[0] = mc.parent(r_ik_foot_chain[0], r_ik_leg_chain[-1])[0]
-
-        # Create fk arms and legs:
-        if fk_arm is True:
-            l_fk_arm_chain, l_fk_arm_ctrs_grp = self.create_fk_limb(jnt_key_list=["l_shoulder", "l_elbow", "l_wrist"], main_name="arm")
-            r_fk_arm_chain, r_fk_arm_ctrs_grp = self.create_fk_limb(jnt_key_list=["r_shoulder", "r_elbow", "r_wrist"], main_name="arm")
-
-            # ---connect fk arm ctrs to clavicle ctr
-            l_fk_arm_ctrs_grp = mc.parent(l_fk_arm_ctrs_grp, l_clavicle_ctr)[0]
-            r_fk_arm_ctrs_grp = mc.parent(r_fk_arm_ctrs_grp, r_clavicle_ctr)[0]
-
-        if fk_leg is True:
-            l_fk_leg_chain, l_fk_leg_ctrs_grp = self.create_fk_limb(jnt_key_list=["l_thigh", "l_knee", "l_ankle", "l_ball"], main_name="leg")
-            r_fk_leg_chain, r_fk_leg_ctrs_grp = self.create_fk_limb(jnt_key_list=["r_thigh", "r_knee", "r_ankle", "r_ball"], main_name="leg")
-
-            # ---point constraint fk control grp to fk jnt
-            mc.pointConstraint(l_fk_leg_chain[0], l_fk_leg_ctrs_grp)
-            mc.pointConstraint(r_fk_leg_chain[0], r_fk_leg_ctrs_grp)
-
-        # Create hands and foot controls, including fingers and toes
-        l_hand_setting_space = self.create_digit_setting_ctrs(digit_root_jnt_list=self.get_anim_jnt_name(self.l_finger_root_jnt_key),
-                                                              parent_jnt=self.get_anim_jnt_name("l_wrist"), rotate_digit_setting_ctr=[0, 90, 0],
-                                                              move_digit_setting_ctr=[10, 7, 0], mid_name="handSetting")[0]
-        r_hand_setting_space = self.create_digit_setting_ctrs(digit_root_jnt_list=self.get_anim_jnt_name(self.r_finger_root_jnt_key),
-                                                              parent_jnt=self.get_anim_jnt_name("r_wrist"),rotate_digit_setting_ctr=[0, -90, 0],
-                                                              move_digit_setting_ctr=[-10, -7, 0], mid_name="handSetting")[0]
-
-        mc.parent(l_hand_setting_space, self.global_ctr)
-        mc.parent(r_hand_setting_space, self.global_ctr)
+    def build_ik_arms(self, mirror_build=False):
+        """
+        Create ik arms
+        """
+        self.build_limb_sides(self.build_side_ik_arm, mirror_build=mirror_build, step_name="ik_arms")
+
+    def build_side_ik_arm(self, left_or_right):
+        ik_chain, ik_ctrs_grp, ik_ctr, ik_hdl = self.create_ik_limb(root_jnt_key=left_or_right+"_shoulder", mid_jnt_key=left_or_right+"_elbow",
+                                                                    end_jnt_key=left_or_right+"_wrist", main_name="arm",
+                                                                    match_jnt_orient=True, ik_ctr_rotate=[0,0,90],
+                                                                    pv_ctr_rotate=[90,0,0],
+                                                                    pole_vec_pos=self.get_pole_vec_pos(left_or_right, "arm"))
+        self.get_limb_data(left_or_right, "arm").update(ik_chain=ik_chain, ik_ctrs_grp=ik_ctrs_grp, ik_ctr=ik_ctr)
+
+    def build_ik_legs(self, mirror_build=False):
+        """
+        Create ik legs
+        """
+        self.build_limb_sides(self.build_side_ik_leg, mirror_build=mirror_build, step_name="ik_legs")
+
+    def build_side_ik_leg(self, left_or_right):
+        # ---Will constraint the ik hdl to the ik control later(when creating ik foot),
+        # so set the constraint_ik_ctr to false now.
+        ik_chain, ik_ctrs_grp, ik_ctr, ik_hdl = self.create_ik_limb(root_jnt_key=left_or_right+"_thigh", mid_jnt_key=left_or_right+"_knee",
+                                                                    end_jnt_key=left_or_right+"_ankle", main_name="leg",
+                                                                    constraint_ik_ctr=False, pv_ctr_rotate=[90,0,0],
+                                                                    pole_vec_pos=self.get_pole_vec_pos(left_or_right, "leg"))
+        self.get_limb_data(left_or_right, "leg").update(ik_chain=ik_chain, ik_ctrs_grp=ik_ctrs_grp, ik_ctr=ik_ctr,
+                                                        ik_hdl=ik_hdl)
+
+    def build_ik_feet(self, mirror_build=False):
+        """
+        Create ik feet, the ik feet are parented to the ik leg end joints
+        """
+        self.build_limb_sides(self.build_side_ik_foot, mirror_build=mirror_build, step_name="ik_feet")
+
+    def build_side_ik_foot(self, left_or_right):
+        limb_data = self.get_limb_data(left_or_right, "leg")
+        ik_foot_chain = self.create_ik_foot(ankle_jnt_key=left_or_right+"_ankle", ball_jnt_key=left_or_right+"_ball",
+                                            toe_jnt_key=left_or_right+"_footTip", leg_ik_ctr=limb_data["ik_ctr"],
+                                            leg_ik_hdl=limb_data["ik_hdl"])[0]
+
+        ik_foot_chain[0] = mc.parent(ik_foot_chain[0], limb_data["ik_chain"][-1])[0]
+        limb_data["ik_foot_chain"] = ik_foot_chain
+
+    def build_fk_arms(self, mirror_build=False):
+        """
+        Create fk arms, the fk arm controls follow the clavicle controls
+        """
+        self.build_limb_sides(self.build_side_fk_arm, mirror_build=mirror_build, step_name="fk_arms")
+
+    def build_side_fk_arm(self, left_or_right):
+        fk_chain, fk_ctrs_grp = self.create_fk_limb(jnt_key_list=[left_or_right+"_shoulder", left_or_right+"_elbow",
+                                                                  left_or_right+"_wrist"], main_name="arm")
+        fk_ctrs_grp = mc.parent(fk_ctrs_grp, self.build_data["clavicle_ctr"][left_or_right])[0]
+        self.get_limb_data(left_or_right, "arm").update(fk_chain=fk_chain, fk_ctrs_grp=fk_ctrs_grp)
+
+    def build_fk_legs(self, mirror_build=False):
+        """
+        Create fk legs
+        """
+        self.build_limb_sides(self.build_side_fk_leg, mirror_build=mirror_build, step_name="fk_legs")
+
+    def build_side_fk_leg(self, left_or_right):
+        fk_chain, fk_ctrs_grp = self.create_fk_limb(jnt_key_list=[left_or_right+"_thigh", left_or_right+"_knee",
+                                                                  left_or_right+"_ankle", left_or_right+"_ball"], main_name="leg")
+
+        # ---point constraint fk control grp to fk jnt
+        mc.pointConstraint(fk_chain[0], fk_ctrs_grp)
+        self.get_limb_data(left_or_right, "leg").update(fk_chain=fk_chain, fk_ctrs_grp=fk_ctrs_grp)
+
+    def build_digits(self, toe_count=0, mirror_build=False):
+        """
+        Create hands and foot controls, including fingers and toes
+        """
+        self.build_limb_sides(self.build_side_digits, mirror_build=mirror_build, toe_count=toe_count)
+
+    def build_side_digits(self, left_or_right, toe_count=0):
+        side_sign = 1 if left_or_right == LEFT_PREFIX else -1
+        finger_root_jnt_key = self.l_finger_root_jnt_key if left_or_right == LEFT_PREFIX else self.r_finger_root_jnt_key
+        hand_setting_space, hand_setting_ctr = self.create_digit_setting_ctrs(
+            digit_root_jnt_list=self.get_anim_jnt_name(finger_root_jnt_key),
+            parent_jnt=self.get_anim_jnt_name(left_or_right+"_wrist"), rotate_digit_setting_ctr=[0, 90*side_sign, 0],
+            move_digit_setting_ctr=[10*side_sign, 7*side_sign, 0], mid_name="handSetting")
+        self.backend.parent(hand_setting_space, self.global_ctr)
+        setting_ctr_list = [hand_setting_ctr]
 
         if toe_count > 0:
-            l_foot_setting_space = self.create_digit_setting_ctrs(digit_root_jnt_list=self.get_anim_jnt_name(self.l_toe_root_jnt_key),
-                                                                  parent_jnt=self.get_anim_jnt_name("l_ball"), rotate_digit_setting_ctr=[0, 90, 0],
-                                                                  move_digit_setting_ctr=[10, -7, 0], mid_name="footSetting")[0]
-            r_foot_setting_space = self.create_digit_setting_ctrs(digit_root_jnt_list=self.get_anim_jnt_name(self.r_toe_root_jnt_key),
-                                                                  parent_jnt=self.get_anim_jnt_name("r_ball"), rotate_digit_setting_ctr=[0, -90, 0],
-                                                                  move_digit_setting_ctr=[-10, 7, 0], mid_name="footSetting")[0]
-
-            mc.parent(l_foot_setting_space, self.global_ctr)
-            mc.parent(r_foot_setting_space, self.global_ctr)
-
-        # Blend ik and fk limbs:
-        # ----get the animate joint chains first
-        l_arm_anim_jnt_chain = self.get_anim_jnt_name(["l_shoulder", "l_elbow", "l_wrist"])
-        r_arm_anim_jnt_chain = self.get_anim_jnt_name(["r_shoulder", "r_elbow", "r_wrist"])
-        l_leg_anim_jnt_chain = self.get_anim_jnt_name(["l_thigh", "l_knee", "l_ankle", "l_ball"])
-        r_leg_anim_jnt_chain = self.get_anim_jnt_name(["r_thigh", "r_knee", "r_ankle", "r_ball"])
-
-        # If no IK/FK arm/leg needed, assign the related jnt chains and control groups to none.
-        if not ik_arm:
-            l_ik_arm_chain, l_ik_arm_ctrs_grp, r_ik_arm_chain, r_ik_arm_ctrs_grp = [None], None, [None], None
-        if not fk_arm:
-            l_fk_arm_chain, l_fk_arm_ctrs_grp, r_fk_arm_chain, r_fk_arm_ctrs_grp = [None], None, [None], None
-        if not ik_leg:
-            l_ik_leg_chain, l_ik_foot_chain, l_ik_leg_ctrs_grp, r_ik_leg_chain, r_ik_foot_chain, r_ik_leg_ctrs_grp = [None], [None], None, [None], [None], None
-        if not fk_leg:
-            l_fk_leg_chain, l_fk_leg_ctrs_grp, r_fk_leg_chain, r_fk_leg_ctrs_grp = [None], None, [None], None
-
-        self.blend_ik_fk_limb(ik_jnt_chain=l_ik_arm_chain, fk_jnt_chain=l_fk_arm_chain, anim_jnt_chain=l_arm_anim_jnt_chain,
-                              blend_attr_name="lArmIkFk", blend_ctr=self.global_ctr, ik_ctrs_grp=l_ik_arm_ctrs_grp,
-                              fk_ctrs_grp=l_fk_arm_ctrs_grp)
-        self.blend_ik_fk_limb(ik_jnt_chain=r_ik_arm_chain, fk_jnt_chain=r_fk_arm_chain, anim_jnt_chain=r_arm_anim_jnt_chain,
-                              blend_attr_name="rArmIkFk", blend_ctr=self.global_ctr, ik_ctrs_grp=r_ik_arm_ctrs_grp,
-                              fk_ctrs_grp=r_fk_arm_ctrs_grp)
-        self.blend_ik_fk_limb(ik_jnt_chain=l_ik_leg_chain[:-1]+l_ik_foot_chain[:-1], fk_jnt_chain=l_fk_leg_chain, anim_jnt_chain=l_leg_anim_jnt_chain,
-                              blend_attr_name="lLegIkFk", blend_ctr=self.global_ctr, ik_ctrs_grp=l_ik_leg_ctrs_grp,
-                              fk_ctrs_grp=l_fk_leg_ctrs_grp)
-        self.blend_ik_fk_limb(ik_jnt_chain=r_ik_leg_chain[:-1]+r_ik_foot_chain[:-1], fk_jnt_chain=r_fk_leg_chain, anim_jnt_chain=r_leg_anim_jnt_chain,
-                              blend_attr_name="rLegIkFk", blend_ctr=self.global_ctr, ik_ctrs_grp=r_ik_leg_ctrs_grp ,
-                              fk_ctrs_grp=r_fk_leg_ctrs_grp)
-
-        # Create Stretch arms and legs:
-        stretch_loop_dict = {}
-        if stretch_arm and ik_arm:
-            stretch_loop_dict.update({"l_arm": [l_ik_arm_ctr, l_ik_arm_chain], "r_arm": [r_ik_arm_ctr, r_ik_arm_chain]})
-
-        if stretch_leg and ik_leg:
-            stretch_loop_dict.update({"l_leg": [l_ik_leg_ctr, l_ik_leg_chain], "r_leg": [r_ik_leg_ctr, r_ik_leg_chain]})
-
-        for limb_name, ctr_and_chain_list in stretch_loop_dict.items():
-            ik_arm_ctr = ctr_and_chain_list[0]
-            ik_arm_chain = ctr_and_chain_list[1]
-            self.create_stretch_limb(ik_ctr=ik_arm_ctr, end_jnt=ik_arm_chain[0],stretch_jnt_list=[ik_arm_chain[0], ik_arm_chain[1]],
-                                     switch_ctr=self.global_ctr, limb_name=limb_name)
+            toe_root_jnt_key = self.l_toe_root_jnt_key if left_or_right == LEFT_PREFIX else self.r_toe_root_jnt_key
+            foot_setting_space, foot_setting_ctr = self.create_digit_setting_ctrs(
+                digit_root_jnt_list=self.get_anim_jnt_name(toe_root_jnt_key),
+                parent_jnt=self.get_anim_jnt_name(left_or_right+"_ball"), rotate_digit_setting_ctr=[0, 90*side_sign, 0],
+                move_digit_setting_ctr=[10*side_sign, -7*side_sign, 0], mid_name="footSetting")
+            self.backend.parent(foot_setting_space, self.global_ctr)
+            setting_ctr_list.append(foot_setting_ctr)
+
+        # The setting controls are shaped from the side, the mirror build mirrors their shapes
+        return setting_ctr_list
+
+    def build_blend(self, compact_blend=False):
+        """
+        Blend ik and fk limbs, limbs without IK or FK chain use None for the related jnt chains and control groups
+        """
+        for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+            arm_data = self.get_limb_data(left_or_right, "arm")
+            self.blend_ik_fk_limb(ik_jnt_chain=arm_data.get("ik_chain", [None]), fk_jnt_chain=arm_data.get("fk_chain", [None]),
+                                  anim_jnt_chain=self.get_anim_jnt_name([left_or_right+"_shoulder", left_or_right+"_elbow",
+                                                                         left_or_right+"_wrist"]),
+                                  blend_attr_name=left_or_right+"ArmIkFk", blend_ctr=self.global_ctr,
+                                  ik_ctrs_grp=arm_data.get("ik_ctrs_grp"), fk_ctrs_grp=arm_data.get("fk_ctrs_grp"),
+                                  compact=compact_blend)
+
+        for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+            leg_data = self.get_limb_data(left_or_right, "leg")
+            ik_leg_chain = leg_data.get("ik_chain", [None])[:-1] + leg_data.get("ik_foot_chain", [None])[:-1]
+            self.blend_ik_fk_limb(ik_jnt_chain=ik_leg_chain, fk_jnt_chain=leg_data.get("fk_chain", [None]),
+                                  anim_jnt_chain=self.get_anim_jnt_name([left_or_right+"_thigh", left_or_right+"_knee",
+                                                                         left_or_right+"_ankle", left_or_right+"_ball"]),
+                                  blend_attr_name=left_or_right+"LegIkFk", blend_ctr=self.global_ctr,
+                                  ik_ctrs_grp=leg_data.get("ik_ctrs_grp"), fk_ctrs_grp=leg_data.get("fk_ctrs_grp"),
+                                  compact=compact_blend)
+
+    def build_stretch(self, stretch_arm=True, stretch_leg=True, mirror_build=False):
+        """
+        Create Stretch arms and legs, only the limbs with ik chain can stretch
+        """
+        for limb_name, stretch_limb in [("arm", stretch_arm), ("leg", stretch_leg)]:
+            if stretch_limb:
+                self.build_limb_sides(self.build_side_stretch, mirror_build=mirror_build, limb_name=limb_name)
+
+    def build_side_stretch(self, left_or_right, limb_name):
+        limb_data = self.get_limb_data(left_or_right, limb_name)
+        if "ik_chain" not in limb_data:
+            return
+
+        ik_chain = limb_data["ik_chain"]
+        self.create_stretch_limb(ik_ctr=limb_data["ik_ctr"], end_jnt=ik_chain[0], stretch_jnt_list=[ik_chain[0], ik_chain[1]],
+                                 switch_ctr=self.global_ctr, limb_name=left_or_right+SEPARATOR+limb_name)
+
+    def build_limb_sides(self, build_side, mirror_build=False, step_name=None, **kwargs):
+        """
+        Run the build of one side for the left and the right side. If mirror_build is True and the skeleton is
+        symmetric, only the left side is built and the right side is a mirrored copy of the new left nodes, the limb
+        data of the step(LIMB_STEP_DATA_DICT) is mapped to the copies. build_side can return the left controls
+        shaped from the side, the shapes of their copies are mirrored.
+        """
+        if not mirror_build or not self.is_symmetric():
+            for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+                build_side(left_or_right, **kwargs)
+            return
 
+        with node_registry.NodeRecorder() as node_recorder:
+            shape_mirror_list = build_side(LEFT_PREFIX, **kwargs)
+            self.backend.commit()
+        uuid_dict = rig_mirror.mirror_nodes(node_recorder.get_uuids(), prefix=util.clear_path(self.rig_grp),
+                                            shape_mirror_list=shape_mirror_list)
+
+        if step_name in LIMB_STEP_DATA_DICT:
+            limb_name, data_key_list = LIMB_STEP_DATA_DICT[step_name]
+            left_data = self.get_limb_data(LEFT_PREFIX, limb_name)
+            right_data = self.get_limb_data(RIGHT_PREFIX, limb_name)
+            for data_key in data_key_list:
+                if isinstance(left_data[data_key], list):
+                    right_data[data_key] = [self.get_mirror_node(node, uuid_dict) for node in left_data[data_key]]
+                else:
+                    right_data[data_key] = self.get_mirror_node(left_data[data_key], uuid_dict)
+
+    def get_mirror_node(self, node, uuid_dict):
+        """
+        Return the name of the mirrored copy of a left node, uuid_dict is returned by rig_mirror.mirror_nodes.
+        """
+        return mc.ls(uuid_dict[mc.ls(node, uuid=True)[0]])[0]
+
+    def is_symmetric(self):
+        """
+        Check if the right animate joints mirror the left ones, the joint positions are queried once per build.
+        """
+        if "symmetric" not in self.build_data:
+            left_key_list = sorted(jnt_key for jnt_key in self.anim_jnt_info_dict
+                                   if jnt_key.startswith(LEFT_PREFIX + SEPARATOR))
+            right_key_list = [RIGHT_PREFIX + jnt_key[len(LEFT_PREFIX):] for jnt_key in left_key_list]
+            symmetric = bool(left_key_list) and all(jnt_key in self.anim_jnt_info_dict for jnt_key in right_key_list)
+            if symmetric:
+                pos_list = util.get_world_positions(self.get_anim_jnt_name(left_key_list + right_key_list))
+                mirror_pos_list = rig_math.scale_vectors(pos_list[:len(left_key_list)], rig_math.MIRROR_PLANE_SCALE)
+                symmetric = all(rig_math.vec_length(rig_math.vec_sub(mirror_pos, pos)) < MIRROR_TOLERANCE
+                                for mirror_pos, pos in zip(mirror_pos_list, pos_list[len(left_key_list):]))
+            self.build_data["symmetric"] = symmetric
+        return self.build_data["symmetric"]
+
+    def build_connect(self):
         self.connect_anim_and_bind()
+        self.backend.commit()
         self.setup_global_scale()
 
-        # Clean up stuff
+    def build_cleanup(self):
+        """
+        Clean up stuff
+        """
+        spine_jnt_key_list = self.build_data["spine_jnt_key_list"]
+        neck_jnt_key_list = self.build_data["neck_jnt_key_list"]
+
         # --- disconnect the clavicle and neck joints from spine joints, in order to fix the scale issue
         for jnt_key in ["l_clavicle", "r_clavicle", "c_neck01"]:
             mc.parent(self.get_anim_jnt_name(jnt_key), self.anim_jnt_grp)
@@ -294,109 +677,135 @@ class AutoRigger:
 
         # --- hide attr from some controls
         hide_attr = ["scale", "visibility"]
-        util.hide_attr(hip_ctr, attrs=hide_attr)
+        util.hide_attr(self.build_data["hip_ctr"], attrs=hide_attr)
         util.hide_attr(self.cog_ctr, attrs=hide_attr)
-        for cla_ctr in  [r_clavicle_ctr, l_clavicle_ctr]:
+        for cla_ctr in self.build_data["clavicle_ctr"].values():
             util.hide_attr(cla_ctr, attrs=hide_attr)
 
         # hide misc and anim joint group
-        mc.setAttr(self.anim_jnt_grp+".visibility", 0)
-        mc.setAttr(self.bind_jnt_grp + ".visibility", 1)
-        mc.setAttr(self.misc_grp + ".visibility", 0)
+        self.backend.set_attr(self.anim_jnt_grp+".visibility", 0)
+        self.backend.set_attr(self.bind_jnt_grp + ".visibility", 1)
+        self.backend.set_attr(self.misc_grp + ".visibility", 0)
+
+    def get_limb_data(self, left_or_right, limb_name):
+        """
+        Get the dictionary holding the IK/FK joint chains and controls of the limb created by the build steps
+        """
+        return self.build_data.setdefault(left_or_right + SEPARATOR + limb_name, {})
 
     def init_jnt_orientation(self, mirror_behavior=True):
         """
         Correct all the joints orientation, mainly make them aim to the right direction before creating other stuff.
+        The orientation of the whole skeleton is solved in one pass and written back to the joints in one batch.
         """
-        # The first joint in the joint chain should aim to the second one,
-        # the second one should aim to the third one, so far and so forth...
-        center_jnt_chain_list = ["c_neck", "c_head", "c_headTip"]
-        l_arm_chain_list = ["l_clavicle", "l_shoulder", "l_elbow", "l_wrist"]
-        l_leg_chain_list = ["l_thigh", "l_knee"]
-        l_foot_chain_list = ["l_ankle", "l_ball", "l_footTip"]
-        r_arm_chain_list = ["r_clavicle", "r_shoulder", "r_elbow", "r_wrist"]
-        r_leg_chain_list = ["r_thigh", "r_knee"]
-        r_foot_chain_list = ["r_ankle", "r_ball", "r_footTip"]
-
-        # Get all the digit(toes and fingers) joint chains and put them in a list
-        all_digits_chain_list = []
-        for digit_root_list in [self.l_finger_root_jnt_key, self.r_finger_root_jnt_key]:
-            all_digits_chain_list.append(self.get_digit_jnt_chain(digit_root_list=digit_root_list, child_jnt_count=3))
+        orientation_input = self.get_orientation_input(mirror_behavior=mirror_behavior)
+        jnt_key_list, pos_dict, parent_dict, rule_dict, flip_key_list = orientation_input
 
-        for digit_root_list in [self.l_toe_root_jnt_key, self.r_toe_root_jnt_key]:
-            all_digits_chain_list.append(self.get_digit_jnt_chain(digit_root_list=digit_root_list, child_jnt_count=2))
+        # The orientation solved by prepare_build is used if the joints were not moved since
+        if self.prepared_orientation is not None and self.prepared_orientation[0] == orientation_input:
+            translate_dict, orient_dict = self.prepared_orientation[1]
+        else:
+            translate_dict, orient_dict = orient_solver.solve_skeleton(pos_dict, parent_dict, rule_dict,
+                                                                       flip_key_list=flip_key_list)
+        self.prepared_orientation = None
 
-        all_l_fingers_chain_list, all_r_fingers_chain_list, all_l_toes_chain_list, all_r_toes_chain_list = all_digits_chain_list
+        # Connect all the bind joints, all the children of a joint are parented in one go.
+        child_key_dict = {}
+        for jnt_key in jnt_key_list:
+            if parent_dict[jnt_key] is not None:
+                child_key_dict.setdefault(parent_dict[jnt_key], []).append(jnt_key)
 
-        # put all the joint chains that need to re-aim in a list
-        jnt_chains_need_aimming = [center_jnt_chain_list, l_arm_chain_list, l_leg_chain_list+l_foot_chain_list, r_arm_chain_list, r_leg_chain_list+r_foot_chain_list]
+        for parent_key, child_key_list in child_key_dict.items():
+            mc.parent(self.get_bnd_jnt_name(child_key_list) + [self.get_bnd_jnt_name(parent_key)], relative=True)
 
-        for digits_chain_list in all_digits_chain_list:
-            for single_digit_chain in digits_chain_list:
-                jnt_chains_need_aimming.append(single_digit_chain)
+        # Write the solved orientation back
+        util.set_jnt_transforms(self.get_bnd_jnt_name(jnt_key_list),
+                                translate_list=[translate_dict[jnt_key] for jnt_key in jnt_key_list],
+                                orient_list=[orient_dict[jnt_key] for jnt_key in jnt_key_list])
 
-        for jnt_chain in jnt_chains_need_aimming:
-            util.aim_jnt(self.get_bnd_jnt_name(jnt_chain))
+    def get_orientation_input(self, mirror_behavior=True):
+        """
+        Return the input of the orientation solver: the bind joint keys, their positions, their parent keys, the
+        orientation rules and the joints flipped for mirror behavior. Only the joint positions are read from the scene.
+        The digit rules follow the digit root joint lists, see set_digit_root_keys.
+        """
+        rule_dict, flip_key_list = self.get_jnt_orient_rules(mirror_behavior=mirror_behavior)
 
-        # Make wrist joint orientation to the same as elbow
-        util.set_jnt_orient(self.get_bnd_jnt_name("l_wrist"), target_jnt=self.get_bnd_jnt_name("l_elbow"))
-        util.set_jnt_orient(self.get_bnd_jnt_name("r_wrist"), target_jnt=self.get_bnd_jnt_name("r_elbow"))
+        # Query all the placed joint positions, the bind joints are all under the rig group at this moment
+        jnt_key_list = list(self.bind_jnt_info_dict.keys())
+        jnt_key_by_uuid = {}
+        pos_dict = {}
+        for jnt_key, jnt_name in zip(jnt_key_list, self.get_bnd_jnt_name(jnt_key_list)):
+            jnt_key_by_uuid[self.bind_jnt_info_dict[jnt_key]["uuid"]] = jnt_key
+            pos_dict[jnt_key] = mc.getAttr(jnt_name + ".translate")[0]
 
-        # Connect all the bind joints
-        for jnt_key, jnt_info in self.bind_jnt_info_dict.items():
-            if jnt_info["parent_uuid"] is not None:
-                mc.parent(self.get_bnd_jnt_name(jnt_key), mc.ls(jnt_info["parent_uuid"])[0])
-
-        # Sync joint orientation
-        # --- reorient all the leg joints
-        for jnt in self.get_bnd_jnt_name(l_leg_chain_list+r_leg_chain_list):
-            mc.joint(jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="zdown")
-
-        # --- reorient all the foot joints, need to unparent all the toes first,
-        #     otherwise the ball joint will point to one of the toes.
-        for toe_root_key in self.l_toe_root_jnt_key+self.r_toe_root_jnt_key:
-            mc.parent(self.get_bnd_jnt_name(toe_root_key), self.rig_grp)
-
-        for jnt in self.get_bnd_jnt_name(l_foot_chain_list[:-1]+r_foot_chain_list[:-1]):
-            mc.joint(jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="ydown")
-
-        for toe_chain in all_l_toes_chain_list + all_r_toes_chain_list:
-            for toe_jnt in  self.get_bnd_jnt_name(toe_chain[:-1]):
-                mc.joint(toe_jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="ydown")
-
-        # --- parent back the toes to the ball joints
-        for toe_root_key in self.l_toe_root_jnt_key+self.r_toe_root_jnt_key:
-            mc.parent(self.get_bnd_jnt_name(toe_root_key), mc.ls(self.bind_jnt_info_dict[toe_root_key]["parent_uuid"]))
-
-        # --- reorient all arm joints
-        for jnt in self.get_bnd_jnt_name(l_arm_chain_list[:-1] + r_arm_chain_list[:-1]):
-            mc.joint(jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="yup")
-
-        # --- zero out footTip joints orientation to match their parent
-        mc.makeIdentity(self.get_bnd_jnt_name("l_footTip"), rotate=True, jointOrient=True, apply=True)
-        mc.makeIdentity(self.get_bnd_jnt_name("r_footTip"), rotate=True, jointOrient=True, apply=True)
-
-        # --- reorient all the finger joints
-        for i, finger_chain_list in enumerate((all_l_fingers_chain_list + all_r_fingers_chain_list)):
-            for finger_jnt in self.get_bnd_jnt_name(finger_chain_list[:-1]):
-                if "thumb" in finger_jnt:
-                    mc.joint(finger_jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="zup")
+        parent_dict = {}
+        for jnt_key in jnt_key_list:
+            parent_dict[jnt_key] = jnt_key_by_uuid.get(self.bind_jnt_info_dict[jnt_key]["parent_uuid"])
+
+        return jnt_key_list, pos_dict, parent_dict, rule_dict, flip_key_list
+
+    def get_jnt_orient_rules(self, mirror_behavior=True):
+        """
+        Return the orientation rule of every bind joint, and the joints that need to be flipped for mirror behavior.
+        """
+        # The first joint in the joint chain should aim to the second one,
+        # the second one should aim to the third one, so far and so forth...
+        rule_dict = {"c_neck": orient_solver.aim_rule("c_head"),
+                     "c_head": orient_solver.aim_rule("c_headTip")}
+        flip_key_list = []
+
+        for left_or_right in [LEFT_PREFIX, RIGHT_PREFIX]:
+            side_rule_dict = {}
+            arm_chain_list = ["clavicle", "shoulder", "elbow", "wrist"]
+            leg_chain_list = ["thigh", "knee", "ankle"]
+            foot_chain_list = ["ankle", "ball", "footTip"]
+            arm_chain_list, leg_chain_list, foot_chain_list = [[left_or_right + SEPARATOR + name for name in chain_list]
+                                                               for chain_list in [arm_chain_list, leg_chain_list, foot_chain_list]]
+
+            # --- arm joints, wrist joint orientation is the same as elbow
+            self.add_chain_orient_rules(side_rule_dict, arm_chain_list, secondary_axis="yup", end_rule="match")
+            # --- leg joints and foot joints, footTip joint orientation is the same as ball
+            self.add_chain_orient_rules(side_rule_dict, leg_chain_list, secondary_axis="zdown", end_rule=None)
+            self.add_chain_orient_rules(side_rule_dict, foot_chain_list, secondary_axis="ydown", end_rule="match")
+
+            if left_or_right == LEFT_PREFIX:
+                finger_root_list, toe_root_list = self.l_finger_root_jnt_key, self.l_toe_root_jnt_key
+            else:
+                finger_root_list, toe_root_list = self.r_finger_root_jnt_key, self.r_toe_root_jnt_key
+
+            # --- finger joints, the end finger joints orientation is the same as their parent
+            for finger_chain_list in self.get_digit_jnt_chain(digit_root_list=finger_root_list, child_jnt_count=3):
+                if "thumb" in finger_chain_list[0]:
+                    secondary_axis = "zup"
                 else:
-                    mc.joint(finger_jnt, edit=True, orientJoint="xyz", secondaryAxisOrient="yup")
-            # zero out the end finger joints orientation to match their parent
-            mc.makeIdentity(self.get_bnd_jnt_name(finger_chain_list[-1]), rotate=True, jointOrient=True, apply=True)
+                    secondary_axis = "yup"
+                self.add_chain_orient_rules(side_rule_dict, finger_chain_list, secondary_axis=secondary_axis, end_rule="match")
 
-        # Change the joint orientation if mirror behavior mode is on
-        if mirror_behavior is True:
-            jnts_need_to_change = r_leg_chain_list + r_foot_chain_list + r_arm_chain_list
-            for r_finger_chain in all_r_fingers_chain_list:
-                jnts_need_to_change += r_finger_chain
+            # --- toe joints, the end toe joints keep the world orientation
+            for toe_chain_list in self.get_digit_jnt_chain(digit_root_list=toe_root_list, child_jnt_count=2):
+                self.add_chain_orient_rules(side_rule_dict, toe_chain_list, secondary_axis="ydown", end_rule=None)
 
-            for r_toe_chain in all_r_toes_chain_list:
-                jnts_need_to_change += r_toe_chain
+            # Change the joint orientation if mirror behavior mode is on
+            if mirror_behavior is True and left_or_right == RIGHT_PREFIX:
+                flip_key_list += side_rule_dict.keys()
 
-            for jnt in self.get_bnd_jnt_name(jnts_need_to_change):
-                util.set_jnt_orient(jnt, add_rot=[0, 0, 180])
+            rule_dict.update(side_rule_dict)
+
+        return rule_dict, flip_key_list
+
+    def add_chain_orient_rules(self, rule_dict, jnt_chain, secondary_axis="yup", end_rule=None):
+        """
+        Add aim rules for the input joint chain, every joint aims to the next one. The end joint either matches the
+        orientation of its parent(end_rule="match") or keeps the world orientation.
+        """
+        for i, jnt_key in enumerate(jnt_chain[:-1]):
+            rule_dict[jnt_key] = orient_solver.aim_rule(jnt_chain[i+1], secondary_axis=secondary_axis)
+
+        if end_rule == "match":
+            rule_dict.setdefault(jnt_chain[-1], orient_solver.match_rule(jnt_chain[-2]))
+        else:
+            rule_dict.setdefault(jnt_chain[-1], orient_solver.world_rule())
 
     def create_pelvis_jnt(self):
         """
@@ -480,6 +889,7 @@ class AutoRigger:
         mc.parent(self.get_bnd_jnt_name("c_head"), neck_root_jnt)
         mc.delete(self.get_bnd_jnt_name("c_neck"))
         self.bind_jnt_info_dict.pop("c_neck")
+        self.jnt_registry.invalidate((BIND_JNT_SUFFIX, "c_neck"))
 
         return neck_jnt_key_list
 
@@ -545,14 +955,67 @@ class AutoRigger:
             fol_node = mc.rename(fol_node, util.change_suffix(util.clear_path(spine_jnt), FOLLICLE_SUFFIX))
             mc.parent(fol_node, self.misc_grp)
 
-        # Create controls
-        mid_name_list = ["spineRoot", "spineMid", "spineEnd"]
+        # Create controls, the clusters follow the IK controls
         cluster_list = [root_cluster, mid_cluster, end_cluster]
-        ctr_list, ctr_space_list, fk_ctr_space_list, fk_ctr_list = [], [], [], []
         for i in range(len(cluster_list)):
             cluster_list[i] = mc.parent(cluster_list[i], self.misc_grp)[0]
 
-            ctr_space, ctr = util.create_ctr_cuv(pos=mc.xform(cluster_list[i], query=True, rotatePivot=True, worldSpace=True),
+        ctr_pos_list = [mc.xform(cluster, query=True, rotatePivot=True, worldSpace=True) for cluster in cluster_list]
+        ctr_space_list, ctr_list, fk_ctr_space_list, fk_ctr_list = self.create_spine_ctrs(ctr_pos_list)
+        for ctr, cluster in zip(ctr_list, cluster_list):
+            mc.parentConstraint(ctr, cluster, maintainOffset=True)
+            mc.scaleConstraint(ctr, cluster, maintainOffset=True)
+
+        spine_surf = mc.rename(spine_surf, SEPARATOR.join([prefix, CENTER_PREFIX, "spineSurf", NURBS_SURF_SUFFIX]))
+        spine_surf = mc.parent(spine_surf, self.misc_grp)[0]
+
+        fk_ctr_space_list[0] = mc.parent(fk_ctr_space_list[0], self.global_ctr)[0]
+
+        return ctr_space_list, ctr_list, fk_ctr_space_list, fk_ctr_list
+
+    def create_light_spine(self, spine_jnt_chain):
+        """
+        Create the spine controls of the ribbon spine without the surface, clusters and follicles. Every spine joint
+        is parent constrained to the IK controls, weighted by how much the ribbon surface cvs of each control move the
+        surface at the joint, so the joints follow the controls like on the ribbon without evaluating a surface.
+        """
+        chain_list_len = len(spine_jnt_chain)
+
+        if chain_list_len % 2 == 0:
+            return
+
+        root_pos = mc.xform(spine_jnt_chain[0], query=True, translation=True, worldSpace=True)
+        end_pos = mc.xform(spine_jnt_chain[-1], query=True, translation=True, worldSpace=True)
+        spine_vec = rig_math.vec_sub(end_pos, root_pos)
+
+        # The controls are at the center of the ribbon cvs they would move
+        ctr_pos_list = [rig_math.vec_add(root_pos, rig_math.vec_scale(spine_vec, param))
+                        for param in RIBBON_CTR_PARAM_LIST]
+        ctr_space_list, ctr_list, fk_ctr_space_list, fk_ctr_list = self.create_spine_ctrs(ctr_pos_list)
+
+        param_u_delta = 1.0/(chain_list_len-1)
+        for i, spine_jnt in enumerate(spine_jnt_chain):
+            basis_list = rig_math.bspline_basis(RIBBON_KNOT_LIST, RIBBON_DEGREE, param_u_delta*i)
+            spine_jnt_chain[i] = mc.parent(spine_jnt, self.misc_grp)[0]
+            for ctr, cv_index_list in zip(ctr_list, RIBBON_CTR_CV_LIST):
+                weight = sum([basis_list[cv_index] for cv_index in cv_index_list])
+                if weight > rig_math.EPSILON:
+                    mc.parentConstraint(ctr, spine_jnt_chain[i], maintainOffset=True, weight=weight)
+
+        fk_ctr_space_list[0] = mc.parent(fk_ctr_space_list[0], self.global_ctr)[0]
+
+        return ctr_space_list, ctr_list, fk_ctr_space_list, fk_ctr_list
+
+    def create_spine_ctrs(self, ctr_pos_list):
+        """
+        Create the root, middle and end spine IK controls at the input positions, each IK control is under a FK
+        control and the FK controls are chained.
+        """
+        prefix = util.clear_path(self.rig_grp)
+        mid_name_list = ["spineRoot", "spineMid", "spineEnd"]
+        ctr_list, ctr_space_list, fk_ctr_space_list, fk_ctr_list = [], [], [], []
+        for i in range(len(ctr_pos_list)):
+            ctr_space, ctr = util.create_ctr_cuv(pos=ctr_pos_list[i],
                                                  ctr_type="cube", scale_cv=[30, 5, 10],
                                                  ctr_name=SEPARATOR.join([prefix, CENTER_PREFIX, mid_name_list[i] + "Ik", CONTROL_SUFFIX]),
                                                  space_name=SEPARATOR.join([prefix, CENTER_PREFIX, mid_name_list[i] + "Ik", SPACE_GRP_SUFFIX]))
@@ -560,8 +1023,6 @@ class AutoRigger:
                                                        ctr_name=SEPARATOR.join([prefix, CENTER_PREFIX, mid_name_list[i] + "Fk", CONTROL_SUFFIX]),
                                                        space_name=SEPARATOR.join([prefix, CENTER_PREFIX, mid_name_list[i] + "Fk", SPACE_GRP_SUFFIX]))
 
-            mc.parentConstraint(ctr, cluster_list[i], maintainOffset=True)
-            mc.scaleConstraint(ctr, cluster_list[i], maintainOffset=True)
             util.hide_attr(ctr, attrs=["scale", "visibility"])
             util.hide_attr(fk_ctr, attrs=["translate", "scale", "visibility"])
 
@@ -575,11 +1036,6 @@ class AutoRigger:
             fk_ctr_space_list.append(fk_ctr_space)
             fk_ctr_list.append(fk_ctr)
 
-        spine_surf = mc.rename(spine_surf, SEPARATOR.join([prefix, CENTER_PREFIX, "spineSurf", NURBS_SURF_SUFFIX]))
-        spine_surf = mc.parent(spine_surf, self.misc_grp)[0]
-
-        fk_ctr_space_list[0] = mc.parent(fk_ctr_space_list[0], self.global_ctr)[0]
-
         return ctr_space_list, ctr_list, fk_ctr_space_list, fk_ctr_list
 
     def create_general_ctr(self, jnt=None, pos=[0,0,0],  cst_types=["parent"], ctr_type="circle", ctr_scale=[1,1,1], ctr_rot=[0,0,0], ctr_move=[0,0,0],
@@ -619,7 +1075,7 @@ class AutoRigger:
 
     def create_ik_limb(self, root_jnt_key, mid_jnt_key, end_jnt_key, main_name, constraint_ik_ctr=True, constraint_pv_ctr=True,
                        ik_ctr_rotate = [0,0,0], pv_ctr_rotate = [0,0,0], ik_ctr_scale= [10,10,10], pv_ctr_scale= [10,10,10],
-                       match_jnt_orient=False):
+                       match_jnt_orient=False, pole_vec_pos=None):
         """
         Create IK limb, controls. Rename all new objects and put them in the right groups
         """
@@ -632,7 +1088,8 @@ class AutoRigger:
                                                                                                pv_ctr_rotate=pv_ctr_rotate,
                                                                                                ik_ctr_scale=ik_ctr_scale,
                                                                                                pv_ctr_scale=pv_ctr_scale,
-                                                                                               match_jnt_orient=match_jnt_orient
+                                                                                               match_jnt_orient=match_jnt_orient,
+                                                                                               pole_vec_pos=pole_vec_pos
                                                                                                )
         # Get the animate names for renaming the new IK joints
         animate_jnt_chain = self.get_anim_jnt_name([root_jnt_key, mid_jnt_key, end_jnt_key])
@@ -661,6 +1118,27 @@ class AutoRigger:
 
         return ik_jnt_chain, ik_ctrs_grp, ik_ctr, ik_hdl
 
+    def get_pole_vec_pos(self, left_or_right, limb_name):
+        """
+        Get the pole vector position of the IK limb. The first call queries the joints of all the IK limbs in one pass
+        and solves all the pole vectors at once, the other limbs reuse the result.
+        """
+        pole_vec_pos_dict = self.build_data.get("pole_vec_pos_dict")
+        if pole_vec_pos_dict is None:
+            limb_key_list = [(side, name) for name in sorted(IK_LIMB_JNT_DICT) for side in [LEFT_PREFIX, RIGHT_PREFIX]]
+            jnt_key_list = [side + SEPARATOR + jnt for side, name in limb_key_list for jnt in IK_LIMB_JNT_DICT[name]]
+            pos_list = util.get_world_positions(self.get_anim_jnt_name(jnt_key_list))
+
+            chain_pos_list = [pos_list[i*3:i*3+3] for i in range(len(limb_key_list))]
+            fallback_vec_list = [POLE_VEC_FALLBACK_DICT[name] for side, name in limb_key_list]
+            pole_vec_pos_list = rig_math.pole_vec_positions(chain_pos_list, fallback_vec_list)
+
+            pole_vec_pos_dict = dict((side + SEPARATOR + name, pole_vec_pos) for (side, name), pole_vec_pos
+                                     in zip(limb_key_list, pole_vec_pos_list))
+            self.build_data["pole_vec_pos_dict"] = pole_vec_pos_dict
+
+        return pole_vec_pos_dict[left_or_right + SEPARATOR + limb_name]
+
     def create_ik_foot(self, ankle_jnt_key, ball_jnt_key, toe_jnt_key, leg_ik_ctr, leg_ik_hdl):
         """
         Create IK foot and add foot roll attributes to foot control
@@ -712,18 +1190,18 @@ class AutoRigger:
             mc.addAttr(leg_ik_ctr, longName=attr, attributeType='float', keyable=True)
 
         # Connect foot roll attrs to toe roatation z
-        mc.connectAttr(leg_ik_ctr + ".toeRoll", toe_loc + ".rz")
-        mc.connectAttr(leg_ik_ctr + ".ballRoll", ball_loc + ".rz")
-        mc.connectAttr(leg_ik_ctr + ".heelRoll", heel_loc + ".rz")
+        self.backend.connect_attr(leg_ik_ctr + ".toeRoll", toe_loc + ".rz")
+        self.backend.connect_attr(leg_ik_ctr + ".ballRoll", ball_loc + ".rz")
+        self.backend.connect_attr(leg_ik_ctr + ".heelRoll", heel_loc + ".rz")
 
         # Ball roll and toe left:
-        pma_node = mc.createNode("plusMinusAverage")
-        md_node = mc.createNode("multiplyDivide")
-        mc.setAttr(md_node+".input2Z", -1)
-        mc.connectAttr(leg_ik_ctr + ".ballRoll", pma_node + ".input1D[0]")
-        mc.connectAttr(leg_ik_ctr + ".toeLift", pma_node + ".input1D[1]")
-        mc.connectAttr(pma_node + ".output1D", md_node + ".input1Z")
-        mc.connectAttr(md_node + ".outputZ", ball_ik + ".rz")
+        pma_node = self.backend.create_node("plusMinusAverage", name=SEPARATOR.join([prefix, left_or_right, "toeLift", NODE_OBJ_SUFFIX]))
+        md_node = self.backend.create_node("multiplyDivide", name=SEPARATOR.join([prefix, left_or_right, "toeLiftReverse", NODE_OBJ_SUFFIX]))
+        self.backend.set_attr(md_node+".input2Z", -1)
+        self.backend.connect_attr(leg_ik_ctr + ".ballRoll", pma_node + ".input1D[0]")
+        self.backend.connect_attr(leg_ik_ctr + ".toeLift", pma_node + ".input1D[1]")
+        self.backend.connect_attr(pma_node + ".output1D", md_node + ".input1Z")
+        self.backend.connect_attr(md_node + ".outputZ", ball_ik + ".rz")
 
         mc.orientConstraint(ball_loc, ankle_drv_jnt, maintainOffset=True)
         mc.pointConstraint(ankle_loc, leg_ik_hdl, maintainOffset=True)
@@ -758,9 +1236,13 @@ class AutoRigger:
         return fk_jnt_chain, fk_ctrs_grp
 
     def blend_ik_fk_limb(self, ik_jnt_chain, fk_jnt_chain, anim_jnt_chain, blend_ctr, blend_attr_name,
-                         ik_ctrs_grp, fk_ctrs_grp):
+                         ik_ctrs_grp, fk_ctrs_grp, compact=False):
         """
-        Blend the input IK FK chain to the animate chain, and add the control attribute to the input blend control
+        Blend the input IK FK chain to the animate chain, and add the control attribute to the input blend control.
+        If compact is True, every joint is blended by one pair blend node, the rotate on its rotate channels and the
+        scale on its translate channels, and a single chain is connected to the animate chain without blend node. The
+        scale is blended by a blend colors node if the linear unit is not centimeter, the translate channels would get
+        unit conversion nodes.
         """
         # Create blend colors node and add blend attribute on it
         only_fk = False
@@ -773,24 +1255,42 @@ class AutoRigger:
 
         if not (only_fk or only_ik):
             mc.addAttr(blend_ctr, longName=blend_attr_name, keyable=True, attributeType='float', minValue=0, maxValue=1)
-            reverse_node = mc.createNode("reverse", name=util.change_suffix(util.clear_path(ik_ctrs_grp), REVERSE_NODE_SUFFIX))
-            mc.connectAttr(blend_ctr+"."+blend_attr_name, reverse_node+".inputX")
-            mc.connectAttr(reverse_node + ".outputX", ik_ctrs_grp+".visibility")
-            mc.connectAttr(blend_ctr + "." + blend_attr_name, fk_ctrs_grp + ".visibility")
+            reverse_node = self.backend.create_node("reverse", name=util.change_suffix(util.clear_path(ik_ctrs_grp), REVERSE_NODE_SUFFIX))
+            self.backend.connect_attr(blend_ctr+"."+blend_attr_name, reverse_node+".inputX")
+            self.backend.connect_attr(reverse_node + ".outputX", ik_ctrs_grp+".visibility")
+            self.backend.connect_attr(blend_ctr + "." + blend_attr_name, fk_ctrs_grp + ".visibility")
+
+            pair_blend_scale = compact and mc.currentUnit(query=True, linear=True) == PAIR_BLEND_SCALE_UNIT
 
             # Connect fk, ik joints to animate joints
             for i in range((len(ik_jnt_chain))):
                 ik_jnt = ik_jnt_chain[i]
                 fk_jnt = fk_jnt_chain[i]
                 anim_jnt = anim_jnt_chain[i]
-
-                for attr in ["rotate", "scale"]:
-                    bc_node = mc.createNode("blendColors", name=SEPARATOR.join([util.clear_path(self.rig_grp),
-                                                                                self.get_jnt_key(ik_jnt)+attr, BLEND_COLORS_SUFFIX]))
-                    mc.connectAttr(fk_jnt+"."+attr, bc_node+".color1")
-                    mc.connectAttr(ik_jnt+"."+attr, bc_node+".color2")
-                    mc.connectAttr(bc_node + ".output", anim_jnt + "." + attr)
-                    mc.connectAttr(blend_ctr + "." + blend_attr_name, bc_node + ".blender")
+                blend_attr_list = ["rotate", "scale"]
+
+                if compact:
+                    # Pair blend weight 1 uses the second inputs, the FK chain, the same as the blend colors blender
+                    pb_node = self.backend.create_node("pairBlend", name=SEPARATOR.join([util.clear_path(self.rig_grp),
+                                                                                        self.get_jnt_key(ik_jnt), PAIR_BLEND_SUFFIX]))
+                    self.backend.connect_attr(ik_jnt + ".rotate", pb_node + ".inRotate1")
+                    self.backend.connect_attr(fk_jnt + ".rotate", pb_node + ".inRotate2")
+                    self.backend.connect_attr(pb_node + ".outRotate", anim_jnt + ".rotate")
+                    self.backend.connect_attr(blend_ctr + "." + blend_attr_name, pb_node + ".weight")
+                    if pair_blend_scale:
+                        self.backend.connect_attr(ik_jnt + ".scale", pb_node + ".inTranslate1")
+                        self.backend.connect_attr(fk_jnt + ".scale", pb_node + ".inTranslate2")
+                        self.backend.connect_attr(pb_node + ".outTranslate", anim_jnt + ".scale")
+                        continue
+                    blend_attr_list = ["scale"]
+
+                for attr in blend_attr_list:
+                    bc_node = self.backend.create_node("blendColors", name=SEPARATOR.join([util.clear_path(self.rig_grp),
+                                                                                          self.get_jnt_key(ik_jnt)+attr, BLEND_COLORS_SUFFIX]))
+                    self.backend.connect_attr(fk_jnt+"."+attr, bc_node+".color1")
+                    self.backend.connect_attr(ik_jnt+"."+attr, bc_node+".color2")
+                    self.backend.connect_attr(bc_node + ".output", anim_jnt + "." + attr)
+                    self.backend.connect_attr(blend_ctr + "." + blend_attr_name, bc_node + ".blender")
         else:
             if only_fk:
                 blend_jnt_chain = fk_jnt_chain
@@ -802,12 +1302,16 @@ class AutoRigger:
                 anim_jnt = anim_jnt_chain[i]
 
                 for attr in ["rotate", "scale"]:
-                    bc_node = mc.createNode("blendColors", name=SEPARATOR.join([util.clear_path(self.rig_grp),
-                                                                                self.get_jnt_key(blend_jnt) + attr,
-                                                                                BLEND_COLORS_SUFFIX]))
-                    mc.setAttr(bc_node+".blender", 1)
-                    mc.connectAttr(blend_jnt + "." + attr, bc_node + ".color1")
-                    mc.connectAttr(bc_node + ".output", anim_jnt + "." + attr)
+                    if compact:
+                        self.connect_step_attr(blend_jnt + "." + attr, anim_jnt + "." + attr)
+                        continue
+
+                    bc_node = self.backend.create_node("blendColors", name=SEPARATOR.join([util.clear_path(self.rig_grp),
+                                                                                          self.get_jnt_key(blend_jnt) + attr,
+                                                                                          BLEND_COLORS_SUFFIX]))
+                    self.backend.set_attr(bc_node+".blender", 1)
+                    self.backend.connect_attr(blend_jnt + "." + attr, bc_node + ".color1")
+                    self.backend.connect_attr(bc_node + ".output", anim_jnt + "." + attr)
 
     def create_digit_setting_ctrs(self, digit_root_jnt_list, parent_jnt, rotate_digit_setting_ctr=[0,90,0],
                                   move_digit_setting_ctr=[10,7,0], mid_name="digitSetting"):
@@ -853,8 +1357,8 @@ class AutoRigger:
             digit_ctr_offset_list[i] = mc.rename(digit_ctr_offset_list[i], util.change_suffix(digit_jnt_name, OFFSET_GRP_SUFFIX))
             digit_ctr_space_list[i] = mc.rename(digit_ctr_space_list[i], util.change_suffix(digit_jnt_name, SPACE_GRP_SUFFIX ))
 
-            mc.connectAttr(digit_setting_ctr+"." + curl_attr_name,
-                           util.clear_path(digit_ctr_offset_list[i]) + ".rotateZ")
+            self.backend.connect_attr(digit_setting_ctr+"." + curl_attr_name,
+                                      util.clear_path(digit_ctr_offset_list[i]) + ".rotateZ")
 
         mc.parent(digit_ctr_space_list[0], digit_setting_ctr)
         return digit_ctr_space_list, digit_ctr_list, digit_ctr_offset_list
@@ -909,7 +1413,7 @@ class AutoRigger:
             bind_jnt = self.get_bnd_jnt_name(jnt_key)
             anim_jnt = self.get_anim_jnt_name(jnt_key)
             mc.parentConstraint(anim_jnt, bind_jnt, maintainOffset=False)
-            mc.connectAttr(anim_jnt + ".scale", bind_jnt + ".scale")
+            self.backend.connect_attr(anim_jnt + ".scale", bind_jnt + ".scale")
 
     def setup_global_scale(self):
         """
@@ -918,12 +1422,14 @@ class AutoRigger:
         mc.scaleConstraint(self.global_ctr, self.anim_jnt_grp)
         mc.scaleConstraint(self.global_ctr, self.bind_jnt_grp)
 
-    def create_twist_jnts(self, start_jnt, end_jnt, twist_rate_list=[-1, -0.5, -0.2], twist_axis="x", parent_to_end_jnt=False):
+    def create_twist_jnts(self, start_jnt, end_jnt, twist_rate_list=[-1, -0.5, -0.2], twist_axis="x", parent_to_end_jnt=False,
+                          compact=False):
         """
         Create twist joints between two specific joints, twist joints will be driven by the first joint. The twist joint count
         depends on how many twist rate items in the twist_rate_list. For instance [-1, -0.5, -0.2], the first twist joint
         will not twist when the
         driver joint twist, the second will rotate 50% and the third will rotate 80%
+        If compact is True, one multiply divide node drives three twist joints with its X, Y and Z channels.
         """
         twist_jnt_count = len(twist_rate_list)
         start_jnt_key = self.get_jnt_key(start_jnt)
@@ -958,12 +1464,14 @@ class AutoRigger:
         mc.delete(twist_end_jnt)
 
         # Connect twist joints to their parent
+        channel_count = 3 if compact else 1
         for i, twist_jnt in enumerate(twist_jnt_list):
-            md_node = mc.createNode("multiplyDivide")
-            mc.setAttr(md_node+".input2X", twist_rate_list[i])
-            mc.connectAttr(start_jnt+".rotate"+twist_axis.upper(), md_node+".input1X")
-            mc.connectAttr(md_node + ".outputX",  twist_jnt + ".rotateX")
-            mc.rename(md_node, util.change_suffix(util.clear_path(twist_jnt), NODE_OBJ_SUFFIX))
+            channel = "XYZ"[i % channel_count]
+            if i % channel_count == 0:
+                md_node = self.backend.create_node("multiplyDivide", name=util.change_suffix(util.clear_path(twist_jnt), NODE_OBJ_SUFFIX))
+            self.backend.set_attr(md_node+".input2"+channel, twist_rate_list[i])
+            self.backend.connect_attr(start_jnt+".rotate"+twist_axis.upper(), md_node+".input1"+channel)
+            self.backend.connect_attr(md_node + ".output"+channel,  twist_jnt + ".rotateX")
 
             if not parent_to_end_jnt:
                 parent_jnt = start_jnt
@@ -980,21 +1488,14 @@ class AutoRigger:
 
     def create_stretch_limb(self, ik_ctr, end_jnt, stretch_jnt_list, switch_ctr, limb_name, global_ctr=None):
         """
-        Create stretch limb, rename the new created nodes and group
+        Create stretch limb, the utility nodes get the character prefix, rename the new created distance node
         """
-        distance_dimen, start_loc, end_loc = util.create_stretch_limb(ik_ctr=ik_ctr, end_jnt=end_jnt, stretch_jnt_list=stretch_jnt_list,
-                                                                      switch_ctr=switch_ctr, switch_attr_name=limb_name+"Stretch",
-                                                                      global_ctr=self.global_ctr)
-
         prefix = util.clear_path(self.rig_grp)
-        distance_dimen = mc.rename(distance_dimen, SEPARATOR.join([prefix, limb_name, DISTANCE_DIMEN_SUFFIX]))
-        start_loc = mc.rename(start_loc, SEPARATOR.join([prefix, limb_name+"StretchStart", LOCATOR_SUFFIX]))
-        end_loc = mc.rename(end_loc, SEPARATOR.join([prefix, limb_name + "StretchEnd", LOCATOR_SUFFIX]))
-
-        stretch_grp = mc.group(distance_dimen, start_loc, end_loc, parent=self.misc_grp)
-        stretch_grp = mc.rename(stretch_grp, SEPARATOR.join([prefix, limb_name+"Stretch", GRP_SUFFIX]))
+        distance_node = util.create_stretch_limb(ik_ctr=ik_ctr, end_jnt=end_jnt, stretch_jnt_list=stretch_jnt_list,
+                                                 switch_ctr=switch_ctr, switch_attr_name=limb_name+"Stretch",
+                                                 global_ctr=self.global_ctr, backend=self.backend, prefix=prefix)
 
-        return stretch_grp
+        return self.backend.rename(distance_node, SEPARATOR.join([prefix, limb_name, DISTANCE_BETWEEN_SUFFIX]))
 
     def get_default_twist_rate(self, twist_jnt_count, counter_twist=True):
         """
@@ -1039,15 +1540,17 @@ class AutoRigger:
         """
         if isBind:
             search_dict = self.bind_jnt_info_dict
+            jnt_type = BIND_JNT_SUFFIX
         elif isAnim:
             search_dict = self.anim_jnt_info_dict
+            jnt_type = ANIM_JNT_SUFFIX
 
         if type(jnt_key) is not list:
-            return mc.ls(search_dict[jnt_key]["uuid"])[0]
+            return self.jnt_registry.get_name((jnt_type, jnt_key), search_dict[jnt_key]["uuid"])
         else:
             result_list = []
             for k in jnt_key:
-                result_list.append(mc.ls(search_dict[k]["uuid"])[0])
+                result_list.append(self.jnt_registry.get_name((jnt_type, k), search_dict[k]["uuid"]))
             return result_list
 
     def get_uuid(self, obj_name):
@@ -0,0 +1,344 @@
+"""
+Headless batch rigging. Reads a manifest of characters, builds every rig in a pool of mayapy worker processes and
+writes one scene file per character, plus a JSON report with the timing and failures of every character.
+
+Usage:
+    python batch_rig.py manifest.json --workers 4 --report report.json
+
+Manifest example:
+    {"output_dir": "rigs",
+     "export_graph": true,
+     "rig_cache_dir": "rig_cache", "rig_cache_size": 1024,
+     "characters": [{"name": "crowdA",
+                     "jnt_pos_file": "crowdA_joints.json",
+                     "finger_count": 4, "toe_count": 0, "symmetry": true, "bake_symmetry": true,
+                     "spine_jnt_count": 5, "neck_jnt_count": 3,
+                     "ik_leg": true, "stretch_leg": false}]}
+
+The joint positions can be given inline with "jnt_pos_dict" or in a JSON file with "jnt_pos_file", they are the
+joint key and world position pairs returned by JointPlacementHelper.get_jnt_positions. Every create_rig option
+can be set on the character, options that are not set use the create_rig default value. With "export_graph", the
+node graph of every rig is also written next to its scene file, to be analyzed by rig_graph without Maya.
+
+With "rig_cache_dir", every built rig is stored in the rig cache(rig_cache.py), characters with the same bind joint
+positions and create_rig options import the cached rig instead of building it. "rig_cache_size" is the size cap of
+the cache folder in megabytes.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import traceback
+import shutil
+from multiprocessing.pool import ThreadPool
+
+FOLDER_PATH = os.path.abspath(os.path.dirname(__file__))
+
+PLACEMENT_OPTION_LIST = ["finger_count", "toe_count", "symmetry", "bake_symmetry"]
+RIG_OPTION_LIST = ["spine_jnt_count", "neck_jnt_count", "upper_arm_twist_count", "lower_arm_twist_count",
+                   "upper_leg_twist_count", "lower_leg_twist_count", "finger_count", "toe_count", "mirror_behavior",
+                   "stretch_arm", "stretch_leg", "fk_arm", "ik_arm", "fk_leg", "ik_leg", "compact_twist",
+                   "compact_blend", "light_spine", "mirror_build", "use_api_modifier"]
+
+DEF_WORKER_CNT = 2
+DEF_SCENE_EXT = ".ma"
+GRAPH_FILE_SUFFIX = "_graph.json"
+SCENE_TYPE_DICT = {".ma": "mayaAscii", ".mb": "mayaBinary"}
+MAYAPY_ENV_NAME = "MAYAPY"
+DEF_MAYAPY = "mayapy"
+
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_STORE_FAILED = "store_failed"
+MEGABYTE = 1024*1024
+
+# Error Msg
+NO_NAME_ERR = "Character has no name."
+SPINE_JNT_CNT_ODD_ERR = "Spine joints count should be an odd number."
+IK_FK_LEG_ERR = "At least one IK/FK legs option should be on."
+IK_FK_ARM_ERR = "At least one IK/FK arms option should be on."
+WORKER_CRASH_ERR = "Worker process exited without a result, return code: {0}\n{1}"
+
+
+def load_manifest(manifest_path):
+    """
+    Load the manifest file and return a list of build jobs, relative paths are resolved from the manifest folder.
+    """
+    with open(manifest_path, "r") as file_obj:
+        manifest = json.load(file_obj)
+
+    manifest_folder = os.path.dirname(os.path.abspath(manifest_path))
+    output_dir = os.path.join(manifest_folder, manifest.get("output_dir", "."))
+    scene_ext = manifest.get("scene_ext", DEF_SCENE_EXT)
+    export_graph = manifest.get("export_graph", False)
+    cache_dir = manifest.get("rig_cache_dir")
+    if cache_dir is not None:
+        cache_dir = os.path.join(manifest_folder, cache_dir)
+    cache_max_size = manifest.get("rig_cache_size")
+    if cache_max_size is not None:
+        cache_max_size = int(cache_max_size*MEGABYTE)
+
+    job_list = []
+    for char_info in manifest["characters"]:
+        jnt_pos_dict = char_info.get("jnt_pos_dict")
+        if jnt_pos_dict is None and char_info.get("jnt_pos_file") is not None:
+            with open(os.path.join(manifest_folder, char_info["jnt_pos_file"]), "r") as file_obj:
+                jnt_pos_dict = json.load(file_obj)
+
+        job = {"name": char_info.get("name", ""),
+               "jnt_pos_dict": jnt_pos_dict,
+               "placement_options": dict((key, char_info[key]) for key in PLACEMENT_OPTION_LIST if key in char_info),
+               "rig_options": dict((key, char_info[key]) for key in RIG_OPTION_LIST if key in char_info),
+               "scene_path": os.path.join(output_dir, char_info.get("name", "") + scene_ext),
+               "graph_path": os.path.join(output_dir, char_info.get("name", "") + GRAPH_FILE_SUFFIX) if export_graph
+               else None,
+               "cache_dir": cache_dir,
+               "cache_max_size": cache_max_size}
+        job_list.append(job)
+
+    return job_list
+
+
+def validate_job(job):
+    """
+    Validate the job options, the same rules as the UI. Return an error message or None.
+    """
+    rig_options = job["rig_options"]
+
+    if not job["name"]:
+        return NO_NAME_ERR
+
+    if rig_options.get("spine_jnt_count", 5) % 2 == 0:
+        return SPINE_JNT_CNT_ODD_ERR
+
+    if not (rig_options.get("ik_leg", False) or rig_options.get("fk_leg", True)):
+        return IK_FK_LEG_ERR
+
+    if not (rig_options.get("ik_arm", True) or rig_options.get("fk_arm", True)):
+        return IK_FK_ARM_ERR
+
+    return None
+
+
+def get_failed_result(job, error):
+    return {"name": job["name"], "scene_file": None, "graph_file": None, "status": STATUS_FAILED, "timing": {},
+            "cache": None, "error": error}
+
+
+def run_batch(job_list, worker_count=DEF_WORKER_CNT, mayapy=None):
+    """
+    Build all the jobs in a pool of mayapy processes and return the result of every job. The jobs are split
+    between the workers, so every worker only pays the maya startup time once.
+    """
+    if mayapy is None:
+        mayapy = os.environ.get(MAYAPY_ENV_NAME, DEF_MAYAPY)
+
+    result_dict = {}
+    valid_job_list = []
+    for i, job in enumerate(job_list):
+        error = validate_job(job)
+        if error is not None:
+            result_dict[i] = get_failed_result(job, error)
+        else:
+            valid_job_list.append((i, job))
+
+    worker_count = max(1, min(worker_count, len(valid_job_list)))
+    worker_job_list = [valid_job_list[i::worker_count] for i in range(worker_count)]
+
+    temp_dir = tempfile.mkdtemp(prefix="batch_rig_")
+    try:
+        def run_worker_process(worker_index):
+            indexed_job_list = worker_job_list[worker_index]
+            if not indexed_job_list:
+                return
+
+            job_file = os.path.join(temp_dir, "jobs{0}.json".format(worker_index))
+            result_file = os.path.join(temp_dir, "results{0}.json".format(worker_index))
+            with open(job_file, "w") as file_obj:
+                json.dump([job for i, job in indexed_job_list], file_obj)
+
+            process = subprocess.Popen([mayapy, os.path.abspath(__file__), "--worker", job_file, result_file],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output = process.communicate()[0].decode("utf-8", "replace")
+
+            worker_result_list = []
+            if os.path.exists(result_file):
+                with open(result_file, "r") as file_obj:
+                    worker_result_list = json.load(file_obj)
+
+            # Jobs without result were not finished because the worker crashed
+            for n, (i, job) in enumerate(indexed_job_list):
+                if n < len(worker_result_list):
+                    result_dict[i] = worker_result_list[n]
+                else:
+                    result_dict[i] = get_failed_result(job, WORKER_CRASH_ERR.format(process.returncode, output))
+
+        pool = ThreadPool(worker_count)
+        pool.map(run_worker_process, range(worker_count))
+        pool.close()
+        pool.join()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return [result_dict[i] for i in range(len(job_list))]
+
+
+def build_character(job):
+    """
+    Build a single character in the current maya session and save the scene. Return the result dictionary.
+    """
+    import maya.cmds as mc
+    import joint_placement_helper
+    import auto_rigger
+    import rig_graph
+    import rig_cache
+
+    result = {"name": job["name"], "scene_file": job["scene_path"], "graph_file": job.get("graph_path"),
+              "status": STATUS_FAILED, "timing": {}, "cache": None, "error": None}
+    start_time = time.time()
+
+    try:
+        mc.file(new=True, force=True)
+
+        step_time = time.time()
+        jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
+        placement_options = job["placement_options"]
+        jnt_placement_helper.create_temp_skeleton(character_name=job["name"], jnt_pos_dict=job["jnt_pos_dict"],
+                                                  **placement_options)
+        result["timing"]["create_temp_skeleton"] = time.time() - step_time
+
+        step_time = time.time()
+        rig_grp, bind_jnt_info_dict = jnt_placement_helper.finish_jnt_placement()
+        result["timing"]["finish_jnt_placement"] = time.time() - step_time
+
+        cache = None
+        cache_key = None
+        if job.get("cache_dir") is not None:
+            step_time = time.time()
+            cache = rig_cache.RigCache(job["cache_dir"], max_size=job.get("cache_max_size") or rig_cache.DEF_MAX_SIZE)
+            cache_key = rig_cache.get_build_key(rig_cache.get_bind_jnt_positions(bind_jnt_info_dict),
+                                                job["rig_options"])
+            cached_rig_grp = cache.load_rig(cache_key, rig_grp)
+            result["timing"]["load_cache"] = time.time() - step_time
+            if cached_rig_grp is not None:
+                rig_grp = cached_rig_grp
+                result["cache"] = CACHE_HIT
+            else:
+                result["cache"] = CACHE_MISS
+
+        if result["cache"] != CACHE_HIT:
+            step_time = time.time()
+            rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
+            rigger.create_rig(**job["rig_options"])
+            result["timing"]["create_rig"] = time.time() - step_time
+
+            if cache is not None:
+                step_time = time.time()
+                # The rig is built, a failed cache write should not fail the character
+                try:
+                    cache.store_rig(cache_key, rig_grp)
+                except Exception:
+                    result["cache"] = CACHE_STORE_FAILED
+                    result["cache_error"] = traceback.format_exc()
+                result["timing"]["store_cache"] = time.time() - step_time
+
+        step_time = time.time()
+        scene_folder = os.path.dirname(job["scene_path"])
+        if scene_folder and not os.path.isdir(scene_folder):
+            os.makedirs(scene_folder)
+        scene_type = SCENE_TYPE_DICT.get(os.path.splitext(job["scene_path"])[1], SCENE_TYPE_DICT[DEF_SCENE_EXT])
+        mc.file(rename=job["scene_path"])
+        mc.file(save=True, force=True, type=scene_type)
+        result["timing"]["save_scene"] = time.time() - step_time
+
+        if job.get("graph_path") is not None:
+            step_time = time.time()
+            rig_graph.export_rig_graph(rig_grp, file_path=job["graph_path"])
+            result["timing"]["export_graph"] = time.time() - step_time
+
+        result["status"] = STATUS_SUCCESS
+    except Exception:
+        result["error"] = traceback.format_exc()
+
+    result["timing"]["total"] = time.time() - start_time
+    return result
+
+
+def run_worker(job_file, result_file):
+    """
+    Worker process entry, initialize maya standalone and build the jobs one by one. The result file is written after
+    every job, so the finished jobs are kept if the process crashes later.
+    """
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+
+    if FOLDER_PATH not in sys.path:
+        sys.path.insert(0, FOLDER_PATH)
+
+    with open(job_file, "r") as file_obj:
+        job_list = json.load(file_obj)
+
+    result_list = []
+    for job in job_list:
+        result_list.append(build_character(job))
+        with open(result_file, "w") as file_obj:
+            json.dump(result_list, file_obj, indent=2)
+
+    maya.standalone.uninitialize()
+
+
+def write_report(result_list, report_path, total_time, worker_count):
+    """
+    Write the batch report JSON file.
+    """
+    report = {"total_time": total_time,
+              "worker_count": worker_count,
+              "character_count": len(result_list),
+              "success_count": len([result for result in result_list if result["status"] == STATUS_SUCCESS]),
+              "failed_count": len([result for result in result_list if result["status"] != STATUS_SUCCESS]),
+              "cache_hit_count": len([result for result in result_list if result.get("cache") == CACHE_HIT]),
+              "characters": result_list}
+
+    with open(report_path, "w") as file_obj:
+        json.dump(report, file_obj, indent=2)
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build rigs for all the characters in a manifest file.")
+    parser.add_argument("manifest", nargs="?", help="Character manifest JSON file.")
+    parser.add_argument("--workers", type=int, default=DEF_WORKER_CNT, help="Number of mayapy worker processes.")
+    parser.add_argument("--mayapy", default=None, help="mayapy executable, $MAYAPY or mayapy by default.")
+    parser.add_argument("--report", default=None, help="Report file, next to the manifest by default.")
+    parser.add_argument("--worker", nargs=2, metavar=("JOB_FILE", "RESULT_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        run_worker(args.worker[0], args.worker[1])
+        return 0
+
+    if args.manifest is None:
+        parser.error("manifest is required")
+
+    start_time = time.time()
+    job_list = load_manifest(args.manifest)
+    result_list = run_batch(job_list, worker_count=args.workers, mayapy=args.mayapy)
+
+    report_path = args.report
+    if report_path is None:
+        report_path = os.path.splitext(os.path.abspath(args.manifest))[0] + "_report.json"
+    report = write_report(result_list, report_path, time.time() - start_time, args.workers)
+
+    print("{0}/{1} characters rigged, report: {2}".format(report["success_count"], report["character_count"], report_path))
+    return 0 if report["failed_count"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
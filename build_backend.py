@@ -0,0 +1,210 @@
+"""
+Execution backends for the DG operations of the rig build. CmdsBackend runs every operation right away through
+maya.cmds, ModifierBackend queues them in API modifiers and commits the queue in one batch at the end of each build
+stage. Both backends produce the same node graph.
+"""
+import os
+import re
+import maya.cmds as mc
+import maya.api.OpenMaya as opm
+
+MODIFIER_CMD_NAME = "autoRigCommitModifier"
+MODIFIER_PLUGIN_FILE = "auto_rig_modifier_cmd.py"
+
+# Modifiers waiting to be committed by the plugin command, the command pops them in order.
+PENDING_MODIFIER_LIST = []
+
+PLUG_TOKEN_PATTERN = re.compile(r"^(\w+)(?:\[(\d+)\])?$")
+
+
+def get_backend(use_api_modifier=False):
+    """
+    Return a new backend instance
+    """
+    if use_api_modifier:
+        return ModifierBackend()
+    return CmdsBackend()
+
+
+class CmdsBackend(object):
+    """
+    Run the operations right away through maya.cmds
+    """
+    def create_node(self, node_type, name=None):
+        if name is None:
+            return mc.createNode(node_type)
+        return mc.createNode(node_type, name=name)
+
+    def connect_attr(self, source_plug, dest_plug):
+        mc.connectAttr(source_plug, dest_plug)
+
+    def set_attr(self, plug, value):
+        mc.setAttr(plug, value)
+
+    def rename(self, node, new_name):
+        return mc.rename(node, new_name)
+
+    def parent(self, node, parent_node):
+        mc.parent(node, parent_node)
+
+    def commit(self):
+        pass
+
+    def get_name(self, node):
+        return node
+
+
+class ModifierBackend(object):
+    """
+    Queue the operations in API modifiers, nothing happens in the scene before commit is called. The name returned
+    for a new or renamed node is the requested one, the commit makes it unique if another node has it already. The
+    backend keeps resolving the returned names to their nodes, get_name gives the scene name after the commit.
+    """
+    def __init__(self):
+        load_modifier_plugin()
+        self.dg_modifier = opm.MDGModifier()
+        self.dag_modifier = opm.MDagModifier()
+        self.pending_node_dict = {}
+        # Returned name: MObjectHandle of every node created or renamed by the backend, kept after the commits
+        self.node_handle_dict = {}
+        self.operation_count = 0
+        self.committed_operation_count = 0
+        self.commit_count = 0
+
+    def create_node(self, node_type, name=None):
+        node_obj = self.dg_modifier.createNode(node_type)
+        if name is not None:
+            self.dg_modifier.renameNode(node_obj, name)
+        else:
+            name = opm.MFnDependencyNode(node_obj).name()
+        self.pending_node_dict[name] = node_obj
+        self.node_handle_dict[name] = opm.MObjectHandle(node_obj)
+        self.operation_count += 1
+        return name
+
+    def connect_attr(self, source_plug, dest_plug):
+        self.dg_modifier.connect(self.get_plug(source_plug), self.get_plug(dest_plug))
+        self.operation_count += 1
+
+    def set_attr(self, plug, value):
+        plug = self.get_plug(plug)
+        attr_obj = plug.attribute()
+
+        if attr_obj.hasFn(opm.MFn.kUnitAttribute):
+            unit_type = opm.MFnUnitAttribute(attr_obj).unitType()
+            if unit_type == opm.MFnUnitAttribute.kAngle:
+                self.dg_modifier.newPlugValueMAngle(plug, opm.MAngle(value, opm.MAngle.kDegrees))
+            elif unit_type == opm.MFnUnitAttribute.kDistance:
+                self.dg_modifier.newPlugValueMDistance(plug, opm.MDistance(value))
+            else:
+                self.dg_modifier.newPlugValueDouble(plug, value)
+        elif attr_obj.hasFn(opm.MFn.kEnumAttribute):
+            self.dg_modifier.newPlugValueInt(plug, int(value))
+        elif attr_obj.hasFn(opm.MFn.kNumericAttribute):
+            numeric_type = opm.MFnNumericAttribute(attr_obj).numericType()
+            if numeric_type == opm.MFnNumericData.kBoolean:
+                self.dg_modifier.newPlugValueBool(plug, bool(value))
+            elif numeric_type == opm.MFnNumericData.kFloat:
+                self.dg_modifier.newPlugValueFloat(plug, value)
+            elif numeric_type == opm.MFnNumericData.kDouble:
+                self.dg_modifier.newPlugValueDouble(plug, value)
+            else:
+                self.dg_modifier.newPlugValueInt(plug, int(value))
+        else:
+            self.dg_modifier.newPlugValueDouble(plug, value)
+
+        self.operation_count += 1
+
+    def rename(self, node, new_name):
+        node_obj = self.get_node_obj(node)
+        self.dg_modifier.renameNode(node_obj, new_name)
+        if node in self.pending_node_dict:
+            self.pending_node_dict[new_name] = self.pending_node_dict.pop(node)
+        self.node_handle_dict[new_name] = opm.MObjectHandle(node_obj)
+        self.operation_count += 1
+        return new_name
+
+    def parent(self, node, parent_node):
+        self.dag_modifier.reparentNode(self.get_node_obj(node), self.get_node_obj(parent_node))
+        self.operation_count += 1
+
+    def commit(self):
+        """
+        Commit all the queued operations through the plugin command, so they can be undone like any other command.
+        Nothing is committed if no operation was queued since the last commit.
+        """
+        if self.operation_count == self.committed_operation_count:
+            return
+
+        for modifier in [self.dg_modifier, self.dag_modifier]:
+            commit_modifier(modifier)
+
+        self.dg_modifier = opm.MDGModifier()
+        self.dag_modifier = opm.MDagModifier()
+        self.pending_node_dict = {}
+        self.committed_operation_count = self.operation_count
+        self.commit_count += 1
+
+    def get_name(self, node):
+        """
+        Return the scene name of a node returned by create_node or rename, the commit may have changed it. Other
+        names are returned as they are.
+        """
+        node_handle = self.node_handle_dict.get(node)
+        if node not in self.pending_node_dict and node_handle is not None and node_handle.isValid():
+            return opm.MFnDependencyNode(node_handle.object()).name()
+        return node
+
+    def get_node_obj(self, node):
+        """
+        Get the MObject of the node, the node can be a node created or renamed by this backend, under the returned
+        name, or an existing scene node.
+        """
+        if node in self.pending_node_dict:
+            return self.pending_node_dict[node]
+
+        node_handle = self.node_handle_dict.get(node)
+        if node_handle is not None and node_handle.isValid():
+            return node_handle.object()
+
+        sel_list = opm.MSelectionList()
+        sel_list.add(node)
+        return sel_list.getDependNode(0)
+
+    def get_plug(self, plug_name):
+        """
+        Get the MPlug of a "node.attr" string, supports array elements and compound children like "attr[0].child".
+        """
+        node, attr_path = plug_name.split(".", 1)
+        node_fn = opm.MFnDependencyNode(self.get_node_obj(node))
+
+        plug = None
+        for token in attr_path.split("."):
+            attr_name, index = PLUG_TOKEN_PATTERN.match(token).groups()
+            if plug is None:
+                plug = node_fn.findPlug(attr_name, False)
+            else:
+                plug = plug.child(node_fn.attribute(attr_name))
+            if index is not None:
+                plug = plug.elementByLogicalIndex(int(index))
+
+        return plug
+
+
+def commit_modifier(modifier):
+    """
+    Commit a single API modifier through the plugin command, the edits can be undone like any other command. The
+    command gets the module name to find the queue, it is not the same when the tool is installed as a package.
+    """
+    load_modifier_plugin()
+    PENDING_MODIFIER_LIST.append(modifier)
+    getattr(mc, MODIFIER_CMD_NAME)(__name__)
+
+
+def load_modifier_plugin():
+    """
+    Load the plugin command which commits the modifiers.
+    """
+    if not mc.pluginInfo(MODIFIER_PLUGIN_FILE, query=True, loaded=True):
+        folder_path = os.path.abspath(os.path.dirname(__file__))
+        mc.loadPlugin(os.path.join(folder_path, MODIFIER_PLUGIN_FILE), quiet=True)
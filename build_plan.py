@@ -0,0 +1,443 @@
+"""
+Declarative build plan of the rig. The create_rig options and the bind joint keys are compiled to an ordered list of
+build steps, each step holds the typed operations it is going to run(create node, connect, constrain, rename,
+parent...). The plan is pure data, it can be compiled and inspected without maya, so the cost of a rig can be
+budgeted before building it. AutoRigger executes the plan step by step.
+"""
+import collections
+
+# Operation types
+CREATE_OP = "create"
+CONSTRAIN_OP = "constrain"
+CONNECT_OP = "connect"
+SET_OP = "set"
+ADD_ATTR_OP = "addAttr"
+RENAME_OP = "rename"
+PARENT_OP = "parent"
+DELETE_OP = "delete"
+
+# Operation types which add a node to the scene, and remove a node from the scene
+NODE_OP_LIST = [CREATE_OP, CONSTRAIN_OP]
+REMOVE_NODE_OP_LIST = [DELETE_OP]
+
+BuildOp = collections.namedtuple("BuildOp", ["op_type", "node_type"])
+
+SEPARATOR = "_"
+LEFT_PREFIX = "l"
+RIGHT_PREFIX = "r"
+SIDE_LIST = [LEFT_PREFIX, RIGHT_PREFIX]
+FINGER_NAME_LIST = ["thumb", "index", "middle", "ring", "pinky"]
+EXTRA_FINGER_NAME = "extraFinger"
+TOE_NAME = "toe"
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Count of the keyable attributes hidden by util.hide_attr
+HIDE_ATTR_COUNT_DICT = {"translate": 3, "rotate": 3, "scale": 3, "visibility": 1}
+
+# Steps which can be torn down and built again on their own, a change of the other steps needs a full build
+REBUILD_STEP_LIST = ["twist", "ik_arms", "ik_legs", "ik_feet", "fk_arms", "fk_legs", "blend", "stretch"]
+
+# Steps reading the nodes created by a step, they are rebuilt together with it
+STEP_READER_DICT = {"ik_arms": ["blend", "stretch"],
+                    "ik_legs": ["ik_feet", "blend", "stretch"],
+                    "ik_feet": ["blend"],
+                    "fk_arms": ["blend"],
+                    "fk_legs": ["blend"]}
+
+# Step kwargs choosing how a step is built, not what it builds, a change of them doesn't make the step dirty
+BUILD_STRATEGY_ARG_LIST = ["mirror_build", "use_api_modifier"]
+
+
+class BuildStep(object):
+    """
+    One step of the build plan, AutoRigger runs it by calling the method_name method with the kwargs.
+    """
+    def __init__(self, name, subsystem, kwargs=None):
+        self.name = name
+        self.subsystem = subsystem
+        self.method_name = "build_" + name
+        self.kwargs = kwargs or {}
+        self.op_list = []
+
+    def __repr__(self):
+        return "BuildStep({0}, {1} ops)".format(self.name, len(self.op_list))
+
+    def add_op(self, op_type, node_type=None, count=1):
+        self.op_list += [BuildOp(op_type, node_type)] * count
+
+    def add_nodes(self, node_type_list, count=1):
+        for node_type in node_type_list:
+            self.add_op(CREATE_OP, node_type, count=count)
+
+    def add_joints(self, count=1, rename=True):
+        self.add_op(CREATE_OP, "joint", count=count)
+        if rename:
+            self.add_op(RENAME_OP, count=count)
+
+    def add_constraint(self, cst_type, count=1):
+        self.add_op(CONSTRAIN_OP, cst_type, count=count)
+
+    def add_ctr(self, ctr_type="cube", count=1, offset=False, hide_attrs=("visibility",)):
+        """
+        Control curve created by util.create_ctr_cuv: space group, control transform and curve shape.
+        """
+        self.add_nodes(["transform", "transform", "nurbsCurve"], count=count)
+        if offset:
+            self.add_nodes(["transform"], count=count)
+        self.add_op(RENAME_OP, count=count*(3 if offset else 2))
+        self.add_op(SET_OP, count=count*sum([HIDE_ATTR_COUNT_DICT[attr] for attr in hide_attrs]))
+
+    def add_locator(self, count=1):
+        self.add_nodes(["transform", "locator"], count=count)
+
+    def get_node_count_dict(self):
+        """
+        Return the count of the nodes added by this step for each node type, deleted nodes are subtracted.
+        """
+        node_count_dict = collections.defaultdict(int)
+        for op in self.op_list:
+            if op.op_type in NODE_OP_LIST:
+                node_count_dict[op.node_type] += 1
+            elif op.op_type in REMOVE_NODE_OP_LIST:
+                node_count_dict[op.node_type] -= 1
+
+        return dict((node_type, count) for node_type, count in node_count_dict.items() if count)
+
+    def get_op_count_dict(self):
+        op_count_dict = collections.defaultdict(int)
+        for op in self.op_list:
+            op_count_dict[op.op_type] += 1
+        return dict(op_count_dict)
+
+
+class BuildPlan(object):
+    def __init__(self, options):
+        self.options = options
+        self.step_list = []
+
+    def __repr__(self):
+        return "BuildPlan({0} steps)".format(len(self.step_list))
+
+    def add_step(self, name, subsystem, kwargs=None):
+        step = BuildStep(name, subsystem, kwargs=kwargs)
+        self.step_list.append(step)
+        return step
+
+    def get_step(self, name):
+        for step in self.step_list:
+            if step.name == name:
+                return step
+        return None
+
+    def get_op_list(self):
+        op_list = []
+        for step in self.step_list:
+            op_list += step.op_list
+        return op_list
+
+    def get_cost_report(self):
+        """
+        Return the predicted node counts of the whole rig per node type and per subsystem, and the operation counts.
+        """
+        nodes_by_type = collections.defaultdict(int)
+        ops_by_type = collections.defaultdict(int)
+        subsystem_dict = collections.OrderedDict()
+
+        for step in self.step_list:
+            subsystem_info = subsystem_dict.setdefault(step.subsystem, {"node_count": 0, "nodes_by_type": {},
+                                                                        "op_count": 0})
+            for node_type, count in step.get_node_count_dict().items():
+                nodes_by_type[node_type] += count
+                subsystem_info["nodes_by_type"][node_type] = subsystem_info["nodes_by_type"].get(node_type, 0) + count
+                subsystem_info["node_count"] += count
+
+            for op_type, count in step.get_op_count_dict().items():
+                ops_by_type[op_type] += count
+                subsystem_info["op_count"] += count
+
+        return {"options": dict(self.options),
+                "step_list": [step.name for step in self.step_list],
+                "node_count": sum(nodes_by_type.values()),
+                "nodes_by_type": dict(nodes_by_type),
+                "op_count": sum(ops_by_type.values()),
+                "ops_by_type": dict(ops_by_type),
+                "subsystems": subsystem_dict}
+
+
+def get_dirty_steps(old_plan, new_plan):
+    """
+    Return the names of the steps to rebuild when going from old_plan to new_plan: the steps added, removed or with
+    changed kwargs, and the steps reading their nodes. The names are in build order, removed steps at their old place.
+    The BUILD_STRATEGY_ARG_LIST kwargs are not compared, they give the same rig.
+    """
+    old_step_dict = dict((step.name, step) for step in old_plan.step_list)
+    new_step_dict = dict((step.name, step) for step in new_plan.step_list)
+
+    dirty_set = set()
+    for step_name in set(old_step_dict) | set(new_step_dict):
+        old_step = old_step_dict.get(step_name)
+        new_step = new_step_dict.get(step_name)
+        if old_step is None or new_step is None or get_rig_kwargs(old_step) != get_rig_kwargs(new_step):
+            dirty_set.add(step_name)
+
+    reader_list = list(dirty_set)
+    while reader_list:
+        for reader_name in STEP_READER_DICT.get(reader_list.pop(), []):
+            if reader_name not in dirty_set and (reader_name in old_step_dict or reader_name in new_step_dict):
+                dirty_set.add(reader_name)
+                reader_list.append(reader_name)
+
+    step_order_list = [step.name for step in new_plan.step_list]
+    for i, step in enumerate(old_plan.step_list):
+        if step.name not in step_order_list:
+            previous_name_list = [old_step.name for old_step in old_plan.step_list[:i] if old_step.name in step_order_list]
+            index = step_order_list.index(previous_name_list[-1]) + 1 if previous_name_list else 0
+            step_order_list.insert(index, step.name)
+
+    return [step_name for step_name in step_order_list if step_name in dirty_set]
+
+
+def get_rig_kwargs(step):
+    """
+    Return the kwargs of the step changing the built rig, without the BUILD_STRATEGY_ARG_LIST ones.
+    """
+    return dict((key, value) for key, value in step.kwargs.items() if key not in BUILD_STRATEGY_ARG_LIST)
+
+
+def get_finger_root_keys(left_or_right, finger_count=5):
+    """
+    Same finger root joint rule as the auto rigger.
+    """
+    finger_root_list = [left_or_right + SEPARATOR + name + "01" for name in FINGER_NAME_LIST]
+    if finger_count > 5:
+        finger_root_list += [left_or_right + SEPARATOR + EXTRA_FINGER_NAME + ALPHABET[i] + "01"
+                             for i in range(finger_count - 5)]
+    elif 5 >= finger_count > 1:
+        finger_root_list = finger_root_list[:finger_count]
+    else:
+        finger_root_list = [finger_root_list[1]]
+    return finger_root_list
+
+
+def get_toe_root_keys(left_or_right, toe_count=0):
+    return [left_or_right + SEPARATOR + TOE_NAME + ALPHABET[i] + "01" for i in range(toe_count)]
+
+
+def get_digit_ctr_count(digit_root_key, jnt_key_list):
+    """
+    The digit controls are created for every joint of the digit chain except the end joint.
+    """
+    digit_name = digit_root_key[:-2]
+    chain_len = len([jnt_key for jnt_key in jnt_key_list if jnt_key[:-2] == digit_name and jnt_key[-2:].isdigit()])
+    return max(chain_len - 1, 0)
+
+
+def compile_plan(bind_jnt_key_list, spine_jnt_count=5, neck_jnt_count=3, upper_arm_twist_count=3,
+                 lower_arm_twist_count=3, upper_leg_twist_count=3, lower_leg_twist_count=3, finger_count=5,
+                 toe_count=0, mirror_behavior=True, stretch_arm=True, stretch_leg=True, fk_arm=True, ik_arm=True,
+                 fk_leg=True, ik_leg=False, compact_twist=False, compact_blend=False,
+                 light_spine=False, mirror_build=False):
+    """
+    Compile the create_rig options and the placed bind joint keys to a build plan. The operations of every step are
+    predicted from the same rules the builder uses, the plan doesn't query the scene. A change of the builder has to
+    be followed here, offline_maya.check_cost_prediction compares the predictions with offline builds.
+    The mirror build creates the same nodes as the regular build, it only changes the limb step arguments.
+    """
+    bind_jnt_key_list = list(bind_jnt_key_list)
+    bind_jnt_count = len(bind_jnt_key_list)
+    options = {"spine_jnt_count": spine_jnt_count, "neck_jnt_count": neck_jnt_count,
+               "upper_arm_twist_count": upper_arm_twist_count, "lower_arm_twist_count": lower_arm_twist_count,
+               "upper_leg_twist_count": upper_leg_twist_count, "lower_leg_twist_count": lower_leg_twist_count,
+               "finger_count": finger_count, "toe_count": toe_count, "mirror_behavior": mirror_behavior,
+               "stretch_arm": stretch_arm, "stretch_leg": stretch_leg, "fk_arm": fk_arm, "ik_arm": ik_arm,
+               "fk_leg": fk_leg, "ik_leg": ik_leg, "compact_twist": compact_twist,
+               "compact_blend": compact_blend, "light_spine": light_spine, "mirror_build": mirror_build}
+    plan = BuildPlan(options)
+    # The right limbs can only be mirrored copies of the left limbs if the joints have the mirror behavior orientation
+    mirror_limbs = bool(mirror_build and mirror_behavior)
+
+    # Rig groups
+    step = plan.add_step("groups", "core", kwargs={"finger_count": finger_count, "toe_count": toe_count})
+    step.add_nodes(["transform"], count=4)
+
+    # Joint orientation, every joint is parented once and gets translate, rotate and joint orient
+    step = plan.add_step("orientation", "skeleton", kwargs={"mirror_behavior": mirror_behavior})
+    step.add_op(PARENT_OP, count=bind_jnt_count-1)
+    step.add_op(SET_OP, count=bind_jnt_count*3)
+
+    # Spine, neck and pelvis bind joints, c_neck is replaced by the neck chain
+    step = plan.add_step("spine_neck", "skeleton", kwargs={"spine_jnt_count": spine_jnt_count,
+                                                           "neck_jnt_count": neck_jnt_count})
+    step.add_joints(count=spine_jnt_count + neck_jnt_count + 1)
+    step.add_op(DELETE_OP, "joint")
+    step.add_op(PARENT_OP, count=spine_jnt_count + neck_jnt_count + 8)
+    bind_jnt_count += spine_jnt_count + neck_jnt_count
+
+    # Animate skeleton, duplicated from the whole bind skeleton
+    step = plan.add_step("anim_skeleton", "skeleton")
+    step.add_joints(count=bind_jnt_count)
+    step.add_op(PARENT_OP, count=2)
+
+    # Clavicle and neck controls
+    step = plan.add_step("upper_body_ctrs", "controls")
+    step.add_ctr("clavicle", count=2)
+    step.add_constraint("parentConstraint", count=2)
+    step.add_op(PARENT_OP, count=2)
+    step.add_ctr("circle", count=neck_jnt_count, hide_attrs=("translate", "scale", "visibility"))
+    step.add_constraint("orientConstraint", count=neck_jnt_count)
+    step.add_op(PARENT_OP, count=neck_jnt_count-1)
+
+    # Twist joints, one joint for each twist rate, and one multiply divide node for each twist rate or for every three
+    # twist rates in compact mode
+    twist_count = upper_arm_twist_count + lower_arm_twist_count + upper_leg_twist_count + lower_leg_twist_count
+    if twist_count > 0:
+        step = plan.add_step("twist", "twist", kwargs={"upper_arm_twist_count": upper_arm_twist_count,
+                                                       "lower_arm_twist_count": lower_arm_twist_count,
+                                                       "upper_leg_twist_count": upper_leg_twist_count,
+                                                       "lower_leg_twist_count": lower_leg_twist_count,
+                                                       "compact_twist": compact_twist,
+                                                       "mirror_build": mirror_limbs})
+        for count in [upper_arm_twist_count, lower_arm_twist_count, upper_leg_twist_count, lower_leg_twist_count]:
+            if count > 0:
+                md_count = (count + 2)//3 if compact_twist else count
+                step.add_joints(count=count*2)
+                step.add_nodes(["multiplyDivide"], count=md_count*2)
+                step.add_op(SET_OP, count=count*2*2)
+                step.add_op(CONNECT_OP, count=count*2*2)
+                step.add_op(PARENT_OP, count=count*2*2 + 4)
+
+    # Global, COG and hip controls
+    step = plan.add_step("main_ctrs", "controls")
+    step.add_ctr("circle")
+    step.add_ctr("cog")
+    step.add_ctr("hip")
+    step.add_constraint("parentConstraint", count=2)
+    step.add_op(PARENT_OP, count=3)
+
+    # Ribbon spine, nurbs surface with one follicle per spine joint, driven by three clusters. The light spine has
+    # one parent constraint per spine joint instead
+    step = plan.add_step("ribbon_spine", "ribbon_spine", kwargs={"light_spine": light_spine})
+    if light_spine:
+        step.add_op(PARENT_OP, count=spine_jnt_count + 3 + 2 + 4)
+        step.add_constraint("parentConstraint", count=spine_jnt_count)
+    else:
+        step.add_nodes(["transform", "nurbsSurface", "makeNurbPlane"])
+        step.add_nodes(["cluster", "transform", "clusterHandle", "objectSet", "groupId", "groupParts"], count=3)
+        step.add_nodes(["tweak", "objectSet", "groupId", "groupParts"])
+        step.add_nodes(["follicle", "transform"], count=spine_jnt_count)
+        step.add_op(SET_OP, count=spine_jnt_count*2)
+        step.add_op(CONNECT_OP, count=spine_jnt_count*4)
+        step.add_op(RENAME_OP, count=spine_jnt_count + 1)
+        step.add_op(PARENT_OP, count=spine_jnt_count*2 + 3 + 6 + 4)
+        step.add_constraint("parentConstraint", count=3)
+        step.add_constraint("scaleConstraint", count=3)
+    step.add_ctr("cube", count=3, hide_attrs=("scale", "visibility"))
+    step.add_ctr("circle", count=3, hide_attrs=("translate", "scale", "visibility"))
+
+    # IK limbs, the ik leg handles are constrained by the ik foot
+    for limb_name, enabled, limb_cst_list in [("arms", ik_arm, ["parentConstraint", "orientConstraint"]),
+                                              ("legs", ik_leg, [])]:
+        if not enabled:
+            continue
+        step = plan.add_step("ik_" + limb_name, "ik_" + limb_name[:-1], kwargs={"mirror_build": mirror_limbs})
+        step.add_joints(count=3*2)
+        step.add_nodes(["ikHandle", "ikEffector", "transform"], count=2)
+        step.add_op(RENAME_OP, count=3*2)
+        step.add_ctr("square", count=2*2, hide_attrs=("scale", "visibility"))
+        for cst_type in limb_cst_list + ["poleVectorConstraint"]:
+            step.add_constraint(cst_type, count=2)
+        step.add_op(PARENT_OP, count=6*2)
+
+    # IK feet, foot roll locators and nodes
+    if ik_leg:
+        step = plan.add_step("ik_feet", "ik_foot", kwargs={"mirror_build": mirror_limbs})
+        step.add_joints(count=3*2, rename=False)
+        step.add_locator(count=4*2)
+        step.add_nodes(["transform"], count=4*2)
+        step.add_nodes(["plusMinusAverage", "multiplyDivide"], count=2)
+        step.add_op(ADD_ATTR_OP, count=4*2)
+        step.add_op(SET_OP, count=2)
+        step.add_op(CONNECT_OP, count=7*2)
+        step.add_constraint("orientConstraint", count=2)
+        step.add_constraint("pointConstraint", count=2)
+        step.add_op(PARENT_OP, count=14*2)
+
+    # FK limbs
+    for limb_name, enabled, chain_len, limb_cst_list in [("arms", fk_arm, 3, []),
+                                                         ("legs", fk_leg, 4, ["pointConstraint"])]:
+        if not enabled:
+            continue
+        step = plan.add_step("fk_" + limb_name, "fk_" + limb_name[:-1], kwargs={"mirror_build": mirror_limbs})
+        step.add_joints(count=chain_len*2)
+        step.add_ctr("circle", count=chain_len*2, hide_attrs=("translate", "scale", "visibility"))
+        step.add_constraint("orientConstraint", count=chain_len*2)
+        step.add_nodes(["transform"], count=2)
+        for cst_type in limb_cst_list:
+            step.add_constraint(cst_type, count=2)
+        step.add_op(PARENT_OP, count=(chain_len*2 + 1)*2)
+
+    # Hand and foot setting controls, one control for each digit joint except the end joint
+    step = plan.add_step("digits", "digits", kwargs={"toe_count": toe_count, "mirror_build": mirror_limbs})
+    for left_or_right in SIDE_LIST:
+        for digit_root_list in [get_finger_root_keys(left_or_right, finger_count),
+                                get_toe_root_keys(left_or_right, toe_count)]:
+            if not digit_root_list:
+                continue
+            step.add_ctr("handSetting", hide_attrs=("translate", "rotate", "scale", "visibility"))
+            step.add_constraint("parentConstraint")
+            step.add_op(PARENT_OP, count=2)
+            for digit_root_key in digit_root_list:
+                digit_ctr_count = get_digit_ctr_count(digit_root_key, bind_jnt_key_list)
+                step.add_ctr("circle", count=digit_ctr_count, offset=True,
+                             hide_attrs=("translate", "scale", "visibility"))
+                step.add_constraint("orientConstraint", count=digit_ctr_count)
+                step.add_op(ADD_ATTR_OP)
+                step.add_op(CONNECT_OP, count=digit_ctr_count)
+                step.add_op(PARENT_OP, count=digit_ctr_count)
+
+    # IK FK blending, two blend colors nodes(rotate, scale) for every limb joint. In compact mode one pair blend node
+    # for every limb joint, and direct connections for the limbs with a single chain
+    step = plan.add_step("blend", "blend", kwargs={"compact_blend": compact_blend})
+    for chain_len, has_ik, has_fk in [(3, ik_arm, fk_arm), (4, ik_leg, fk_leg)]:
+        if has_ik and has_fk:
+            step.add_op(ADD_ATTR_OP, count=2)
+            step.add_nodes(["reverse"], count=2)
+            step.add_op(CONNECT_OP, count=3*2)
+            if compact_blend:
+                step.add_nodes(["pairBlend"], count=chain_len*2)
+                step.add_op(CONNECT_OP, count=chain_len*2*7)
+            else:
+                step.add_nodes(["blendColors"], count=chain_len*2*2)
+                step.add_op(CONNECT_OP, count=chain_len*2*2*4)
+        elif compact_blend:
+            step.add_op(CONNECT_OP, count=chain_len*2*2)
+        else:
+            step.add_nodes(["blendColors"], count=chain_len*2*2)
+            step.add_op(SET_OP, count=chain_len*2*2)
+            step.add_op(CONNECT_OP, count=chain_len*2*2*2)
+
+    # Stretch limbs
+    stretch_limb_count = 2*(int(bool(stretch_arm and ik_arm)) + int(bool(stretch_leg and ik_leg)))
+    if stretch_limb_count:
+        step = plan.add_step("stretch", "stretch", kwargs={"stretch_arm": stretch_arm, "stretch_leg": stretch_leg,
+                                                           "mirror_build": mirror_limbs})
+        step.add_nodes(["distanceBetween", "multiplyDivide", "multiplyDivide", "condition", "condition"],
+                       count=stretch_limb_count)
+        step.add_op(ADD_ATTR_OP, count=stretch_limb_count)
+        step.add_op(SET_OP, count=7*stretch_limb_count)
+        step.add_op(CONNECT_OP, count=12*stretch_limb_count)
+        step.add_op(RENAME_OP, count=stretch_limb_count)
+
+    # Connect the animate skeleton to the bind skeleton, and the global scale
+    step = plan.add_step("connect", "connect")
+    step.add_constraint("parentConstraint", count=bind_jnt_count)
+    step.add_op(CONNECT_OP, count=bind_jnt_count)
+    step.add_constraint("scaleConstraint", count=2)
+
+    # Clean up
+    step = plan.add_step("cleanup", "core")
+    step.add_op(PARENT_OP, count=3)
+    step.add_constraint("pointConstraint")
+    step.add_op(SET_OP, count=3 + 4*2 + 4*2)
+
+    return plan
@@ -0,0 +1,123 @@
+"""
+Per-stage instrumentation of the rig build. The profiler records the wall time, the maya.cmds calls and the nodes
+created by every build stage, and writes them as a JSON report and a one line summary.
+
+The commands are counted by wrapping the maya.cmds functions while the profiler runs, the original functions are
+restored when it stops. Nothing is wrapped if the build isn't profiled.
+"""
+import json
+import time
+import maya.cmds as mc
+
+LOG_PREFIX = "[autoRig profile]"
+
+
+class BuildProfiler(object):
+    def __init__(self, log=True):
+        self.log = log
+        self.stage_list = []
+        self.current_stage = None
+        self.original_cmd_dict = {}
+        self.command_count_dict = {}
+        self.start_time = 0.0
+        self.total_time = 0.0
+        self.start_node_count = 0
+        self.node_count = 0
+
+    def start(self):
+        """
+        Wrap the maya.cmds functions and start the clock.
+        """
+        self.stage_list = []
+        self.command_count_dict = {}
+        self.wrap_commands()
+        self.start_node_count = self.get_scene_node_count()
+        self.start_time = time.time()
+
+    def stop(self):
+        """
+        Restore the maya.cmds functions, log the summary line if the log is on.
+        """
+        if self.current_stage is not None:
+            self.end_stage()
+        self.total_time = time.time() - self.start_time
+        self.node_count = self.get_scene_node_count() - self.start_node_count
+        self.unwrap_commands()
+
+        if self.log:
+            print(self.get_log_line())
+
+    def start_stage(self, name, subsystem=None):
+        if self.current_stage is not None:
+            self.end_stage()
+        self.command_count_dict = {}
+        self.current_stage = {"name": name,
+                              "subsystem": subsystem,
+                              "start_time": time.time(),
+                              "start_node_count": self.get_scene_node_count()}
+
+    def end_stage(self):
+        stage = self.current_stage
+        self.current_stage = None
+        self.stage_list.append({"name": stage["name"],
+                                "subsystem": stage["subsystem"],
+                                "time": time.time() - stage["start_time"],
+                                "command_count": sum(self.command_count_dict.values()),
+                                "commands": self.command_count_dict,
+                                "node_count": self.get_scene_node_count() - stage["start_node_count"]})
+
+    def wrap_commands(self):
+        self.original_cmd_dict = {}
+        for cmd_name in dir(mc):
+            cmd_func = getattr(mc, cmd_name)
+            if cmd_name.startswith("_") or not callable(cmd_func):
+                continue
+            self.original_cmd_dict[cmd_name] = cmd_func
+            setattr(mc, cmd_name, self.get_counted_command(cmd_name, cmd_func))
+
+    def unwrap_commands(self):
+        for cmd_name, cmd_func in self.original_cmd_dict.items():
+            setattr(mc, cmd_name, cmd_func)
+        self.original_cmd_dict = {}
+
+    def get_counted_command(self, cmd_name, cmd_func):
+        profiler = self
+
+        def counted_command(*args, **kwargs):
+            count_dict = profiler.command_count_dict
+            count_dict[cmd_name] = count_dict.get(cmd_name, 0) + 1
+            return cmd_func(*args, **kwargs)
+
+        counted_command.__name__ = cmd_name
+        return counted_command
+
+    def get_scene_node_count(self):
+        """
+        Count the scene nodes with the original ls command, so the count isn't recorded as a build command.
+        """
+        ls_cmd = self.original_cmd_dict.get("ls", mc.ls)
+        return len(ls_cmd())
+
+    def get_report(self):
+        return {"total_time": self.total_time,
+                "command_count": sum([stage["command_count"] for stage in self.stage_list]),
+                "node_count": self.node_count,
+                "stages": self.stage_list}
+
+    def write_report(self, report_path):
+        with open(report_path, "w") as file_obj:
+            json.dump(self.get_report(), file_obj, indent=2)
+        return report_path
+
+    def get_log_line(self):
+        """
+        One line summary, the stages are listed slowest first.
+        """
+        stage_info_list = ["{0} {1:.3f}s/{2}cmds/{3}nodes".format(stage["name"], stage["time"],
+                                                                   stage["command_count"], stage["node_count"])
+                           for stage in sorted(self.stage_list, key=lambda stage: -stage["time"])]
+        report = self.get_report()
+        return "{0} total {1:.3f}s, {2} commands, {3} nodes | {4}".format(LOG_PREFIX, report["total_time"],
+                                                                        report["command_count"],
+                                                                        report["node_count"],
+                                                                        ", ".join(stage_info_list))
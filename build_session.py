@@ -0,0 +1,114 @@
+"""
+Build session of the skeleton and rig creation. While a session is open, Maya doesn't redraw the viewports, doesn't
+auto-key the moved controls and evaluates the graph in DG mode instead of building an evaluation graph after every
+change, and the whole build is one undo chunk, or undo is turned off. The previous state is restored when the session
+ends, even if the build raises.
+
+Nested sessions open a nested undo chunk. The state is only changed by the outermost managed session, so a build
+running from an event loop can hold an unmanaged session for its undo chunk and suspend the state in a short managed
+session per step, the viewport redraws between the steps.
+
+Usage:
+    with build_session.BuildSession("autoRigCreateRig") as session:
+        build()
+    print(session.elapsed)
+
+    with build_session.BuildSession("autoRigCreateRig", disable_undo=True):
+        build()
+
+    with build_session.BuildSession("autoRigCreateRig", managed=False):
+        for step in step_list:
+            with build_session.BuildSession("autoRigCreateRig"):
+                step()
+"""
+import time
+import maya.cmds as mc
+
+# Evaluation manager mode of the DG evaluation
+DG_EVALUATION_MODE = "off"
+
+# Open sessions, only the outermost managed one changes the state
+SESSION_STACK = []
+
+
+class BuildSession(object):
+    def __init__(self, chunk_name, managed=True, disable_undo=False):
+        """
+        chunk_name is the name of the undo chunk of the build. If managed is False, the session doesn't change the
+        refresh, auto-key and evaluation state, it only opens the undo chunk like a build without a session. If
+        disable_undo is True, undo is turned off instead of recording the build, the build can't be undone and the
+        undo queue is kept as it was, it is only used by the outermost session.
+        """
+        self.chunk_name = chunk_name
+        self.managed = managed
+        self.disable_undo = disable_undo
+        self.restore_list = []
+        self.start_time = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.restore_list = []
+        self.start_time = time.time()
+        is_outer = not SESSION_STACK
+        is_outer_managed = self.managed and not [session for session in SESSION_STACK if session.managed]
+        SESSION_STACK.append(self)
+
+        try:
+            if is_outer_managed:
+                self.suspend_state()
+            if self.disable_undo and is_outer:
+                undo_state = mc.undoInfo(query=True, state=True)
+                mc.undoInfo(stateWithoutFlush=False)
+                self.restore_list.append(lambda: mc.undoInfo(stateWithoutFlush=undo_state))
+            else:
+                mc.undoInfo(openChunk=True, chunkName=self.chunk_name)
+                self.restore_list.append(lambda: mc.undoInfo(closeChunk=True))
+        except Exception:
+            self.restore(raise_error=False)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        # A restore error doesn't hide the error of the build
+        self.restore(raise_error=exc_type is None)
+        self.elapsed = time.time() - self.start_time
+        return False
+
+    def suspend_state(self):
+        """
+        Suspend the viewport refresh and the auto-key, and switch the evaluation to DG mode. The restore function of
+        every change is added to the restore list as soon as the change is made.
+        """
+        # Batch sessions have no viewport to refresh
+        if not mc.about(batch=True):
+            mc.refresh(suspend=True)
+            self.restore_list.append(lambda: mc.refresh(suspend=False))
+
+        if mc.autoKeyframe(query=True, state=True):
+            mc.autoKeyframe(state=False)
+            self.restore_list.append(lambda: mc.autoKeyframe(state=True))
+
+        # The evaluation manager is only in Maya 2016 and later
+        if hasattr(mc, "evaluationManager"):
+            evaluation_mode = mc.evaluationManager(query=True, mode=True)[0]
+            if evaluation_mode != DG_EVALUATION_MODE:
+                mc.evaluationManager(mode=DG_EVALUATION_MODE)
+                self.restore_list.append(lambda: mc.evaluationManager(mode=evaluation_mode))
+
+    def restore(self, raise_error=True):
+        """
+        Undo the state changes in reverse order, every change is restored even if restoring another one fails. The
+        first restore error is raised at the end if raise_error is True.
+        """
+        error = None
+        while self.restore_list:
+            try:
+                self.restore_list.pop()()
+            except Exception as restore_error:
+                if error is None:
+                    error = restore_error
+
+        if self in SESSION_STACK:
+            SESSION_STACK.remove(self)
+        if error is not None and raise_error:
+            raise error
@@ -1,8 +1,14 @@
 import maya.cmds as mc
 import os
-import json
 import utility as util
+import rig_math
+import node_registry
+import skeleton_model
+import template_cache
+import build_session
+import label_cuv_compiler
 import string
+import collections
 
 LEFT_PREFIX = "l"
 RIGHT_PREFIX = "r"
@@ -19,6 +25,11 @@ LABEL_OFFSET = [0, 5, 0]
 FINGER_LABEL_OFFSET = [0, 2, 0]
 FINGER_ROOT_JNT_LIST = ["l_thumb01", "l_index01", "l_middle01", "l_ring01", "l_pinky01"]
 LABEL_CUV_ATTR_NAME = "__labelCuv__"
+# Local transform mirror of the right joints, the same as the live symmetry multiply divide nodes
+MIRROR_TRANSLATE_SCALE = [-1, 1, 1]
+MIRROR_ROTATE_SCALE = [1, -1, -1]
+MIRROR_UNDO_CHUNK_NAME = "autoRigMirrorJnts"
+TEMP_SKELETON_UNDO_CHUNK_NAME = "autoRigCreateTempSkeleton"
 
 
 TEMP_SKELETON_JSON_NAME = "template_skeleton"
@@ -28,13 +39,19 @@ FILE_ERROR_MSG = "Missing template file!"
 
 class JointPlacementHelper:
     def __init__(self):
-        self.jnt_info_dict = json.loads(self.get_json(file_name=TEMP_SKELETON_JSON_NAME))
-        self.jnt_label_cuv_dict = json.loads(self.get_json(file_name=JNT_LABEL_CUVS_JSON_NAME))
+        template_dict = self.get_template(file_name=TEMP_SKELETON_JSON_NAME)
+        self.skeleton_model = skeleton_model.SkeletonModel.from_template(template_dict) if template_dict is not None \
+            else None
+        self.jnt_info_dict = {}
+        self.jnt_label_cuv_dict = self.get_template(file_name=JNT_LABEL_CUVS_JSON_NAME)
 
         self.node_info_dict = {}
         self.label_cuv_list = []
         self.temp_grp = ""
         self.extra_finger_chain_list = None
+        self.symmetry = False
+        self.bake_symmetry = False
+        self.jnt_registry = node_registry.NodeRegistry()
 
     def get_json(self, file_name):
         folder_path = os.path.abspath(os.path.dirname(__file__))
@@ -46,13 +63,40 @@ class JointPlacementHelper:
             return file_content
         except IOError:
             mc.warning(FILE_ERROR_MSG)
-            return None      
-        
-    def create_temp_skeleton(self, character_name="demo", finger_count=5, toe_count=0, symmetry=True):
+            return None
+
+    def get_template(self, file_name):
+        """
+        Get a copy-on-write view of the parsed template, the template files are only parsed once per process.
+        """
+        folder_path = os.path.abspath(os.path.dirname(__file__))
+        file_path = os.path.join(folder_path, file_name)
+        try:
+            return template_cache.get_template_view(file_path)
+        except (IOError, OSError):
+            mc.warning(FILE_ERROR_MSG)
+            return None
+
+    def create_temp_skeleton(self, character_name="demo", finger_count=5, toe_count=0, symmetry=True, jnt_pos_dict=None,
+                             bake_symmetry=False, managed_session=True, disable_undo=False):
         """
-        Create a template skeleton for joint placement.
+        Create a template skeleton for joint placement. jnt_pos_dict can hold saved joint positions(joint key: world
+        position) to place the joints with, instead of the template positions. If bake_symmetry is True, the right
+        joints are not driven live by the left joints, they are mirrored by mirror_jnts on demand and when the joint
+        placement is finished.
+        The skeleton is created in a build session(see build_session.BuildSession) unless managed_session is False. If
+        disable_undo is True, undo is turned off instead of recording the skeleton creation in one chunk.
         """
+        with build_session.BuildSession(TEMP_SKELETON_UNDO_CHUNK_NAME, managed=managed_session,
+                                        disable_undo=disable_undo):
+            self.build_temp_skeleton(character_name=character_name, finger_count=finger_count, toe_count=toe_count,
+                                     symmetry=symmetry, jnt_pos_dict=jnt_pos_dict, bake_symmetry=bake_symmetry)
+
+    def build_temp_skeleton(self, character_name="demo", finger_count=5, toe_count=0, symmetry=True, jnt_pos_dict=None,
+                            bake_symmetry=False):
         self.temp_grp = character_name
+        self.symmetry = symmetry
+        self.bake_symmetry = bake_symmetry
 
         self.temp_grp = mc.group(name=self.temp_grp, empty=True, world=True)
         self.temp_grp = mc.rename(self.temp_grp, util.clear_path(self.temp_grp).replace(SEPARATOR, ""))
@@ -62,34 +106,43 @@ class JointPlacementHelper:
             self.extra_finger_chain_list = self.handle_extra_finger(extra_finger_count=finger_count-5)
         elif finger_count < 5:
             fingers_to_delete = ["index", "thumb", "middle", "ring", "pinky"][finger_count:]
-
-            for jnt_key in self.jnt_info_dict.keys():
-                for finger_str in fingers_to_delete:
-                    if finger_str in jnt_key:
-                        self.jnt_info_dict.pop(jnt_key)
-                        # Remove related label in label dictionary as well
-                        if (LEFT_PREFIX+SEPARATOR in jnt_key) and ("01" in jnt_key):
-                            self.jnt_label_cuv_dict.pop(jnt_key)
+            for jnt_key in self.skeleton_model.remove_digits(fingers_to_delete):
+                # Remove related label in label dictionary as well
+                if jnt_key in self.jnt_label_cuv_dict:
+                    self.jnt_label_cuv_dict.pop(jnt_key)
 
         # Handle toes:
         self.handle_toe(toe_count=toe_count)
 
-        # Create joints based on the joint dictionary
+        # Use the saved joint positions
+        if jnt_pos_dict is not None:
+            self.skeleton_model.set_positions(jnt_pos_dict)
+
+        # The joints are in topological order, every parent comes before its children
+        self.jnt_info_dict = self.skeleton_model.get_jnt_info_dict()
+
+        # Create every joint directly under its parent, the parents are created first. The template joints have no
+        # rotation and the template group sits at the origin, so the local translation is the offset to the parent.
+        jnt_path_dict = {}
+        temp_grp_path = mc.ls(self.temp_grp, long=True)[0]
         for jnt_key, jnt_info in self.jnt_info_dict.items():
-            jnt_name = SEPARATOR.join([self.temp_grp, jnt_key])
             jnt_pos = jnt_info["pos"]
+            if jnt_info["parent"] is not None:
+                parent_path = jnt_path_dict[jnt_info["parent"]]
+                jnt_pos = rig_math.vec_sub(jnt_pos, self.jnt_info_dict[jnt_info["parent"]]["pos"])
+            else:
+                parent_path = temp_grp_path
 
-            mc.select(deselect=True)
-            jnt_name = mc.joint(name=jnt_name, position=jnt_pos)
-            jnt_name = mc.parent(jnt_name, self.temp_grp)[0]
-
+            jnt_name = mc.createNode("joint", name=SEPARATOR.join([self.temp_grp, jnt_key]), parent=parent_path,
+                                     skipSelect=True)
+            jnt_path_dict[jnt_key] = parent_path + PATH_SLASH + jnt_name
+            mc.setAttr(jnt_path_dict[jnt_key] + ".translate", *jnt_pos)
             jnt_info["jnt_name"] = jnt_name
-            jnt_info["uuid"] = self.get_uuid(jnt_name)
 
-        # Connect all the joints by parenting them to their parent joints.
-        for jnt_key, jnt_obj in self.jnt_info_dict.items():
-            if jnt_obj["parent"] is not None:
-                mc.parent(self.get_jnt_name(jnt_key), self.get_jnt_name(jnt_obj["parent"]))
+        # Query all the uuids at once
+        jnt_uuid_list = mc.ls([jnt_path_dict[jnt_key] for jnt_key in self.jnt_info_dict.keys()], uuid=True)
+        for jnt_info, jnt_uuid in zip(self.jnt_info_dict.values(), jnt_uuid_list):
+            jnt_info["uuid"] = jnt_uuid
 
         # Connect the right side joints to left side joints by using multiply divide node,
         # in order to make the right joints a mirror image to left joints
@@ -101,7 +154,9 @@ class JointPlacementHelper:
             if side_prefix == LEFT_PREFIX:
                 left_side_jnt_key_list.append(jnt_key)
 
-        if symmetry is True:
+        if symmetry is True and bake_symmetry is True:
+            self.mirror_jnts(left_side_jnt_key_list)
+        elif symmetry is True:
             for jnt_key in left_side_jnt_key_list:
                 left_jnt_name = self.get_jnt_name(jnt_key)
                 right_jnt_name = self.get_jnt_name(jnt_key.replace(LEFT_PREFIX+SEPARATOR, RIGHT_PREFIX+SEPARATOR))
@@ -135,36 +190,35 @@ class JointPlacementHelper:
         self.create_jnt_label()
 
     def handle_extra_finger(self, extra_finger_count):
+        """
+        Add the extra fingers as copies of the pinky chain, moved back one finger offset after another. Return the
+        extra finger chains, the left and right chain of every finger.
+        """
         alphabet_list = string.ascii_uppercase
-        extra_finger_chain_list = []
-        for i in range(extra_finger_count):
-            for prefix in [LEFT_PREFIX, RIGHT_PREFIX]:
-                extra_finger_chain = []
-                parent_jnt_key = prefix + SEPARATOR + "wrist"
-                for finger_seq in range(4):
-                    pinky_jnt_pos = self.jnt_info_dict[prefix + SEPARATOR + "pinky" + str((finger_seq+1)).zfill(2)]["pos"]
-                    finger_jnt_key = prefix + SEPARATOR + EXTRAT_FINGER_NAME + alphabet_list[i] + str((finger_seq+1)).zfill(2)
-
-                    jnt_info = {}
-                    jnt_info["jnt_name"] = finger_jnt_key
-                    jnt_info["parent"] = parent_jnt_key
-                    jnt_info["pos"] = [pinky_jnt_pos[0], pinky_jnt_pos[1], pinky_jnt_pos[2] - FINGER_POS_BTW_OFFSET*(i+1)]
-                    self.jnt_info_dict[finger_jnt_key] = jnt_info
-
-                    extra_finger_chain.append(finger_jnt_key)
+        base_name_list = [EXTRAT_FINGER_NAME + alphabet_list[i] for i in range(extra_finger_count)]
+        offset_list = [[0, 0, -FINGER_POS_BTW_OFFSET*(i+1)] for i in range(extra_finger_count)]
 
-                    parent_jnt_key = finger_jnt_key
-                extra_finger_chain_list.append(extra_finger_chain)
+        side_chain_list = []
+        for prefix in [LEFT_PREFIX, RIGHT_PREFIX]:
+            pinky_chain = [prefix + SEPARATOR + "pinky" + str(finger_seq+1).zfill(2) for finger_seq in range(4)]
+            side_chain_list.append(self.skeleton_model.copy_chain(pinky_chain, base_name_list, offset_list))
 
-        return extra_finger_chain_list
+        return [chain for chain_pair in zip(*side_chain_list) for chain in chain_pair]
 
     def create_jnt_label(self):
         """
-        Create the joint label curves based on the global label information dictionary
+        Create the joint label curves based on the global label information dictionary. The label curves are stored
+        closed in the library, every label is created as one transform holding all its curve shapes.
         """
-        for jnt_key, label_cuvs_info in self.jnt_label_cuv_dict.items():
-            cuv_grp = mc.group(name=self.jnt_info_dict[jnt_key]["jnt_name"]+"Label"+SEPARATOR+"cuv", empty=True)
+        label_key_list = list(self.jnt_label_cuv_dict.keys())
+        cuv_grp_list = []
+        for jnt_key in label_key_list:
+            cuv_info_list = [label_cuv_compiler.close_cuv_info(cuv_info) for cuv_info in self.jnt_label_cuv_dict[jnt_key]]
+            cuv_grp_list.append([self.jnt_info_dict[jnt_key]["jnt_name"]+"Label"+SEPARATOR+"cuv", cuv_info_list])
 
+        label_cuv_grp_list = util.create_multi_shape_cuvs(cuv_grp_list)
+
+        for jnt_key, cuv_grp in zip(label_key_list, label_cuv_grp_list):
             if jnt_key in FINGER_ROOT_JNT_LIST:
                 label_scale = FINGER_LABEL_SCALE
                 label_offset = FINGER_LABEL_OFFSET
@@ -172,14 +226,6 @@ class JointPlacementHelper:
                 label_scale = LABEL_SCALE
                 label_offset = LABEL_OFFSET
 
-            for single_cuv_obj in label_cuvs_info:
-                new_cuv = mc.curve(point=single_cuv_obj["point"], degree=single_cuv_obj["degree"])
-                closed_cuv = mc.closeCurve(new_cuv, caching=False)
-                mc.delete(new_cuv)
-                cuv_shape_node = mc.ls(mc.listRelatives(closed_cuv), type="nurbsCurve")
-                mc.parent(cuv_shape_node, cuv_grp, shape=True, relative=True)
-                mc.delete(closed_cuv)
-
             # Move all the labels curves to the right places, constraint to their joint and lock the translation, rotation and scale
             mc.xform(cuv_grp, centerPivots=True)
             mc.scale(label_scale, label_scale, label_scale, cuv_grp)
@@ -199,6 +245,10 @@ class JointPlacementHelper:
         """
         #self.temp_grp = mc.listRelatives(self.get_jnt_name("c_root"), parent=True, path=True)[0]
 
+        # The right joints may have been moved since the last mirror
+        if self.symmetry is True and self.bake_symmetry is True:
+            self.mirror_jnts()
+
         # Delete all the label cuvs
         for label_cuv in self.label_cuv_list:
             mc.delete(label_cuv)
@@ -215,7 +265,8 @@ class JointPlacementHelper:
                 mc.setAttr(jnt_name + ".scale", lock=False)
                 mc.parent(jnt_name, self.temp_grp)
 
-        bind_jnt_dict = {}
+        # Keep the topological order, the rigger solves the joint orientation in this order
+        bind_jnt_dict = collections.OrderedDict()
 
         # add joint info to the bind joint dict
         for jnt_key, jnt_info in self.jnt_info_dict.items():
@@ -236,6 +287,7 @@ class JointPlacementHelper:
 
         # Chest joint will be replaced by the second last spine joint, so delete it here
         mc.delete(mc.ls(bind_jnt_dict["c_chest"]["uuid"]))
+        self.jnt_registry.invalidate("c_chest")
         bind_jnt_dict["l_clavicle"]["parent_uuid"] = None
         bind_jnt_dict["r_clavicle"]["parent_uuid"] = None
         bind_jnt_dict["c_neck"]["parent_uuid"] = None
@@ -244,33 +296,83 @@ class JointPlacementHelper:
         return self.temp_grp, bind_jnt_dict
 
     def handle_toe(self, toe_count):
+        """
+        Add the toes as copies of the template toe chain, spread on both sides of it, then remove the template chain.
+        """
+        alphhabet_list = string.ascii_uppercase
+        base_name_list = ["toe" + alphhabet_list[i] for i in range(toe_count)]
+        offset_list = [[(i+1)*TOE_OFFSET if i % 2 == 0 else -(i+1)*TOE_OFFSET, 0, 0] for i in range(toe_count)]
+
         if toe_count > 0:
-            alphhabet_list = string.ascii_uppercase
-            for i in range(toe_count):
-                for suffix in [LEFT_PREFIX, RIGHT_PREFIX]:
-                    for name in ["toeTemp01", "toeTemp02", "toeTemp03"]:
-                        template_jnt_info = self.jnt_info_dict[suffix+SEPARATOR+name]
-                        jnt_info = {}
-                        jnt_key = template_jnt_info["jnt_name"].replace("toeTemp", "toe"+alphhabet_list[i])
-                        jnt_info["jnt_name"] = jnt_key
-
-                        if name != "toe01":
-                            jnt_info["parent"] = template_jnt_info["parent"].replace("toeTemp", "toe" + alphhabet_list[i])
-                        else:
-                            jnt_info["parent"] = template_jnt_info["parent"]
-
-                        if i%2 == 0:
-                            diff = (i+1)*TOE_OFFSET
-                        else:
-                            diff = -(i+1)*TOE_OFFSET
-                        temp_pos = template_jnt_info["pos"]
-                        jnt_info["pos"] = [temp_pos[0]+diff, temp_pos[1], temp_pos[2]]
-
-                        self.jnt_info_dict[jnt_key] = jnt_info
+            for prefix in [LEFT_PREFIX, RIGHT_PREFIX]:
+                toe_temp_chain = [prefix + SEPARATOR + name for name in ["toeTemp01", "toeTemp02", "toeTemp03"]]
+                self.skeleton_model.copy_chain(toe_temp_chain, base_name_list, offset_list)
+
+        self.skeleton_model.remove_digits(["toeTemp"])
+
+    def get_mirror_jnt_key(self, jnt_key):
+        """
+        Get the key of the joint on the other side, None for the center joints.
+        """
+        side_prefix, separator, key_name = jnt_key.partition(SEPARATOR)
+        if side_prefix == LEFT_PREFIX:
+            return RIGHT_PREFIX + SEPARATOR + key_name
+        if side_prefix == RIGHT_PREFIX:
+            return LEFT_PREFIX + SEPARATOR + key_name
+        return None
+
+    def mirror_jnts(self, jnt_key_list=None):
+        """
+        Mirror the left joints to the right joints in one pass. jnt_key_list can hold left or right joint keys to only
+        mirror these joints, all the joints are mirrored by default. The transforms are local, so the children of a
+        mirrored joint don't need to be mirrored again. Return the keys of the mirrored right joints.
+        """
+        if jnt_key_list is None:
+            jnt_key_list = self.jnt_info_dict.keys()
+
+        left_key_list = []
+        for jnt_key in jnt_key_list:
+            if jnt_key.startswith(RIGHT_PREFIX + SEPARATOR):
+                jnt_key = self.get_mirror_jnt_key(jnt_key)
+            if jnt_key.startswith(LEFT_PREFIX + SEPARATOR) and jnt_key not in left_key_list:
+                left_key_list.append(jnt_key)
+        right_key_list = [self.get_mirror_jnt_key(jnt_key) for jnt_key in left_key_list]
+
+        # Read all the left transforms, then mirror them in one batch
+        translate_list = [mc.getAttr(self.get_jnt_name(jnt_key) + ".translate")[0] for jnt_key in left_key_list]
+        rotate_list = [mc.getAttr(self.get_jnt_name(jnt_key) + ".rotate")[0] for jnt_key in left_key_list]
+        translate_list = rig_math.scale_vectors(translate_list, MIRROR_TRANSLATE_SCALE)
+        rotate_list = rig_math.scale_vectors(rotate_list, MIRROR_ROTATE_SCALE)
+
+        mc.undoInfo(openChunk=True, chunkName=MIRROR_UNDO_CHUNK_NAME)
+        try:
+            for jnt_key, translate, rotate in zip(right_key_list, translate_list, rotate_list):
+                right_jnt_name = self.get_jnt_name(jnt_key)
+                mc.setAttr(right_jnt_name + ".translate", *translate)
+                mc.setAttr(right_jnt_name + ".rotate", *rotate)
+        finally:
+            mc.undoInfo(closeChunk=True)
+
+        return right_key_list
 
+    def mirror_selected_jnts(self):
+        """
+        Mirror the selected template joints of either side, all the joints if nothing is selected.
+        """
+        uuid_set = set(mc.ls(selection=True, uuid=True))
+        if not uuid_set:
+            return self.mirror_jnts()
+        return self.mirror_jnts([jnt_key for jnt_key, jnt_info in self.jnt_info_dict.items()
+                                 if jnt_info["uuid"] in uuid_set])
+
+    def get_jnt_positions(self):
+        """
+        Return the world position of every template joint, the result can be saved and used as jnt_pos_dict later.
+        """
+        jnt_pos_dict = {}
         for jnt_key in self.jnt_info_dict.keys():
-            if "toeTemp" in jnt_key:
-                self.jnt_info_dict.pop(jnt_key)
+            jnt_pos_dict[jnt_key] = mc.xform(self.get_jnt_name(jnt_key), query=True, translation=True, worldSpace=True)
+        return jnt_pos_dict
 
     def get_uuid(self, obj_name):
         """
@@ -284,7 +386,7 @@ class JointPlacementHelper:
         Get the joint name by the joint key
         """
         jnt_uuid = self.jnt_info_dict[jnt_key]["uuid"]
-        return mc.ls(jnt_uuid)[0]
+        return self.jnt_registry.get_name(jnt_key, jnt_uuid)
 
     def has_attr(self, obj_name, attr_name):
         """
@@ -0,0 +1,59 @@
+"""
+Offline compiler of the joint label curve library. The label curves are stored as open degree 1 curves, the compiler
+closes them and stores the closed curve data(points, knots, degree, form), so the joint placement can create the
+label shapes directly instead of creating, closing and deleting curves in the scene.
+
+Usage:
+    python label_cuv_compiler.py joint_label_cuv_lib
+"""
+import sys
+import json
+
+OPEN_FORM = "open"
+CLOSED_FORM = "closed"
+
+
+def close_cuv_info(cuv_info):
+    """
+    Return the closed curve data of a label curve, the same shape closeCurve creates for a degree 1 curve: the first
+    point is repeated at the end. Curves which already have knots are returned as they are.
+    """
+    if "knot" in cuv_info:
+        return cuv_info
+
+    degree = cuv_info["degree"]
+    point_list = [list(point) for point in cuv_info["point"]]
+    if degree != 1:
+        raise ValueError("Only degree 1 label curves can be closed, got degree {0}.".format(degree))
+
+    if point_list[0] != point_list[-1]:
+        point_list.append(list(point_list[0]))
+
+    return {"degree": degree, "form": CLOSED_FORM, "point": point_list, "knot": list(range(len(point_list)))}
+
+
+def compile_label_cuv_dict(label_cuv_dict):
+    compiled_dict = {}
+    for jnt_key, cuv_info_list in label_cuv_dict.items():
+        compiled_dict[jnt_key] = [close_cuv_info(cuv_info) for cuv_info in cuv_info_list]
+    return compiled_dict
+
+
+def compile_label_cuv_file(file_path):
+    """
+    Close all the curves of the library file in place, one label per line.
+    """
+    with open(file_path, "r") as file_obj:
+        label_cuv_dict = json.load(file_obj)
+
+    compiled_dict = compile_label_cuv_dict(label_cuv_dict)
+    line_list = ["{0}: {1}".format(json.dumps(jnt_key), json.dumps(compiled_dict[jnt_key], sort_keys=True))
+                 for jnt_key in sorted(compiled_dict)]
+
+    with open(file_path, "w") as file_obj:
+        file_obj.write("{" + ",\n ".join(line_list) + "}\n")
+
+
+if __name__ == "__main__":
+    for lib_path in sys.argv[1:]:
+        compile_label_cuv_file(lib_path)
@@ -1,3 +1,6 @@
+import copy
+import threading
+import traceback
 import maya.cmds as mc
 from maya import OpenMayaUI as omui
 
@@ -49,8 +52,14 @@ UPPER_LEG_TWIST_LBL = "Upper Leg Twist:"
 LOWER_LEG_TWIST_LBL = "Lower Leg Twist:"
 JNT_PLACEMENT_BTN_LBL = "Joint Placement"
 CREATE_RIG_BTN_LBL = "Create Rig"
+MIRROR_NOW_BTN_LBL = "Mirror Now"
 MIRROR_BEHV_LBL = "Mirror Behavior:"
 SYMMETRY_LBL = "Symmetrical Character:"
+BAKE_SYMMETRY_LBL = "Bake Symmetry:"
+CANCEL_BTN_LBL = "Cancel"
+BUILD_PROGRESS_TITLE = "Creating Rig"
+PREPARE_BUILD_LBL = "Preparing the build..."
+BUILD_STEP_LBL = "Building {0} ({1}/{2})"
 
 # Default value
 DEF_SPINE_JNT_CNT = 5
@@ -64,6 +73,11 @@ DEF_TOE_CNT_RANGE = [0, 26]
 DEF_TWIST_JNT_CNT = 3
 DEF_TWIST_JNT_RANGE = [0, 30]
 
+# Build scheduling, the worker thread is polled every BUILD_POLL_INTERVAL milliseconds, then one build step runs per
+# idle timer event
+BUILD_POLL_INTERVAL = 20
+BUILD_STEP_INTERVAL = 0
+
 # Warning Msg
 NO_CHAR_NAME_ERR = "Please input character name."
 SPINE_JNT_CNT_ODD_ERR = "Spine joints count should be an odd number."
@@ -71,6 +85,9 @@ TEMP_SKELETON_ERR = "Some problems were found in the template skeleton, please g
 CREATE_RIG_SUCCESS = "Rig has been created successfully!"
 IK_FK_LEG_ERR = "Please select at least one IK/FK legs option."
 IK_FK_ARM_ERR = "Please select at least one IK/FK arms option."
+CREATE_RIG_CANCELED = "Rig creation has been canceled, the partial rig has been undone."
+PREPARE_BUILD_ERR = "The rig build preparation failed:\n{0}"
+BUILD_STEP_ERR = "The rig build failed at the {0} step, the partial rig has been undone:\n{1}"
 
 mayaMainWindowPtr = omui.MQtUtil.mainWindow()
 mayaMainWindow = wrapInstance(long(mayaMainWindowPtr), QWidget)
@@ -88,6 +105,9 @@ class MainWindow(QWidget):
         # Define rigger instance
         self.auto_rigger = None
         self.jnt_placement_helper = None
+        # Bind skeleton of the finished joint placement, kept for the next build after a canceled build
+        self.rig_grp = None
+        self.bind_jnt_info_dict = None
 
         # Init instance variables
         self.char_name_line_edit = QLineEdit()  # Character Name
@@ -98,6 +118,7 @@ class MainWindow(QWidget):
 
         self.mirror_behv_chk_box = QCheckBox()  # Mirror behavior check box
         self.symmetry_chk_box = QCheckBox()  # Mirror behavior check box
+        self.bake_symmetry_chk_box = QCheckBox()  # Bake symmetry check box
 
         self.fk_arm_chk_box = QCheckBox(FK_ARM_LBL)  # fk arm check box
         self.fk_leg_chk_box = QCheckBox(FK_LEG_LBL)  # fk leg check box
@@ -134,11 +155,25 @@ class MainWindow(QWidget):
 
         self.jnt_placement_btn = QPushButton(JNT_PLACEMENT_BTN_LBL)  # Joint placement button
         self.create_rig_btn = QPushButton(CREATE_RIG_BTN_LBL)  # Create rig button
+        self.mirror_now_btn = QPushButton(MIRROR_NOW_BTN_LBL)  # Mirror template joints button
+
+        # Build progress dialog, only created during a build
+        self.build_progress_dlg = None
+
+        # Build state, the build steps run from the build timer
+        self.build_timer = QTimer(self)
+        self.build_thread = None
+        self.build_result = {}
+        self.build_plan = None
+        self.build_steps = None
+        self.build_step_index = 0
+        self.cancel_requested = False
 
         # Put all user input boxes in a list
         self.jp_input_list = [self.char_name_line_edit, self.biped_rdo_btn, self.quadru_rdo_btn, self.other_rdo_btn,
                               self.spine_jnts_spin, self.neck_jnts_spin, self.finger_cnt_spin, self.toe_cnt_spin, self.upper_arm_twist_spin,
-                              self.upper_leg_twist_spin, self.lower_arm_twist_spin, self.lower_leg_twist_spin, self.mirror_behv_chk_box, self.symmetry_chk_box]
+                              self.upper_leg_twist_spin, self.lower_arm_twist_spin, self.lower_leg_twist_spin, self.mirror_behv_chk_box, self.symmetry_chk_box,
+                              self.bake_symmetry_chk_box]
 
         self.cg_input_list = [self.strh_arm_chk_box, self.strh_leg_chk_box,
                               self.fk_leg_chk_box, self.ik_leg_chk_box,
@@ -159,6 +194,7 @@ class MainWindow(QWidget):
 
         self.mirror_behv_chk_box.setChecked(True)
         self.symmetry_chk_box.setChecked(True)
+        self.symmetry_chk_box.toggled.connect(self.bake_symmetry_chk_box.setEnabled)
 
         # Stretch arm and leg check box group
         self.strh_arm_chk_box.setChecked(True)
@@ -190,11 +226,16 @@ class MainWindow(QWidget):
         self.jnt_placement_btn.clicked.connect(self.jnt_placement_btn_on_click)
         self.create_rig_btn.clicked.connect(self.create_rig_btn_on_click)
         self.create_rig_btn.setEnabled(False)
+        self.mirror_now_btn.clicked.connect(self.mirror_now_btn_on_click)
+        self.mirror_now_btn.setEnabled(False)
+
+        self.build_timer.timeout.connect(self.build_timer_on_timeout)
 
         # Add all inputs to the form layout
         main_layout.addRow(self.tr("&Character Name:"), self.char_name_line_edit)
         main_layout.addRow(type_rdo_grp_box)
         main_layout.addRow(self.tr(SYMMETRY_LBL), self.symmetry_chk_box)
+        main_layout.addRow(self.tr(BAKE_SYMMETRY_LBL), self.bake_symmetry_chk_box)
         main_layout.addRow(self.tr(MIRROR_BEHV_LBL), self.mirror_behv_chk_box)
         main_layout.addRow(self.tr(SPINE_JNT_LBL), self.spine_jnts_spin)
         main_layout.addRow(self.tr(NECK_JNT_LBL), self.neck_jnts_spin)
@@ -207,6 +248,7 @@ class MainWindow(QWidget):
         main_layout.addRow(fk_ik_chk_box_grp)
         main_layout.addRow(strh_chk_grp_widget)
         main_layout.addRow(self.jnt_placement_btn)
+        main_layout.addRow(self.mirror_now_btn)
         main_layout.addRow(self.create_rig_btn)
 
         self.setLayout(main_layout)
@@ -225,7 +267,8 @@ class MainWindow(QWidget):
         # Crate temp skeleton
         self.jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
         self.jnt_placement_helper.create_temp_skeleton(character_name=character_name, finger_count=self.finger_cnt_spin.value(),
-                                                       toe_count=self.toe_cnt_spin.value(), symmetry=self.symmetry_chk_box.isChecked())
+                                                       toe_count=self.toe_cnt_spin.value(), symmetry=self.symmetry_chk_box.isChecked(),
+                                                       bake_symmetry=self.bake_symmetry_chk_box.isChecked())
         self.char_name_line_edit.setText(util.clear_path(self.jnt_placement_helper.temp_grp))
 
         # Disable all inputs, enable create rig button
@@ -235,31 +278,182 @@ class MainWindow(QWidget):
             input.setEnabled(True)
         self.jnt_placement_btn.setEnabled(False)
         self.create_rig_btn.setEnabled(True)
+        self.mirror_now_btn.setEnabled(self.symmetry_chk_box.isChecked() and self.bake_symmetry_chk_box.isChecked())
+
+    def mirror_now_btn_on_click(self):
+        """
+        Mirror now button on click function. Mirror the selected template joints to the other side, all the joints if
+        nothing is selected.
+        """
+        self.jnt_placement_helper.mirror_selected_jnts()
 
     def create_rig_btn_on_click(self):
         """
-        Create rig button on click function.
+        Create rig button on click function. The pure math of the build runs on a worker thread, then the build steps
+        run one per timer event, so Maya keeps redrawing and the build can be canceled between two steps. The progress
+        dialog is application modal, the scene can't be edited while the undo chunk of the build is open.
         """
         self.create_rig_btn.setEnabled(False)
+        self.mirror_now_btn.setEnabled(False)
         for input in self.cg_input_list:
             input.setEnabled(False)
+
+        # A canceled build leaves the bind skeleton. The rigger of the canceled build has changed its joint info and
+        # joint lists, every build gets a new rigger with a copy of the joint info of the placement.
+        if self.bind_jnt_info_dict is None:
+            try:
+                self.rig_grp, self.bind_jnt_info_dict = self.jnt_placement_helper.finish_jnt_placement()
+            except:
+                # If the temp skeleton is broken or missing than send a warning message
+                mc.warning(TEMP_SKELETON_ERR)
+                return
+        self.auto_rigger = auto_rigger.AutoRigger(rig_grp=self.rig_grp,
+                                                  bind_jnt_info_dict=copy.deepcopy(self.bind_jnt_info_dict))
+
+        rig_options = self.get_rig_options()
+        # The digit rules of the orientation input follow the digit counts, the build sets the same digit root joints
+        self.auto_rigger.set_digit_root_keys(finger_count=rig_options["finger_count"],
+                                             toe_count=rig_options["toe_count"])
+        # The joint positions are read here, the worker thread doesn't touch the scene
+        orientation_input = self.auto_rigger.get_orientation_input(mirror_behavior=rig_options["mirror_behavior"])
+
+        self.build_result = {}
+        self.build_plan = None
+        self.build_steps = None
+        self.build_step_index = 0
+        self.cancel_requested = False
+        self.build_thread = threading.Thread(target=self.prepare_build, args=(rig_options, orientation_input))
+        self.build_thread.daemon = True
+        self.build_thread.start()
+
+        self.show_build_progress(PREPARE_BUILD_LBL, value=0, maximum=0)
+        self.build_timer.start(BUILD_POLL_INTERVAL)
+
+    def get_rig_options(self):
+        """
+        Return the create_rig options of the user inputs, every check box gives its own option.
+        """
+        return {"spine_jnt_count": self.spine_jnts_spin.value(), "neck_jnt_count": self.neck_jnts_spin.value(),
+                "upper_arm_twist_count": self.upper_arm_twist_spin.value(),
+                "lower_arm_twist_count": self.lower_arm_twist_spin.value(),
+                "upper_leg_twist_count": self.upper_leg_twist_spin.value(),
+                "lower_leg_twist_count": self.lower_leg_twist_spin.value(),
+                "mirror_behavior": self.mirror_behv_chk_box.isChecked(),
+                "ik_arm": self.ik_arm_chk_box.isChecked(), "fk_arm": self.fk_arm_chk_box.isChecked(),
+                "ik_leg": self.ik_leg_chk_box.isChecked(), "fk_leg": self.fk_leg_chk_box.isChecked(),
+                "stretch_arm": self.strh_arm_chk_box.isChecked(), "stretch_leg": self.strh_leg_chk_box.isChecked(),
+                "finger_count": self.finger_cnt_spin.value(), "toe_count": self.toe_cnt_spin.value()}
+
+    def prepare_build(self, rig_options, orientation_input):
+        """
+        Worker thread function, compile the build plan and run the pure math of the build. No Maya command may be
+        called here.
+        """
+        try:
+            self.build_result["plan"] = self.auto_rigger.prepare_build(rig_options,
+                                                                       orientation_input=orientation_input)
+        except Exception:
+            self.build_result["error"] = traceback.format_exc()
+
+    def build_timer_on_timeout(self):
+        """
+        Build timer function. Wait for the worker thread, then run the next build step, the window is redrawn between
+        the steps.
+        """
+        if self.build_steps is None:
+            if self.build_thread.is_alive():
+                return
+            if "error" in self.build_result:
+                # Nothing was built yet, only the options have to be enabled again
+                self.finish_build(canceled=True, message=PREPARE_BUILD_ERR.format(self.build_result["error"]))
+                return
+            if self.cancel_requested:
+                self.finish_build(canceled=True)
+                return
+
+            self.build_plan = self.build_result["plan"]
+            self.build_steps = self.auto_rigger.iter_create_rig(self.build_plan, session_per_step=True)
+            self.show_build_progress(self.get_build_step_lbl(), value=0, maximum=len(self.build_plan.step_list))
+            self.build_timer.setInterval(BUILD_STEP_INTERVAL)
+            return
+
+        if self.cancel_requested:
+            # Closing the step generator closes the undo chunk of the build, the chunk is only opened by the first step
+            self.build_steps.close()
+            if self.build_step_index > 0:
+                mc.undo()
+            self.finish_build(canceled=True)
+            return
+
         try:
-            rig_grp, bind_jnt_info_dict = self.jnt_placement_helper.finish_jnt_placement()
-        except:
-            # If the temp skeleton is broken or missing than send a warning message
-            mc.warning(TEMP_SKELETON_ERR)
+            next(self.build_steps)
+        except StopIteration:
+            self.finish_build()
+            mc.warning(CREATE_RIG_SUCCESS)
+            return
+        except Exception:
+            # An error raised in a timer slot would only be printed, it is reported like a cancel. The undo chunk was
+            # opened when the first step started and the failed step closed it, every started step is undone.
+            step_name = self.build_plan.step_list[self.build_step_index].name
+            mc.undo()
+            self.finish_build(canceled=True, message=BUILD_STEP_ERR.format(step_name, traceback.format_exc()))
             return
 
-        self.auto_rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
-        self.auto_rigger.create_rig(spine_jnt_count=self.spine_jnts_spin.value(), neck_jnt_count=self.neck_jnts_spin.value(),
-                                    upper_arm_twist_count=self.upper_arm_twist_spin.value(), lower_arm_twist_count=self.lower_arm_twist_spin.value(),
-                                    upper_leg_twist_count=self.upper_leg_twist_spin.value(), lower_leg_twist_count=self.lower_leg_twist_spin.value(),
-                                    mirror_behavior=self.mirror_behv_chk_box.isChecked(),
-                                    ik_arm=self.ik_arm_chk_box.isChecked(), fk_arm=self.fk_arm_chk_box.isChecked(),
-                                    ik_leg=self.ik_arm_chk_box.isChecked(), fk_leg=self.fk_leg_chk_box.isChecked(),
-                                    stretch_arm=self.strh_arm_chk_box.isChecked(), stretch_leg=self.strh_leg_chk_box.isChecked(),
-                                    finger_count=self.finger_cnt_spin.value(), toe_count=self.toe_cnt_spin.value())
-        mc.warning(CREATE_RIG_SUCCESS)
+        self.build_step_index += 1
+        self.show_build_progress(self.get_build_step_lbl(), value=self.build_step_index)
+
+    def build_progress_dlg_on_cancel(self):
+        """
+        Build progress dialog cancel function. The build stops before the next build step and the built steps are
+        undone.
+        """
+        self.cancel_requested = True
+
+    def get_build_step_lbl(self):
+        step_list = self.build_plan.step_list
+        if self.build_step_index >= len(step_list):
+            return ""
+        return BUILD_STEP_LBL.format(step_list[self.build_step_index].name, self.build_step_index + 1, len(step_list))
+
+    def show_build_progress(self, stage_text, value=0, maximum=None):
+        """
+        Show the build progress dialog, a maximum of 0 shows a busy progress bar.
+        """
+        if self.build_progress_dlg is None:
+            self.build_progress_dlg = QProgressDialog(self)
+            self.build_progress_dlg.setWindowTitle(BUILD_PROGRESS_TITLE)
+            self.build_progress_dlg.setCancelButtonText(CANCEL_BTN_LBL)
+            self.build_progress_dlg.setWindowModality(Qt.ApplicationModal)
+            self.build_progress_dlg.setMinimumDuration(0)
+            self.build_progress_dlg.setAutoClose(False)
+            self.build_progress_dlg.setAutoReset(False)
+            self.build_progress_dlg.canceled.connect(self.build_progress_dlg_on_cancel)
+            self.build_progress_dlg.show()
+
+        self.build_progress_dlg.setLabelText(stage_text)
+        if maximum is not None:
+            self.build_progress_dlg.setRange(0, maximum)
+        self.build_progress_dlg.setValue(value)
+
+    def finish_build(self, canceled=False, message=CREATE_RIG_CANCELED):
+        """
+        Stop the build timer and close the build progress dialog. After a canceled or failed build the options can be
+        changed and the rig created again, the message tells why the build stopped.
+        """
+        self.build_timer.stop()
+        self.build_steps = None
+        self.build_thread = None
+        if self.build_progress_dlg is not None:
+            # Closing the dialog would emit canceled
+            self.build_progress_dlg.hide()
+            self.build_progress_dlg.deleteLater()
+            self.build_progress_dlg = None
+
+        if canceled:
+            for input in self.cg_input_list:
+                input.setEnabled(True)
+            self.create_rig_btn.setEnabled(True)
+            mc.warning(message)
 
     def validate_input(self):
         """
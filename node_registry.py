@@ -0,0 +1,100 @@
+"""
+Node lookup registry, caches stable node handles per key so looking up the same node again doesn't need to query
+the scene by uuid. The node recorder keeps handles on the nodes created while it is open, so the new nodes of a build
+step are known without listing the whole scene.
+
+Usage:
+    with node_registry.NodeRecorder() as recorder:
+        build_step()
+    new_uuid_list = recorder.get_uuids()
+"""
+import maya.cmds as mc
+import maya.api.OpenMaya as opm
+
+
+class NodeRegistry(object):
+    def __init__(self):
+        # key: [uuid, MObjectHandle, is_dag_node]
+        self.handle_dict = {}
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def get_name(self, key, uuid):
+        """
+        Return the node name of the key. The handle survives rename and reparent, so the name is always up to date
+        as long as the node is alive, the scene is only queried on the first lookup or after the node was deleted.
+        """
+        handle_info = self.handle_dict.get(key)
+        if handle_info is not None and handle_info[0] == uuid and handle_info[1].isValid():
+            self.hit_count += 1
+            return self.get_handle_name(handle_info[1], handle_info[2])
+
+        self.miss_count += 1
+        node_name = mc.ls(uuid)[0]
+
+        sel_list = opm.MSelectionList()
+        sel_list.add(node_name)
+        node_obj = sel_list.getDependNode(0)
+        self.handle_dict[key] = [uuid, opm.MObjectHandle(node_obj), node_obj.hasFn(opm.MFn.kDagNode)]
+
+        return node_name
+
+    def get_handle_name(self, handle, is_dag_node):
+        """
+        Get the node name from the handle, dag nodes use the shortest unique path like mc.ls does.
+        """
+        if is_dag_node:
+            return opm.MDagPath.getAPathTo(handle.object()).partialPathName()
+        return opm.MFnDependencyNode(handle.object()).name()
+
+    def invalidate(self, key=None):
+        """
+        Forget the cached handle of the key, or all the handles if no key is given. Call it when the builder deletes
+        the node or replaces the node of the key.
+        """
+        if key is None:
+            self.handle_dict.clear()
+        else:
+            self.handle_dict.pop(key, None)
+
+    def reset_counters(self):
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def stats(self):
+        """
+        Return the lookup counters, every hit is a scene query that has been saved.
+        """
+        lookup_count = self.hit_count + self.miss_count
+        hit_rate = float(self.hit_count)/lookup_count if lookup_count else 0.0
+        return {"hits": self.hit_count, "misses": self.miss_count, "lookups": lookup_count,
+                "hit_rate": hit_rate, "cached_handles": len(self.handle_dict)}
+
+
+class NodeRecorder(object):
+    """
+    Record the nodes created while the recorder is open, by any command or API call, through a node added callback.
+    """
+    def __init__(self):
+        self.handle_list = []
+        self.callback_id = None
+
+    def __enter__(self):
+        self.handle_list = []
+        self.callback_id = opm.MDGMessage.addNodeAddedCallback(self.on_node_added, "dependNode")
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        opm.MMessage.removeCallback(self.callback_id)
+        self.callback_id = None
+        return False
+
+    def on_node_added(self, node_obj, client_data):
+        self.handle_list.append(opm.MObjectHandle(node_obj))
+
+    def get_uuids(self):
+        """
+        Return the uuids of the recorded nodes which still exist, in creation order.
+        """
+        return [opm.MFnDependencyNode(handle.object()).uuid().asString() for handle in self.handle_list
+                if handle.isValid()]
@@ -0,0 +1,3753 @@
+"""
+Offline stand-in for the subset of maya.cmds and maya.api.OpenMaya used by the project. It keeps an in-memory DAG/DG
+(names, hierarchy, attributes, connections, transforms and control point geometry) and records every command call
+with its timing, so JointPlacementHelper and AutoRigger.create_rig can run without Maya, and the exact count of
+commands and nodes of every option set can be measured.
+
+The stand-in doesn't run the Maya dependency graph. Utility nodes(multiplyDivide, plusMinusAverage, condition,
+reverse, blendColors, distanceDimShape) and constraints are evaluated when their outputs are queried, aim/orient
+operations are solved once when they are called and IK handles don't move their joints. Geometry operations are
+approximated in object space.
+
+Usage:
+    import offline_maya
+    offline_maya.install()     # before maya.cmds is imported by the project modules
+    report = offline_maya.build_rig_offline(placement_options={"finger_count": 5}, rig_options={"ik_leg": True})
+
+    python offline_maya.py '{"finger_count": 5, "ik_leg": true}'
+    python offline_maya.py check     # the offline checks, see run_checks
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import types
+import uuid
+import collections
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import rig_math
+
+TIMER = getattr(time, "perf_counter", time.time)
+
+MODULE_NAME_LIST = ["maya", "maya.cmds", "maya.api", "maya.api.OpenMaya", "maya.standalone"]
+
+UUID_PATTERN = re.compile(r"^[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}$")
+PLUG_TOKEN_PATTERN = re.compile(r"^(\w+)(?:\[(\d+|\*)\])?$")
+COMPONENT_PATTERN = re.compile(r"^(.+)\.(cv)\[(\*|\d+)(?::(\d+))?\]$")
+TRAILING_NUMBER_PATTERN = re.compile(r"^(.*?)(\d+)$")
+TARGET_WEIGHT_PATTERN = re.compile(r"^target\[(\d+)\]\.targetWeight$")
+
+SHAPE_TYPE_LIST = ["nurbsCurve", "nurbsSurface", "locator", "follicle", "clusterHandle", "distanceDimShape", "mesh"]
+TRANSFORM_TYPE_LIST = ["transform", "joint", "ikHandle", "ikEffector", "parentConstraint", "pointConstraint",
+                       "orientConstraint", "scaleConstraint", "aimConstraint", "poleVectorConstraint"]
+CONSTRAINT_TYPE_LIST = ["parentConstraint", "pointConstraint", "orientConstraint", "scaleConstraint",
+                        "aimConstraint", "poleVectorConstraint"]
+# Attribute types holding numbers
+VALUE_ATTR_TYPE_LIST = ["bool", "enum", "long", "short", "float", "double", "doubleLinear", "doubleAngle"]
+
+AXIS_INDEX_DICT = {"X": 0, "Y": 1, "Z": 2, "R": 0, "G": 1, "B": 2}
+
+IDENTITY_MATRIX = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+# World up directions of joint -orientJoint -secondaryAxisOrient
+SECONDARY_AXIS_DICT = {"xup": (1.0, 0.0, 0.0), "xdown": (-1.0, 0.0, 0.0),
+                       "yup": (0.0, 1.0, 0.0), "ydown": (0.0, -1.0, 0.0),
+                       "zup": (0.0, 0.0, 1.0), "zdown": (0.0, 0.0, -1.0)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Call recorder
+# ----------------------------------------------------------------------------------------------------------------------
+class CallRecorder(object):
+    """
+    Record every command call with its timing, and every node creation.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.call_log = []
+        self.command_count_dict = collections.defaultdict(int)
+        self.command_time_dict = collections.defaultdict(float)
+        self.created_node_dict = collections.defaultdict(int)
+        self.depth = 0
+
+    def record_call(self, command_name, duration):
+        self.call_log.append((command_name, duration))
+        self.command_count_dict[command_name] += 1
+        self.command_time_dict[command_name] += duration
+
+    def record_node(self, node_type):
+        self.created_node_dict[node_type] += 1
+
+    def get_command_count(self):
+        return len(self.call_log)
+
+    def get_report(self):
+        """
+        Return the command counts and timings, the created nodes and the nodes alive in the scene per type.
+        """
+        alive_node_dict = collections.defaultdict(int)
+        for node in SCENE.node_list:
+            alive_node_dict[node.node_type] += 1
+
+        return {"command_count": len(self.call_log),
+                "command_time": sum(self.command_time_dict.values()),
+                "commands": dict((name, {"count": count, "time": self.command_time_dict[name]})
+                                 for name, count in self.command_count_dict.items()),
+                "created_node_count": sum(self.created_node_dict.values()),
+                "created_nodes_by_type": dict(self.created_node_dict),
+                "node_count": len(SCENE.node_list),
+                "nodes_by_type": dict(alive_node_dict)}
+
+
+RECORDER = CallRecorder()
+
+
+def recorded(command_name):
+    """
+    Decorator recording the command call, nested command calls made by the stand-in itself are not recorded.
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if RECORDER.depth:
+                return func(*args, **kwargs)
+
+            RECORDER.depth += 1
+            start_time = TIMER()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                RECORDER.depth -= 1
+                RECORDER.record_call(command_name, TIMER() - start_time)
+
+        wrapper.__name__ = command_name
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Matrix helpers, row vectors like Maya
+# ----------------------------------------------------------------------------------------------------------------------
+def mat4_mult(mat_a, mat_b):
+    return [[sum(mat_a[i][k]*mat_b[k][j] for k in range(4)) for j in range(4)] for i in range(4)]
+
+
+def mat4_from_parts(mat3=None, translation=(0.0, 0.0, 0.0)):
+    mat3 = mat3 or rig_math.IDENTITY_MATRIX
+    return [[mat3[0][0], mat3[0][1], mat3[0][2], 0.0],
+            [mat3[1][0], mat3[1][1], mat3[1][2], 0.0],
+            [mat3[2][0], mat3[2][1], mat3[2][2], 0.0],
+            [translation[0], translation[1], translation[2], 1.0]]
+
+
+def mat4_translation(mat):
+    return [mat[3][0], mat[3][1], mat[3][2]]
+
+
+def mat4_rotation_part(mat):
+    return [[mat[i][j] for j in range(3)] for i in range(3)]
+
+
+def mat3_determinant(mat):
+    return (mat[0][0]*(mat[1][1]*mat[2][2] - mat[1][2]*mat[2][1]) -
+            mat[0][1]*(mat[1][0]*mat[2][2] - mat[1][2]*mat[2][0]) +
+            mat[0][2]*(mat[1][0]*mat[2][1] - mat[1][1]*mat[2][0]))
+
+
+def mat3_inverse(mat):
+    det = mat3_determinant(mat)
+    if abs(det) < rig_math.EPSILON:
+        return [list(row) for row in rig_math.IDENTITY_MATRIX]
+
+    inv_det = 1.0/det
+    return [[(mat[1][1]*mat[2][2] - mat[1][2]*mat[2][1])*inv_det,
+             (mat[0][2]*mat[2][1] - mat[0][1]*mat[2][2])*inv_det,
+             (mat[0][1]*mat[1][2] - mat[0][2]*mat[1][1])*inv_det],
+            [(mat[1][2]*mat[2][0] - mat[1][0]*mat[2][2])*inv_det,
+             (mat[0][0]*mat[2][2] - mat[0][2]*mat[2][0])*inv_det,
+             (mat[0][2]*mat[1][0] - mat[0][0]*mat[1][2])*inv_det],
+            [(mat[1][0]*mat[2][1] - mat[1][1]*mat[2][0])*inv_det,
+             (mat[0][1]*mat[2][0] - mat[0][0]*mat[2][1])*inv_det,
+             (mat[0][0]*mat[1][1] - mat[0][1]*mat[1][0])*inv_det]]
+
+
+def mat4_inverse(mat):
+    """
+    Inverse of an affine matrix.
+    """
+    inv_rot = mat3_inverse(mat4_rotation_part(mat))
+    inv_translation = rig_math.vec_scale(rig_math.vec_mat_mult(mat4_translation(mat), inv_rot), -1.0)
+    return mat4_from_parts(inv_rot, inv_translation)
+
+
+def point_mat_mult(point, mat):
+    return [point[0]*mat[0][j] + point[1]*mat[1][j] + point[2]*mat[2][j] + mat[3][j] for j in range(3)]
+
+
+def decompose_mat3(mat3):
+    """
+    Split a 3x3 matrix into scale and a rotation matrix, a negative determinant is put on the x scale.
+    """
+    scale = [rig_math.vec_length(row) for row in mat3]
+    rot = [rig_math.vec_scale(row, 1.0/length) if length > rig_math.EPSILON else list(axis)
+           for row, length, axis in zip(mat3, scale, rig_math.IDENTITY_MATRIX)]
+    if mat3_determinant(rot) < 0:
+        scale[0] *= -1
+        rot[0] = rig_math.vec_scale(rot[0], -1.0)
+    return scale, rot
+
+
+def orthonormalize(mat3):
+    return decompose_mat3(mat3)[1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Attribute schema
+# ----------------------------------------------------------------------------------------------------------------------
+class AttrDef(object):
+    __slots__ = ["name", "short_name", "attr_type", "default", "child_list", "parent", "keyable", "is_array",
+                 "is_output", "min_value", "max_value"]
+
+    def __init__(self, name, short_name=None, attr_type="double", default=0.0, child_list=None, parent=None,
+                 keyable=False, is_array=False, is_output=False):
+        self.name = name
+        self.short_name = short_name or name
+        self.attr_type = attr_type
+        self.default = default
+        self.child_list = child_list or []
+        self.parent = parent
+        self.keyable = keyable
+        self.is_array = is_array
+        self.is_output = is_output
+        self.min_value = None
+        self.max_value = None
+
+
+def attr_defs(name, short_name=None, attr_type="double", default=0.0, axis="XYZ", keyable=False, is_array=False,
+              is_output=False, children=None):
+    """
+    Return the attribute definition list of a scalar attribute(axis=None) or a compound of three children.
+    """
+    if axis is None and children is None:
+        return [AttrDef(name, short_name, attr_type, default, keyable=keyable, is_array=is_array,
+                        is_output=is_output)]
+
+    if children is None:
+        if not isinstance(default, (list, tuple)):
+            default = [default]*len(axis)
+        children = [AttrDef(name + axis_name, (short_name or name) + axis_name.lower(), attr_type, value,
+                            parent=name, keyable=keyable, is_output=is_output)
+                    for axis_name, value in zip(axis, default)]
+    else:
+        for child in children:
+            child.parent = name
+            child.is_output = is_output
+
+    compound = AttrDef(name, short_name, "compound", None, child_list=[child.name for child in children],
+                       keyable=False, is_array=is_array, is_output=is_output)
+    return [compound] + children
+
+
+BASE_ATTR_LIST = attr_defs("message", "msg", "message", None, axis=None) + \
+                 attr_defs("nodeState", "nds", "enum", 0, axis=None) + \
+                 attr_defs("caching", "cch", "bool", False, axis=None)
+
+DAG_ATTR_LIST = BASE_ATTR_LIST + \
+                attr_defs("visibility", "v", "bool", True, axis=None, keyable=True) + \
+                attr_defs("worldMatrix", "wm", "matrix", None, axis=None, is_array=True, is_output=True) + \
+                attr_defs("worldInverseMatrix", "wim", "matrix", None, axis=None, is_array=True, is_output=True) + \
+                attr_defs("parentMatrix", "pm", "matrix", None, axis=None, is_array=True, is_output=True) + \
+                attr_defs("parentInverseMatrix", "pim", "matrix", None, axis=None, is_array=True, is_output=True) + \
+                attr_defs("matrix", "m", "matrix", None, axis=None, is_output=True) + \
+                attr_defs("instObjGroups", "iog", "compound", None, axis=None, is_array=True)
+
+TRANSFORM_ATTR_LIST = DAG_ATTR_LIST + \
+                      attr_defs("translate", "t", "doubleLinear", 0.0, keyable=True) + \
+                      attr_defs("rotate", "r", "doubleAngle", 0.0, keyable=True) + \
+                      attr_defs("scale", "s", "double", 1.0, keyable=True) + \
+                      attr_defs("shear", "sh", "double", 0.0, axis=["XY", "XZ", "YZ"]) + \
+                      attr_defs("rotatePivot", "rp", "doubleLinear", 0.0) + \
+                      attr_defs("scalePivot", "sp", "doubleLinear", 0.0) + \
+                      attr_defs("rotateAxis", "ra", "doubleAngle", 0.0) + \
+                      attr_defs("rotateOrder", "ro", "enum", 0, axis=None) + \
+                      attr_defs("inheritsTransform", "it", "bool", True, axis=None) + \
+                      attr_defs("displayHandle", "dh", "bool", False, axis=None) + \
+                      attr_defs("displayLocalAxis", "dla", "bool", False, axis=None)
+
+JOINT_ATTR_LIST = TRANSFORM_ATTR_LIST + \
+                  attr_defs("jointOrient", "jo", "doubleAngle", 0.0) + \
+                  attr_defs("radius", "radi", "double", 1.0, axis=None) + \
+                  attr_defs("segmentScaleCompensate", "ssc", "bool", True, axis=None) + \
+                  attr_defs("inverseScale", "is", "double", 1.0) + \
+                  attr_defs("drawStyle", "ds", "enum", 0, axis=None)
+
+CONSTRAINT_ATTR_LIST = TRANSFORM_ATTR_LIST + \
+                       attr_defs("target", "tg", "compound", None, is_array=True, children=
+                                 attr_defs("targetTranslate", "tt", "doubleLinear", 0.0) +
+                                 attr_defs("targetRotate", "tr", "doubleAngle", 0.0) +
+                                 attr_defs("targetScale", "ts", "double", 1.0) +
+                                 attr_defs("targetParentMatrix", "tpm", "matrix", None, axis=None) +
+                                 attr_defs("targetOffsetTranslate", "tot", "doubleLinear", 0.0) +
+                                 attr_defs("targetOffsetRotate", "tor", "doubleAngle", 0.0) +
+                                 attr_defs("targetWeight", "tw", "double", 1.0, axis=None)) + \
+                       attr_defs("constraintTranslate", "ct", "doubleLinear", 0.0, is_output=True) + \
+                       attr_defs("constraintRotate", "cr", "doubleAngle", 0.0, is_output=True) + \
+                       attr_defs("constraintScale", "cs", "double", 1.0, is_output=True) + \
+                       attr_defs("constraintParentInverseMatrix", "cpim", "matrix", None, axis=None) + \
+                       attr_defs("offset", "o", "double", 0.0) + \
+                       attr_defs("aimVector", "a", "double", [1.0, 0.0, 0.0]) + \
+                       attr_defs("upVector", "u", "double", [0.0, 1.0, 0.0]) + \
+                       attr_defs("worldUpVector", "wu", "double", [0.0, 1.0, 0.0]) + \
+                       attr_defs("worldUpType", "wut", "enum", 0, axis=None) + \
+                       attr_defs("constraintTranslateX", "ctx", "doubleLinear", 0.0, axis=None) + \
+                       attr_defs("pivotSpace", "ps", "matrix", None, axis=None)
+
+SHAPE_ATTR_LIST = DAG_ATTR_LIST + \
+                  attr_defs("intermediateObject", "io", "bool", False, axis=None)
+
+NODE_ATTR_DICT = {
+    "transform": TRANSFORM_ATTR_LIST,
+    "joint": JOINT_ATTR_LIST,
+    "ikHandle": TRANSFORM_ATTR_LIST + attr_defs("poleVector", "pv", "double", [0.0, 0.0, 1.0]) +
+                attr_defs("twist", "twi", "doubleAngle", 0.0, axis=None, keyable=True) +
+                attr_defs("ikBlend", "ikb", "double", 1.0, axis=None, keyable=True) +
+                attr_defs("startJoint", "hsj", "message", None, axis=None) +
+                attr_defs("endEffector", "hee", "message", None, axis=None),
+    "ikEffector": TRANSFORM_ATTR_LIST + attr_defs("handlePath", "hp", "message", None, axis=None, is_array=True),
+    "parentConstraint": CONSTRAINT_ATTR_LIST,
+    "pointConstraint": CONSTRAINT_ATTR_LIST,
+    "orientConstraint": CONSTRAINT_ATTR_LIST,
+    "scaleConstraint": CONSTRAINT_ATTR_LIST,
+    "aimConstraint": CONSTRAINT_ATTR_LIST,
+    "poleVectorConstraint": CONSTRAINT_ATTR_LIST,
+    "nurbsCurve": SHAPE_ATTR_LIST + attr_defs("create", "cr", "nurbsCurve", None, axis=None) +
+                  attr_defs("local", "l", "nurbsCurve", None, axis=None, is_output=True) +
+                  attr_defs("worldSpace", "ws", "nurbsCurve", None, axis=None, is_array=True, is_output=True),
+    "nurbsSurface": SHAPE_ATTR_LIST + attr_defs("create", "cr", "nurbsSurface", None, axis=None) +
+                    attr_defs("local", "l", "nurbsSurface", None, axis=None, is_output=True) +
+                    attr_defs("worldSpace", "ws", "nurbsSurface", None, axis=None, is_array=True, is_output=True),
+    "mesh": SHAPE_ATTR_LIST + attr_defs("inMesh", "i", "mesh", None, axis=None) +
+            attr_defs("outMesh", "o", "mesh", None, axis=None, is_output=True),
+    "locator": SHAPE_ATTR_LIST + attr_defs("localPosition", "lp", "doubleLinear", 0.0) +
+               attr_defs("worldPosition", "wp", "doubleLinear", 0.0, is_array=True, is_output=True),
+    "follicle": SHAPE_ATTR_LIST + attr_defs("parameterU", "pu", "double", 0.0, axis=None, keyable=True) +
+                attr_defs("parameterV", "pv", "double", 0.0, axis=None, keyable=True) +
+                attr_defs("inputSurface", "is", "nurbsSurface", None, axis=None) +
+                attr_defs("inputMesh", "inm", "mesh", None, axis=None) +
+                attr_defs("inputWorldMatrix", "iwm", "matrix", None, axis=None) +
+                attr_defs("outTranslate", "ot", "doubleLinear", 0.0, is_output=True) +
+                attr_defs("outRotate", "or", "doubleAngle", 0.0, is_output=True),
+    "clusterHandle": SHAPE_ATTR_LIST + attr_defs("origin", "or", "doubleLinear", 0.0),
+    "distanceDimShape": SHAPE_ATTR_LIST + attr_defs("startPoint", "sp", "doubleLinear", 0.0) +
+                        attr_defs("endPoint", "ep", "doubleLinear", 0.0) +
+                        attr_defs("distance", "dist", "doubleLinear", 0.0, axis=None, is_output=True),
+    "multiplyDivide": BASE_ATTR_LIST + attr_defs("operation", "op", "enum", 1, axis=None) +
+                      attr_defs("input1", "i1", "float", 0.0) + attr_defs("input2", "i2", "float", 1.0) +
+                      attr_defs("output", "o", "float", 0.0, is_output=True),
+    "plusMinusAverage": BASE_ATTR_LIST + attr_defs("operation", "op", "enum", 1, axis=None) +
+                        attr_defs("input1D", "i1", "float", 0.0, axis=None, is_array=True) +
+                        attr_defs("output1D", "o1", "float", 0.0, axis=None, is_output=True),
+    "condition": BASE_ATTR_LIST + attr_defs("operation", "op", "enum", 0, axis=None) +
+                 attr_defs("firstTerm", "ft", "float", 0.0, axis=None) +
+                 attr_defs("secondTerm", "st", "float", 0.0, axis=None) +
+                 attr_defs("colorIfTrue", "ct", "float", 0.0, axis="RGB") +
+                 attr_defs("colorIfFalse", "cf", "float", 1.0, axis="RGB") +
+                 attr_defs("outColor", "oc", "float", 0.0, axis="RGB", is_output=True),
+    "reverse": BASE_ATTR_LIST + attr_defs("input", "i", "float", 0.0) +
+               attr_defs("output", "o", "float", 0.0, is_output=True),
+    "blendColors": BASE_ATTR_LIST + attr_defs("blender", "b", "float", 0.5, axis=None, keyable=True) +
+                   attr_defs("color1", "c1", "float", [1.0, 0.0, 0.0], axis="RGB") +
+                   attr_defs("color2", "c2", "float", [0.0, 0.0, 1.0], axis="RGB") +
+                   attr_defs("output", "op", "float", 0.0, axis="RGB", is_output=True),
+    "pairBlend": BASE_ATTR_LIST + attr_defs("weight", "w", "double", 1.0, axis=None, keyable=True) +
+                 attr_defs("inTranslate1", "it1", "doubleLinear", 0.0) +
+                 attr_defs("inTranslate2", "it2", "doubleLinear", 0.0) +
+                 attr_defs("inRotate1", "ir1", "doubleAngle", 0.0) +
+                 attr_defs("inRotate2", "ir2", "doubleAngle", 0.0) +
+                 attr_defs("rotInterpolation", "ri", "enum", 0, axis=None) +
+                 attr_defs("outTranslate", "ot", "doubleLinear", 0.0, is_output=True) +
+                 attr_defs("outRotate", "or", "doubleAngle", 0.0, is_output=True),
+    "distanceBetween": BASE_ATTR_LIST + attr_defs("point1", "p1", "doubleLinear", 0.0) +
+                       attr_defs("point2", "p2", "doubleLinear", 0.0) +
+                       attr_defs("inMatrix1", "im1", "matrix", None, axis=None) +
+                       attr_defs("inMatrix2", "im2", "matrix", None, axis=None) +
+                       attr_defs("distance", "d", "doubleLinear", 0.0, axis=None, is_output=True),
+    "decomposeMatrix": BASE_ATTR_LIST + attr_defs("inputMatrix", "imat", "matrix", None, axis=None) +
+                       attr_defs("outputTranslate", "ot", "doubleLinear", 0.0, is_output=True) +
+                       attr_defs("outputRotate", "or", "doubleAngle", 0.0, is_output=True) +
+                       attr_defs("outputScale", "os", "double", 1.0, is_output=True),
+    "curveInfo": BASE_ATTR_LIST + attr_defs("inputCurve", "ic", "nurbsCurve", None, axis=None) +
+                 attr_defs("arcLength", "al", "doubleLinear", 0.0, axis=None, is_output=True),
+    "makeNurbCircle": BASE_ATTR_LIST + attr_defs("normal", "nr", "doubleLinear", [0.0, 1.0, 0.0]) +
+                      attr_defs("radius", "r", "doubleLinear", 1.0, axis=None) +
+                      attr_defs("outputCurve", "oc", "nurbsCurve", None, axis=None, is_output=True),
+    "makeNurbPlane": BASE_ATTR_LIST + attr_defs("patchesU", "u", "long", 1, axis=None) +
+                     attr_defs("patchesV", "v", "long", 1, axis=None) +
+                     attr_defs("width", "w", "doubleLinear", 1.0, axis=None) +
+                     attr_defs("outputSurface", "os", "nurbsSurface", None, axis=None, is_output=True),
+    "cluster": BASE_ATTR_LIST + attr_defs("envelope", "en", "float", 1.0, axis=None, keyable=True) +
+               attr_defs("matrix", "ma", "matrix", None, axis=None) +
+               attr_defs("input", "ip", "compound", None, axis=None, is_array=True) +
+               attr_defs("outputGeometry", "og", "geometry", None, axis=None, is_array=True, is_output=True),
+    "tweak": BASE_ATTR_LIST + attr_defs("envelope", "en", "float", 1.0, axis=None) +
+             attr_defs("outputGeometry", "og", "geometry", None, axis=None, is_array=True, is_output=True),
+    "objectSet": BASE_ATTR_LIST + attr_defs("dagSetMembers", "dsm", "message", None, axis=None, is_array=True) +
+                 attr_defs("usedBy", "ub", "message", None, axis=None, is_array=True),
+    "groupId": BASE_ATTR_LIST + attr_defs("groupId", "id", "long", 0, axis=None),
+    "groupParts": BASE_ATTR_LIST + attr_defs("inputGeometry", "ig", "geometry", None, axis=None) +
+                  attr_defs("outputGeometry", "og", "geometry", None, axis=None, is_output=True),
+    "ikRPsolver": BASE_ATTR_LIST,
+}
+
+# Map of name(long or short) to attribute definition for every node type
+ATTR_LOOKUP_DICT = {}
+for _node_type, _attr_list in NODE_ATTR_DICT.items():
+    _lookup = {}
+    for _attr_def in _attr_list:
+        _lookup.setdefault(_attr_def.name, _attr_def)
+        _lookup.setdefault(_attr_def.short_name, _attr_def)
+    ATTR_LOOKUP_DICT[_node_type] = _lookup
+
+
+def get_default_node_name(node_type):
+    return node_type[0].lower() + node_type[1:]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Scene
+# ----------------------------------------------------------------------------------------------------------------------
+class Node(object):
+    def __init__(self, node_type, name):
+        self.node_type = node_type
+        self.name = name
+        self.uuid = str(uuid.uuid4()).upper()
+        self.parent = None
+        self.children = []
+        self.value_dict = {}
+        # plug path: {"keyable": bool, "locked": bool}
+        self.flag_dict = {}
+        self.dynamic_attr_dict = collections.OrderedDict()
+        # Control points in object space, for curves and surfaces
+        self.cv_list = []
+        self.cuv_info = None
+        self.alive = True
+        self.in_scene = False
+
+    def __repr__(self):
+        return "Node({0}, {1})".format(self.name, self.node_type)
+
+    @property
+    def is_dag(self):
+        return self.node_type in TRANSFORM_TYPE_LIST or self.node_type in SHAPE_TYPE_LIST
+
+    @property
+    def is_shape(self):
+        return self.node_type in SHAPE_TYPE_LIST
+
+    @property
+    def is_transform(self):
+        return self.node_type in TRANSFORM_TYPE_LIST
+
+    def get_attr_def(self, attr_name):
+        attr_def = ATTR_LOOKUP_DICT.get(self.node_type, ATTR_LOOKUP_DICT["transform"]).get(attr_name)
+        if attr_def is None:
+            attr_def = self.dynamic_attr_dict.get(attr_name)
+        return attr_def
+
+    def get_shapes(self):
+        return [child for child in self.children if child.is_shape]
+
+    def get_path_list(self):
+        path_list = []
+        node = self
+        while node is not None:
+            path_list.append(node.name)
+            node = node.parent
+        return path_list[::-1]
+
+
+class Scene(object):
+    def __init__(self):
+        self.node_list = []
+        self.name_index = collections.defaultdict(list)
+        self.uuid_index = {}
+        self.connection_dict = collections.OrderedDict()    # (dest node, dest plug): (source node, source plug)
+        self.selection = []
+        self.scene_name = ""
+        self.reserved_name_set = set()
+        self.plugin_dict = {}
+        self.command_dict = {}
+        # Scene snapshots of the closed undo chunks, see undoInfo
+        self.undo_list = []
+        self.chunk_depth = 0
+
+    # --- nodes ---
+    def register(self, node):
+        """
+        Add a created node to the scene, the node gets a unique name.
+        """
+        self.reserved_name_set.discard(node.name)
+        node.name = self.get_unique_name(node.name, node)
+        node.in_scene = True
+        self.node_list.append(node)
+        self.name_index[node.name].append(node)
+        self.uuid_index[node.uuid] = node
+        RECORDER.record_node(node.node_type)
+        for callback_func, client_data in list(NODE_ADDED_CALLBACK_DICT.values()):
+            callback_func(MObject(node=node), client_data)
+        return node
+
+    def create_node(self, node_type, name=None, parent=None, select=True):
+        if name is None:
+            name = get_default_node_name(node_type) + "1"
+        node = self.register(Node(node_type, name))
+        if parent is not None:
+            self.set_parent(node, parent)
+        if select:
+            self.selection = [node]
+        return node
+
+    def remove(self, node):
+        for child in list(node.children):
+            self.remove(child)
+
+        removed_key_list = [key for key, source in self.connection_dict.items() if key[0] is node or source[0] is node]
+        # The plugs driven by the node keep their last value, like in Maya
+        kept_value_list = [(key, get_value(key[0], key[1])) for key in removed_key_list
+                           if key[0] is not node and is_value_plug(key[0], key[1])]
+        for key in removed_key_list:
+            del self.connection_dict[key]
+        for (dest_node, dest_plug), value in kept_value_list:
+            set_value(dest_node, dest_plug, value, check=False)
+
+        if node.parent is not None:
+            node.parent.children.remove(node)
+            node.parent = None
+
+        if node.in_scene:
+            self.node_list.remove(node)
+            self.name_index[node.name].remove(node)
+            self.uuid_index.pop(node.uuid, None)
+        node.alive = False
+        node.in_scene = False
+        if node in self.selection:
+            self.selection.remove(node)
+
+    def rename(self, node, new_name):
+        if new_name == node.name:
+            return node.name
+        if "|" in new_name or not new_name:
+            raise RuntimeError("New name '{0}' is not valid.".format(new_name))
+
+        if node.in_scene:
+            self.name_index[node.name].remove(node)
+        node.name = self.get_unique_name(new_name, node) if node.in_scene else new_name
+        if node.in_scene:
+            self.name_index[node.name].append(node)
+        return node.name
+
+    def get_unique_name(self, name, node=None):
+        """
+        Make the name unique in the scene, a trailing number is incremented like Maya does.
+        """
+        if name not in self.reserved_name_set and not [other for other in self.name_index.get(name, [])
+                                                       if other is not node]:
+            return name
+
+        match = TRAILING_NUMBER_PATTERN.match(name)
+        if match:
+            base, number = match.group(1), int(match.group(2))
+            width = len(match.group(2))
+        else:
+            base, number, width = name, 0, 1
+
+        while True:
+            number += 1
+            new_name = base + str(number).zfill(width)
+            if not self.name_index.get(new_name) and new_name not in self.reserved_name_set:
+                return new_name
+
+    # --- lookup ---
+    def find(self, name, allow_component=False):
+        """
+        Find the node of a name, a path or a uuid. Raise ValueError if no node or more than one node matches.
+        """
+        if isinstance(name, Node):
+            return name
+        if name is None:
+            raise ValueError("No object matches name: None")
+
+        name = str(name)
+        if UUID_PATTERN.match(name):
+            node = self.uuid_index.get(name)
+            if node is None:
+                raise ValueError("No object matches name: " + name)
+            return node
+
+        if "." in name:
+            name = name.split(".", 1)[0]
+
+        token_list = [token for token in name.split("|")]
+        absolute = token_list[0] == ""
+        token_list = [token for token in token_list if token]
+        if not token_list:
+            raise ValueError("No object matches name: " + name)
+
+        candidate_list = []
+        for node in self.name_index.get(token_list[-1], []):
+            path_list = node.get_path_list()
+            if absolute:
+                if path_list == token_list:
+                    candidate_list.append(node)
+            elif path_list[-len(token_list):] == token_list:
+                candidate_list.append(node)
+
+        if not candidate_list:
+            raise ValueError("No object matches name: " + name)
+        if len(candidate_list) > 1:
+            raise ValueError("More than one object matches name: " + name)
+        return candidate_list[0]
+
+    def exists(self, name):
+        try:
+            self.find(name)
+            return True
+        except ValueError:
+            return False
+
+    def get_partial_name(self, node):
+        """
+        Shortest unique path of the node, like the names returned by the Maya commands.
+        """
+        other_list = [other for other in self.name_index.get(node.name, []) if other is not node]
+        if not other_list or not node.is_dag:
+            return node.name
+
+        path_list = node.get_path_list()
+        other_path_list = [other.get_path_list() for other in other_list]
+        for i in range(1, len(path_list)+1):
+            suffix = path_list[-i:]
+            if not [other_path for other_path in other_path_list if other_path[-i:] == suffix]:
+                return "|".join(suffix)
+        return "|" + "|".join(path_list)
+
+    def get_full_name(self, node):
+        if not node.is_dag:
+            return node.name
+        return "|" + "|".join(node.get_path_list())
+
+    # --- hierarchy ---
+    def set_parent(self, node, parent):
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        node.parent = parent
+        if parent is not None:
+            parent.children.append(node)
+
+        # Sibling names should be unique
+        sibling_list = parent.children if parent is not None else [other for other in self.node_list
+                                                                     if other.is_dag and other.parent is None]
+        if [sibling for sibling in sibling_list if sibling is not node and sibling.name == node.name]:
+            self.rename(node, node.name)
+
+    def get_descendants(self, node):
+        """
+        Descendants in pre-order.
+        """
+        result = []
+        for child in node.children:
+            result.append(child)
+            result += self.get_descendants(child)
+        return result
+
+    # --- connections ---
+    def connect(self, source_node, source_plug, dest_node, dest_plug, force=False):
+        key = (dest_node, dest_plug)
+        if key in self.connection_dict and not force:
+            old_source = self.connection_dict[key]
+            if old_source == (source_node, source_plug):
+                raise RuntimeError("Connection from {0}.{1} to {2}.{3} already exists.".format(
+                    source_node.name, source_plug, dest_node.name, dest_plug))
+            raise RuntimeError("{0}.{1} is already connected.".format(dest_node.name, dest_plug))
+        if is_locked(dest_node, dest_plug):
+            raise RuntimeError("The destination attribute '{0}.{1}' is locked.".format(dest_node.name, dest_plug))
+        self.connection_dict[key] = (source_node, source_plug)
+
+    def disconnect(self, source_node, source_plug, dest_node, dest_plug):
+        if self.connection_dict.get((dest_node, dest_plug)) == (source_node, source_plug):
+            value = get_value(dest_node, dest_plug) if is_value_plug(dest_node, dest_plug) else None
+            del self.connection_dict[(dest_node, dest_plug)]
+            if value is not None:
+                set_value(dest_node, dest_plug, value, check=False)
+
+    def get_source(self, node, plug):
+        return self.connection_dict.get((node, plug))
+
+    def get_connections(self, node):
+        """
+        All the connections of the node, as (source node, source plug, dest node, dest plug).
+        """
+        result = []
+        for (dest_node, dest_plug), (source_node, source_plug) in self.connection_dict.items():
+            if dest_node is node or source_node is node:
+                result.append((source_node, source_plug, dest_node, dest_plug))
+        return result
+
+    # --- undo ---
+    def get_snapshot(self):
+        """
+        Copy of the scene state, the nodes are restored in place so the API handles of the old nodes stay valid after
+        undo, like in Maya.
+        """
+        node_data = pickle.dumps([(node.value_dict, node.flag_dict, node.cv_list, node.cuv_info)
+                                  for node in self.node_list], pickle.HIGHEST_PROTOCOL)
+        node_state_list = [(node, node.node_type, node.name, node.uuid, node.parent, list(node.children),
+                            collections.OrderedDict(node.dynamic_attr_dict)) for node in self.node_list]
+        return {"node_data": node_data,
+                "node_state_list": node_state_list,
+                "connection_dict": collections.OrderedDict(self.connection_dict),
+                "selection": list(self.selection),
+                "reserved_name_set": set(self.reserved_name_set)}
+
+    def restore_snapshot(self, snapshot):
+        """
+        Put the scene back to the snapshot, the nodes created since the snapshot become invalid.
+        """
+        node_set = set(node_state[0] for node_state in snapshot["node_state_list"])
+        for node in self.node_list:
+            if node not in node_set:
+                node.alive = False
+                node.in_scene = False
+
+        self.node_list = []
+        self.name_index = collections.defaultdict(list)
+        self.uuid_index = {}
+        for node_state, node_data in zip(snapshot["node_state_list"], pickle.loads(snapshot["node_data"])):
+            node = node_state[0]
+            node.node_type, node.name, node.uuid, node.parent, node.children, node.dynamic_attr_dict = node_state[1:]
+            node.value_dict, node.flag_dict, node.cv_list, node.cuv_info = node_data
+            node.alive = True
+            node.in_scene = True
+            self.node_list.append(node)
+            self.name_index[node.name].append(node)
+            self.uuid_index[node.uuid] = node
+
+        self.connection_dict = snapshot["connection_dict"]
+        self.selection = snapshot["selection"]
+        self.reserved_name_set = snapshot["reserved_name_set"]
+
+
+SCENE = Scene()
+
+# Node added callbacks of MDGMessage, id: (function, client data)
+NODE_ADDED_CALLBACK_DICT = {}
+
+
+def new_scene():
+    """
+    Discard the current scene, the nodes of the old scene become invalid.
+    """
+    global SCENE
+    old_scene = SCENE
+    for node in old_scene.node_list:
+        node.alive = False
+        node.in_scene = False
+    SCENE = Scene()
+    SCENE.plugin_dict = old_scene.plugin_dict
+    SCENE.command_dict = old_scene.command_dict
+    return SCENE
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Plugs and values
+# ----------------------------------------------------------------------------------------------------------------------
+def split_plug_token(token):
+    match = PLUG_TOKEN_PATTERN.match(token)
+    if match is None:
+        raise ValueError("Invalid attribute name: " + token)
+    return match.group(1), match.group(2)
+
+
+def parse_plug(plug_name):
+    """
+    Return the node, the plug path with long attribute names and the attribute definition of a plug string like
+    "node.target[0].targetTranslate".
+    """
+    if "." not in plug_name:
+        raise ValueError("No attribute given: " + plug_name)
+    node_name, attr_path = plug_name.split(".", 1)
+    node = SCENE.find(node_name)
+    plug_path, attr_def = normalize_plug_path(node, attr_path)
+    return node, plug_path, attr_def
+
+
+def normalize_plug_path(node, attr_path):
+    token_list = []
+    attr_def = None
+    for token in attr_path.split("."):
+        name, index = split_plug_token(token)
+        attr_def = node.get_attr_def(name)
+        if attr_def is None:
+            raise ValueError("No object matches name: {0}.{1}".format(node.name, attr_path))
+        token_list.append(attr_def.name if index is None else "{0}[{1}]".format(attr_def.name, index))
+    return ".".join(token_list), attr_def
+
+
+def get_child_path(plug_path, child_name):
+    last_token = plug_path.rsplit(".", 1)[-1]
+    if last_token.endswith("]"):
+        return plug_path + "." + child_name
+    prefix = plug_path.rsplit(".", 1)[0] + "." if "." in plug_path else ""
+    return prefix + child_name
+
+
+def get_parent_path(plug_path, attr_def):
+    """
+    Plug path of the compound parent of a child plug, None for a plug without parent.
+    """
+    if attr_def.parent is None:
+        return None
+    if "." in plug_path:
+        prefix, last_token = plug_path.rsplit(".", 1)
+        if split_plug_token(prefix.rsplit(".", 1)[-1])[0] == attr_def.parent:
+            return prefix
+        return prefix + "." + attr_def.parent
+    return attr_def.parent
+
+
+def get_flag(node, plug_path, flag_name, default):
+    flag_info = node.flag_dict.get(plug_path)
+    if flag_info is not None and flag_name in flag_info:
+        return flag_info[flag_name]
+    return default
+
+
+def set_flag(node, plug_path, flag_name, value):
+    node.flag_dict.setdefault(plug_path, {})[flag_name] = value
+
+
+def is_locked(node, plug_path):
+    if get_flag(node, plug_path, "locked", False):
+        return True
+    attr_def = node.get_attr_def(split_plug_token(plug_path.rsplit(".", 1)[-1])[0])
+    if attr_def is not None:
+        parent_path = get_parent_path(plug_path, attr_def)
+        if parent_path is not None:
+            return get_flag(node, parent_path, "locked", False)
+    return False
+
+
+def is_keyable(node, plug_path, attr_def):
+    return get_flag(node, plug_path, "keyable", attr_def.keyable)
+
+
+def get_input(node, plug_path, attr_def):
+    """
+    Source of the plug or of its compound parent, as (source node, source plug, child index).
+    """
+    source = SCENE.get_source(node, plug_path)
+    if source is not None:
+        return source[0], source[1], None
+
+    parent_path = get_parent_path(plug_path, attr_def)
+    if parent_path is not None:
+        source = SCENE.get_source(node, parent_path)
+        if source is not None:
+            parent_def = node.get_attr_def(attr_def.parent)
+            return source[0], source[1], parent_def.child_list.index(attr_def.name)
+    return None
+
+
+def is_value_plug(node, plug_path):
+    """
+    True if the plug holds numbers, the only values kept when the plug is disconnected.
+    """
+    plug_path, attr_def = normalize_plug_path(node, plug_path)
+    attr_def_list = [node.get_attr_def(child_name) for child_name in attr_def.child_list] if attr_def.child_list \
+        else [attr_def]
+    return all(child_def.attr_type in VALUE_ATTR_TYPE_LIST for child_def in attr_def_list)
+
+
+def is_driven(node, plug_path, attr_def):
+    return get_input(node, plug_path, attr_def) is not None
+
+
+def get_value(node, plug_path, attr_def=None):
+    """
+    Evaluated value of a plug, compound plugs return the list of the children values.
+    """
+    if attr_def is None:
+        plug_path, attr_def = normalize_plug_path(node, plug_path)
+
+    if attr_def.child_list:
+        # Constraint outputs are solved once for the three children
+        source = SCENE.get_source(node, plug_path)
+        if source is not None and source[0].node_type in CONSTRAINT_TYPE_LIST:
+            return get_value(source[0], source[1])
+        if attr_def.is_output and node.node_type in CONSTRAINT_TYPE_LIST:
+            value = compute_constraint(node, plug_path, attr_def)
+            if value is not None:
+                return value
+        return [get_value(node, get_child_path(plug_path, child_name), node.get_attr_def(child_name))
+                for child_name in attr_def.child_list]
+
+    source = get_input(node, plug_path, attr_def)
+    if source is not None:
+        source_node, source_plug, child_index = source
+        value = get_value(source_node, source_plug)
+        if child_index is not None and isinstance(value, (list, tuple)):
+            value = value[child_index]
+        return value
+
+    # Constraints follow their targets, IK handles don't move the joints
+    if attr_def.is_output and node.node_type in CONSTRAINT_TYPE_LIST:
+        value = compute_constraint(node, plug_path, attr_def)
+        if value is not None:
+            return value
+    elif attr_def.is_output:
+        compute_func = COMPUTE_DICT.get(node.node_type)
+        if compute_func is not None:
+            value = compute_func(node, plug_path, attr_def)
+            if value is not None:
+                return value
+        if attr_def.attr_type == "matrix":
+            return compute_dag_matrix(node, plug_path, attr_def)
+
+    return node.value_dict.get(plug_path, attr_def.default)
+
+
+def set_value(node, plug_path, value, attr_def=None, check=True):
+    """
+    Set a plug value, locked or driven plugs raise RuntimeError unless check is off.
+    """
+    if attr_def is None:
+        plug_path, attr_def = normalize_plug_path(node, plug_path)
+
+    if attr_def.child_list:
+        for child_name, child_value in zip(attr_def.child_list, value):
+            set_value(node, get_child_path(plug_path, child_name), child_value, node.get_attr_def(child_name),
+                      check=check)
+        return
+
+    if check and (is_locked(node, plug_path) or is_driven(node, plug_path, attr_def)):
+        raise RuntimeError("setAttr: The attribute '{0}.{1}' is locked or connected and cannot be modified.".format(
+            node.name, plug_path))
+
+    if attr_def.attr_type == "bool":
+        value = bool(value)
+    elif attr_def.attr_type in ["enum", "long", "short"]:
+        value = int(value)
+    elif isinstance(value, (int, float)):
+        value = float(value)
+    node.value_dict[plug_path] = value
+
+
+def get_vector(node, attr_name):
+    return get_value(node, attr_name)
+
+
+def set_vector(node, attr_name, value):
+    set_value(node, attr_name, [float(axis_value) for axis_value in value], check=False)
+
+
+def get_array_indices(node, plug_path):
+    """
+    Logical indices of an array plug which have a value or a connection.
+    """
+    index_set = set()
+    pattern = re.compile(re.escape(plug_path) + r"\[(\d+)\]")
+    for key in node.value_dict:
+        match = pattern.match(key)
+        if match:
+            index_set.add(int(match.group(1)))
+    for dest_node, dest_plug in SCENE.connection_dict:
+        if dest_node is node:
+            match = pattern.match(dest_plug)
+            if match:
+                index_set.add(int(match.group(1)))
+    return sorted(index_set)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Transforms
+# ----------------------------------------------------------------------------------------------------------------------
+def get_local_rotation(node):
+    """
+    Local rotation matrix of a transform, rotate combined with the joint orient for joints.
+    """
+    rot = rig_math.euler_xyz_to_matrix(get_vector(node, "rotate"))
+    if node.node_type == "joint":
+        rot = rig_math.mat_mult(rot, rig_math.euler_xyz_to_matrix(get_vector(node, "jointOrient")))
+    return rot
+
+
+def get_pivot_offset(node, scale, rot):
+    """
+    Translation of the local matrix which comes from the pivots.
+    """
+    rotate_pivot = get_vector(node, "rotatePivot")
+    scale_pivot = get_vector(node, "scalePivot")
+    point = [-scale_pivot[i]*scale[i] + scale_pivot[i] - rotate_pivot[i] for i in range(3)]
+    return rig_math.vec_add(rig_math.vec_mat_mult(point, rot), rotate_pivot)
+
+
+def get_local_matrix(node):
+    if not node.is_transform:
+        return [list(row) for row in IDENTITY_MATRIX]
+
+    scale = get_vector(node, "scale")
+    rot = get_local_rotation(node)
+    mat3 = [rig_math.vec_scale(row, scale_value) for row, scale_value in zip(rot, scale)]
+    translation = rig_math.vec_add(get_vector(node, "translate"), get_pivot_offset(node, scale, rot))
+    return mat4_from_parts(mat3, translation)
+
+
+def get_parent_matrix(node):
+    if node.parent is None:
+        return [list(row) for row in IDENTITY_MATRIX]
+    return get_world_matrix(node.parent)
+
+
+def get_world_matrix(node):
+    """
+    World matrix of the node. The matrices are cached during the outermost query, the scene doesn't change while a
+    matrix is computed and the constraint targets are shared by many constrained nodes.
+    """
+    world_mat = EVALUATION_CACHE.get(node)
+    if world_mat is None:
+        EVALUATION_STATE["depth"] += 1
+        try:
+            local_mat = get_local_matrix(node)
+            if node.parent is None or (node.is_transform and not get_value(node, "inheritsTransform")):
+                world_mat = local_mat
+            else:
+                world_mat = mat4_mult(local_mat, get_world_matrix(node.parent))
+        finally:
+            EVALUATION_STATE["depth"] -= 1
+        if EVALUATION_STATE["depth"]:
+            EVALUATION_CACHE[node] = world_mat
+        else:
+            EVALUATION_CACHE.clear()
+    return [list(row) for row in world_mat]
+
+
+# World matrices of the query being evaluated, node: matrix
+EVALUATION_CACHE = {}
+EVALUATION_STATE = {"depth": 0}
+
+
+def get_world_rotation(node):
+    return orthonormalize(mat4_rotation_part(get_world_matrix(node)))
+
+
+def mat3_is_close(mat_a, mat_b, tolerance=1e-6):
+    return all(abs(mat_a[i][j] - mat_b[i][j]) < tolerance for i in range(3) for j in range(3))
+
+
+def set_local_matrix(node, local_mat, rotate=None):
+    """
+    Set the transform attributes from a local matrix. Rotate and scale values are kept when they already match, a
+    joint keeps its rotate and the rotation difference goes to the joint orient. The rotate values of a joint can be
+    given, the rotate of a constrained joint follows the constraint once the joint is moved.
+    """
+    scale, rot = decompose_mat3(mat4_rotation_part(local_mat))
+    old_scale = get_vector(node, "scale")
+    if all(abs(scale[i] - old_scale[i]) < 1e-6 for i in range(3)):
+        scale = old_scale
+    else:
+        set_vector(node, "scale", scale)
+
+    if rotate is not None and node.node_type == "joint":
+        rotate_mat = rig_math.euler_xyz_to_matrix(rotate)
+        set_vector(node, "jointOrient", rig_math.matrix_to_euler_xyz(
+            rig_math.mat_mult(rig_math.mat_transpose(rotate_mat), rot)))
+    elif not mat3_is_close(rot, get_local_rotation(node)):
+        if node.node_type == "joint":
+            rotate_mat = rig_math.euler_xyz_to_matrix(get_vector(node, "rotate"))
+            joint_orient = rig_math.mat_mult(rig_math.mat_transpose(rotate_mat), rot)
+            set_vector(node, "jointOrient", rig_math.matrix_to_euler_xyz(joint_orient))
+        else:
+            set_vector(node, "rotate", rig_math.matrix_to_euler_xyz(rot))
+    rot = get_local_rotation(node)
+
+    translation = rig_math.vec_sub(mat4_translation(local_mat), get_pivot_offset(node, scale, rot))
+    set_vector(node, "translate", translation)
+
+
+def set_world_matrix(node, world_mat, rotate=None):
+    set_local_matrix(node, mat4_mult(world_mat, mat4_inverse(get_parent_matrix(node))), rotate=rotate)
+
+
+def get_local_translate(node, position):
+    """
+    Translate values putting the transform at a world position.
+    """
+    parent_mat = get_parent_matrix(node)
+    local_translation = rig_math.vec_mat_mult(rig_math.vec_sub(position, mat4_translation(parent_mat)),
+                                              mat3_inverse(mat4_rotation_part(parent_mat)))
+    scale = get_vector(node, "scale")
+    return rig_math.vec_sub(local_translation, get_pivot_offset(node, scale, get_local_rotation(node)))
+
+
+def get_local_rotate(node, world_rot):
+    """
+    Rotate values giving the transform a world orientation, joints keep their joint orient.
+    """
+    parent_rot = orthonormalize(mat4_rotation_part(get_parent_matrix(node)))
+    local_rot = rig_math.mat_mult(world_rot, rig_math.mat_transpose(parent_rot))
+    if node.node_type == "joint":
+        joint_orient = rig_math.euler_xyz_to_matrix(get_vector(node, "jointOrient"))
+        local_rot = rig_math.mat_mult(local_rot, rig_math.mat_transpose(joint_orient))
+    return rig_math.matrix_to_euler_xyz(local_rot)
+
+
+def set_world_position(node, position):
+    """
+    Move the transform to a world position, only the translate values are changed.
+    """
+    set_vector(node, "translate", get_local_translate(node, position))
+
+
+def set_world_rotation(node, world_rot):
+    """
+    Rotate the transform to a world orientation, only the rotate values are changed.
+    """
+    set_vector(node, "rotate", get_local_rotate(node, world_rot))
+
+
+def keep_children_world_matrix(node):
+    """
+    Return a function restoring the world matrices of the children transforms after the node is changed.
+    """
+    child_mat_list = [(child, get_world_matrix(child), get_vector(child, "rotate")) for child in node.children
+                      if child.is_transform]
+
+    def restore():
+        for child, child_mat, rotate in child_mat_list:
+            set_world_matrix(child, child_mat, rotate=rotate)
+    return restore
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Node computations
+# ----------------------------------------------------------------------------------------------------------------------
+def get_axis_index(plug_path, attr_def):
+    return AXIS_INDEX_DICT[attr_def.name[-1]]
+
+
+def get_sibling(node, plug_path, attr_def, compound_name):
+    """
+    Value of the same axis of another compound, ex: input1X for outputX.
+    """
+    axis_index = get_axis_index(plug_path, attr_def)
+    compound_def = node.get_attr_def(compound_name)
+    return get_value(node, compound_def.child_list[axis_index])
+
+
+def compute_multiply_divide(node, plug_path, attr_def):
+    operation = get_value(node, "operation")
+    value_a = get_sibling(node, plug_path, attr_def, "input1")
+    value_b = get_sibling(node, plug_path, attr_def, "input2")
+    if operation == 1:
+        return value_a*value_b
+    if operation == 2:
+        return value_a/value_b if value_b else 0.0
+    if operation == 3:
+        try:
+            return value_a**value_b
+        except (ValueError, ZeroDivisionError):
+            return 0.0
+    return value_a
+
+
+def compute_plus_minus_average(node, plug_path, attr_def):
+    operation = get_value(node, "operation")
+    value_list = [get_value(node, "input1D[{0}]".format(i)) for i in get_array_indices(node, "input1D")]
+    if not value_list:
+        return 0.0
+    if operation == 2:
+        return value_list[0] - sum(value_list[1:])
+    if operation == 3:
+        return sum(value_list)/len(value_list)
+    return sum(value_list)
+
+
+CONDITION_OPERATION_LIST = [lambda a, b: a == b, lambda a, b: a != b, lambda a, b: a > b,
+                            lambda a, b: a >= b, lambda a, b: a < b, lambda a, b: a <= b]
+
+
+def compute_condition(node, plug_path, attr_def):
+    compare = CONDITION_OPERATION_LIST[get_value(node, "operation")]
+    if compare(get_value(node, "firstTerm"), get_value(node, "secondTerm")):
+        return get_sibling(node, plug_path, attr_def, "colorIfTrue")
+    return get_sibling(node, plug_path, attr_def, "colorIfFalse")
+
+
+def compute_reverse(node, plug_path, attr_def):
+    return 1.0 - get_sibling(node, plug_path, attr_def, "input")
+
+
+def compute_blend_colors(node, plug_path, attr_def):
+    blender = get_value(node, "blender")
+    return (get_sibling(node, plug_path, attr_def, "color1")*blender +
+            get_sibling(node, plug_path, attr_def, "color2")*(1.0 - blender))
+
+
+def compute_pair_blend(node, plug_path, attr_def):
+    weight = get_value(node, "weight")
+    prefix = "inTranslate" if attr_def.parent == "outTranslate" else "inRotate"
+    return (get_sibling(node, plug_path, attr_def, prefix + "1")*(1.0 - weight) +
+            get_sibling(node, plug_path, attr_def, prefix + "2")*weight)
+
+
+def compute_distance_dimension(node, plug_path, attr_def):
+    return rig_math.vec_length(rig_math.vec_sub(get_value(node, "endPoint"), get_value(node, "startPoint")))
+
+
+def get_matrix_input(node, plug_path):
+    """
+    Return the matrix of the dag matrix plug(worldMatrix, parentMatrix...) connected to the plug, identity if the plug
+    isn't connected.
+    """
+    source = SCENE.get_source(node, plug_path)
+    if source is None:
+        return mat4_from_parts()
+    source_node, source_plug = source
+    value_list = compute_dag_matrix(source_node, source_plug, source_node.get_attr_def(source_plug.split("[")[0]))
+    return [value_list[i*4:i*4+4] for i in range(4)]
+
+
+def compute_distance_between(node, plug_path, attr_def):
+    point_a = point_mat_mult(get_value(node, "point1"), get_matrix_input(node, "inMatrix1"))
+    point_b = point_mat_mult(get_value(node, "point2"), get_matrix_input(node, "inMatrix2"))
+    return rig_math.vec_length(rig_math.vec_sub(point_b, point_a))
+
+
+def compute_decompose_matrix(node, plug_path, attr_def):
+    source = SCENE.get_source(node, "inputMatrix")
+    if source is None:
+        return None
+    world_mat = get_world_matrix(source[0])
+    scale, rot = decompose_mat3(mat4_rotation_part(world_mat))
+    if attr_def.parent == "outputTranslate":
+        value_list = mat4_translation(world_mat)
+    elif attr_def.parent == "outputRotate":
+        value_list = rig_math.matrix_to_euler_xyz(rot)
+    else:
+        value_list = scale
+    return value_list[get_axis_index(plug_path, attr_def)]
+
+
+def compute_curve_info(node, plug_path, attr_def):
+    source = SCENE.get_source(node, "inputCurve")
+    if source is None:
+        return 0.0
+    point_list = get_world_cvs(source[0])
+    return sum(rig_math.vec_length(rig_math.vec_sub(point_b, point_a))
+               for point_a, point_b in zip(point_list[:-1], point_list[1:]))
+
+
+def compute_locator(node, plug_path, attr_def):
+    if attr_def.parent != "worldPosition":
+        return None
+    position = point_mat_mult(get_value(node, "localPosition"), get_world_matrix(node))
+    return position[get_axis_index(plug_path, attr_def)]
+
+
+def compute_dag_matrix(node, plug_path, attr_def):
+    if attr_def.name == "worldMatrix":
+        mat = get_world_matrix(node)
+    elif attr_def.name == "worldInverseMatrix":
+        mat = mat4_inverse(get_world_matrix(node))
+    elif attr_def.name == "parentMatrix":
+        mat = get_parent_matrix(node)
+    elif attr_def.name == "parentInverseMatrix":
+        mat = mat4_inverse(get_parent_matrix(node))
+    else:
+        mat = get_local_matrix(node)
+    return [value for row in mat for value in row]
+
+
+COMPUTE_DICT = {"multiplyDivide": compute_multiply_divide,
+                "plusMinusAverage": compute_plus_minus_average,
+                "condition": compute_condition,
+                "reverse": compute_reverse,
+                "blendColors": compute_blend_colors,
+                "pairBlend": compute_pair_blend,
+                "distanceDimShape": compute_distance_dimension,
+                "distanceBetween": compute_distance_between,
+                "decomposeMatrix": compute_decompose_matrix,
+                "curveInfo": compute_curve_info,
+                "locator": compute_locator}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Geometry
+# ----------------------------------------------------------------------------------------------------------------------
+def get_geometry_shape(node):
+    if node.is_shape:
+        return node
+    for shape in node.get_shapes():
+        if shape.cv_list:
+            return shape
+    raise ValueError("{0} has no control points.".format(node.name))
+
+
+def get_world_cvs(shape):
+    world_mat = get_world_matrix(shape)
+    return [point_mat_mult(point, world_mat) for point in shape.cv_list]
+
+
+def parse_components(component_name):
+    """
+    Return the shape and the control point indices of a component string like "curve1.cv[0:7]".
+    """
+    match = COMPONENT_PATTERN.match(component_name)
+    if match is None:
+        return None
+    shape = get_geometry_shape(SCENE.find(match.group(1)))
+    if match.group(3) == "*":
+        return shape, list(range(len(shape.cv_list)))
+    start = int(match.group(3))
+    end = int(match.group(4)) if match.group(4) is not None else start
+    if end >= len(shape.cv_list):
+        raise ValueError("No object matches name: " + component_name)
+    return shape, list(range(start, end+1))
+
+
+def get_bounding_box_center(node):
+    """
+    Center of the bounding box of the shapes control points, in the object space of the transform.
+    """
+    point_list = [point for shape in node.get_shapes() for point in shape.cv_list]
+    if not point_list:
+        return [0.0, 0.0, 0.0]
+    return [(min(point[i] for point in point_list) + max(point[i] for point in point_list))/2.0 for i in range(3)]
+
+
+def get_plane_cvs(patches_u, patches_v=1, width=1.0):
+    """
+    Control points of a cubic nurbs plane lying on the xz plane, u along x.
+    """
+    def get_greville(span_count):
+        knot_list = [0]*2 + list(range(span_count+1)) + [span_count]*2
+        return [sum(knot_list[i:i+3])/(3.0*span_count) - 0.5 for i in range(span_count+3)]
+
+    return [[u*width, 0.0, v*width] for u in get_greville(patches_u) for v in get_greville(patches_v)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Commands
+# ----------------------------------------------------------------------------------------------------------------------
+def get_flag_value(kwargs, long_name, short_name=None, default=None):
+    if long_name in kwargs:
+        return kwargs[long_name]
+    if short_name is not None and short_name in kwargs:
+        return kwargs[short_name]
+    return default
+
+
+def flatten_args(args):
+    result = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            result += flatten_args(arg)
+        elif arg is not None:
+            result.append(arg)
+    return result
+
+
+def split_values(args, count=3):
+    """
+    Split the leading numeric arguments of move, rotate and scale from the object names.
+    """
+    value_list = []
+    arg_list = list(args)
+    while arg_list and isinstance(arg_list[0], (int, float)) and len(value_list) < count:
+        value_list.append(float(arg_list.pop(0)))
+    return value_list, flatten_args(arg_list)
+
+
+def get_name(node):
+    return SCENE.get_partial_name(node)
+
+
+def get_names(node_list):
+    return [get_name(node) for node in node_list]
+
+
+def find_nodes(name_list):
+    return [SCENE.find(name) for name in flatten_args(name_list)]
+
+
+def get_targets(args):
+    """
+    Nodes of the command arguments, the selection if there is no argument.
+    """
+    name_list = flatten_args(args)
+    if not name_list:
+        return list(SCENE.selection)
+    return [SCENE.find(name) for name in name_list]
+
+
+def is_type(node, node_type):
+    if node.node_type == node_type:
+        return True
+    if node_type == "transform":
+        return node.is_transform
+    if node_type == "shape":
+        return node.is_shape
+    if node_type == "dagNode":
+        return node.is_dag
+    if node_type == "constraint":
+        return node.node_type in CONSTRAINT_TYPE_LIST
+    return False
+
+
+def create_shape_node(node_type, shape_name=None, transform_name=None, parent=None):
+    """
+    Create a shape with its transform, return the transform and the shape.
+    """
+    base_name = get_default_node_name(node_type)
+    transform = SCENE.create_node("transform", transform_name or base_name + "1", parent=parent)
+    if shape_name is None:
+        match = TRAILING_NUMBER_PATTERN.match(transform.name)
+        shape_name = transform.name + "Shape" if match is None else match.group(1) + "Shape" + match.group(2)
+    shape = SCENE.create_node(node_type, shape_name, parent=transform, select=False)
+    return transform, shape
+
+
+@recorded("createNode")
+def createNode(node_type, name=None, n=None, parent=None, p=None, skipSelect=False, ss=False, **kwargs):
+    name = name or n
+    parent = parent or p
+    parent_node = SCENE.find(parent) if parent is not None else None
+    if node_type not in NODE_ATTR_DICT:
+        raise RuntimeError("Unknown object type: " + str(node_type))
+
+    if node_type in SHAPE_TYPE_LIST and parent_node is None:
+        transform, shape = create_shape_node(node_type, shape_name=name)
+        return get_name(shape)
+
+    node = SCENE.create_node(node_type, name, parent=parent_node, select=not (skipSelect or ss))
+    return get_name(node)
+
+
+@recorded("ls")
+def ls(*args, **kwargs):
+    want_uuid = get_flag_value(kwargs, "uuid", None, False)
+    node_type = get_flag_value(kwargs, "type", "typ")
+    transforms = get_flag_value(kwargs, "transforms", "tr", False)
+    long_name = get_flag_value(kwargs, "long", "l", False)
+    if get_flag_value(kwargs, "defaultNodes", "dn", False):
+        # The stand-in scenes start empty, there are no default nodes
+        return []
+    if get_flag_value(kwargs, "selection", "sl", False):
+        name_list = list(SCENE.selection)
+    elif args:
+        name_list = flatten_args(args)
+    else:
+        name_list = list(SCENE.node_list)
+
+    result = []
+    for name in name_list:
+        if not isinstance(name, Node):
+            component = parse_components(name) if ".cv[" in name else None
+            if component is not None:
+                shape, index_list = component
+                result.append("{0}.cv[{1}:{2}]".format(get_name(shape), index_list[0], index_list[-1]))
+                continue
+            if "." in name:
+                try:
+                    node, plug_path, attr_def = parse_plug(name)
+                except ValueError:
+                    continue
+                result.append("{0}.{1}".format(get_name(node), plug_path))
+                continue
+            try:
+                node = SCENE.find(name)
+            except ValueError:
+                continue
+        else:
+            node = name
+
+        if node_type is not None and not is_type(node, node_type):
+            continue
+        if transforms and not node.is_transform:
+            continue
+        if want_uuid:
+            result.append(node.uuid)
+        else:
+            result.append(SCENE.get_full_name(node) if long_name else get_name(node))
+    return result
+
+
+@recorded("nodeType")
+def nodeType(name, **kwargs):
+    return SCENE.find(name.split(".")[0]).node_type
+
+
+@recorded("objExists")
+def objExists(name):
+    try:
+        if "." in name:
+            parse_plug(name)
+        else:
+            SCENE.find(name)
+        return True
+    except ValueError:
+        return False
+
+
+@recorded("select")
+def select(*args, **kwargs):
+    if get_flag_value(kwargs, "deselect", "d", False) and not args:
+        SCENE.selection = []
+        return
+    if get_flag_value(kwargs, "clear", "cl", False):
+        SCENE.selection = []
+        return
+
+    node_list = find_nodes(args)
+    if get_flag_value(kwargs, "deselect", "d", False):
+        SCENE.selection = [node for node in SCENE.selection if node not in node_list]
+    elif get_flag_value(kwargs, "add", "add", False):
+        SCENE.selection += [node for node in node_list if node not in SCENE.selection]
+    else:
+        SCENE.selection = node_list
+
+
+@recorded("listRelatives")
+def listRelatives(*args, **kwargs):
+    node_type = get_flag_value(kwargs, "type", "typ")
+    full_path = get_flag_value(kwargs, "fullPath", "f", False)
+    no_intermediate = get_flag_value(kwargs, "noIntermediate", "ni", False)
+
+    result = []
+    for node in get_targets(args):
+        if get_flag_value(kwargs, "parent", "p", False):
+            relative_list = [node.parent] if node.parent is not None else []
+        elif get_flag_value(kwargs, "allDescendents", "ad", False):
+            # Maya lists the deepest descendants first
+            relative_list = SCENE.get_descendants(node)[::-1]
+        elif get_flag_value(kwargs, "shapes", "s", False):
+            relative_list = node.get_shapes()
+        else:
+            relative_list = list(node.children)
+
+        for relative in relative_list:
+            if node_type is not None and not is_type(relative, node_type if isinstance(node_type, str)
+                                                     else node_type[0]):
+                continue
+            if no_intermediate and relative.is_shape and get_value(relative, "intermediateObject"):
+                continue
+            if relative not in result:
+                result.append(relative)
+
+    if not result:
+        return None
+    return [SCENE.get_full_name(node) if full_path else get_name(node) for node in result]
+
+
+@recorded("listConnections")
+def listConnections(*args, **kwargs):
+    want_source = get_flag_value(kwargs, "source", "s", True)
+    want_destination = get_flag_value(kwargs, "destination", "d", True)
+    want_plugs = get_flag_value(kwargs, "plugs", "p", False)
+    want_shapes = get_flag_value(kwargs, "shapes", "sh", False)
+    want_connections = get_flag_value(kwargs, "connections", "c", False)
+
+    result = []
+    for name in flatten_args(args):
+        if "." in name:
+            node, plug_path, attr_def = parse_plug(name)
+        else:
+            node, plug_path = SCENE.find(name), None
+
+        for source_node, source_plug, dest_node, dest_plug in SCENE.get_connections(node):
+            if want_source and dest_node is node and (plug_path is None or dest_plug == plug_path):
+                own_plug, other_node, other_plug = dest_plug, source_node, source_plug
+            elif want_destination and source_node is node and (plug_path is None or source_plug == plug_path):
+                own_plug, other_node, other_plug = source_plug, dest_node, dest_plug
+            else:
+                continue
+
+            # Maya lists the plug of the queried node before every connected plug or node
+            if want_connections:
+                result.append("{0}.{1}".format(get_name(node), own_plug))
+            if want_plugs:
+                result.append("{0}.{1}".format(get_name(other_node), other_plug))
+            elif other_node.is_shape and not want_shapes:
+                result.append(get_name(other_node.parent))
+            else:
+                result.append(get_name(other_node))
+
+    return result or None
+
+
+# --- hierarchy ---
+def parent_node(node, parent, relative=False):
+    """
+    Parent a node, the world transform is kept unless relative is on.
+    """
+    if parent is not None and (parent is node or parent in SCENE.get_descendants(node)):
+        raise RuntimeError("Cannot parent '{0}' under itself or its descendants.".format(node.name))
+    if node.parent is parent:
+        if parent is None:
+            raise RuntimeError("Object '{0}' is already a child of the world.".format(node.name))
+        raise RuntimeError("Object '{0}' is already a child of '{1}'.".format(node.name, parent.name))
+
+    if relative or not node.is_transform:
+        SCENE.set_parent(node, parent)
+        return
+
+    world_mat = get_world_matrix(node)
+    rotate = get_vector(node, "rotate")
+    SCENE.set_parent(node, parent)
+    set_world_matrix(node, world_mat, rotate=rotate)
+
+
+@recorded("parent")
+def parent(*args, **kwargs):
+    name_list = flatten_args(args)
+    relative = get_flag_value(kwargs, "relative", "r", False) or get_flag_value(kwargs, "shape", "s", False)
+    if get_flag_value(kwargs, "world", "w", False):
+        node_list, parent_node_obj = find_nodes(name_list) or list(SCENE.selection), None
+    else:
+        if len(name_list) < 2:
+            raise RuntimeError("parent: Not enough objects or values.")
+        node_list, parent_node_obj = find_nodes(name_list[:-1]), SCENE.find(name_list[-1])
+
+    for node in node_list:
+        parent_node(node, parent_node_obj, relative=relative)
+    return get_names(node_list)
+
+
+@recorded("group")
+def group(*args, **kwargs):
+    name = get_flag_value(kwargs, "name", "n") or "group1"
+    parent_name = get_flag_value(kwargs, "parent", "p")
+    node_list = [] if get_flag_value(kwargs, "empty", "em", False) else (find_nodes(args) or list(SCENE.selection))
+
+    if parent_name is not None:
+        parent_node_obj = SCENE.find(parent_name)
+    elif get_flag_value(kwargs, "world", "w", False) or not node_list:
+        parent_node_obj = None
+    else:
+        parent_node_obj = node_list[0].parent
+
+    grp = SCENE.create_node("transform", name, parent=parent_node_obj)
+    for node in node_list:
+        parent_node(node, grp)
+    SCENE.selection = [grp]
+    return get_name(grp)
+
+
+def copy_node(node, parent_node_obj, name=None, parent_only=False):
+    new_node = Node(node.node_type, name or node.name)
+    new_node.value_dict = dict(node.value_dict)
+    new_node.flag_dict = dict((key, dict(value)) for key, value in node.flag_dict.items())
+    new_node.dynamic_attr_dict = collections.OrderedDict(node.dynamic_attr_dict)
+    new_node.cv_list = [list(point) for point in node.cv_list]
+    new_node.cuv_info = node.cuv_info
+    SCENE.register(new_node)
+    SCENE.set_parent(new_node, parent_node_obj)
+
+    new_node_list = [new_node]
+    if not parent_only:
+        for child in node.children:
+            # Children keep their names, they only have to be unique under their parent
+            new_child_list = copy_node(child, None, name=child.name, parent_only=False)
+            SCENE.set_parent(new_child_list[0], new_node)
+            new_node_list += new_child_list
+    return new_node_list
+
+
+@recorded("duplicate")
+def duplicate(*args, **kwargs):
+    name = get_flag_value(kwargs, "name", "n")
+    parent_only = get_flag_value(kwargs, "parentOnly", "po", False)
+    roots_only = get_flag_value(kwargs, "returnRootsOnly", "rr", False)
+    input_connections = get_flag_value(kwargs, "inputConnections", "ic", False)
+
+    result = []
+    copy_dict = {}
+    for node in get_targets(args):
+        if name is None:
+            new_name = node.name
+            if not TRAILING_NUMBER_PATTERN.match(new_name):
+                new_name += "1"
+        else:
+            new_name = name
+        new_node_list = copy_node(node, node.parent, name=new_name, parent_only=parent_only)
+        copy_dict.update(zip([node] + ([] if parent_only else SCENE.get_descendants(node)), new_node_list))
+        result += new_node_list[:1] if roots_only else [new_node for new_node in new_node_list
+                                                         if not new_node.is_shape]
+    # The copies keep the inputs from outside nodes, connections between the copied nodes go to the copies
+    if input_connections:
+        for (dest_node, dest_plug), (source_node, source_plug) in list(SCENE.connection_dict.items()):
+            if dest_node in copy_dict:
+                SCENE.connection_dict[(copy_dict[dest_node], dest_plug)] = (copy_dict.get(source_node, source_node),
+                                                                            source_plug)
+    SCENE.selection = result[:1]
+    return get_names(result)
+
+
+@recorded("delete")
+def delete(*args, **kwargs):
+    for name in flatten_args(args):
+        node = SCENE.find(name)
+        if node.alive:
+            SCENE.remove(node)
+
+
+@recorded("rename")
+def rename(*args, **kwargs):
+    name_list = flatten_args(args)
+    if len(name_list) == 1:
+        node, new_name = SCENE.selection[0], name_list[0]
+    else:
+        node, new_name = SCENE.find(name_list[0]), name_list[1]
+    old_name = node.name
+    SCENE.rename(node, new_name)
+
+    # Shapes named after the transform are renamed with it
+    if not get_flag_value(kwargs, "ignoreShape", "is", False):
+        match = TRAILING_NUMBER_PATTERN.match(old_name)
+        old_shape_name_list = [old_name + "Shape"] + ([match.group(1) + "Shape" + match.group(2)] if match else [])
+        for shape in node.get_shapes():
+            if shape.name in old_shape_name_list:
+                SCENE.rename(shape, node.name + "Shape")
+    return get_name(node)
+
+
+# --- attributes ---
+@recorded("getAttr")
+def getAttr(plug_name, **kwargs):
+    node, plug_path, attr_def = parse_plug(plug_name)
+    if get_flag_value(kwargs, "lock", "l", False):
+        return is_locked(node, plug_path)
+    if get_flag_value(kwargs, "keyable", "k", False):
+        return is_keyable(node, plug_path, attr_def)
+    if get_flag_value(kwargs, "type", "typ", False):
+        return attr_def.attr_type
+    if get_flag_value(kwargs, "size", "s", False):
+        return len(get_array_indices(node, plug_path))
+
+    value = get_value(node, plug_path, attr_def)
+    if attr_def.child_list:
+        return [tuple(value)]
+    return value
+
+
+@recorded("setAttr")
+def setAttr(plug_name, *args, **kwargs):
+    node, plug_path, attr_def = parse_plug(plug_name)
+
+    keyable = get_flag_value(kwargs, "keyable", "k")
+    lock = get_flag_value(kwargs, "lock", "l")
+    channel_box = get_flag_value(kwargs, "channelBox", "cb")
+    if keyable is not None:
+        set_flag(node, plug_path, "keyable", bool(keyable))
+        for child_name in attr_def.child_list:
+            set_flag(node, get_child_path(plug_path, child_name), "keyable", bool(keyable))
+    if channel_box is not None:
+        set_flag(node, plug_path, "channelBox", bool(channel_box))
+    if lock is not None:
+        set_flag(node, plug_path, "locked", bool(lock))
+
+    value_list = flatten_args(args)
+    if not value_list:
+        return
+    if get_flag_value(kwargs, "type", "typ") in ["string"]:
+        node.value_dict[plug_path] = value_list[0]
+        return
+    if attr_def.child_list:
+        if len(value_list) != len(attr_def.child_list):
+            raise RuntimeError("setAttr: '{0}.{1}' needs {2} values.".format(node.name, plug_path,
+                                                                              len(attr_def.child_list)))
+        set_value(node, plug_path, value_list, attr_def)
+    else:
+        set_value(node, plug_path, value_list[0], attr_def)
+
+
+@recorded("connectAttr")
+def connectAttr(source_plug_name, dest_plug_name, **kwargs):
+    source_node, source_plug, source_def = parse_plug(source_plug_name)
+    dest_node, dest_plug, dest_def = parse_plug(dest_plug_name)
+    if source_node is dest_node and source_plug == dest_plug:
+        raise RuntimeError("connectAttr: Cannot connect an attribute to itself.")
+    SCENE.connect(source_node, source_plug, dest_node, dest_plug, force=get_flag_value(kwargs, "force", "f", False))
+    return "Connected {0}.{1} to {2}.{3}.".format(source_node.name, source_plug, dest_node.name, dest_plug)
+
+
+@recorded("disconnectAttr")
+def disconnectAttr(source_plug_name, dest_plug_name, **kwargs):
+    source_node, source_plug, source_def = parse_plug(source_plug_name)
+    dest_node, dest_plug, dest_def = parse_plug(dest_plug_name)
+    SCENE.disconnect(source_node, source_plug, dest_node, dest_plug)
+
+
+@recorded("isConnected")
+def isConnected(source_plug_name, dest_plug_name, **kwargs):
+    source_node, source_plug, source_def = parse_plug(source_plug_name)
+    dest_node, dest_plug, dest_def = parse_plug(dest_plug_name)
+    return SCENE.get_source(dest_node, dest_plug) == (source_node, source_plug)
+
+
+ADD_ATTR_TYPE_DICT = {"float": "float", "double": "double", "short": "short", "long": "long", "bool": "bool",
+                      "enum": "enum", "doubleLinear": "doubleLinear", "doubleAngle": "doubleAngle",
+                      "message": "message", "matrix": "matrix"}
+
+
+@recorded("addAttr")
+def addAttr(*args, **kwargs):
+    node = get_targets(args)[0]
+    long_name = get_flag_value(kwargs, "longName", "ln")
+    short_name = get_flag_value(kwargs, "shortName", "sn")
+    attr_type = ADD_ATTR_TYPE_DICT.get(get_flag_value(kwargs, "attributeType", "at", "double"), "double")
+    default = get_flag_value(kwargs, "defaultValue", "dv", 0.0)
+    if node.get_attr_def(long_name) is not None:
+        raise RuntimeError("addAttr: Found a conflict with the attribute name '{0}' on {1}.".format(long_name,
+                                                                                                    node.name))
+    attr_def = AttrDef(long_name, short_name, attr_type, default,
+                       keyable=bool(get_flag_value(kwargs, "keyable", "k", False)))
+    attr_def.min_value = get_flag_value(kwargs, "minValue", "min")
+    attr_def.max_value = get_flag_value(kwargs, "maxValue", "max")
+    node.dynamic_attr_dict[long_name] = attr_def
+    if short_name:
+        node.dynamic_attr_dict[short_name] = attr_def
+
+
+@recorded("attributeQuery")
+def attributeQuery(attr_name, **kwargs):
+    node = SCENE.find(get_flag_value(kwargs, "node", "n"))
+    attr_def = node.get_attr_def(attr_name)
+    if get_flag_value(kwargs, "exists", "ex", False):
+        return attr_def is not None
+    if attr_def is None:
+        raise RuntimeError("attributeQuery: Object {0} has no attribute {1}.".format(node.name, attr_name))
+    if get_flag_value(kwargs, "minExists", "mne", False):
+        return attr_def.min_value is not None
+    if get_flag_value(kwargs, "maxExists", "mxe", False):
+        return attr_def.max_value is not None
+    if get_flag_value(kwargs, "minimum", "min", False):
+        return [attr_def.min_value]
+    if get_flag_value(kwargs, "maximum", "max", False):
+        return [attr_def.max_value]
+    return None
+
+
+@recorded("renameAttr")
+def renameAttr(plug_name, new_name):
+    node, plug_path, old_def = parse_plug(plug_name)
+    if node.dynamic_attr_dict.get(old_def.name) is not old_def:
+        raise RuntimeError("renameAttr: Only dynamic attributes can be renamed.")
+
+    # Duplicated nodes share the attribute definitions
+    old_name = old_def.name
+    attr_def = AttrDef(new_name, new_name if old_def.short_name == old_name else old_def.short_name,
+                       old_def.attr_type, old_def.default, keyable=old_def.keyable)
+    attr_def.min_value = old_def.min_value
+    attr_def.max_value = old_def.max_value
+    node.dynamic_attr_dict = collections.OrderedDict(
+        (attr_def.name if name == old_name else name, attr_def if value is old_def else value)
+        for name, value in node.dynamic_attr_dict.items() if not (name == old_def.short_name and name != old_name))
+    if attr_def.short_name != attr_def.name:
+        node.dynamic_attr_dict[attr_def.short_name] = attr_def
+
+    def rename_plug(plug):
+        return new_name + plug[len(old_name):] if plug.split("[")[0].split(".")[0] == old_name else plug
+
+    for plug_dict in [node.value_dict, node.flag_dict]:
+        for plug in list(plug_dict.keys()):
+            plug_dict[rename_plug(plug)] = plug_dict.pop(plug)
+    SCENE.connection_dict = collections.OrderedDict(
+        ((dest_node, rename_plug(dest_plug) if dest_node is node else dest_plug),
+         (source_node, rename_plug(source_plug) if source_node is node else source_plug))
+        for (dest_node, dest_plug), (source_node, source_plug) in SCENE.connection_dict.items())
+    return new_name
+
+
+@recorded("deleteAttr")
+def deleteAttr(*args, **kwargs):
+    attr_name = get_flag_value(kwargs, "attribute", "at")
+    if attr_name is None:
+        node, plug_path, attr_def = parse_plug(flatten_args(args)[0])
+    else:
+        node = get_targets(args)[0]
+        attr_def = node.get_attr_def(attr_name)
+    if attr_def is None or node.dynamic_attr_dict.get(attr_def.name) is not attr_def:
+        raise RuntimeError("deleteAttr: Only dynamic attributes can be deleted.")
+
+    for name in [attr_def.name, attr_def.short_name]:
+        node.dynamic_attr_dict.pop(name, None)
+    for plug_dict in [node.value_dict, node.flag_dict]:
+        for plug_path in list(plug_dict.keys()):
+            if plug_path.split(".")[0].split("[")[0] == attr_def.name:
+                del plug_dict[plug_path]
+    for (dest_node, dest_plug), (source_node, source_plug) in list(SCENE.connection_dict.items()):
+        if (dest_node is node and dest_plug.split("[")[0] == attr_def.name) or \
+                (source_node is node and source_plug.split("[")[0] == attr_def.name):
+            del SCENE.connection_dict[(dest_node, dest_plug)]
+
+
+@recorded("listAttr")
+def listAttr(*args, **kwargs):
+    node = get_targets(args)[0]
+    keyable = get_flag_value(kwargs, "keyable", "k", False)
+    user_defined = get_flag_value(kwargs, "userDefined", "ud", False)
+
+    attr_list = [] if user_defined else list(NODE_ATTR_DICT.get(node.node_type, []))
+    attr_list += [attr_def for name, attr_def in node.dynamic_attr_dict.items() if name == attr_def.name]
+
+    result = []
+    for attr_def in attr_list:
+        # Children of array compounds only exist on the elements
+        if attr_def.parent is not None and node.get_attr_def(attr_def.parent).is_array:
+            continue
+        if keyable and (attr_def.child_list or not is_keyable(node, attr_def.name, attr_def)):
+            continue
+        result.append(attr_def.name)
+    return result or None
+
+
+# --- transforms ---
+@recorded("xform")
+def xform(*args, **kwargs):
+    query = get_flag_value(kwargs, "query", "q", False)
+    world_space = get_flag_value(kwargs, "worldSpace", "ws", False)
+    target_list = flatten_args(args) or get_names(SCENE.selection)
+
+    component = parse_components(target_list[0]) if ".cv[" in str(target_list[0]) else None
+    if component is not None:
+        shape, index_list = component
+        if query and get_flag_value(kwargs, "rotation", "ro", False):
+            return [0.0, 0.0, 0.0]
+        if query and get_flag_value(kwargs, "translation", "t", False):
+            point_list = get_world_cvs(shape) if world_space else shape.cv_list
+            return [value for i in index_list for value in point_list[i]]
+        raise RuntimeError("xform: Unsupported component operation.")
+
+    node_list = find_nodes(target_list)
+    node = node_list[0]
+    if query:
+        if get_flag_value(kwargs, "translation", "t", False):
+            # The values of all the queried objects, one after the other
+            if world_space:
+                return [value for node in node_list for value in mat4_translation(get_world_matrix(node))]
+            return [value for node in node_list for value in get_vector(node, "translate")]
+        if get_flag_value(kwargs, "rotation", "ro", False):
+            if world_space:
+                return rig_math.matrix_to_euler_xyz(get_world_rotation(node))
+            return get_vector(node, "rotate")
+        if get_flag_value(kwargs, "scale", "s", False):
+            return get_vector(node, "scale")
+        if get_flag_value(kwargs, "rotatePivot", "rp", False):
+            if world_space:
+                return point_mat_mult(get_vector(node, "rotatePivot"), get_world_matrix(node))
+            return get_vector(node, "rotatePivot")
+        if get_flag_value(kwargs, "matrix", "m", False):
+            mat = get_world_matrix(node) if world_space else get_local_matrix(node)
+            return [value for row in mat for value in row]
+        raise RuntimeError("xform: Unsupported query.")
+
+    for node in node_list:
+        if get_flag_value(kwargs, "centerPivots", "cp", False):
+            center = get_bounding_box_center(node)
+            set_vector(node, "rotatePivot", center)
+            set_vector(node, "scalePivot", center)
+        translation = get_flag_value(kwargs, "translation", "t")
+        if translation is not None:
+            if world_space:
+                set_world_position(node, translation)
+            else:
+                set_value(node, "translate", translation)
+        rotation = get_flag_value(kwargs, "rotation", "ro")
+        if rotation is not None:
+            if world_space:
+                set_world_rotation(node, rig_math.euler_xyz_to_matrix(rotation))
+            else:
+                set_value(node, "rotate", rotation)
+        scale_value = get_flag_value(kwargs, "scale", "s")
+        if scale_value is not None:
+            set_value(node, "scale", scale_value)
+
+
+def transform_components(component_list, rotation=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0),
+                         translation=(0.0, 0.0, 0.0)):
+    """
+    Rotate, scale and move control points in object space, around the center of their bounding box.
+    """
+    for component_name in component_list:
+        shape, index_list = parse_components(component_name)
+        point_list = [shape.cv_list[i] for i in index_list]
+        center = [(min(point[axis] for point in point_list) + max(point[axis] for point in point_list))/2.0
+                  for axis in range(3)]
+        local_point_list = [rig_math.vec_sub(point, center) for point in point_list]
+        new_point_list = rig_math.transform_points(local_point_list, rotation=rotation, scale=scale,
+                                                   translation=rig_math.vec_add(center, translation))
+        for i, point in zip(index_list, new_point_list):
+            shape.cv_list[i] = point
+
+
+def scale_components_around(component_list, scale, pivot):
+    """
+    Scale control points along the world axes around a world space pivot.
+    """
+    for component_name in component_list:
+        shape, index_list = parse_components(component_name)
+        world_mat = get_world_matrix(shape.parent) if shape.parent is not None else IDENTITY_MATRIX
+        inverse_mat = mat4_inverse(world_mat)
+        for i in index_list:
+            world_point = rig_math.vec_sub(point_mat_mult(shape.cv_list[i], world_mat), pivot)
+            world_point = rig_math.vec_add([value*axis_scale for value, axis_scale in zip(world_point, scale)], pivot)
+            shape.cv_list[i] = point_mat_mult(world_point, inverse_mat)
+
+
+def split_components(name_list):
+    component_list = [name for name in name_list if ".cv[" in str(name)]
+    node_list = [SCENE.find(name) for name in name_list if ".cv[" not in str(name)]
+    return component_list, node_list
+
+
+@recorded("move")
+def move(*args, **kwargs):
+    value_list, name_list = split_values(args)
+    component_list, node_list = split_components(name_list or get_names(SCENE.selection))
+    relative = get_flag_value(kwargs, "relative", "r", False)
+    local_space = get_flag_value(kwargs, "localSpace", "ls", False) or get_flag_value(kwargs, "objectSpace", "os",
+                                                                                     False)
+
+    if relative:
+        transform_components(component_list, translation=value_list)
+    else:
+        for component_name in component_list:
+            shape, index_list = parse_components(component_name)
+            inverse_mat = mat4_inverse(get_world_matrix(shape))
+            for i in index_list:
+                shape.cv_list[i] = point_mat_mult(value_list, inverse_mat)
+
+    for node in node_list:
+        if relative and local_space:
+            set_value(node, "translate", rig_math.vec_add(get_vector(node, "translate"), value_list))
+        elif relative:
+            set_world_position(node, rig_math.vec_add(mat4_translation(get_world_matrix(node)), value_list))
+        else:
+            set_world_position(node, value_list)
+
+
+@recorded("rotate")
+def rotate(*args, **kwargs):
+    value_list, name_list = split_values(args)
+    component_list, node_list = split_components(name_list or get_names(SCENE.selection))
+    relative = get_flag_value(kwargs, "relative", "r", False)
+
+    transform_components(component_list, rotation=value_list)
+    for node in node_list:
+        if relative:
+            value_list = rig_math.vec_add(get_vector(node, "rotate"), value_list)
+        set_value(node, "rotate", value_list)
+
+
+@recorded("scale")
+def scale(*args, **kwargs):
+    value_list, name_list = split_values(args)
+    component_list, node_list = split_components(name_list or get_names(SCENE.selection))
+    relative = get_flag_value(kwargs, "relative", "r", False)
+
+    pivot = get_flag_value(kwargs, "pivot", "p")
+    if pivot is not None:
+        scale_components_around(component_list, value_list, pivot)
+    else:
+        transform_components(component_list, scale=value_list)
+    for node in node_list:
+        if relative:
+            value_list = [old_value*value for old_value, value in zip(get_vector(node, "scale"), value_list)]
+        set_value(node, "scale", value_list)
+
+
+def bake_into_shapes(node, mat3, translation=(0.0, 0.0, 0.0)):
+    for shape in node.get_shapes():
+        shape.cv_list = [rig_math.vec_add(rig_math.vec_mat_mult(point, mat3), translation)
+                         for point in shape.cv_list]
+
+
+@recorded("makeIdentity")
+def makeIdentity(*args, **kwargs):
+    apply_flag = get_flag_value(kwargs, "apply", "a", False)
+    do_translate = get_flag_value(kwargs, "translate", "t", False)
+    do_rotate = get_flag_value(kwargs, "rotate", "r", False)
+    do_scale = get_flag_value(kwargs, "scale", "s", False)
+    joint_orient = get_flag_value(kwargs, "jointOrient", "jo", False)
+    if not (do_translate or do_rotate or do_scale):
+        do_translate = do_rotate = do_scale = True
+
+    for node in get_targets(args):
+        restore = keep_children_world_matrix(node) if apply_flag else (lambda: None)
+
+        if do_scale:
+            if apply_flag:
+                scale_value = get_vector(node, "scale")
+                bake_into_shapes(node, [rig_math.vec_scale(axis, value)
+                                        for axis, value in zip(rig_math.IDENTITY_MATRIX, scale_value)])
+            set_vector(node, "scale", [1.0, 1.0, 1.0])
+
+        if do_rotate:
+            if node.node_type == "joint":
+                if apply_flag and not joint_orient:
+                    set_vector(node, "jointOrient", rig_math.matrix_to_euler_xyz(get_local_rotation(node)))
+                elif joint_orient:
+                    set_vector(node, "jointOrient", [0.0, 0.0, 0.0])
+            elif apply_flag:
+                bake_into_shapes(node, get_local_rotation(node))
+            set_vector(node, "rotate", [0.0, 0.0, 0.0])
+
+        if do_translate and node.node_type != "joint":
+            if apply_flag:
+                bake_into_shapes(node, rig_math.IDENTITY_MATRIX, get_vector(node, "translate"))
+            set_vector(node, "translate", [0.0, 0.0, 0.0])
+
+        restore()
+
+
+# --- joints ---
+def orient_joint(node, secondary_axis):
+    child_list = [child for child in node.children if child.node_type == "joint"]
+    if not child_list:
+        return
+
+    aim_vec = rig_math.vec_sub(mat4_translation(get_world_matrix(child_list[0])),
+                               mat4_translation(get_world_matrix(node)))
+    up_vec = SECONDARY_AXIS_DICT.get(secondary_axis, (0.0, 1.0, 0.0))
+    world_rot = rig_math.aim_matrix(aim_vec, up_vec)
+
+    restore = keep_children_world_matrix(node)
+    parent_rot = orthonormalize(mat4_rotation_part(get_parent_matrix(node)))
+    set_vector(node, "rotate", [0.0, 0.0, 0.0])
+    set_vector(node, "jointOrient",
+               rig_math.matrix_to_euler_xyz(rig_math.mat_mult(world_rot, rig_math.mat_transpose(parent_rot))))
+    restore()
+
+
+@recorded("joint")
+def joint(*args, **kwargs):
+    name_list = flatten_args(args)
+    if get_flag_value(kwargs, "query", "q", False):
+        node = SCENE.find(name_list[0])
+        if get_flag_value(kwargs, "position", "p", False):
+            return mat4_translation(get_world_matrix(node))
+        if get_flag_value(kwargs, "orientation", "o", False):
+            return get_vector(node, "jointOrient")
+        raise RuntimeError("joint: Unsupported query.")
+
+    if get_flag_value(kwargs, "edit", "e", False):
+        for node in find_nodes(name_list):
+            orient = get_flag_value(kwargs, "orientJoint", "oj")
+            if orient is not None:
+                orient_joint(node, get_flag_value(kwargs, "secondaryAxisOrient", "sao", "yup"))
+            orientation = get_flag_value(kwargs, "orientation", "o")
+            if orientation is not None:
+                set_vector(node, "jointOrient", orientation)
+            position = get_flag_value(kwargs, "position", "p")
+            if position is not None:
+                if get_flag_value(kwargs, "relative", "r", False):
+                    set_vector(node, "translate", position)
+                else:
+                    set_world_position(node, position)
+        return
+
+    if name_list:
+        parent_node_obj = SCENE.find(name_list[0])
+    else:
+        parent_node_obj = SCENE.selection[-1] if SCENE.selection and SCENE.selection[-1].node_type == "joint" \
+            else None
+
+    node = SCENE.create_node("joint", get_flag_value(kwargs, "name", "n") or "joint1", parent=parent_node_obj)
+    position = get_flag_value(kwargs, "position", "p", (0.0, 0.0, 0.0))
+    if get_flag_value(kwargs, "relative", "r", False):
+        set_vector(node, "translate", position)
+    else:
+        set_world_position(node, position)
+    orientation = get_flag_value(kwargs, "orientation", "o")
+    if orientation is not None:
+        set_vector(node, "jointOrient", orientation)
+    return get_name(node)
+
+
+# --- geometry ---
+@recorded("curve")
+def curve(*args, **kwargs):
+    point_list = [list(point) for point in get_flag_value(kwargs, "point", "p", [])]
+    degree = get_flag_value(kwargs, "degree", "d", 3)
+    periodic = get_flag_value(kwargs, "periodic", "per", False)
+    if periodic:
+        point_list = point_list[:-degree]
+
+    transform, shape = create_shape_node("nurbsCurve", transform_name=get_flag_value(kwargs, "name", "n") or "curve1")
+    shape.cv_list = point_list
+    shape.cuv_info = {"degree": degree, "form": "periodic" if periodic else "open",
+                      "knot": get_flag_value(kwargs, "knot", "k")}
+    SCENE.selection = [transform]
+    return get_name(transform)
+
+
+@recorded("circle")
+def circle(*args, **kwargs):
+    normal = get_flag_value(kwargs, "normal", "nr", (0.0, 1.0, 0.0))
+    radius = get_flag_value(kwargs, "radius", "r", 1.0)
+    aim_rot = rig_math.aim_matrix(normal, rig_math.get_perpendicular(normal))
+    point_list = []
+    for i in range(8):
+        angle = 2*math.pi*i/8.0
+        point = [0.0, math.cos(angle)*radius*1.108, math.sin(angle)*radius*1.108]
+        point_list.append(rig_math.vec_mat_mult(point, aim_rot))
+
+    transform, shape = create_shape_node("nurbsCurve", transform_name=get_flag_value(kwargs, "name", "n") or "nurbsCircle1")
+    shape.cv_list = point_list
+    shape.cuv_info = {"degree": 3, "form": "periodic"}
+    make_node = SCENE.create_node("makeNurbCircle", "makeNurbCircle1", select=False)
+    SCENE.connect(make_node, "outputCurve", shape, "create")
+    SCENE.selection = [transform]
+    return [get_name(transform), get_name(make_node)]
+
+
+@recorded("nurbsPlane")
+def nurbsPlane(*args, **kwargs):
+    patches_u = get_flag_value(kwargs, "patchesU", "u", 1)
+    patches_v = get_flag_value(kwargs, "patchesV", "v", 1)
+    width = get_flag_value(kwargs, "width", "w", 1.0)
+
+    transform, shape = create_shape_node("nurbsSurface",
+                                         transform_name=get_flag_value(kwargs, "name", "n") or "nurbsPlane1")
+    shape.cv_list = get_plane_cvs(patches_u, patches_v, width)
+    make_node = SCENE.create_node("makeNurbPlane", "makeNurbPlane1", select=False)
+    set_value(make_node, "patchesU", patches_u)
+    set_value(make_node, "patchesV", patches_v)
+    SCENE.connect(make_node, "outputSurface", shape, "create")
+    SCENE.selection = [transform]
+    return [get_name(transform), get_name(make_node)]
+
+
+def get_deformer_input(shape):
+    """
+    The first deformer of a shape creates the tweak node and its set. Shapes without construction history also get
+    an intermediate original shape.
+    """
+    if [node for node in SCENE.node_list if node.node_type == "tweak" and getattr(node, "deformed_shape", None)
+            is shape]:
+        return
+    if SCENE.get_source(shape, "create") is None:
+        orig_shape = SCENE.create_node(shape.node_type, shape.name + "Orig", parent=shape.parent, select=False)
+        orig_shape.cv_list = [list(point) for point in shape.cv_list]
+        set_value(orig_shape, "intermediateObject", True)
+
+    tweak = SCENE.create_node("tweak", "tweak1", select=False)
+    tweak.deformed_shape = shape
+    tweak_set = SCENE.create_node("objectSet", "tweakSet1", select=False)
+    SCENE.create_node("groupId", "groupId1", select=False)
+    SCENE.create_node("groupParts", "groupParts1", select=False)
+    SCENE.connect(tweak, "message", tweak_set, "usedBy[0]")
+
+
+@recorded("cluster")
+def cluster(*args, **kwargs):
+    component_list = flatten_args(args)
+    name = get_flag_value(kwargs, "name", "n") or "cluster1"
+
+    point_list = []
+    shape = None
+    for component_name in component_list:
+        shape, index_list = parse_components(component_name)
+        world_cv_list = get_world_cvs(shape)
+        point_list += [world_cv_list[i] for i in index_list]
+    get_deformer_input(shape)
+
+    cluster_node = SCENE.create_node("cluster", name, select=False)
+    handle, handle_shape = create_shape_node("clusterHandle", transform_name=cluster_node.name + "Handle",
+                                             shape_name=cluster_node.name + "HandleShape")
+    SCENE.create_node("objectSet", cluster_node.name + "Set", select=False)
+    SCENE.create_node("groupId", "groupId1", select=False)
+    SCENE.create_node("groupParts", "groupParts1", select=False)
+
+    center = [sum(point[i] for point in point_list)/len(point_list) for i in range(3)]
+    set_vector(handle, "rotatePivot", center)
+    set_vector(handle, "scalePivot", center)
+    set_vector(handle_shape, "origin", center)
+    SCENE.connect(handle, "worldMatrix[0]", cluster_node, "matrix")
+    SCENE.connect(cluster_node, "outputGeometry[0]", shape, "create", force=True)
+    SCENE.selection = [handle]
+    return [get_name(cluster_node), get_name(handle)]
+
+
+@recorded("spaceLocator")
+def spaceLocator(*args, **kwargs):
+    transform, shape = create_shape_node("locator", transform_name=get_flag_value(kwargs, "name", "n") or "locator1")
+    position = get_flag_value(kwargs, "position", "p")
+    if position is not None:
+        set_vector(shape, "localPosition", position)
+    SCENE.selection = [transform]
+    return [get_name(transform)]
+
+
+def find_locator_at(position):
+    for node in SCENE.node_list:
+        if node.node_type == "locator" and rig_math.vec_length(
+                rig_math.vec_sub(get_value(node, "worldPosition[0]"), position)) < 1e-6:
+            return node
+    return None
+
+
+@recorded("distanceDimension")
+def distanceDimension(*args, **kwargs):
+    start_point = list(get_flag_value(kwargs, "startPoint", "sp"))
+    end_point = list(get_flag_value(kwargs, "endPoint", "ep"))
+
+    # Locators already placed at the points are used, like in Maya
+    locator_list = []
+    for point in [start_point, end_point]:
+        locator_shape = find_locator_at(point)
+        if locator_shape is None:
+            transform, locator_shape = create_shape_node("locator", transform_name="locator1")
+            set_world_position(transform, point)
+        locator_list.append(locator_shape)
+
+    transform, shape = create_shape_node("distanceDimShape", transform_name="distanceDimension1")
+    SCENE.connect(locator_list[0], "worldPosition[0]", shape, "startPoint")
+    SCENE.connect(locator_list[1], "worldPosition[0]", shape, "endPoint")
+    return get_name(shape)
+
+
+# --- constraints ---
+def get_constraint_targets(cst):
+    """
+    Target nodes of a constraint by target index, the targets are the sources of the targetParentMatrix plugs.
+    """
+    target_list = []
+    for key in cst.value_dict:
+        match = TARGET_WEIGHT_PATTERN.match(key)
+        if match:
+            source = SCENE.get_source(cst, "target[{0}].targetParentMatrix".format(match.group(1)))
+            if source is not None:
+                target_list.append((int(match.group(1)), source[0]))
+    return sorted(target_list, key=lambda target: target[0])
+
+
+def get_targets_center(target_list):
+    position_list = [mat4_translation(get_world_matrix(target)) for target in target_list]
+    return [sum(position[i] for position in position_list)/len(position_list) for i in range(3)]
+
+
+def get_target_offset_matrix(cst, index):
+    offset_rot = rig_math.euler_xyz_to_matrix(get_vector(cst, "target[{0}].targetOffsetRotate".format(index)))
+    return mat4_from_parts(offset_rot, get_vector(cst, "target[{0}].targetOffsetTranslate".format(index)))
+
+
+def set_constraint_offset(cst, node, index_list):
+    """
+    Store the offsets keeping the constrained node where it is, like maintainOffset. The offsets are stored where
+    Maya keeps them: per target in the target space for the parent constraint, in the constraint offset for the
+    others, in the node parent space for the point constraint.
+    """
+    target_list = [target for index, target in get_constraint_targets(cst) if index in index_list]
+    world_mat = get_world_matrix(node)
+    if cst.node_type == "parentConstraint":
+        world_rot = orthonormalize(mat4_rotation_part(world_mat))
+        for index, target in zip(index_list, target_list):
+            target_mat = get_world_matrix(target)
+            offset_pos = rig_math.vec_mat_mult(rig_math.vec_sub(mat4_translation(world_mat),
+                                                                mat4_translation(target_mat)),
+                                               mat3_inverse(mat4_rotation_part(target_mat)))
+            offset_rot = rig_math.mat_mult(world_rot, rig_math.mat_transpose(get_world_rotation(target)))
+            set_vector(cst, "target[{0}].targetOffsetTranslate".format(index), offset_pos)
+            set_vector(cst, "target[{0}].targetOffsetRotate".format(index), rig_math.matrix_to_euler_xyz(offset_rot))
+    elif cst.node_type == "orientConstraint":
+        offset_rot = rig_math.mat_mult(orthonormalize(mat4_rotation_part(world_mat)),
+                                       rig_math.mat_transpose(get_world_rotation(target_list[0])))
+        set_vector(cst, "offset", rig_math.matrix_to_euler_xyz(offset_rot))
+    elif cst.node_type == "pointConstraint":
+        offset_pos = rig_math.vec_sub(mat4_translation(world_mat), get_targets_center(target_list))
+        set_vector(cst, "offset", rig_math.vec_mat_mult(offset_pos, mat3_inverse(mat4_rotation_part(
+            get_parent_matrix(node)))))
+    elif cst.node_type == "scaleConstraint":
+        target_scale = decompose_mat3(mat4_rotation_part(get_world_matrix(target_list[0])))[0]
+        set_vector(cst, "offset", [value/target_value if abs(target_value) > rig_math.EPSILON else 1.0
+                                   for value, target_value in zip(get_vector(node, "scale"), target_scale)])
+
+
+def solve_point(cst, node, target_list):
+    parent_mat = get_parent_matrix(node)
+    offset = rig_math.vec_mat_mult(get_vector(cst, "offset"), mat4_rotation_part(parent_mat))
+    return get_local_translate(node, rig_math.vec_add(get_targets_center(target_list), offset))
+
+
+def solve_orient(cst, node, target_list):
+    offset_rot = rig_math.euler_xyz_to_matrix(get_vector(cst, "offset"))
+    return get_local_rotate(node, rig_math.mat_mult(offset_rot, get_world_rotation(target_list[0])))
+
+
+def solve_parent(cst, node, target_list, output_name):
+    world_mat_list = [mat4_mult(get_target_offset_matrix(cst, index), get_world_matrix(target))
+                      for index, target in get_constraint_targets(cst)]
+    if output_name == "constraintRotate":
+        return get_local_rotate(node, orthonormalize(mat4_rotation_part(world_mat_list[0])))
+    position_list = [mat4_translation(world_mat) for world_mat in world_mat_list]
+    return get_local_translate(node, [sum(position[i] for position in position_list)/len(position_list)
+                                      for i in range(3)])
+
+
+def solve_scale(cst, node, target_list):
+    offset = get_vector(cst, "offset") if "offsetX" in cst.value_dict else [1.0, 1.0, 1.0]
+    target_scale = decompose_mat3(mat4_rotation_part(get_world_matrix(target_list[0])))[0]
+    return [value*offset_value for value, offset_value in zip(target_scale, offset)]
+
+
+def solve_aim(cst, node, target_list):
+    aim_vec = rig_math.vec_sub(get_targets_center(target_list), mat4_translation(get_world_matrix(node)))
+    return get_local_rotate(node, rig_math.aim_matrix(aim_vec, get_vector(cst, "worldUpVector")))
+
+
+def solve_pole_vector(cst, node, target_list):
+    """
+    Pole vector of the IK handle, the target position from the start joint in the space of the handle parent.
+    """
+    start_jnt = SCENE.get_source(node, "startJoint")
+    if start_jnt is None:
+        return None
+    pole_vec = rig_math.vec_sub(mat4_translation(get_world_matrix(target_list[0])),
+                                mat4_translation(get_world_matrix(start_jnt[0])))
+    return rig_math.vec_mat_mult(pole_vec, mat3_inverse(mat4_rotation_part(get_parent_matrix(node))))
+
+
+def compute_constraint(cst, plug_path, attr_def):
+    """
+    Output of a constraint from the current world matrices of its targets, so the constrained nodes follow their
+    targets when the targets move or the constraint gets new targets. A constraint queried while it is evaluated
+    returns its stored output.
+    """
+    output_name = attr_def.parent or attr_def.name
+    if output_name not in CONSTRAINT_OUTPUT_NAME_LIST or (cst, output_name) in EVALUATING_SET or \
+            cst.parent is None:
+        return None
+    target_list = [target for index, target in get_constraint_targets(cst)]
+    if not target_list:
+        return None
+
+    EVALUATING_SET.add((cst, output_name))
+    try:
+        if cst.node_type == "parentConstraint":
+            value = solve_parent(cst, cst.parent, target_list, output_name)
+        else:
+            value = CONSTRAINT_SOLVE_DICT[cst.node_type](cst, cst.parent, target_list)
+    finally:
+        EVALUATING_SET.discard((cst, output_name))
+    if value is None or not attr_def.parent:
+        return value
+    return value[cst.get_attr_def(output_name).child_list.index(attr_def.name)]
+
+
+def create_constraint(cst_type, args, kwargs):
+    name_list = flatten_args(args)
+    if len(name_list) < 2:
+        name_list = get_names(SCENE.selection)
+    target_list, node = find_nodes(name_list[:-1]), SCENE.find(name_list[-1])
+    maintain_offset = get_flag_value(kwargs, "maintainOffset", "mo", False)
+
+    weight = get_flag_value(kwargs, "weight", "w", 1.0)
+
+    # Like maya, the targets are added to the constraint of the same type if the node already has one
+    cst_list = [child for child in node.children if child.node_type == cst_type]
+    if cst_list:
+        cst = cst_list[0]
+        start_index = len(get_constraint_targets(cst))
+    else:
+        cst_name = get_flag_value(kwargs, "name", "n") or "{0}_{1}1".format(node.name, cst_type)
+        cst = SCENE.create_node(cst_type, cst_name, parent=node, select=False)
+        start_index = 0
+
+    for i, target in enumerate(target_list, start_index):
+        SCENE.connect(target, "parentMatrix[0]", cst, "target[{0}].targetParentMatrix".format(i))
+        SCENE.connect(target, "translate", cst, "target[{0}].targetTranslate".format(i))
+        set_value(cst, "target[{0}].targetWeight".format(i), weight)
+
+    if maintain_offset:
+        set_constraint_offset(cst, node, range(start_index, start_index + len(target_list)))
+    elif cst_type == "pointConstraint":
+        set_vector(cst, "offset", get_flag_value(kwargs, "offset", "o", (0.0, 0.0, 0.0)))
+    elif cst_type == "aimConstraint":
+        set_vector(cst, "worldUpVector", get_flag_value(kwargs, "worldUpVector", "wu", (0.0, 1.0, 0.0)))
+
+    if not cst_list:
+        for cst_attr, node_attr in CONSTRAINT_OUTPUT_DICT[cst_type]:
+            set_vector(cst, cst_attr, get_vector(node, node_attr))
+            SCENE.connect(cst, cst_attr, node, node_attr)
+    return [get_name(cst)]
+
+
+CONSTRAINT_OUTPUT_DICT = {"pointConstraint": [("constraintTranslate", "translate")],
+                          "orientConstraint": [("constraintRotate", "rotate")],
+                          "aimConstraint": [("constraintRotate", "rotate")],
+                          "parentConstraint": [("constraintTranslate", "translate"), ("constraintRotate", "rotate")],
+                          "scaleConstraint": [("constraintScale", "scale")]}
+CONSTRAINT_OUTPUT_NAME_LIST = ["constraintTranslate", "constraintRotate", "constraintScale"]
+CONSTRAINT_SOLVE_DICT = {"pointConstraint": solve_point,
+                         "orientConstraint": solve_orient,
+                         "scaleConstraint": solve_scale,
+                         "aimConstraint": solve_aim,
+                         "poleVectorConstraint": solve_pole_vector}
+# Constraint outputs being evaluated, (constraint node, output name)
+EVALUATING_SET = set()
+
+
+@recorded("pointConstraint")
+def pointConstraint(*args, **kwargs):
+    return create_constraint("pointConstraint", args, kwargs)
+
+
+@recorded("orientConstraint")
+def orientConstraint(*args, **kwargs):
+    return create_constraint("orientConstraint", args, kwargs)
+
+
+@recorded("parentConstraint")
+def parentConstraint(*args, **kwargs):
+    return create_constraint("parentConstraint", args, kwargs)
+
+
+@recorded("scaleConstraint")
+def scaleConstraint(*args, **kwargs):
+    return create_constraint("scaleConstraint", args, kwargs)
+
+
+@recorded("aimConstraint")
+def aimConstraint(*args, **kwargs):
+    return create_constraint("aimConstraint", args, kwargs)
+
+
+@recorded("poleVectorConstraint")
+def poleVectorConstraint(*args, **kwargs):
+    name_list = flatten_args(args)
+    target, node = SCENE.find(name_list[0]), SCENE.find(name_list[-1])
+    cst = SCENE.create_node("poleVectorConstraint", "{0}_poleVectorConstraint1".format(node.name), parent=node,
+                            select=False)
+    SCENE.connect(target, "parentMatrix[0]", cst, "target[0].targetParentMatrix")
+    SCENE.connect(target, "translate", cst, "target[0].targetTranslate")
+    set_value(cst, "target[0].targetWeight", 1.0)
+    SCENE.connect(cst, "constraintTranslate", node, "poleVector", force=True)
+    return [get_name(cst)]
+
+
+# --- IK ---
+@recorded("ikHandle")
+def ikHandle(*args, **kwargs):
+    start_jnt = SCENE.find(get_flag_value(kwargs, "startJoint", "sj"))
+    end_jnt = SCENE.find(get_flag_value(kwargs, "endEffector", "ee"))
+    if end_jnt not in SCENE.get_descendants(start_jnt):
+        raise RuntimeError("ikHandle: The end joint is not below the start joint.")
+
+    effector = SCENE.create_node("ikEffector", "effector1", parent=end_jnt.parent, select=False)
+    set_world_position(effector, mat4_translation(get_world_matrix(end_jnt)))
+    handle = SCENE.create_node("ikHandle", get_flag_value(kwargs, "name", "n") or "ikHandle1")
+    set_world_position(handle, mat4_translation(get_world_matrix(end_jnt)))
+    SCENE.connect(start_jnt, "message", handle, "startJoint")
+    SCENE.connect(effector, "handlePath[0]", handle, "endEffector")
+    return [get_name(handle), get_name(effector)]
+
+
+# --- scene and misc ---
+@recorded("file")
+def file(*args, **kwargs):
+    if get_flag_value(kwargs, "query", "q", False):
+        if get_flag_value(kwargs, "sceneName", "sn", False):
+            return SCENE.scene_name
+        raise RuntimeError("file: Unsupported query.")
+    if get_flag_value(kwargs, "new", "f", False):
+        new_scene()
+        return ""
+    rename_path = get_flag_value(kwargs, "rename", "rn")
+    if rename_path is not None:
+        SCENE.scene_name = rename_path
+        return rename_path
+    if get_flag_value(kwargs, "save", "s", False):
+        if not SCENE.scene_name:
+            raise RuntimeError("file: The scene has no name.")
+        write_scene(SCENE.scene_name)
+        return SCENE.scene_name
+    if get_flag_value(kwargs, "exportSelected", "es", False):
+        export_nodes(args[0], list(SCENE.selection))
+        return args[0]
+    if get_flag_value(kwargs, "i", "import", False):
+        new_node_list = import_nodes(args[0])
+        if get_flag_value(kwargs, "returnNewNodes", "rnn", False):
+            return [SCENE.get_full_name(node) for node in new_node_list]
+        return args[0]
+    raise RuntimeError("file: Unsupported operation.")
+
+
+# Application preferences, they are kept when a new scene is started
+PREF_DICT = {"undo": True, "auto_key": False, "evaluation_mode": "parallel", "refresh_suspended": False,
+             "linear_unit": "cm"}
+
+
+@recorded("undoInfo")
+def undoInfo(*args, **kwargs):
+    """
+    Only the chunks are undoable, the outermost chunk takes a snapshot of the scene when it opens, undo puts the scene
+    back to the snapshot of the last chunk. Turning undo off with the state flag flushes the snapshots.
+    """
+    if get_flag_value(kwargs, "query", "q", False):
+        return PREF_DICT["undo"]
+    for flag_name in ["state", "stateWithoutFlush", "st", "swf"]:
+        if flag_name in kwargs:
+            PREF_DICT["undo"] = bool(kwargs[flag_name])
+            if flag_name in ["state", "st"] and not PREF_DICT["undo"]:
+                SCENE.undo_list = []
+    if get_flag_value(kwargs, "openChunk", "ock", False):
+        if not SCENE.chunk_depth and PREF_DICT["undo"]:
+            SCENE.undo_list.append(SCENE.get_snapshot())
+        SCENE.chunk_depth += 1
+    if get_flag_value(kwargs, "closeChunk", "cck", False):
+        SCENE.chunk_depth = max(SCENE.chunk_depth - 1, 0)
+
+
+@recorded("undo")
+def undo(*args, **kwargs):
+    if not SCENE.undo_list:
+        warning("There are no more commands to undo.")
+        return
+    SCENE.restore_snapshot(SCENE.undo_list.pop())
+
+
+@recorded("autoKeyframe")
+def autoKeyframe(*args, **kwargs):
+    if get_flag_value(kwargs, "query", "q", False):
+        return PREF_DICT["auto_key"]
+    if "state" in kwargs or "st" in kwargs:
+        PREF_DICT["auto_key"] = bool(get_flag_value(kwargs, "state", "st"))
+
+
+@recorded("evaluationManager")
+def evaluationManager(*args, **kwargs):
+    if get_flag_value(kwargs, "query", "q", False):
+        return [PREF_DICT["evaluation_mode"]]
+    if "mode" in kwargs:
+        PREF_DICT["evaluation_mode"] = kwargs["mode"]
+
+
+@recorded("currentUnit")
+def currentUnit(*args, **kwargs):
+    """
+    Only the linear unit is kept, the connections don't convert units.
+    """
+    if get_flag_value(kwargs, "query", "q", False):
+        return PREF_DICT["linear_unit"]
+    if "linear" in kwargs or "l" in kwargs:
+        PREF_DICT["linear_unit"] = get_flag_value(kwargs, "linear", "l")
+
+
+@recorded("about")
+def about(*args, **kwargs):
+    """
+    The stand-in is an interactive session, so the refresh suspension is exercised.
+    """
+    if get_flag_value(kwargs, "batch", "b", False):
+        return False
+    raise RuntimeError("about: Unsupported flag.")
+
+
+@recorded("warning")
+def warning(*args, **kwargs):
+    sys.stderr.write("Warning: {0}\n".format(" ".join(str(arg) for arg in args)))
+
+
+@recorded("refresh")
+def refresh(*args, **kwargs):
+    if "suspend" in kwargs or "su" in kwargs:
+        PREF_DICT["refresh_suspended"] = bool(get_flag_value(kwargs, "suspend", "su"))
+
+
+@recorded("dgdirty")
+def dgdirty(*args, **kwargs):
+    """
+    The connections are evaluated on every getAttr, there is nothing cached to dirty.
+    """
+    pass
+
+
+@recorded("loadPlugin")
+def loadPlugin(plugin_path, **kwargs):
+    """
+    Import the plugin file and register its commands on the cmds module.
+    """
+    plugin_name = os.path.splitext(os.path.basename(plugin_path))[0]
+    if plugin_name in SCENE.plugin_dict:
+        return [plugin_name]
+
+    import imp
+    plugin_module = imp.load_source(plugin_name, plugin_path)
+    SCENE.plugin_dict[plugin_name] = plugin_module
+    plugin_module.initializePlugin(MObject(plugin_name))
+    return [plugin_name]
+
+
+@recorded("pluginInfo")
+def pluginInfo(plugin_name, **kwargs):
+    plugin_name = os.path.splitext(os.path.basename(plugin_name))[0]
+    if get_flag_value(kwargs, "loaded", "l", False):
+        return plugin_name in SCENE.plugin_dict
+    if get_flag_value(kwargs, "registered", "r", False):
+        return plugin_name in SCENE.plugin_dict
+    raise RuntimeError("pluginInfo: Unsupported query.")
+
+
+def register_command(command_name, creator):
+    """
+    Expose a plugin command as a function of the cmds module.
+    """
+    def command_func(*args, **kwargs):
+        command = creator()
+        return command.doIt(MArgList(args))
+
+    SCENE.command_dict[command_name] = creator
+    setattr(CMDS_MODULE, command_name, recorded(command_name)(command_func))
+
+
+def write_scene(scene_path):
+    """
+    Save the scene as a JSON dump of the nodes and the connections.
+    """
+    node_info_list = []
+    for node in SCENE.node_list:
+        node_info_list.append({"name": SCENE.get_full_name(node), "type": node.node_type, "uuid": node.uuid,
+                               "values": dict((key, value) for key, value in node.value_dict.items()
+                                              if isinstance(value, (int, float, bool)))})
+    connection_list = [["{0}.{1}".format(SCENE.get_full_name(source_node), source_plug),
+                        "{0}.{1}".format(SCENE.get_full_name(dest_node), dest_plug)]
+                       for (dest_node, dest_plug), (source_node, source_plug) in SCENE.connection_dict.items()]
+
+    with open(scene_path, "w") as file_obj:
+        json.dump({"nodes": node_info_list, "connections": connection_list}, file_obj, indent=1)
+
+
+def export_nodes(file_path, node_list):
+    """
+    Write the nodes with their descendants and all their upstream nodes to a fragment file, like file -exportSelected
+    with the history. The fragment keeps the whole node state, so it can be imported again by import_nodes.
+    """
+    source_node_dict = collections.defaultdict(list)
+    for (dest_node, dest_plug), (source_node, source_plug) in SCENE.connection_dict.items():
+        source_node_dict[dest_node].append(source_node)
+
+    export_list = []
+    export_index_dict = {}
+    pending_list = list(node_list)
+    while pending_list:
+        for node in [pending_list[0]] + SCENE.get_descendants(pending_list[0]):
+            if node not in export_index_dict:
+                export_index_dict[node] = len(export_list)
+                export_list.append(node)
+                pending_list += source_node_dict.get(node, [])
+        pending_list.pop(0)
+
+    node_info_list = []
+    for node in export_list:
+        node_info_list.append({"type": node.node_type, "name": node.name,
+                               "parent": export_index_dict.get(node.parent),
+                               "values": node.value_dict, "flags": node.flag_dict,
+                               "dynamic_attrs": list(node.dynamic_attr_dict.items()),
+                               "cv_list": node.cv_list, "cuv_info": node.cuv_info})
+    connection_list = [(export_index_dict[source_node], source_plug, export_index_dict[dest_node], dest_plug)
+                       for (dest_node, dest_plug), (source_node, source_plug) in SCENE.connection_dict.items()
+                       if source_node in export_index_dict and dest_node in export_index_dict]
+
+    with open(file_path, "wb") as file_obj:
+        pickle.dump({"nodes": node_info_list, "connections": connection_list}, file_obj, 2)
+
+
+def import_nodes(file_path):
+    """
+    Create the nodes of a fragment file written by export_nodes, names clashing with the scene get a new number.
+    Return the new nodes.
+    """
+    with open(file_path, "rb") as file_obj:
+        fragment = pickle.load(file_obj)
+
+    new_node_list = []
+    for node_info in fragment["nodes"]:
+        new_node = Node(node_info["type"], node_info["name"])
+        new_node.value_dict = dict(node_info["values"])
+        new_node.flag_dict = dict((key, dict(value)) for key, value in node_info["flags"].items())
+        new_node.dynamic_attr_dict = collections.OrderedDict(node_info["dynamic_attrs"])
+        new_node.cv_list = [list(point) for point in node_info["cv_list"]]
+        new_node.cuv_info = node_info["cuv_info"]
+        new_node_list.append(SCENE.register(new_node))
+
+    for new_node, node_info in zip(new_node_list, fragment["nodes"]):
+        if node_info["parent"] is not None:
+            SCENE.set_parent(new_node, new_node_list[node_info["parent"]])
+    for source_index, source_plug, dest_index, dest_plug in fragment["connections"]:
+        SCENE.connection_dict[(new_node_list[dest_index], dest_plug)] = (new_node_list[source_index], source_plug)
+    return new_node_list
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# maya.api.OpenMaya subset
+# ----------------------------------------------------------------------------------------------------------------------
+class MVector(object):
+    def __init__(self, *args):
+        if len(args) == 1:
+            args = tuple(args[0])
+        self.x, self.y, self.z = [float(value) for value in (list(args) + [0.0, 0.0, 0.0])[:3]]
+
+    def __getitem__(self, index):
+        return [self.x, self.y, self.z][index]
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        return iter([self.x, self.y, self.z])
+
+    def __add__(self, other):
+        return MVector(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __sub__(self, other):
+        return MVector(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __neg__(self):
+        return MVector(-self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        # vector * vector is the dot product, like the Maya API
+        if isinstance(other, (MVector, MPoint)):
+            return self.x*other[0] + self.y*other[1] + self.z*other[2]
+        return MVector(self.x*other, self.y*other, self.z*other)
+
+    def __rmul__(self, other):
+        return MVector(self.x*other, self.y*other, self.z*other)
+
+    def __truediv__(self, other):
+        return MVector(self.x/other, self.y/other, self.z/other)
+
+    __div__ = __truediv__
+
+    def __xor__(self, other):
+        return MVector(rig_math.vec_cross(list(self), list(other)))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "maya.api.OpenMaya.MVector({0}, {1}, {2})".format(self.x, self.y, self.z)
+
+    def length(self):
+        return rig_math.vec_length(list(self))
+
+    def normal(self):
+        return MVector(rig_math.vec_normalize(list(self)))
+
+    def normalize(self):
+        self.x, self.y, self.z = rig_math.vec_normalize(list(self))
+        return self
+
+    def isEquivalent(self, other, tolerance=1e-10):
+        return all(abs(a - b) <= tolerance for a, b in zip(self, other))
+
+
+class MPoint(MVector):
+    def __init__(self, *args):
+        if len(args) == 1:
+            args = tuple(args[0])
+        super(MPoint, self).__init__(*args[:3])
+        self.w = float(args[3]) if len(args) > 3 else 1.0
+
+    def __sub__(self, other):
+        return MVector(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __add__(self, other):
+        return MPoint(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __repr__(self):
+        return "maya.api.OpenMaya.MPoint({0}, {1}, {2}, {3})".format(self.x, self.y, self.z, self.w)
+
+
+class MFn(object):
+    kInvalid = 0
+    kDependencyNode = 4
+    kDagNode = 107
+    kTransform = 110
+    kJoint = 121
+    kShape = 248
+    kAttribute = 554
+    kNumericAttribute = 561
+    kUnitAttribute = 563
+    kEnumAttribute = 565
+    kCompoundAttribute = 566
+    kTypedAttribute = 567
+    kMatrixAttribute = 569
+    kMessageAttribute = 570
+    kData = 580
+    kNurbsCurveData = 584
+
+UNIT_ATTR_TYPE_LIST = ["doubleLinear", "doubleAngle"]
+NUMERIC_ATTR_TYPE_LIST = ["double", "float", "bool", "long", "short"]
+
+
+class MObject(object):
+    """
+    Handle on a stand-in node, an attribute definition or a data block.
+    """
+    def __init__(self, node=None, attr_def=None, data=None):
+        self.node = node
+        self.attr_def = attr_def
+        self.data = data
+
+    def isNull(self):
+        return self.node is None and self.attr_def is None and self.data is None
+
+    def hasFn(self, fn_type):
+        if isinstance(self.node, Node):
+            if fn_type == MFn.kDependencyNode:
+                return True
+            if fn_type == MFn.kDagNode:
+                return self.node.is_dag
+            if fn_type == MFn.kTransform:
+                return self.node.is_transform
+            if fn_type == MFn.kJoint:
+                return self.node.node_type == "joint"
+            if fn_type == MFn.kShape:
+                return self.node.is_shape
+            return False
+
+        if self.attr_def is not None:
+            attr_type = self.attr_def.attr_type
+            return (fn_type == MFn.kAttribute or
+                    fn_type == MFn.kUnitAttribute and attr_type in UNIT_ATTR_TYPE_LIST or
+                    fn_type == MFn.kNumericAttribute and attr_type in NUMERIC_ATTR_TYPE_LIST or
+                    fn_type == MFn.kEnumAttribute and attr_type == "enum" or
+                    fn_type == MFn.kCompoundAttribute and attr_type == "compound" or
+                    fn_type == MFn.kMatrixAttribute and attr_type == "matrix" or
+                    fn_type == MFn.kMessageAttribute and attr_type == "message")
+
+        if self.data is not None:
+            return fn_type in [MFn.kData, MFn.kNurbsCurveData]
+        return False
+
+    def __eq__(self, other):
+        return (isinstance(other, MObject) and self.node is other.node and self.attr_def is other.attr_def and
+                self.data is other.data)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.node), id(self.attr_def), id(self.data)))
+
+
+MObject.kNullObj = MObject()
+
+
+def get_node(obj):
+    if not isinstance(obj, MObject) or not isinstance(obj.node, Node):
+        raise RuntimeError("(kInvalidParameter): Object is not a node")
+    return obj.node
+
+
+class MObjectHandle(object):
+    def __init__(self, obj=None):
+        self.obj = obj if obj is not None else MObject.kNullObj
+
+    def isValid(self):
+        return isinstance(self.obj.node, Node) and self.obj.node.alive
+
+    isAlive = isValid
+
+    def object(self):
+        return self.obj
+
+    def hashCode(self):
+        return id(self.obj.node)
+
+
+class MSelectionList(object):
+    def __init__(self):
+        self.item_list = []
+
+    def add(self, name):
+        try:
+            self.item_list.append(SCENE.find(name))
+        except ValueError:
+            raise RuntimeError("(kInvalidParameter): Object does not exist")
+        return self
+
+    def length(self):
+        return len(self.item_list)
+
+    def getDependNode(self, index):
+        return MObject(self.item_list[index])
+
+    def getDagPath(self, index):
+        return MDagPath(self.item_list[index])
+
+
+class MDagPath(object):
+    def __init__(self, node=None):
+        self.dag_node = node
+
+    @staticmethod
+    def getAPathTo(obj):
+        node = get_node(obj)
+        if not node.is_dag:
+            raise RuntimeError("(kInvalidParameter): Object is not a dag node")
+        return MDagPath(node)
+
+    def partialPathName(self):
+        return SCENE.get_partial_name(self.dag_node)
+
+    def fullPathName(self):
+        return SCENE.get_full_name(self.dag_node)
+
+    def node(self):
+        return MObject(self.dag_node)
+
+    def transform(self):
+        return MObject(self.dag_node if self.dag_node.is_transform else self.dag_node.parent)
+
+    def inclusiveMatrix(self):
+        # MMatrix iterates over its 16 values
+        return [value for row in get_world_matrix(self.dag_node) for value in row]
+
+    def isValid(self):
+        return self.dag_node is not None and self.dag_node.alive
+
+
+class MPlug(object):
+    def __init__(self, node=None, plug_path=None, attr_def=None):
+        self.plug_node = node
+        self.plug_path = plug_path
+        self.attr_def = attr_def
+
+    def isNull(self):
+        return self.plug_node is None
+
+    def node(self):
+        return MObject(self.plug_node)
+
+    def attribute(self):
+        return MObject(attr_def=self.attr_def)
+
+    def name(self):
+        return "{0}.{1}".format(self.plug_node.name, self.plug_path)
+
+    partialName = name
+
+    def child(self, child):
+        if isinstance(child, MObject):
+            child_def = child.attr_def
+        else:
+            child_def = self.plug_node.get_attr_def(self.attr_def.child_list[child])
+        return MPlug(self.plug_node, get_child_path(self.plug_path, child_def.name), child_def)
+
+    def elementByLogicalIndex(self, index):
+        return MPlug(self.plug_node, "{0}[{1}]".format(self.plug_path, index), self.attr_def)
+
+    def asDouble(self):
+        return float(get_value(self.plug_node, self.plug_path, self.attr_def))
+
+    asFloat = asDouble
+
+    def asInt(self):
+        return int(get_value(self.plug_node, self.plug_path, self.attr_def))
+
+    def asBool(self):
+        return bool(get_value(self.plug_node, self.plug_path, self.attr_def))
+
+    def isLocked(self):
+        return is_locked(self.plug_node, self.plug_path)
+
+    def isConnected(self):
+        return is_driven(self.plug_node, self.plug_path, self.attr_def) or [
+            True for source_node, source_plug, dest_node, dest_plug in SCENE.get_connections(self.plug_node)
+            if source_node is self.plug_node and source_plug == self.plug_path]
+
+
+class MFnDependencyNode(object):
+    def __init__(self, obj=None):
+        self.fn_node = get_node(obj) if obj is not None else None
+
+    def name(self):
+        return self.fn_node.name
+
+    def uuid(self):
+        return MUuid(self.fn_node.uuid)
+
+    def typeName(self):
+        return self.fn_node.node_type
+
+    def attribute(self, attr_name):
+        attr_def = self.fn_node.get_attr_def(attr_name)
+        if attr_def is None:
+            return MObject.kNullObj
+        return MObject(attr_def=attr_def)
+
+    def hasAttribute(self, attr_name):
+        return self.fn_node.get_attr_def(attr_name) is not None
+
+    def findPlug(self, attr, want_networked_plug=False):
+        attr_def = attr.attr_def if isinstance(attr, MObject) else self.fn_node.get_attr_def(attr)
+        if attr_def is None:
+            raise RuntimeError("(kInvalidParameter): Cannot find plug {0}.{1}".format(self.fn_node.name, attr))
+        if attr_def.parent is not None:
+            return MPlug(self.fn_node, get_child_path(attr_def.parent, attr_def.name), attr_def)
+        return MPlug(self.fn_node, attr_def.name, attr_def)
+
+    def setName(self, name):
+        return SCENE.rename(self.fn_node, name)
+
+
+class MFnUnitAttribute(object):
+    kInvalid = 0
+    kAngle = 1
+    kDistance = 2
+    kTime = 3
+
+    def __init__(self, attr_obj):
+        self.attr_def = attr_obj.attr_def
+
+    def unitType(self):
+        if self.attr_def.attr_type == "doubleAngle":
+            return self.kAngle
+        if self.attr_def.attr_type == "doubleLinear":
+            return self.kDistance
+        return self.kInvalid
+
+
+class MFnNumericData(object):
+    kInvalid = 0
+    kBoolean = 1
+    kShort = 4
+    kInt = 7
+    kFloat = 11
+    kDouble = 14
+
+
+NUMERIC_TYPE_DICT = {"bool": MFnNumericData.kBoolean, "short": MFnNumericData.kShort, "long": MFnNumericData.kInt,
+                     "float": MFnNumericData.kFloat, "double": MFnNumericData.kDouble}
+
+
+class MFnNumericAttribute(object):
+    def __init__(self, attr_obj):
+        self.attr_def = attr_obj.attr_def
+
+    def numericType(self):
+        return NUMERIC_TYPE_DICT.get(self.attr_def.attr_type, MFnNumericData.kInvalid)
+
+
+class MAngle(object):
+    kInvalid = 0
+    kRadians = 1
+    kDegrees = 2
+
+    def __init__(self, value=0.0, unit=kRadians):
+        self.radians = math.radians(value) if unit == self.kDegrees else float(value)
+
+    def asDegrees(self):
+        return math.degrees(self.radians)
+
+    def asRadians(self):
+        return self.radians
+
+
+class MDistance(object):
+    kCentimeters = 6
+
+    def __init__(self, value=0.0, unit=kCentimeters):
+        self.value = float(value)
+
+    def asCentimeters(self):
+        return self.value
+
+
+class MFnNurbsCurveData(object):
+    def create(self):
+        return MObject(data={"type": "nurbsCurve", "cv_list": [], "cuv_info": None})
+
+
+class MFnNurbsCurve(object):
+    kInvalid = 0
+    kOpen = 1
+    kClosed = 2
+    kPeriodic = 3
+
+    FORM_NAME_DICT = {kOpen: "open", kClosed: "closed", kPeriodic: "periodic"}
+
+    def create(self, cv_list, knot_list, degree, form, is_2d, rational, parent=MObject.kNullObj):
+        """
+        Fill the curve data object given as parent, curves created under a transform are not supported.
+        """
+        if parent.data is None:
+            raise RuntimeError("(kInvalidParameter): Only curve data parents are supported offline")
+        parent.data["cv_list"] = [[point[0], point[1], point[2]] for point in cv_list]
+        parent.data["cuv_info"] = {"degree": degree, "form": self.FORM_NAME_DICT.get(form, "open"),
+                                   "knot": list(knot_list)}
+        return parent
+
+
+class MDGModifier(object):
+    """
+    Queue of scene edits, nothing happens before doIt. Every executed operation keeps its undo function.
+    """
+    def __init__(self):
+        self.operation_list = []
+        self.done_count = 0
+        self.undo_list = []
+
+    def createNode(self, node_type, parent=None):
+        if node_type not in NODE_ATTR_DICT:
+            raise TypeError("Unknown node type: " + str(node_type))
+        node = Node(node_type, SCENE.get_unique_name(get_default_node_name(node_type) + "1"))
+        # The name is reserved, so the nodes queued in the same modifier get different names
+        SCENE.reserved_name_set.add(node.name)
+        parent_node_obj = parent.node if isinstance(parent, MObject) and isinstance(parent.node, Node) else None
+        self.operation_list.append(("create", node, parent_node_obj))
+        return MObject(node)
+
+    def renameNode(self, obj, name):
+        self.operation_list.append(("rename", get_node(obj), name))
+
+    def connect(self, source_plug, dest_plug):
+        self.operation_list.append(("connect", source_plug, dest_plug))
+
+    def disconnect(self, source_plug, dest_plug):
+        self.operation_list.append(("disconnect", source_plug, dest_plug))
+
+    def reparentNode(self, obj, parent=None):
+        parent_node_obj = parent.node if isinstance(parent, MObject) and isinstance(parent.node, Node) else None
+        self.operation_list.append(("reparent", get_node(obj), parent_node_obj))
+
+    def deleteNode(self, obj):
+        self.operation_list.append(("delete", get_node(obj)))
+
+    def newPlugValue(self, plug, value):
+        self.operation_list.append(("value", plug, value))
+
+    def newPlugValueDouble(self, plug, value):
+        self.newPlugValue(plug, float(value))
+
+    newPlugValueFloat = newPlugValueDouble
+
+    def newPlugValueInt(self, plug, value):
+        self.newPlugValue(plug, int(value))
+
+    def newPlugValueBool(self, plug, value):
+        self.newPlugValue(plug, bool(value))
+
+    def newPlugValueMAngle(self, plug, value):
+        self.newPlugValue(plug, value.asDegrees())
+
+    def newPlugValueMDistance(self, plug, value):
+        self.newPlugValue(plug, value.asCentimeters())
+
+    def doIt(self):
+        for operation in self.operation_list[self.done_count:]:
+            self.undo_list.append(self.run_operation(operation))
+        self.done_count = len(self.operation_list)
+        return self
+
+    def undoIt(self):
+        while self.undo_list:
+            self.undo_list.pop()()
+        self.done_count = 0
+        return self
+
+    def run_operation(self, operation):
+        """
+        Run one queued operation, return the function undoing it.
+        """
+        operation_type = operation[0]
+        if operation_type == "create":
+            node, parent_node_obj = operation[1], operation[2]
+            node.alive = True
+            SCENE.register(node)
+            if parent_node_obj is not None:
+                SCENE.set_parent(node, parent_node_obj)
+            return lambda: SCENE.remove(node)
+
+        if operation_type == "rename":
+            node, old_name = operation[1], operation[1].name
+            SCENE.rename(node, operation[2])
+            return lambda: SCENE.rename(node, old_name)
+
+        if operation_type in ["connect", "disconnect"]:
+            source_plug, dest_plug = operation[1], operation[2]
+            source_key = (source_plug.plug_node, source_plug.plug_path)
+            dest_key = (dest_plug.plug_node, dest_plug.plug_path)
+            if operation_type == "connect":
+                SCENE.connect(source_key[0], source_key[1], dest_key[0], dest_key[1])
+                return lambda: SCENE.disconnect(source_key[0], source_key[1], dest_key[0], dest_key[1])
+            SCENE.disconnect(source_key[0], source_key[1], dest_key[0], dest_key[1])
+            return lambda: SCENE.connect(source_key[0], source_key[1], dest_key[0], dest_key[1])
+
+        if operation_type == "reparent":
+            node, old_parent = operation[1], operation[1].parent
+            SCENE.set_parent(node, operation[2])
+            return lambda: SCENE.set_parent(node, old_parent)
+
+        if operation_type == "delete":
+            node = operation[1]
+            SCENE.remove(node)
+            return lambda: None
+
+        if operation_type == "value":
+            plug, value = operation[1], operation[2]
+            node = plug.plug_node
+            if isinstance(value, MObject):
+                old_geometry = (node.cv_list, node.cuv_info)
+                node.cv_list = [list(point) for point in value.data["cv_list"]]
+                node.cuv_info = value.data["cuv_info"]
+
+                def undo_geometry():
+                    node.cv_list, node.cuv_info = old_geometry
+                return undo_geometry
+
+            has_old_value = plug.plug_path in node.value_dict
+            old_value = node.value_dict.get(plug.plug_path)
+            set_value(node, plug.plug_path, value, plug.attr_def)
+
+            def undo_value():
+                if has_old_value:
+                    node.value_dict[plug.plug_path] = old_value
+                else:
+                    node.value_dict.pop(plug.plug_path, None)
+            return undo_value
+
+        raise RuntimeError("Unknown modifier operation: " + operation_type)
+
+
+class MDagModifier(MDGModifier):
+    def createNode(self, node_type, parent=MObject.kNullObj):
+        if node_type in SHAPE_TYPE_LIST and not (isinstance(parent, MObject) and isinstance(parent.node, Node)):
+            # Shapes without parent get a new transform, like Maya does
+            parent = super(MDagModifier, self).createNode("transform")
+        return super(MDagModifier, self).createNode(node_type, parent)
+
+
+class MUuid(object):
+    def __init__(self, uuid_string=""):
+        self.uuid_string = uuid_string
+
+    def asString(self):
+        return self.uuid_string
+
+
+class MMessage(object):
+    @staticmethod
+    def removeCallback(callback_id):
+        NODE_ADDED_CALLBACK_DICT.pop(callback_id, None)
+
+
+class MDGMessage(MMessage):
+    @staticmethod
+    def addNodeAddedCallback(callback_func, node_type="dependNode", client_data=None):
+        """
+        Only the callbacks of every node type are supported.
+        """
+        if node_type != "dependNode":
+            raise RuntimeError("(kInvalidParameter): Only dependNode callbacks are supported")
+        callback_id = max(NODE_ADDED_CALLBACK_DICT.keys() or [0]) + 1
+        NODE_ADDED_CALLBACK_DICT[callback_id] = (callback_func, client_data)
+        return callback_id
+
+
+class MArgList(object):
+    def __init__(self, arg_list=()):
+        self.arg_list = list(arg_list)
+
+    def length(self):
+        return len(self.arg_list)
+
+    def asString(self, index):
+        return str(self.arg_list[index])
+
+
+class MPxCommand(object):
+    def __init__(self):
+        pass
+
+    def isUndoable(self):
+        return False
+
+
+class MFnPlugin(object):
+    def __init__(self, plugin_obj=None, vendor="", version="", api_version="Any"):
+        self.plugin_obj = plugin_obj
+
+    def registerCommand(self, command_name, creator, syntax_creator=None):
+        register_command(command_name, creator)
+
+    def deregisterCommand(self, command_name):
+        SCENE.command_dict.pop(command_name, None)
+        if hasattr(CMDS_MODULE, command_name):
+            delattr(CMDS_MODULE, command_name)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Modules
+# ----------------------------------------------------------------------------------------------------------------------
+COMMAND_NAME_LIST = ["createNode", "ls", "nodeType", "objExists", "select", "listRelatives", "listConnections",
+                     "parent", "group", "duplicate", "delete", "rename", "getAttr", "setAttr", "connectAttr",
+                     "disconnectAttr", "isConnected", "addAttr", "deleteAttr", "renameAttr", "listAttr", "attributeQuery", "xform", "move", "rotate", "scale", "makeIdentity",
+                     "joint", "curve", "circle", "nurbsPlane", "cluster", "spaceLocator", "distanceDimension",
+                     "pointConstraint", "orientConstraint", "parentConstraint", "scaleConstraint", "aimConstraint",
+                     "poleVectorConstraint", "ikHandle", "file", "undoInfo", "undo", "warning", "refresh", "dgdirty",
+                     "loadPlugin", "pluginInfo", "autoKeyframe", "evaluationManager", "currentUnit", "about"]
+OPENMAYA_NAME_LIST = ["MVector", "MPoint", "MFn", "MObject", "MObjectHandle", "MSelectionList", "MDagPath", "MPlug",
+                      "MFnDependencyNode", "MFnUnitAttribute", "MFnNumericAttribute", "MFnNumericData", "MAngle",
+                      "MDistance", "MFnNurbsCurveData", "MFnNurbsCurve", "MDGModifier", "MDagModifier",
+                      "MUuid", "MMessage", "MDGMessage", "MArgList", "MPxCommand", "MFnPlugin"]
+
+
+def create_module(module_name, attr_dict):
+    module = types.ModuleType(module_name)
+    module.__dict__.update(attr_dict)
+    return module
+
+
+CMDS_MODULE = create_module("maya.cmds", dict((name, globals()[name]) for name in COMMAND_NAME_LIST))
+OPENMAYA_MODULE = create_module("maya.api.OpenMaya", dict((name, globals()[name]) for name in OPENMAYA_NAME_LIST))
+STANDALONE_MODULE = create_module("maya.standalone", {"initialize": lambda name="python": None,
+                                                      "uninitialize": lambda: None})
+API_MODULE = create_module("maya.api", {"OpenMaya": OPENMAYA_MODULE, "__path__": []})
+MAYA_MODULE = create_module("maya", {"cmds": CMDS_MODULE, "api": API_MODULE, "standalone": STANDALONE_MODULE,
+                                     "__path__": []})
+
+
+def install():
+    """
+    Register the stand-in as the maya modules, the project modules imported after this call use it.
+    """
+    for module_name, module in [("maya", MAYA_MODULE), ("maya.cmds", CMDS_MODULE), ("maya.api", API_MODULE),
+                                ("maya.api.OpenMaya", OPENMAYA_MODULE), ("maya.standalone", STANDALONE_MODULE)]:
+        sys.modules[module_name] = module
+    return CMDS_MODULE
+
+
+def uninstall():
+    for module_name in MODULE_NAME_LIST:
+        sys.modules.pop(module_name, None)
+
+
+def reset():
+    """
+    Start a new scene and clear the recorded calls.
+    """
+    new_scene()
+    RECORDER.reset()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Offline build
+# ----------------------------------------------------------------------------------------------------------------------
+def get_phase_report(start_call_index, start_time, start_node_count_dict):
+    command_count_dict = collections.defaultdict(int)
+    for command_name, duration in RECORDER.call_log[start_call_index:]:
+        command_count_dict[command_name] += 1
+
+    node_count_dict = {}
+    for node_type, count in RECORDER.created_node_dict.items():
+        new_count = count - start_node_count_dict.get(node_type, 0)
+        if new_count:
+            node_count_dict[node_type] = new_count
+
+    return {"time": TIMER() - start_time,
+            "command_count": len(RECORDER.call_log) - start_call_index,
+            "commands": dict(command_count_dict),
+            "created_node_count": sum(node_count_dict.values()),
+            "created_nodes_by_type": node_count_dict}
+
+
+def build_rig_offline(placement_options=None, rig_options=None, character_name="offline", jnt_pos_dict=None,
+                      scene_path=None):
+    """
+    Run the joint placement and create_rig with the stand-in, return the commands and the nodes of every phase and
+    of the whole build.
+    """
+    install()
+    reset()
+    import joint_placement_helper
+    import auto_rigger
+
+    phase_dict = collections.OrderedDict()
+
+    def run_phase(phase_name, func, *args, **kwargs):
+        start_call_index = len(RECORDER.call_log)
+        start_node_count_dict = dict(RECORDER.created_node_dict)
+        start_time = TIMER()
+        result = func(*args, **kwargs)
+        phase_dict[phase_name] = get_phase_report(start_call_index, start_time, start_node_count_dict)
+        return result
+
+    jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
+    run_phase("create_temp_skeleton", jnt_placement_helper.create_temp_skeleton, character_name=character_name,
+              jnt_pos_dict=jnt_pos_dict, **(placement_options or {}))
+    rig_grp, bind_jnt_info_dict = run_phase("finish_jnt_placement", jnt_placement_helper.finish_jnt_placement)
+
+    rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
+    run_phase("create_rig", rigger.create_rig, **(rig_options or {}))
+
+    if scene_path is not None:
+        CMDS_MODULE.file(rename=scene_path)
+        CMDS_MODULE.file(save=True, force=True)
+
+    report = RECORDER.get_report()
+    report["phases"] = phase_dict
+    return report
+
+
+def split_options(option_dict):
+    """
+    Split one option dictionary to the joint placement options and the create_rig options.
+    """
+    placement_option_list = ["finger_count", "toe_count", "symmetry", "bake_symmetry"]
+    placement_options = dict((key, value) for key, value in option_dict.items() if key in placement_option_list)
+    rig_options = dict((key, value) for key, value in option_dict.items()
+                       if key not in ["symmetry", "bake_symmetry"])
+    return placement_options, rig_options
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Checks
+# ----------------------------------------------------------------------------------------------------------------------
+# Option sets of the mirror build check, the digits, the feet and the compact limbs are mirrored
+MIRROR_CHECK_OPTION_LIST = [{"ik_leg": True, "toe_count": 2},
+                            {"finger_count": 3, "lower_arm_twist_count": 2, "compact_twist": True},
+                            {"ik_leg": True, "fk_leg": False, "compact_blend": True}]
+# Option grid of the cost prediction check, every step and strategy of the plan is built by one of them at least
+COST_CHECK_OPTION_LIST = [{}, {"ik_leg": True, "toe_count": 2},
+                          {"finger_count": 3, "compact_twist": True, "lower_arm_twist_count": 2},
+                          {"ik_leg": True, "fk_leg": False, "compact_blend": True},
+                          {"light_spine": True, "finger_count": 7, "spine_jnt_count": 7, "neck_jnt_count": 4},
+                          {"ik_arm": False, "stretch_leg": False, "upper_leg_twist_count": 1},
+                          {"mirror_behavior": False, "compact_blend": True, "ik_leg": True},
+                          {"fk_arm": False, "stretch_arm": False, "use_api_modifier": True},
+                          {"mirror_build": True, "ik_leg": True, "toe_count": 1}]
+# Plan operations run by one command each, the other operations are batched or split by the builder
+COST_CHECK_COMMAND_DICT = {"connect": "connectAttr", "addAttr": "addAttr"}
+# Digit counts of the prepared build check, fewer and more fingers than the default and toes
+PREPARED_BUILD_CHECK_OPTION_LIST = [{"finger_count": 3}, {"finger_count": 7, "toe_count": 3}, {"toe_count": 1}]
+
+
+def get_world_matrix_dict():
+    """
+    World matrices of the transforms of the scene by long name, the matrices are read in one query.
+    """
+    EVALUATION_STATE["depth"] += 1
+    try:
+        return dict((SCENE.get_full_name(node), get_world_matrix(node)) for node in SCENE.node_list
+                    if node.is_transform)
+    finally:
+        EVALUATION_STATE["depth"] -= 1
+        EVALUATION_CACHE.clear()
+
+
+def get_world_cv_dict():
+    """
+    World positions of the curve points of the scene by the long name of the curve shape.
+    """
+    EVALUATION_STATE["depth"] += 1
+    try:
+        return dict((SCENE.get_full_name(node), [point_mat_mult(cv, get_world_matrix(node.parent))
+                                                 for cv in node.cv_list])
+                    for node in SCENE.node_list if node.cv_list and node.parent is not None)
+    finally:
+        EVALUATION_STATE["depth"] -= 1
+        EVALUATION_CACHE.clear()
+
+
+def compare_world_cvs(cv_dict_a, cv_dict_b, tolerance=1e-3):
+    """
+    Long names of the curve shapes missing from one of the scenes or shaped differently.
+    """
+    diff_list = sorted(set(cv_dict_a) ^ set(cv_dict_b))
+    for name in sorted(set(cv_dict_a) & set(cv_dict_b)):
+        cv_list_a, cv_list_b = cv_dict_a[name], cv_dict_b[name]
+        if len(cv_list_a) != len(cv_list_b) or [i for cv_a, cv_b in zip(cv_list_a, cv_list_b) for i in range(3)
+                                                if abs(cv_a[i] - cv_b[i]) > tolerance]:
+            diff_list.append(name)
+    return diff_list
+
+
+def compare_world_matrices(matrix_dict_a, matrix_dict_b, tolerance=1e-3):
+    """
+    Long names of the transforms missing from one of the scenes or placed differently.
+    """
+    diff_list = sorted(set(matrix_dict_a) ^ set(matrix_dict_b))
+    for name in sorted(set(matrix_dict_a) & set(matrix_dict_b)):
+        mat_a, mat_b = matrix_dict_a[name], matrix_dict_b[name]
+        if [i for i in range(4) for j in range(4) if abs(mat_a[i][j] - mat_b[i][j]) > tolerance]:
+            diff_list.append(name)
+    return diff_list
+
+
+def check_mirror_build(option_dict=None):
+    """
+    Build the rig with and without mirror_build, return the transforms whose world matrices differ and the curves
+    shaped differently. The right side copies of the mirror build should look like the right side built from the
+    right joints.
+    """
+    placement_options, rig_options = split_options(option_dict or {})
+    matrix_dict_list = []
+    cv_dict_list = []
+    for mirror_build in [False, True]:
+        build_rig_offline(placement_options=placement_options, rig_options=dict(rig_options, mirror_build=mirror_build))
+        matrix_dict_list.append(get_world_matrix_dict())
+        cv_dict_list.append(get_world_cv_dict())
+    return compare_world_matrices(*matrix_dict_list) + compare_world_cvs(*cv_dict_list)
+
+
+def check_prepared_build(option_dict=None):
+    """
+    Build the rig like the UI does, the orientation input is read and solved by prepare_build before the build. Return
+    the failures: the error of the preparation or of the build, or the orientation input not matching the one of the
+    orientation step, the prepared orientation would be solved again.
+    """
+    install()
+    reset()
+    import joint_placement_helper
+    import auto_rigger
+
+    placement_options, rig_options = split_options(option_dict or {})
+    jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
+    jnt_placement_helper.create_temp_skeleton(character_name="offline", **placement_options)
+    rig_grp, bind_jnt_info_dict = jnt_placement_helper.finish_jnt_placement()
+    rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
+
+    failure_list = []
+    try:
+        rigger.set_digit_root_keys(finger_count=rig_options.get("finger_count", 5),
+                                   toe_count=rig_options.get("toe_count", 0))
+        orientation_input = rigger.get_orientation_input(mirror_behavior=rig_options.get("mirror_behavior", True))
+        plan = rigger.prepare_build(rig_options, orientation_input=orientation_input)
+        for step in rigger.iter_create_rig(plan, session_per_step=True):
+            if step.name == "groups" and rigger.get_orientation_input(
+                    mirror_behavior=rig_options.get("mirror_behavior", True)) != orientation_input:
+                failure_list.append("prepared orientation input doesn't match")
+    except Exception as e:
+        failure_list.append("{0}: {1}".format(type(e).__name__, e))
+    return failure_list
+
+
+def get_node_type_count_dict(node_list=None):
+    """
+    Count of the nodes of the scene, or of the node_list nodes, per node type.
+    """
+    node_count_dict = collections.defaultdict(int)
+    for node in SCENE.node_list if node_list is None else node_list:
+        node_count_dict[node.node_type] += 1
+    return node_count_dict
+
+
+def compare_counts(label, predicted_dict, built_dict):
+    """
+    Return a failure for every key counted differently, "label key: predicted != built".
+    """
+    return ["{0} {1}: {2} != {3}".format(label, key, predicted_dict.get(key, 0), built_dict.get(key, 0))
+            for key in sorted(set(predicted_dict) | set(built_dict))
+            if predicted_dict.get(key, 0) != built_dict.get(key, 0)]
+
+
+def check_cost_prediction(option_dict=None):
+    """
+    Build the rig and compare it with the create_rig dry run: the node count of the whole rig per node type, the
+    nodes created by every step, and the COST_CHECK_COMMAND_DICT operations of every step. A mirror build copies the
+    right side and the modifier backend queues the operations instead of running their commands, only their nodes
+    are compared. Return the failures.
+    """
+    install()
+    reset()
+    import joint_placement_helper
+    import auto_rigger
+
+    placement_options, rig_options = split_options(option_dict or {})
+    jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
+    jnt_placement_helper.create_temp_skeleton(character_name="offline", **placement_options)
+    rig_grp, bind_jnt_info_dict = jnt_placement_helper.finish_jnt_placement()
+    rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
+
+    cost_report = rigger.create_rig(dry_run=True, **rig_options)
+    plan_options = dict((key, value) for key, value in rig_options.items() if key != "use_api_modifier")
+    plan = rigger.compile_build_plan(**plan_options)
+    start_count_dict = get_node_type_count_dict()
+
+    failure_list = []
+    call_index = len(RECORDER.call_log)
+    for step in rigger.iter_create_rig(plan, use_api_modifier=rig_options.get("use_api_modifier", False)):
+        step_uuid_list = rigger.step_record_dict.get(step.name, {}).get("node_list", [])
+        step_node_list = [SCENE.uuid_index[uuid] for uuid in step_uuid_list if uuid in SCENE.uuid_index]
+        created_count_dict = collections.defaultdict(int)
+        for op in step.op_list:
+            if op.op_type in ["create", "constrain"]:
+                created_count_dict[op.node_type] += 1
+        failure_list += compare_counts(step.name, created_count_dict, get_node_type_count_dict(step_node_list))
+
+        command_count_dict = collections.defaultdict(int)
+        for command_name, duration in RECORDER.call_log[call_index:]:
+            command_count_dict[command_name] += 1
+        call_index = len(RECORDER.call_log)
+        if not (rig_options.get("mirror_build") or rig_options.get("use_api_modifier")):
+            op_count_dict = step.get_op_count_dict()
+            failure_list += compare_counts(step.name, dict((op_type, op_count_dict.get(op_type, 0))
+                                                           for op_type in COST_CHECK_COMMAND_DICT),
+                                           dict((op_type, command_count_dict[command_name])
+                                                for op_type, command_name in COST_CHECK_COMMAND_DICT.items()))
+
+    end_count_dict = get_node_type_count_dict()
+    built_count_dict = dict((node_type, count - start_count_dict.get(node_type, 0))
+                            for node_type, count in end_count_dict.items())
+    failure_list += compare_counts("rig", cost_report["nodes_by_type"], built_count_dict)
+    return failure_list
+
+
+def run_checks():
+    """
+    Run the offline checks of every option set, return [(check name, options, failures)] of the failed checks.
+    """
+    failure_list = []
+    for option_dict in MIRROR_CHECK_OPTION_LIST:
+        diff_list = check_mirror_build(option_dict)
+        if diff_list:
+            failure_list.append(("mirror_build", option_dict, diff_list))
+    for option_dict in COST_CHECK_OPTION_LIST:
+        cost_failure_list = check_cost_prediction(option_dict)
+        if cost_failure_list:
+            failure_list.append(("cost_prediction", option_dict, cost_failure_list))
+    for option_dict in PREPARED_BUILD_CHECK_OPTION_LIST:
+        prepare_failure_list = check_prepared_build(option_dict)
+        if prepare_failure_list:
+            failure_list.append(("prepared_build", option_dict, prepare_failure_list))
+    return failure_list
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["check"]:
+    check_failure_list = run_checks()
+    for check_name, check_options, failures in check_failure_list:
+        print("{0} {1}: {2}".format(check_name, json.dumps(check_options, sort_keys=True), failures))
+    print("{0} check(s) failed".format(len(check_failure_list)) if check_failure_list else "All checks passed")
+    sys.exit(1 if check_failure_list else 0)
+
+if __name__ == "__main__":
+    placement_options, rig_options = split_options(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {})
+    report = build_rig_offline(placement_options=placement_options, rig_options=rig_options)
+    report.pop("commands")
+    print(json.dumps(report, indent=2, sort_keys=True))
@@ -0,0 +1,112 @@
+"""
+Analytic joint orientation solver. Computes the joint orientation of the whole skeleton from the placed joint
+positions in one pass, instead of orienting the joints one by one with temporary aim constraints in the scene.
+"""
+import rig_math
+
+AIM_RULE = "aim"
+MATCH_RULE = "match"
+WORLD_RULE = "world"
+
+# World direction of the secondary(y) axis for each secondary axis orient option
+SECONDARY_AXIS_DICT = {"xup": (1.0, 0.0, 0.0), "xdown": (-1.0, 0.0, 0.0),
+                       "yup": (0.0, 1.0, 0.0), "ydown": (0.0, -1.0, 0.0),
+                       "zup": (0.0, 0.0, 1.0), "zdown": (0.0, 0.0, -1.0)}
+
+
+def aim_rule(target_key, secondary_axis="yup"):
+    """
+    The joint x axis aims to the target joint, the y axis points to the secondary axis world direction.
+    """
+    return AIM_RULE, target_key, secondary_axis
+
+
+def match_rule(target_key):
+    """
+    The joint uses the same world orientation as the target joint.
+    """
+    return MATCH_RULE, target_key, None
+
+
+def world_rule():
+    """
+    The joint keeps the world orientation.
+    """
+    return WORLD_RULE, None, None
+
+
+def solve_world_orientations(pos_dict, rule_dict, flip_key_list=()):
+    """
+    Return a dictionary of world rotation matrices, one for each joint in pos_dict. Joints without a rule keep the
+    world orientation, joints in flip_key_list are rotated 180 degrees around their z axis(mirror behavior).
+    """
+    world_rot_dict = {}
+
+    # Solve all the aimed joints in one batch
+    aim_key_list = []
+    aim_vec_list = []
+    up_vec_list = []
+    for jnt_key, (rule_type, target_key, secondary_axis) in rule_dict.items():
+        if rule_type == AIM_RULE:
+            aim_key_list.append(jnt_key)
+            aim_vec_list.append(rig_math.vec_sub(pos_dict[target_key], pos_dict[jnt_key]))
+            up_vec_list.append(SECONDARY_AXIS_DICT[secondary_axis])
+
+    for jnt_key, rot_mat in zip(aim_key_list, rig_math.aim_matrices(aim_vec_list, up_vec_list)):
+        world_rot_dict[jnt_key] = rot_mat
+
+    def resolve(jnt_key, visited):
+        if jnt_key in world_rot_dict:
+            return world_rot_dict[jnt_key]
+        rule_type, target_key, secondary_axis = rule_dict.get(jnt_key, world_rule())
+        if rule_type == MATCH_RULE and target_key not in visited:
+            visited.add(jnt_key)
+            rot_mat = resolve(target_key, visited)
+        else:
+            rot_mat = rig_math.IDENTITY_MATRIX
+        world_rot_dict[jnt_key] = [list(row) for row in rot_mat]
+        return world_rot_dict[jnt_key]
+
+    for jnt_key in pos_dict:
+        resolve(jnt_key, set())
+
+    # The flip is applied on top of the solved orientation, matched joints copy the orientation before flipping
+    for jnt_key in flip_key_list:
+        world_rot_dict[jnt_key] = rig_math.mat_mult(rig_math.FLIP_Z_MATRIX, world_rot_dict[jnt_key])
+
+    return world_rot_dict
+
+
+def solve_local_transforms(pos_dict, world_rot_dict, parent_dict):
+    """
+    Convert world positions and rotations to joint translate and joint orient values relative to the parent joints.
+    Joints without parent are relative to the world. Return two dictionaries, translate and joint orient.
+    """
+    translate_dict = {}
+    local_rot_key_list = []
+    local_rot_list = []
+
+    for jnt_key, pos in pos_dict.items():
+        parent_key = parent_dict.get(jnt_key)
+        if parent_key is None:
+            translate_dict[jnt_key] = list(pos)
+            local_rot_list.append(world_rot_dict[jnt_key])
+        else:
+            parent_inverse = rig_math.mat_transpose(world_rot_dict[parent_key])
+            offset = rig_math.vec_sub(pos, pos_dict[parent_key])
+            translate_dict[jnt_key] = rig_math.vec_mat_mult(offset, parent_inverse)
+            local_rot_list.append(rig_math.mat_mult(world_rot_dict[jnt_key], parent_inverse))
+        local_rot_key_list.append(jnt_key)
+
+    orient_dict = dict(zip(local_rot_key_list, rig_math.matrices_to_euler_xyz(local_rot_list)))
+
+    return translate_dict, orient_dict
+
+
+def solve_skeleton(pos_dict, parent_dict, rule_dict, flip_key_list=()):
+    """
+    Solve the joint orientation of the whole skeleton. pos_dict holds the joint positions, parent_dict holds the
+    parent joint key of each joint(or None). Return the translate and joint orient dictionaries.
+    """
+    world_rot_dict = solve_world_orientations(pos_dict, rule_dict, flip_key_list=flip_key_list)
+    return solve_local_transforms(pos_dict, world_rot_dict, parent_dict)
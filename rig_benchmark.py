@@ -0,0 +1,481 @@
+"""
+Parametric benchmark of the skeleton and rig build. Every sweep changes one option across its UI range while the
+other options keep their default value, and every point builds the temp skeleton, finishes the joint placement and
+creates the rig, then the rig is evaluated by pulling the joint matrices after dirtying the graph. The wall time, the
+maya.cmds calls and the created nodes of every phase are recorded.
+
+The points are built in a mayapy process when one is found, otherwise in this process with the offline maya.cmds
+stand-in, so the command and node counts can be tracked without Maya.
+
+Usage:
+    python rig_benchmark.py --sweep finger_count --sweep toe_count --output bench.json
+    python rig_benchmark.py --baseline bench_baseline.json --save-baseline
+    python rig_benchmark.py --offline --repeat 3 --baseline bench_baseline.json
+    python rig_benchmark.py --sweep spine_jnt_count --option light_spine=true --output bench_light_spine.json
+    python rig_benchmark.py --sweep finger_count --session-gain
+
+A sweep is flagged when a metric grows super-linearly with the swept option(the log-log slope of the metric growth
+against the option growth is above --max-exponent), and a point is flagged when it is slower or creates more
+commands or nodes than the same point of the baseline file. With --session-gain every point is also built without the
+build session(refresh, auto-key and evaluation manager left as they are), and the time the session saved is reported.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import subprocess
+import tempfile
+import shutil
+from distutils.spawn import find_executable
+
+FOLDER_PATH = os.path.abspath(os.path.dirname(__file__))
+
+MAYAPY_ENV_NAME = "MAYAPY"
+DEF_MAYAPY = "mayapy"
+BACKEND_MAYA = "maya"
+BACKEND_OFFLINE = "offline"
+
+PHASE_LIST = ["create_temp_skeleton", "finish_jnt_placement", "create_rig", "evaluate_rig"]
+METRIC_LIST = ["time", "command_count", "node_count"]
+# Phases run in a build session
+SESSION_PHASE_LIST = ["create_temp_skeleton", "create_rig"]
+
+# The option values of every sweep, within the ranges of the UI spin boxes
+TWIST_OPTION_LIST = ["upper_arm_twist_count", "lower_arm_twist_count", "upper_leg_twist_count",
+                     "lower_leg_twist_count"]
+SWEEP_DICT = {"spine_jnt_count": [3, 5, 9, 15, 23, 31],
+              "neck_jnt_count": [3, 5, 9, 15, 23, 31],
+              "finger_count": [1, 3, 5, 10, 20, 30],
+              "toe_count": [0, 1, 5, 10, 18, 26],
+              "twist_count": [0, 1, 3, 8, 15, 30]}
+SWEEP_ORDER_LIST = ["spine_jnt_count", "neck_jnt_count", "finger_count", "toe_count", "twist_count"]
+
+DEF_REPEAT_CNT = 1
+# Graph evaluations of the evaluate_rig phase
+DEF_EVAL_CNT = 5
+DEF_MAX_EXPONENT = 1.25
+DEF_TIME_TOLERANCE = 0.25
+# Time differences under this are noise, not regressions
+MIN_TIME_DIFF = 0.05
+
+WORKER_CRASH_ERR = "Benchmark worker exited without a result, return code: {0}\n{1}"
+OPTION_FORMAT_ERR = "Rig option must be NAME=VALUE: {0}"
+
+
+def get_point_options(sweep_name, value):
+    """
+    Return the joint placement and create_rig options of a sweep point.
+    """
+    if sweep_name == "twist_count":
+        option_dict = dict((option_name, value) for option_name in TWIST_OPTION_LIST)
+    else:
+        option_dict = {sweep_name: value}
+
+    placement_options = dict((key, value) for key, value in option_dict.items() if key in ["finger_count", "toe_count"])
+    return placement_options, option_dict
+
+
+def get_point_list(sweep_name_list=None, extra_rig_options=None, eval_count=DEF_EVAL_CNT):
+    """
+    Return the benchmark points of the sweeps, all the sweeps by default. The extra create_rig options are used on
+    every point, to compare the build modes.
+    """
+    point_list = []
+    for sweep_name in (sweep_name_list or SWEEP_ORDER_LIST):
+        for value in SWEEP_DICT[sweep_name]:
+            placement_options, rig_options = get_point_options(sweep_name, value)
+            rig_options.update(extra_rig_options or {})
+            point_list.append({"sweep": sweep_name,
+                               "value": value,
+                               "placement_options": placement_options,
+                               "rig_options": rig_options,
+                               "eval_count": eval_count})
+    return point_list
+
+
+def get_point_key(point):
+    return "{0}={1}".format(point["sweep"], point["value"])
+
+
+def parse_rig_option(option_str):
+    """
+    Return the name and value of a NAME=VALUE command line option, the value is read as json when possible.
+    """
+    if "=" not in option_str:
+        raise argparse.ArgumentTypeError(OPTION_FORMAT_ERR.format(option_str))
+    option_name, value_str = option_str.split("=", 1)
+    try:
+        value = json.loads(value_str)
+    except ValueError:
+        value = value_str
+    return option_name, value
+
+
+def evaluate_rig(eval_count=DEF_EVAL_CNT):
+    """
+    Dirty the whole graph and pull the world matrix of every joint, eval_count times. Return the number of pulled
+    joints.
+    """
+    import maya.cmds as mc
+
+    jnt_list = mc.ls(type="joint", long=True) or []
+    for i in range(eval_count):
+        mc.dgdirty(allPlugs=True)
+        for jnt in jnt_list:
+            mc.getAttr(jnt + ".worldMatrix[0]")
+    return len(jnt_list)
+
+
+def measure_point(point, repeat_count=DEF_REPEAT_CNT):
+    """
+    Build the point in the current maya session, return the metrics of every phase. The point is built repeat_count
+    times and the fastest run is kept, the command and node counts are the same on every run.
+    """
+    import maya.cmds as mc
+    import joint_placement_helper
+    import auto_rigger
+    import build_profiler
+
+    best_phase_dict = None
+    for i in range(repeat_count):
+        mc.file(new=True, force=True)
+
+        profiler = build_profiler.BuildProfiler(log=False)
+        profiler.start()
+        try:
+            profiler.start_stage("create_temp_skeleton")
+            jnt_placement_helper = joint_placement_helper.JointPlacementHelper()
+            jnt_placement_helper.create_temp_skeleton(character_name="bench",
+                                                      managed_session=point.get("managed_session", True),
+                                                      **point["placement_options"])
+
+            profiler.start_stage("finish_jnt_placement")
+            rig_grp, bind_jnt_info_dict = jnt_placement_helper.finish_jnt_placement()
+
+            profiler.start_stage("create_rig")
+            rigger = auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict)
+            rigger.create_rig(managed_session=point.get("managed_session", True), **point["rig_options"])
+
+            profiler.start_stage("evaluate_rig")
+            evaluate_rig(eval_count=point.get("eval_count", DEF_EVAL_CNT))
+        finally:
+            profiler.stop()
+
+        phase_dict = dict((stage["name"], dict((metric, stage[metric]) for metric in METRIC_LIST))
+                          for stage in profiler.get_report()["stages"])
+        if best_phase_dict is None:
+            best_phase_dict = phase_dict
+        else:
+            for phase_name, metric_dict in phase_dict.items():
+                best_metric_dict = best_phase_dict[phase_name]
+                best_metric_dict["time"] = min(best_metric_dict["time"], metric_dict["time"])
+
+    return best_phase_dict
+
+
+def measure_point_list(point_list, repeat_count=DEF_REPEAT_CNT):
+    """
+    Measure all the points in the current maya session, a failed point keeps its error instead of the metrics.
+    """
+    import traceback
+
+    result_list = []
+    for point in point_list:
+        result = {"sweep": point["sweep"], "value": point["value"], "phases": None, "error": None}
+        try:
+            result["phases"] = measure_point(point, repeat_count=repeat_count)
+        except Exception:
+            result["error"] = traceback.format_exc()
+        result_list.append(result)
+    return result_list
+
+
+def find_mayapy(mayapy=None):
+    """
+    Return the mayapy executable path, or None if it can't be found.
+    """
+    if mayapy is None:
+        mayapy = os.environ.get(MAYAPY_ENV_NAME, DEF_MAYAPY)
+    if os.path.isfile(mayapy):
+        return mayapy
+    return find_executable(mayapy)
+
+
+def run_offline(point_list, repeat_count=DEF_REPEAT_CNT):
+    """
+    Measure the points in this process with the offline maya.cmds stand-in.
+    """
+    if FOLDER_PATH not in sys.path:
+        sys.path.insert(0, FOLDER_PATH)
+    import offline_maya
+    offline_maya.install()
+
+    result_list = []
+    for point in point_list:
+        # Keep the recorded call log from growing across the points
+        offline_maya.reset()
+        result_list.extend(measure_point_list([point], repeat_count=repeat_count))
+    return result_list
+
+
+def run_mayapy(point_list, mayapy, repeat_count=DEF_REPEAT_CNT):
+    """
+    Measure the points in a mayapy process, the process only pays the maya startup time once.
+    """
+    temp_dir = tempfile.mkdtemp(prefix="rig_benchmark_")
+    try:
+        point_file = os.path.join(temp_dir, "points.json")
+        result_file = os.path.join(temp_dir, "results.json")
+        with open(point_file, "w") as file_obj:
+            json.dump(point_list, file_obj)
+
+        process = subprocess.Popen([mayapy, os.path.abspath(__file__), "--worker", point_file, result_file,
+                                    "--repeat", str(repeat_count)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode("utf-8", "replace")
+
+        if not os.path.exists(result_file):
+            raise RuntimeError(WORKER_CRASH_ERR.format(process.returncode, output))
+        with open(result_file, "r") as file_obj:
+            return json.load(file_obj)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run_worker(point_file, result_file, repeat_count=DEF_REPEAT_CNT):
+    """
+    Worker process entry, initialize maya standalone and measure the points.
+    """
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+
+    if FOLDER_PATH not in sys.path:
+        sys.path.insert(0, FOLDER_PATH)
+
+    with open(point_file, "r") as file_obj:
+        point_list = json.load(file_obj)
+
+    result_list = measure_point_list(point_list, repeat_count=repeat_count)
+    with open(result_file, "w") as file_obj:
+        json.dump(result_list, file_obj, indent=2)
+
+    maya.standalone.uninitialize()
+
+
+def get_growth_exponent(value_list, metric_list, min_metric_diff=0):
+    """
+    Return the log-log slope of the metric growth against the value growth, measured from the first point. A linear
+    metric gives 1.0, a quadratic one 2.0. Growths under min_metric_diff are ignored, None if there are less than two
+    points that grew.
+    """
+    log_pair_list = []
+    for value, metric in zip(value_list[1:], metric_list[1:]):
+        value_diff = value - value_list[0]
+        metric_diff = metric - metric_list[0]
+        if value_diff > 0 and metric_diff > min_metric_diff:
+            log_pair_list.append((math.log(value_diff), math.log(metric_diff)))
+
+    if len(log_pair_list) < 2:
+        return None
+
+    x_mean = sum([x for x, y in log_pair_list]) / len(log_pair_list)
+    y_mean = sum([y for x, y in log_pair_list]) / len(log_pair_list)
+    x_var = sum([(x - x_mean) ** 2 for x, y in log_pair_list])
+    if x_var == 0:
+        return None
+    return sum([(x - x_mean) * (y - y_mean) for x, y in log_pair_list]) / x_var
+
+
+def analyze_growth(result_list, max_exponent=DEF_MAX_EXPONENT):
+    """
+    Return the growth exponent of every sweep, phase and metric, and the list of the super-linear ones.
+    """
+    growth_dict = {}
+    flag_list = []
+    for sweep_name in SWEEP_ORDER_LIST:
+        sweep_result_list = sorted([result for result in result_list
+                                    if result["sweep"] == sweep_name and result["phases"] is not None],
+                                   key=lambda result: result["value"])
+        if len(sweep_result_list) < 3:
+            continue
+
+        value_list = [result["value"] for result in sweep_result_list]
+        for phase_name in PHASE_LIST:
+            for metric in METRIC_LIST:
+                metric_list = [result["phases"][phase_name][metric] for result in sweep_result_list]
+                exponent = get_growth_exponent(value_list, metric_list,
+                                               min_metric_diff=MIN_TIME_DIFF if metric == "time" else 0)
+                if exponent is None:
+                    continue
+
+                growth_dict["{0}/{1}/{2}".format(sweep_name, phase_name, metric)] = exponent
+                if exponent > max_exponent:
+                    flag_list.append({"sweep": sweep_name, "phase": phase_name, "metric": metric,
+                                      "exponent": exponent})
+
+    return growth_dict, flag_list
+
+
+def compare_baseline(result_list, baseline_result_list, time_tolerance=DEF_TIME_TOLERANCE):
+    """
+    Return the regressions against the baseline results. The command and node counts are deterministic, so any
+    increase is a regression, the time has to be time_tolerance slower and over the noise threshold.
+    """
+    baseline_dict = dict((get_point_key(result), result) for result in baseline_result_list
+                         if result["phases"] is not None)
+
+    flag_list = []
+    for result in result_list:
+        baseline_result = baseline_dict.get(get_point_key(result))
+        if baseline_result is None or result["phases"] is None:
+            continue
+
+        for phase_name in PHASE_LIST:
+            # Baselines written before a phase was added don't have it
+            if phase_name not in baseline_result["phases"]:
+                continue
+
+            metric_dict = result["phases"][phase_name]
+            baseline_metric_dict = baseline_result["phases"][phase_name]
+            for metric in METRIC_LIST:
+                value = metric_dict[metric]
+                baseline_value = baseline_metric_dict[metric]
+                if metric == "time":
+                    is_regression = value > baseline_value * (1.0 + time_tolerance) and \
+                                    value - baseline_value > MIN_TIME_DIFF
+                else:
+                    is_regression = value > baseline_value
+
+                if is_regression:
+                    flag_list.append({"point": get_point_key(result), "phase": phase_name, "metric": metric,
+                                      "value": value, "baseline": baseline_value})
+
+    return flag_list
+
+
+def get_session_gain(result_list, unmanaged_result_list):
+    """
+    Return the time the build session saved on every point, against the build of the same point without the session.
+    """
+    gain_list = []
+    for result, unmanaged_result in zip(result_list, unmanaged_result_list):
+        if result["phases"] is None or unmanaged_result["phases"] is None:
+            continue
+
+        phase_dict = {}
+        for phase_name in SESSION_PHASE_LIST:
+            managed_time = result["phases"][phase_name]["time"]
+            unmanaged_time = unmanaged_result["phases"][phase_name]["time"]
+            phase_dict[phase_name] = {"managed": managed_time, "unmanaged": unmanaged_time,
+                                      "saved": unmanaged_time - managed_time}
+        gain_list.append({"point": get_point_key(result), "phases": phase_dict})
+
+    return gain_list
+
+
+def run_benchmark(sweep_name_list=None, repeat_count=DEF_REPEAT_CNT, offline=False, mayapy=None,
+                  baseline_path=None, max_exponent=DEF_MAX_EXPONENT, time_tolerance=DEF_TIME_TOLERANCE,
+                  extra_rig_options=None, eval_count=DEF_EVAL_CNT, session_gain=False):
+    """
+    Measure the sweeps and return the benchmark report, with the growth and baseline flags. If session_gain is True,
+    the points are also built without the build session, and the time the session saved is added to the report.
+    """
+    point_list = get_point_list(sweep_name_list, extra_rig_options=extra_rig_options, eval_count=eval_count)
+    run_point_list = list(point_list)
+    if session_gain:
+        run_point_list += [dict(point, managed_session=False) for point in point_list]
+
+    mayapy_path = None if offline else find_mayapy(mayapy)
+    start_time = time.time()
+    if mayapy_path is not None:
+        run_result_list = run_mayapy(run_point_list, mayapy_path, repeat_count=repeat_count)
+    else:
+        run_result_list = run_offline(run_point_list, repeat_count=repeat_count)
+    total_time = time.time() - start_time
+
+    result_list = run_result_list[:len(point_list)]
+    session_gain_list = get_session_gain(result_list, run_result_list[len(point_list):]) if session_gain else None
+
+    growth_dict, growth_flag_list = analyze_growth(result_list, max_exponent=max_exponent)
+
+    regression_flag_list = []
+    if baseline_path is not None and os.path.exists(baseline_path):
+        with open(baseline_path, "r") as file_obj:
+            baseline_report = json.load(file_obj)
+        regression_flag_list = compare_baseline(result_list, baseline_report["points"], time_tolerance=time_tolerance)
+
+    return {"backend": BACKEND_MAYA if mayapy_path is not None else BACKEND_OFFLINE,
+            "repeat_count": repeat_count,
+            "rig_options": extra_rig_options or {},
+            "total_time": total_time,
+            "points": result_list,
+            "failed_points": [get_point_key(result) for result in result_list if result["error"] is not None],
+            "growth": growth_dict,
+            "super_linear": growth_flag_list,
+            "regressions": regression_flag_list,
+            "session_gain": session_gain_list}
+
+
+def write_report(report, report_path):
+    with open(report_path, "w") as file_obj:
+        json.dump(report, file_obj, indent=2, sort_keys=True)
+    return report_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the skeleton and rig build across the option ranges.")
+    parser.add_argument("--sweep", action="append", choices=SWEEP_ORDER_LIST, help="Sweep to run, all by default.")
+    parser.add_argument("--repeat", type=int, default=DEF_REPEAT_CNT, help="Runs per point, the fastest is kept.")
+    parser.add_argument("--option", action="append", type=parse_rig_option, default=[], dest="rig_options",
+                        help="create_rig option used on every point, NAME=VALUE.")
+    parser.add_argument("--eval-count", type=int, default=DEF_EVAL_CNT,
+                        help="Graph evaluations per point in the evaluate_rig phase, 0 to skip it.")
+    parser.add_argument("--session-gain", action="store_true",
+                        help="Also build every point without the build session and report the time it saved.")
+    parser.add_argument("--offline", action="store_true", help="Use the offline stand-in even if mayapy is found.")
+    parser.add_argument("--mayapy", default=None, help="mayapy executable, $MAYAPY or mayapy by default.")
+    parser.add_argument("--output", default=None, help="Benchmark report file.")
+    parser.add_argument("--baseline", default=None, help="Baseline report file to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the report as the new baseline.")
+    parser.add_argument("--max-exponent", type=float, default=DEF_MAX_EXPONENT,
+                        help="Growth exponent over which a sweep is flagged as super-linear.")
+    parser.add_argument("--time-tolerance", type=float, default=DEF_TIME_TOLERANCE,
+                        help="Relative slowdown over which a point is flagged as a regression.")
+    parser.add_argument("--worker", nargs=2, metavar=("POINT_FILE", "RESULT_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        run_worker(args.worker[0], args.worker[1], repeat_count=args.repeat)
+        return 0
+
+    report = run_benchmark(sweep_name_list=args.sweep, repeat_count=args.repeat, offline=args.offline,
+                           mayapy=args.mayapy, baseline_path=None if args.save_baseline else args.baseline,
+                           max_exponent=args.max_exponent, time_tolerance=args.time_tolerance,
+                           extra_rig_options=dict(args.rig_options), eval_count=args.eval_count,
+                           session_gain=args.session_gain)
+
+    if args.output is not None:
+        write_report(report, args.output)
+    if args.save_baseline and args.baseline is not None:
+        write_report(report, args.baseline)
+
+    for flag in report["super_linear"]:
+        print("Super-linear: {sweep} {phase} {metric}, exponent {exponent:.2f}".format(**flag))
+    for flag in report["regressions"]:
+        print("Regression: {point} {phase} {metric}, {value} (baseline {baseline})".format(**flag))
+    for gain in report["session_gain"] or []:
+        print("Build session: {0} {1}".format(gain["point"], ", ".join(
+            "{0} saved {1:.3f}s of {2:.3f}s".format(phase_name, gain["phases"][phase_name]["saved"],
+                                                   gain["phases"][phase_name]["unmanaged"])
+            for phase_name in SESSION_PHASE_LIST)))
+    print("{0} points on {1} in {2:.1f}s, {3} failed, {4} super-linear, {5} regressions".format(
+        len(report["points"]), report["backend"], report["total_time"], len(report["failed_points"]),
+        len(report["super_linear"]), len(report["regressions"])))
+
+    return 0 if not (report["failed_points"] or report["super_linear"] or report["regressions"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Rig snapshot cache. Characters with the same bind joint positions and the same create_rig options get the same rig,
+so the rig built for the first character is stored as a scene fragment, and it is imported and renamed for the other
+characters instead of being built again.
+
+The cache key is a hash of the bind joint positions rounded to POS_DECIMALS, all the create_rig options with their
+default values filled in, and the source of the builder modules, so a rig built by older code is never reused. The
+cache folder holds one fragment file per key and an index file, the least recently used fragments are removed when
+the fragments take more space than the size cap.
+
+Several batch workers can share a cache folder, the fragments and the index are written to a temporary file and
+renamed. Concurrent workers can lose each other's last use time, it only changes the eviction order.
+
+Usage:
+    cache = rig_cache.RigCache("rig_cache", max_size=512*1024*1024)
+    cache_key = rig_cache.get_build_key(rig_cache.get_bind_jnt_positions(bind_jnt_info_dict), rig_options)
+    if cache.load_rig(cache_key, rig_grp) is None:
+        auto_rigger.AutoRigger(rig_grp=rig_grp, bind_jnt_info_dict=bind_jnt_info_dict).create_rig(**rig_options)
+        cache.store_rig(cache_key, rig_grp)
+"""
+import os
+import json
+import time
+import inspect
+import hashlib
+
+FOLDER_PATH = os.path.abspath(os.path.dirname(__file__))
+
+CACHE_VERSION = 1
+POS_DECIMALS = 3
+SEPARATOR = "_"
+PATH_SLASH = "|"
+INDEX_FILE_NAME = "index.json"
+FRAGMENT_EXT = ".ma"
+FRAGMENT_TYPE = "mayaAscii"
+DEF_MAX_SIZE = 1024*1024*1024
+
+# Modules building the rig, a change in any of them changes every cache key
+SOURCE_FILE_LIST = ["auto_rigger.py", "build_plan.py", "build_backend.py", "utility.py", "control_cuv_lib.py",
+                    "rig_math.py", "rig_mirror.py", "orient_solver.py", "node_registry.py", "auto_rig_modifier_cmd.py"]
+# create_rig arguments that don't change the built rig, the mirror build and the modifier backend only change how
+# the same rig is built(offline_maya.check_mirror_build)
+NON_BUILD_ARG_LIST = ["self", "dry_run", "profile", "profile_path", "profile_log", "managed_session", "disable_undo",
+                      "mirror_build", "use_api_modifier"]
+
+SOURCE_HASH = []
+
+# Error Msg
+UNKNOWN_OPTION_ERR = "Unknown create_rig option: {0}"
+
+
+def get_source_hash():
+    """
+    Return the hash of the builder module sources, computed once per process.
+    """
+    if not SOURCE_HASH:
+        source_hash = hashlib.sha1()
+        for file_name in SOURCE_FILE_LIST:
+            file_path = os.path.join(FOLDER_PATH, file_name)
+            if os.path.isfile(file_path):
+                with open(file_path, "rb") as file_obj:
+                    source_hash.update(file_obj.read())
+        SOURCE_HASH.append(source_hash.hexdigest())
+    return SOURCE_HASH[0]
+
+
+def get_rig_option_defaults():
+    """
+    Return the default value of every create_rig option.
+    """
+    import auto_rigger
+
+    get_arg_spec = getattr(inspect, "getfullargspec", None) or inspect.getargspec
+    arg_spec = get_arg_spec(auto_rigger.AutoRigger.create_rig)
+    default_list = arg_spec.defaults or ()
+    arg_list = arg_spec.args[len(arg_spec.args) - len(default_list):]
+    return dict((arg, default) for arg, default in zip(arg_list, default_list) if arg not in NON_BUILD_ARG_LIST)
+
+
+def normalize_rig_options(rig_options, default_dict=None):
+    """
+    Return all the create_rig options, options that are not given have their default value, so setting an option
+    to its default value gives the same key as not setting it.
+    """
+    if default_dict is None:
+        default_dict = get_rig_option_defaults()
+
+    option_dict = dict(default_dict)
+    for key, value in rig_options.items():
+        if key in NON_BUILD_ARG_LIST:
+            continue
+        if key not in default_dict:
+            raise ValueError(UNKNOWN_OPTION_ERR.format(key))
+        option_dict[key] = value
+    return option_dict
+
+
+def normalize_jnt_positions(jnt_pos_dict):
+    """
+    Round the joint positions, so positions which only differ by floating point noise give the same key.
+    """
+    # Adding 0.0 turns -0.0 into 0.0
+    return dict((jnt_key, [round(float(value), POS_DECIMALS) + 0.0 for value in jnt_pos])
+                for jnt_key, jnt_pos in jnt_pos_dict.items())
+
+
+def get_build_key(jnt_pos_dict, rig_options, default_dict=None):
+    """
+    Return the cache key of a rig, the hash of the bind joint positions, the create_rig options and the builder
+    source.
+    """
+    key_info = {"version": CACHE_VERSION,
+                "source": get_source_hash(),
+                "jnt_pos": normalize_jnt_positions(jnt_pos_dict),
+                "rig_options": normalize_rig_options(rig_options, default_dict=default_dict)}
+    return hashlib.sha1(json.dumps(key_info, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_bind_jnt_positions(bind_jnt_info_dict):
+    """
+    Return the world position of every bind joint returned by JointPlacementHelper.finish_jnt_placement.
+    """
+    import maya.cmds as mc
+
+    jnt_pos_dict = {}
+    for jnt_key, jnt_info in bind_jnt_info_dict.items():
+        jnt_pos_dict[jnt_key] = mc.xform(mc.ls(jnt_info["uuid"])[0], query=True, translation=True, worldSpace=True)
+    return jnt_pos_dict
+
+
+def replace_file(temp_path, file_path):
+    """
+    Move the temporary file over the file, os.rename can't replace a file on Windows.
+    """
+    try:
+        os.rename(temp_path, file_path)
+    except OSError:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        os.rename(temp_path, file_path)
+
+
+class RigCache(object):
+    def __init__(self, cache_dir, max_size=DEF_MAX_SIZE):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def get_index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    def get_fragment_path(self, cache_key):
+        return os.path.join(self.cache_dir, cache_key + FRAGMENT_EXT)
+
+    def load_index(self):
+        """
+        Return the cache index, {cache key: {"file", "size", "rig_grp", "last_used"}}. A missing or broken index is
+        an empty cache.
+        """
+        try:
+            with open(self.get_index_path(), "r") as file_obj:
+                return json.load(file_obj)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        temp_path = self.get_index_path() + ".{0}.tmp".format(os.getpid())
+        with open(temp_path, "w") as file_obj:
+            json.dump(index, file_obj, indent=1, sort_keys=True)
+        replace_file(temp_path, self.get_index_path())
+
+    def has_rig(self, cache_key):
+        return cache_key in self.load_index() and os.path.isfile(self.get_fragment_path(cache_key))
+
+    def load_rig(self, cache_key, rig_grp):
+        """
+        Replace the bind skeleton under rig_grp by the cached rig of the key, the cached nodes are renamed from the
+        cached character to the character of rig_grp. Return the new rig group, or None if the key is not cached and
+        the rig has to be built.
+        The cached rig has its own bind joints, the uuids of the old bind joint info dictionary are no longer valid.
+        """
+        import maya.cmds as mc
+
+        index = self.load_index()
+        cache_info = index.get(cache_key)
+        fragment_path = self.get_fragment_path(cache_key)
+        if cache_info is None or not os.path.isfile(fragment_path):
+            self.miss_count += 1
+            return None
+
+        rig_grp_name = rig_grp.split(PATH_SLASH)[-1]
+        cached_grp_name = cache_info["rig_grp"]
+        mc.delete(rig_grp)
+        new_node_list = mc.file(fragment_path, i=True, type=FRAGMENT_TYPE, returnNewNodes=True)
+
+        # Rename by uuid, renaming a parent changes the path of its children
+        new_rig_grp = None
+        for node_uuid in mc.ls(new_node_list, uuid=True):
+            node_name = mc.ls(node_uuid)[0]
+            leaf_name = node_name.split(PATH_SLASH)[-1]
+            if leaf_name == cached_grp_name or leaf_name.startswith(cached_grp_name + SEPARATOR):
+                node_name = mc.rename(node_name, rig_grp_name + leaf_name[len(cached_grp_name):], ignoreShape=True)
+            if leaf_name == cached_grp_name:
+                new_rig_grp = node_name
+
+        cache_info["last_used"] = time.time()
+        self.write_index(index)
+        self.hit_count += 1
+        return new_rig_grp
+
+    def store_rig(self, cache_key, rig_grp):
+        """
+        Export the rig under rig_grp with all its utility nodes as the fragment of the key, then remove the least
+        recently used fragments over the size cap. Return the fragment path.
+        """
+        import maya.cmds as mc
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        fragment_path = self.get_fragment_path(cache_key)
+        temp_path = os.path.join(self.cache_dir, "{0}_{1}_tmp{2}".format(cache_key, os.getpid(), FRAGMENT_EXT))
+        selection = mc.ls(selection=True)
+        mc.select(rig_grp, replace=True)
+        try:
+            mc.file(temp_path, exportSelected=True, type=FRAGMENT_TYPE, force=True, constructionHistory=True,
+                    channels=True, constraints=True, expressions=True, shader=True, preserveReferences=False)
+        finally:
+            if selection:
+                mc.select(selection, replace=True)
+            else:
+                mc.select(clear=True)
+        replace_file(temp_path, fragment_path)
+
+        # Read the index again, other workers may have changed it while the rig was built
+        index = self.load_index()
+        index[cache_key] = {"file": os.path.basename(fragment_path),
+                            "size": os.path.getsize(fragment_path),
+                            "rig_grp": rig_grp.split(PATH_SLASH)[-1],
+                            "last_used": time.time()}
+        self.evict(index, keep_key=cache_key)
+        self.write_index(index)
+        return fragment_path
+
+    def evict(self, index, keep_key=None):
+        """
+        Remove the least recently used fragments until the cache is under the size cap, the fragment of keep_key is
+        kept. Return the removed keys.
+        """
+        removed_key_list = [cache_key for cache_key in index
+                            if not os.path.isfile(self.get_fragment_path(cache_key))]
+        for cache_key in removed_key_list:
+            index.pop(cache_key)
+
+        total_size = sum(cache_info["size"] for cache_info in index.values())
+        for cache_key in sorted(index.keys(), key=lambda cache_key: index[cache_key]["last_used"]):
+            if total_size <= self.max_size:
+                break
+            if cache_key == keep_key:
+                continue
+            try:
+                os.remove(self.get_fragment_path(cache_key))
+            except OSError:
+                # Another worker may be importing it, try again on the next store
+                continue
+            total_size -= index.pop(cache_key)["size"]
+            removed_key_list.append(cache_key)
+
+        return removed_key_list
+
+    def clear(self):
+        index = self.load_index()
+        for cache_key in list(index.keys()):
+            if os.path.isfile(self.get_fragment_path(cache_key)):
+                os.remove(self.get_fragment_path(cache_key))
+            index.pop(cache_key)
+        self.write_index(index)
+
+    def stats(self):
+        """
+        Return the lookup counters of this process and the size of the cache folder.
+        """
+        index = self.load_index()
+        lookup_count = self.hit_count + self.miss_count
+        return {"hits": self.hit_count, "misses": self.miss_count,
+                "hit_rate": float(self.hit_count)/lookup_count if lookup_count else 0.0,
+                "fragment_count": len(index), "size": sum(cache_info["size"] for cache_info in index.values()),
+                "max_size": self.max_size}
@@ -0,0 +1,340 @@
+"""
+Static graph export and evaluation cost analysis of the generated rigs. The exporter walks the DAG nodes under the rig
+group and the DG nodes connected to them in the current maya session, and writes the nodes, their types, their DAG
+parents and the connections between them to a JSON file. The analyzer only reads the file, so rig variants can be
+compared without Maya.
+
+The analysis reports the node counts per type, the constraint counts, the longest dependency chain from the global
+control to the bind joints and the fan-out hot spots, the nodes driving the most other nodes.
+
+Usage:
+    python rig_graph.py bench_graph.json
+    python rig_graph.py ribbon_graph.json light_graph.json --top 5 --output graph_report.json
+"""
+import sys
+import json
+import argparse
+import collections
+
+GRAPH_VERSION = 1
+DAG_PATH_SLASH = "|"
+NAMESPACE_SEPARATOR = ":"
+SEPARATOR = "_"
+GLOBAL_CTR_NAME = "global"
+CONTROL_SUFFIX = "ctr"
+BIND_JNT_SUFFIX = "bnd"
+CONSTRAINT_TYPE_SUFFIX = "Constraint"
+
+DEF_HOT_SPOT_CNT = 10
+
+AXIS_LIST = ["X", "Y", "Z"]
+
+# Source attributes holding the matrices of the DAG parent, the dependency comes from the parent
+PARENT_MATRIX_ATTR_LIST = ["parentMatrix", "parentInverseMatrix"]
+# Source attributes that are not computed from the node inputs, reading them doesn't wait for the node evaluation
+STATIC_ATTR_LIST = ["message", "rotatePivot", "rotatePivotTranslate", "rotateOrder", "jointOrient"]
+# The other attributes of the transforms are channels, reading them only waits for the nodes driving them
+TRANSFORM_TYPE_LIST = ["transform", "joint"]
+TRANSFORM_OUTPUT_ATTR_LIST = ["matrix", "inverseMatrix", "worldMatrix", "worldInverseMatrix", "xformMatrix"]
+# DAG children that don't use the matrix of their parent, besides the constraints. The follicle shapes drive their parent
+PARENT_FREE_TYPE_LIST = ["follicle"]
+
+# Error Msg
+GRAPH_VERSION_ERR = "Unsupported rig graph version: {0}"
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Export, needs a maya session
+# ----------------------------------------------------------------------------------------------------------------------
+def get_node_name(plug):
+    return plug.split(".", 1)[0]
+
+
+def export_rig_graph(rig_grp, file_path=None):
+    """
+    Return the graph of the rig built under rig_grp, written to file_path if given. Default nodes and DAG nodes outside
+    the rig are left out, with their connections.
+    """
+    import maya.cmds as mc
+
+    default_node_set = set(mc.ls(defaultNodes=True) or [])
+
+    # DAG nodes, the full paths give the parents without querying every node
+    full_path_list = mc.ls(rig_grp, long=True) + list(reversed(mc.listRelatives(rig_grp, allDescendents=True,
+                                                                                 fullPath=True) or []))
+    name_dict = dict((full_path, mc.ls(full_path)[0]) for full_path in full_path_list)
+
+    node_list = []
+    node_set = set()
+    for full_path in full_path_list:
+        parent_path = full_path.rsplit(DAG_PATH_SLASH, 1)[0]
+        node_list.append({"name": name_dict[full_path],
+                          "type": mc.nodeType(full_path),
+                          "parent": name_dict.get(parent_path)})
+        node_set.add(name_dict[full_path])
+
+    # DG nodes connected to the rig, directly or through other DG nodes
+    edge_set = set()
+    skip_set = set(default_node_set)
+    queue = collections.deque(node["name"] for node in node_list)
+    while queue:
+        node = queue.popleft()
+        for want_source in [True, False]:
+            plug_list = mc.listConnections(node, source=want_source, destination=not want_source, connections=True,
+                                           plugs=True) or []
+            for own_plug, other_plug in zip(plug_list[::2], plug_list[1::2]):
+                other_node = get_node_name(other_plug)
+                if other_node in skip_set:
+                    continue
+                if other_node not in node_set:
+                    # DAG nodes have a path, the ones that are not under the rig group are not part of the rig
+                    if mc.ls(other_node, long=True)[0].startswith(DAG_PATH_SLASH):
+                        skip_set.add(other_node)
+                        continue
+                    node_list.append({"name": other_node, "type": mc.nodeType(other_node), "parent": None})
+                    node_set.add(other_node)
+                    queue.append(other_node)
+
+                edge_set.add((other_plug, own_plug) if want_source else (own_plug, other_plug))
+
+    graph = {"version": GRAPH_VERSION,
+             "rig_grp": name_dict[full_path_list[0]],
+             "nodes": node_list,
+             "edges": [list(edge) for edge in sorted(edge_set)]}
+
+    if file_path is not None:
+        write_rig_graph(graph, file_path)
+    return graph
+
+
+def write_rig_graph(graph, file_path):
+    with open(file_path, "w") as file_obj:
+        json.dump(graph, file_obj, indent=1)
+    return file_path
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Analysis, plain python
+# ----------------------------------------------------------------------------------------------------------------------
+def load_rig_graph(file_path):
+    with open(file_path, "r") as file_obj:
+        graph = json.load(file_obj)
+    if graph.get("version") != GRAPH_VERSION:
+        raise ValueError(GRAPH_VERSION_ERR.format(graph.get("version")))
+    return graph
+
+
+def get_attr_name(plug):
+    """
+    Return the leaf attribute of the plug without its index, "jnt.worldMatrix[0]" gives "worldMatrix".
+    """
+    return plug.split(".")[-1].split("[")[0]
+
+
+def get_leaf_name(node):
+    return node.split(DAG_PATH_SLASH)[-1].split(NAMESPACE_SEPARATOR)[-1]
+
+
+def find_global_ctr(graph):
+    """
+    Return the global control of the rig, None if the graph has none.
+    """
+    for node in graph["nodes"]:
+        name_part_list = get_leaf_name(node["name"]).split(SEPARATOR)
+        if node["type"] == "transform" and name_part_list[-1] == CONTROL_SUFFIX and GLOBAL_CTR_NAME in name_part_list:
+            return node["name"]
+    return None
+
+
+def get_bind_jnts(graph):
+    return [node["name"] for node in graph["nodes"]
+            if node["type"] == "joint" and get_leaf_name(node["name"]).endswith(SEPARATOR + BIND_JNT_SUFFIX)]
+
+
+def get_source_nodes(plug, node_dict, driver_dict):
+    """
+    Return the nodes the value of a source plug waits for. A transform channel waits for the nodes driving it and
+    nothing if it isn't driven, a parent matrix for the DAG parent and the other outputs for their own node.
+    """
+    node_name, attr_name = get_node_name(plug), get_attr_name(plug)
+    node = node_dict[node_name]
+    if attr_name in STATIC_ATTR_LIST:
+        return set()
+    if attr_name in PARENT_MATRIX_ATTR_LIST:
+        return {node["parent"]} if node["parent"] is not None else set()
+    if node["type"] not in TRANSFORM_TYPE_LIST or attr_name in TRANSFORM_OUTPUT_ATTR_LIST:
+        return {node_name}
+
+    # The channel, its compound parent and its axis children
+    channel_list = [attr_name] + [attr_name + axis for axis in AXIS_LIST]
+    if attr_name[-1] in AXIS_LIST:
+        channel_list.append(attr_name[:-1])
+
+    source_node_set = set()
+    for channel in channel_list:
+        for driver_plug in driver_dict.get((node_name, channel), []):
+            source_node_set.update(get_source_nodes(driver_plug, node_dict, driver_dict))
+    return source_node_set
+
+
+def get_dependency_dict(graph):
+    """
+    Return the node level dependencies of the graph, {node: set of the nodes evaluated after it}. A DAG child depends
+    on its parent, except the constraints and the follicles which get their matrices through connections. A connection
+    depends on the nodes its source plug waits for, so a node reading a channel of the transform it drives, like a
+    constraint or a stretch setup, doesn't form a cycle.
+    """
+    node_dict = dict((node["name"], node) for node in graph["nodes"])
+    dependency_dict = dict((name, set()) for name in node_dict)
+
+    for node in graph["nodes"]:
+        if node["parent"] is None or node["type"] in PARENT_FREE_TYPE_LIST or \
+                node["type"].endswith(CONSTRAINT_TYPE_SUFFIX):
+            continue
+        dependency_dict[node["parent"]].add(node["name"])
+
+    driver_dict = collections.defaultdict(list)
+    for source_plug, dest_plug in graph["edges"]:
+        driver_dict[(get_node_name(dest_plug), get_attr_name(dest_plug))].append(source_plug)
+
+    for source_plug, dest_plug in graph["edges"]:
+        dest_node = get_node_name(dest_plug)
+        for source_node in get_source_nodes(source_plug, node_dict, driver_dict):
+            if source_node != dest_node:
+                dependency_dict[source_node].add(dest_node)
+
+    return dependency_dict
+
+
+def get_longest_chain(dependency_dict, root_node, end_node_list):
+    """
+    Return the longest dependency chain from root_node to one of the end nodes as a node list, and the number of
+    nodes reached from the root that are in a dependency cycle and were left out. The chain is None if no end node is
+    reached.
+    """
+    # Nodes reached from the root
+    reached_set = {root_node}
+    stack = [root_node]
+    while stack:
+        for other_node in dependency_dict[stack.pop()]:
+            if other_node not in reached_set:
+                reached_set.add(other_node)
+                stack.append(other_node)
+
+    in_count_dict = dict((node, 0) for node in reached_set)
+    for node in reached_set:
+        for other_node in dependency_dict[node]:
+            in_count_dict[other_node] += 1
+
+    # Longest distances in topological order, the nodes in a cycle are never ready
+    distance_dict = {root_node: 0}
+    previous_dict = {}
+    ready_list = [root_node]
+    while ready_list:
+        node = ready_list.pop()
+        for other_node in dependency_dict[node]:
+            if distance_dict[node] + 1 > distance_dict.get(other_node, -1):
+                distance_dict[other_node] = distance_dict[node] + 1
+                previous_dict[other_node] = node
+            in_count_dict[other_node] -= 1
+            if in_count_dict[other_node] == 0:
+                ready_list.append(other_node)
+
+    cycle_node_count = len([node for node in reached_set if in_count_dict[node] > 0])
+
+    end_node_list = [node for node in end_node_list if node in distance_dict and in_count_dict[node] == 0]
+    if not end_node_list:
+        return None, cycle_node_count
+
+    chain = [max(end_node_list, key=lambda node: (distance_dict[node], node))]
+    while chain[-1] != root_node:
+        chain.append(previous_dict[chain[-1]])
+    return chain[::-1], cycle_node_count
+
+
+def get_fan_out_list(graph, count=DEF_HOT_SPOT_CNT):
+    """
+    Return the count nodes connected to the most other nodes, with the number of connected nodes and the source plug
+    with the most connections.
+    """
+    node_type_dict = dict((node["name"], node["type"]) for node in graph["nodes"])
+    dest_dict = collections.defaultdict(set)
+    plug_count_dict = collections.defaultdict(collections.Counter)
+    for source_plug, dest_plug in graph["edges"]:
+        source_node = get_node_name(source_plug)
+        dest_dict[source_node].add(get_node_name(dest_plug))
+        plug_count_dict[source_node][source_plug] += 1
+
+    fan_out_list = []
+    for node in sorted(dest_dict, key=lambda node: (-len(dest_dict[node]), node))[:count]:
+        plug, plug_count = sorted(plug_count_dict[node].items(), key=lambda item: (-item[1], item[0]))[0]
+        fan_out_list.append({"node": node,
+                             "type": node_type_dict[node],
+                             "fan_out": len(dest_dict[node]),
+                             "plug": plug,
+                             "plug_fan_out": plug_count})
+    return fan_out_list
+
+
+def analyze_rig_graph(graph, global_ctr=None, hot_spot_count=DEF_HOT_SPOT_CNT):
+    """
+    Return the cost report of the rig graph. The global control is found by its name if not given.
+    """
+    nodes_by_type = collections.Counter(node["type"] for node in graph["nodes"])
+    constraints_by_type = dict((node_type, count) for node_type, count in nodes_by_type.items()
+                               if node_type.endswith(CONSTRAINT_TYPE_SUFFIX))
+
+    if global_ctr is None:
+        global_ctr = find_global_ctr(graph)
+    chain, cycle_node_count = None, 0
+    if global_ctr is not None:
+        chain, cycle_node_count = get_longest_chain(get_dependency_dict(graph), global_ctr, get_bind_jnts(graph))
+
+    return {"rig_grp": graph["rig_grp"],
+            "node_count": len(graph["nodes"]),
+            "connection_count": len(graph["edges"]),
+            "nodes_by_type": dict(nodes_by_type),
+            "constraint_count": sum(constraints_by_type.values()),
+            "constraints_by_type": constraints_by_type,
+            "global_ctr": global_ctr,
+            "longest_chain": chain,
+            "longest_chain_length": len(chain) - 1 if chain is not None else None,
+            "cycle_node_count": cycle_node_count,
+            "fan_out": get_fan_out_list(graph, count=hot_spot_count)}
+
+
+def get_summary_line(file_path, report):
+    chain_end = report["longest_chain"][-1] if report["longest_chain"] is not None else None
+    return "{0}: {1} nodes, {2} connections, {3} constraints, longest chain {4} to {5}".format(
+        file_path, report["node_count"], report["connection_count"], report["constraint_count"],
+        report["longest_chain_length"], chain_end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze the evaluation cost of exported rig graphs.")
+    parser.add_argument("graph", nargs="+", help="Rig graph JSON file written by export_rig_graph.")
+    parser.add_argument("--global-ctr", default=None, help="Root of the longest chain, the global control by default.")
+    parser.add_argument("--top", type=int, default=DEF_HOT_SPOT_CNT, help="Number of fan-out hot spots.")
+    parser.add_argument("--output", default=None, help="Report file, the reports of all the graphs by file.")
+    args = parser.parse_args(argv)
+
+    report_dict = {}
+    for file_path in args.graph:
+        report = analyze_rig_graph(load_rig_graph(file_path), global_ctr=args.global_ctr, hot_spot_count=args.top)
+        report_dict[file_path] = report
+
+        print(get_summary_line(file_path, report))
+        for node_type, count in sorted(report["nodes_by_type"].items(), key=lambda item: (-item[1], item[0])):
+            print("    {0}: {1}".format(node_type, count))
+        for hot_spot in report["fan_out"]:
+            print("    fan-out {fan_out}: {node} ({type}), {plug_fan_out} from {plug}".format(**hot_spot))
+
+    if args.output is not None:
+        with open(args.output, "w") as file_obj:
+            json.dump(report_dict, file_obj, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Pure python math helpers used by the rig builder. Nothing in this module touches the Maya scene, so it can be
+used for batch solving before writing the results back, or without Maya at all.
+
+Matrices follow the Maya convention: 3x3 rotation matrices are row-major and vectors are row vectors, so the rows
+of a rotation matrix are the world space x, y and z axes of the object.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPSILON = 1e-8
+# A chain is straight when the middle joint is closer to the limb axis than this ratio of the root to middle length
+COLLINEAR_TOLERANCE = 1e-3
+IDENTITY_MATRIX = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+
+# Rotate 180 degrees around the local z axis, used by the mirror behavior flip.
+FLIP_Z_MATRIX = ((-1.0, 0.0, 0.0), (0.0, -1.0, 0.0), (0.0, 0.0, 1.0))
+
+# Mirror across the YZ plane, the left side of the character is +x.
+MIRROR_PLANE_SCALE = (-1.0, 1.0, 1.0)
+# Local axis flips of a mirrored object, behavior flips every axis like the mirrored joints, orientation flips only
+# the x axis so a world aligned object stays world aligned.
+BEHAVIOR_MIRROR = (-1.0, -1.0, -1.0)
+ORIENTATION_MIRROR = (-1.0, 1.0, 1.0)
+
+
+def vec_add(vec_a, vec_b):
+    return [vec_a[0]+vec_b[0], vec_a[1]+vec_b[1], vec_a[2]+vec_b[2]]
+
+
+def vec_sub(vec_a, vec_b):
+    return [vec_a[0]-vec_b[0], vec_a[1]-vec_b[1], vec_a[2]-vec_b[2]]
+
+
+def vec_scale(vec, scale):
+    return [vec[0]*scale, vec[1]*scale, vec[2]*scale]
+
+
+def scale_vectors(vec_list, axis_scale):
+    """
+    Multiply every vector by the per axis scale, vectorized with NumPy when it is available.
+    """
+    if np is None or not vec_list:
+        return [[vec[0]*axis_scale[0], vec[1]*axis_scale[1], vec[2]*axis_scale[2]] for vec in vec_list]
+
+    return (np.asarray(vec_list, dtype=float) * np.asarray(axis_scale, dtype=float)).tolist()
+
+
+def vec_dot(vec_a, vec_b):
+    return vec_a[0]*vec_b[0] + vec_a[1]*vec_b[1] + vec_a[2]*vec_b[2]
+
+
+def vec_cross(vec_a, vec_b):
+    return [vec_a[1]*vec_b[2] - vec_a[2]*vec_b[1],
+            vec_a[2]*vec_b[0] - vec_a[0]*vec_b[2],
+            vec_a[0]*vec_b[1] - vec_a[1]*vec_b[0]]
+
+
+def vec_length(vec):
+    return math.sqrt(vec_dot(vec, vec))
+
+
+def vec_normalize(vec):
+    """
+    Return the unit vector, a zero length vector is returned unchanged.
+    """
+    length = vec_length(vec)
+    if length < EPSILON:
+        return [0.0, 0.0, 0.0]
+    return vec_scale(vec, 1.0/length)
+
+
+def vec_mat_mult(vec, mat):
+    """
+    Multiply a row vector by a 3x3 matrix.
+    """
+    return [vec[0]*mat[0][0] + vec[1]*mat[1][0] + vec[2]*mat[2][0],
+            vec[0]*mat[0][1] + vec[1]*mat[1][1] + vec[2]*mat[2][1],
+            vec[0]*mat[0][2] + vec[1]*mat[1][2] + vec[2]*mat[2][2]]
+
+
+def mat_mult(mat_a, mat_b):
+    """
+    Multiply two 3x3 matrices, mat_a is applied first.
+    """
+    return [vec_mat_mult(row, mat_b) for row in mat_a]
+
+
+def mat_transpose(mat):
+    """
+    Transpose a 3x3 matrix, for rotation matrices this is the inverse matrix.
+    """
+    return [[mat[0][0], mat[1][0], mat[2][0]],
+            [mat[0][1], mat[1][1], mat[2][1]],
+            [mat[0][2], mat[1][2], mat[2][2]]]
+
+
+def mat_inverse(mat):
+    """
+    Invert a 3x3 matrix, for matrices with scale or shear. A singular matrix raises ZeroDivisionError.
+    """
+    cofactor_list = [vec_cross(mat[1], mat[2]), vec_cross(mat[2], mat[0]), vec_cross(mat[0], mat[1])]
+    det = vec_dot(mat[0], cofactor_list[0])
+    if abs(det) < EPSILON:
+        raise ZeroDivisionError("Singular matrix")
+    return [[cofactor_list[j][i]/det for j in range(3)] for i in range(3)]
+
+
+def mat_is_close(mat_a, mat_b, tolerance=1e-6):
+    return all(abs(mat_a[i][j] - mat_b[i][j]) < tolerance for i in range(3) for j in range(3))
+
+
+def scale_matrix_axes(mat, row_scale, column_scale):
+    """
+    Scale the rows and the columns of a 3x3 matrix, diag(row_scale) * mat * diag(column_scale). Mirroring the world
+    across a plane is a column scale, flipping the local axes of the object is a row scale.
+    """
+    return [[mat[i][j]*row_scale[i]*column_scale[j] for j in range(3)] for i in range(3)]
+
+
+def get_perpendicular(vec):
+    """
+    Return an unit vector perpendicular to the input vector.
+    """
+    if abs(vec[0]) < 0.9:
+        helper = [1.0, 0.0, 0.0]
+    else:
+        helper = [0.0, 1.0, 0.0]
+    return vec_normalize(vec_cross(vec, helper))
+
+
+def aim_matrix(aim_vec, up_vec):
+    """
+    Build a rotation matrix which x axis points along aim_vec and y axis points as close as possible to up_vec,
+    the same result as an aim constraint or joint -orientJoint xyz with a secondary axis world orientation.
+    """
+    x_axis = vec_normalize(aim_vec)
+    if vec_length(x_axis) < EPSILON:
+        return [list(row) for row in IDENTITY_MATRIX]
+
+    z_axis = vec_normalize(vec_cross(x_axis, up_vec))
+    if vec_length(z_axis) < EPSILON:
+        # The aim vector is parallel to the up vector, pick any stable perpendicular axis instead.
+        z_axis = get_perpendicular(x_axis)
+    y_axis = vec_cross(z_axis, x_axis)
+
+    return [x_axis, y_axis, z_axis]
+
+
+def aim_matrices(aim_vec_list, up_vec_list):
+    """
+    Batch version of aim_matrix, vectorized with NumPy when it is available.
+    """
+    if np is None or not aim_vec_list:
+        return [aim_matrix(aim_vec, up_vec) for aim_vec, up_vec in zip(aim_vec_list, up_vec_list)]
+
+    aim_array = np.asarray(aim_vec_list, dtype=float)
+    up_array = np.asarray(up_vec_list, dtype=float)
+
+    aim_len = np.linalg.norm(aim_array, axis=1)
+    x_axis = aim_array / np.maximum(aim_len, EPSILON)[:, None]
+    z_axis = np.cross(x_axis, up_array)
+    z_len = np.linalg.norm(z_axis, axis=1)
+    z_axis = z_axis / np.maximum(z_len, EPSILON)[:, None]
+    y_axis = np.cross(z_axis, x_axis)
+    result = np.stack([x_axis, y_axis, z_axis], axis=1).tolist()
+
+    # Degenerated rows(zero length aim or aim parallel to up) fall back to the scalar solver
+    for i in np.nonzero((aim_len < EPSILON) | (z_len < EPSILON))[0]:
+        result[i] = aim_matrix(aim_vec_list[i], up_vec_list[i])
+
+    return result
+
+
+def get_bend_fallback(axis_vec, fallback_vec=None):
+    """
+    Return the bend direction of a straight chain, the part of fallback_vec perpendicular to the chain axis, or any
+    perpendicular direction if there is no fallback_vec or it is parallel to the axis.
+    """
+    axis_dir = vec_normalize(axis_vec)
+    if fallback_vec is not None:
+        bend_vec = vec_sub(fallback_vec, vec_scale(axis_dir, vec_dot(fallback_vec, axis_dir)))
+        if vec_length(bend_vec) > EPSILON:
+            return vec_normalize(bend_vec)
+    return get_perpendicular(axis_dir)
+
+
+def pole_vec_position(root_pos, mid_pos, end_pos, fallback_vec=None):
+    """
+    Return the pole vector position of a three joint chain. The pole is on the side the middle joint bends to, as far
+    from the chain axis as the root to middle length. A straight chain has no bend side, its pole goes to the
+    fallback_vec side instead of following the floating point noise.
+    """
+    root_to_mid = vec_sub(mid_pos, root_pos)
+    root_to_end = vec_sub(end_pos, root_pos)
+    upper_len = vec_length(root_to_mid)
+
+    axis_len_sq = vec_dot(root_to_end, root_to_end)
+    if axis_len_sq > EPSILON:
+        projection = vec_scale(root_to_end, float(vec_dot(root_to_mid, root_to_end))/axis_len_sq)
+    else:
+        projection = [0.0, 0.0, 0.0]
+
+    bend_vec = vec_sub(root_to_mid, projection)
+    if vec_length(bend_vec) > COLLINEAR_TOLERANCE*upper_len:
+        bend_dir = vec_normalize(bend_vec)
+    else:
+        bend_dir = get_bend_fallback(root_to_end, fallback_vec)
+
+    return vec_add(vec_add(root_pos, projection), vec_scale(bend_dir, upper_len))
+
+
+def pole_vec_positions(chain_pos_list, fallback_vec_list=None):
+    """
+    Batch version of pole_vec_position for the [root, middle, end] positions of every chain, vectorized with NumPy
+    when it is available.
+    """
+    if fallback_vec_list is None:
+        fallback_vec_list = [None]*len(chain_pos_list)
+    if np is None or not chain_pos_list:
+        return [pole_vec_position(chain_pos[0], chain_pos[1], chain_pos[2], fallback_vec)
+                for chain_pos, fallback_vec in zip(chain_pos_list, fallback_vec_list)]
+
+    chain_array = np.asarray(chain_pos_list, dtype=float)
+    root_array = chain_array[:, 0]
+    root_to_mid = chain_array[:, 1] - root_array
+    root_to_end = chain_array[:, 2] - root_array
+    upper_len = np.linalg.norm(root_to_mid, axis=1)
+
+    axis_len_sq = np.einsum("ij,ij->i", root_to_end, root_to_end)
+    ratio = np.einsum("ij,ij->i", root_to_mid, root_to_end) / np.maximum(axis_len_sq, EPSILON)
+    projection = root_to_end * np.where(axis_len_sq > EPSILON, ratio, 0.0)[:, None]
+
+    bend_vec = root_to_mid - projection
+    bend_len = np.linalg.norm(bend_vec, axis=1)
+    bend_dir = bend_vec / np.maximum(bend_len, EPSILON)[:, None]
+    result = (root_array + projection + bend_dir*upper_len[:, None]).tolist()
+
+    # Straight chains fall back to the scalar solver
+    for i in np.nonzero(bend_len <= COLLINEAR_TOLERANCE*upper_len)[0]:
+        result[i] = pole_vec_position(chain_pos_list[i][0], chain_pos_list[i][1], chain_pos_list[i][2],
+                                      fallback_vec_list[i])
+
+    return result
+
+
+def bspline_basis(knot_list, degree, param):
+    """
+    Return the values of the B-spline basis functions at the parameter, one value for each control point. The knot
+    list is the full knot vector(len(cvs) + degree + 1 knots), the end of the parameter range belongs to the last span.
+    """
+    cv_count = len(knot_list) - degree - 1
+    if param >= knot_list[cv_count]:
+        return [0.0]*(cv_count - 1) + [1.0]
+    if param <= knot_list[degree]:
+        return [1.0] + [0.0]*(cv_count - 1)
+
+    basis_list = [1.0 if knot_list[i] <= param < knot_list[i+1] else 0.0 for i in range(len(knot_list) - 1)]
+    for d in range(1, degree + 1):
+        for i in range(len(knot_list) - d - 1):
+            value = 0.0
+            if knot_list[i+d] > knot_list[i]:
+                value += (param - knot_list[i]) / (knot_list[i+d] - knot_list[i]) * basis_list[i]
+            if knot_list[i+d+1] > knot_list[i+1]:
+                value += (knot_list[i+d+1] - param) / (knot_list[i+d+1] - knot_list[i+1]) * basis_list[i+1]
+            basis_list[i] = value
+
+    return basis_list[:cv_count]
+
+
+def euler_xyz_to_matrix(rotation):
+    """
+    Convert xyz rotate order euler angles(degrees) to a rotation matrix.
+    """
+    rx, ry, rz = [math.radians(angle) for angle in rotation]
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+
+    return [[cy*cz, cy*sz, -sy],
+            [sx*sy*cz - cx*sz, sx*sy*sz + cx*cz, sx*cy],
+            [cx*sy*cz + sx*sz, cx*sy*sz - sx*cz, cx*cy]]
+
+
+def transform_points(point_list, rotation=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0), translation=(0.0, 0.0, 0.0)):
+    """
+    Rotate(xyz rotate order, degrees), scale and then move the points. The rotation and scale are baked in one
+    matrix, so every point is transformed once. Vectorized with NumPy when it is available.
+    """
+    rot_mat = euler_xyz_to_matrix(rotation)
+    mat = [[rot_mat[i][j]*scale[j] for j in range(3)] for i in range(3)]
+
+    if np is None or not point_list:
+        return [vec_add(vec_mat_mult(point, mat), translation) for point in point_list]
+
+    point_array = np.dot(np.asarray(point_list, dtype=float), np.asarray(mat)) + np.asarray(translation, dtype=float)
+    return point_array.tolist()
+
+
+def matrix_to_euler_xyz(mat):
+    """
+    Convert a rotation matrix to xyz rotate order euler angles(degrees).
+    """
+    sy = max(-1.0, min(1.0, -mat[0][2]))
+    ry = math.asin(sy)
+
+    if abs(sy) < 1.0 - EPSILON:
+        rx = math.atan2(mat[1][2], mat[2][2])
+        rz = math.atan2(mat[0][1], mat[0][0])
+    else:
+        # Gimbal lock, put all the remaining rotation on x axis
+        rx = math.atan2(mat[1][0]*sy, mat[1][1])
+        rz = 0.0
+
+    return [math.degrees(rx), math.degrees(ry), math.degrees(rz)]
+
+
+def matrices_to_euler_xyz(mat_list):
+    """
+    Batch version of matrix_to_euler_xyz, vectorized with NumPy when it is available.
+    """
+    if np is None or not mat_list:
+        return [matrix_to_euler_xyz(mat) for mat in mat_list]
+
+    mat_array = np.asarray(mat_list, dtype=float)
+    sy = np.clip(-mat_array[:, 0, 2], -1.0, 1.0)
+    rx = np.arctan2(mat_array[:, 1, 2], mat_array[:, 2, 2])
+    ry = np.arcsin(sy)
+    rz = np.arctan2(mat_array[:, 0, 1], mat_array[:, 0, 0])
+
+    gimbal = np.abs(sy) >= 1.0 - EPSILON
+    rx[gimbal] = np.arctan2(mat_array[gimbal, 1, 0]*sy[gimbal], mat_array[gimbal, 1, 1])
+    rz[gimbal] = 0.0
+
+    return np.degrees(np.stack([rx, ry, rz], axis=1)).tolist()
@@ -0,0 +1,404 @@
+"""
+Mirror copy of the left side rig nodes. The left nodes are duplicated with their input connections in one command, the
+copies are moved to the mirrored place, connected to the right side counterparts of the nodes the left side is
+connected to, and renamed from "l" to "r".
+
+A mirrored object gets the world matrix F * W * P: W is the world matrix of the left object, P mirrors the YZ plane and
+F flips the local axes. F comes from the role of the object: joints, controls matching a joint and the children of
+behavior mirrored objects use the behavior mirror(flip every axis) like the joints of the mirror behavior orientation,
+the objects world aligned by design use the orientation mirror(flip x) so they stay world aligned. A joint chain can be
+world aligned too, so the world matrix alone doesn't tell the role. The local matrix of a child is
+F(child) * L * F(parent), so only the copied roots are placed in world space.
+
+Nodes outside the copied set are matched by name, the counterpart of "char_l_wrist_jnt" is "char_r_wrist_jnt", and an
+unsided node like the global control is its own counterpart.
+
+Usage:
+    uuid_dict = rig_mirror.mirror_nodes(left_uuid_list, prefix="char")
+"""
+import maya.cmds as mc
+import maya.api.OpenMaya as opm
+import rig_math
+import utility as util
+
+SEPARATOR = "_"
+PATH_SLASH = "|"
+LEFT_TOKEN = "l"
+RIGHT_TOKEN = "r"
+TOLERANCE = 1e-5
+
+# The solver is shared by the ik handles of both sides
+SHARED_NODE_TYPE = "ikSolver"
+TRANSLATE_ATTR_SET = {"translate", "translateX", "translateY", "translateZ", "t", "tx", "ty", "tz"}
+ROTATE_ATTR_SET = {"rotate", "rotateX", "rotateY", "rotateZ", "r", "rx", "ry", "rz"}
+
+
+def get_mirror_name(name, prefix=None):
+    """
+    Return the right side name of a left side node name, path or attribute name, every "l" token between the
+    separators becomes "r". The prefix(the character name) at the start of a name is kept as it is.
+    """
+    part_list = []
+    for part in name.split(PATH_SLASH):
+        head = ""
+        if prefix and (part == prefix or part.startswith(prefix + SEPARATOR)):
+            head, part = part[:len(prefix)], part[len(prefix):]
+        part_list.append(head + SEPARATOR.join(RIGHT_TOKEN if token == LEFT_TOKEN else token
+                                               for token in part.split(SEPARATOR)))
+    return PATH_SLASH.join(part_list)
+
+
+def get_mirror_plug(plug, prefix=None):
+    node_name, attr_name = plug.split(".", 1)
+    return get_mirror_name(node_name, prefix=prefix) + "." + get_mirror_name(attr_name)
+
+
+def get_parent_path(node_path):
+    """
+    Return the long name of the parent of a long node name, an empty string for world children.
+    """
+    return node_path.rsplit(PATH_SLASH, 1)[0]
+
+
+def get_world_matrices(obj_list):
+    """
+    Return the 3x3 world matrix(with scale) and the world position of every object. The matrices are read through
+    the API, so the query doesn't cost one xform command per object.
+    """
+    sel_list = opm.MSelectionList()
+    for obj in obj_list:
+        sel_list.add(obj)
+
+    matrix_list = []
+    for i in range(len(obj_list)):
+        value_list = list(sel_list.getDagPath(i).inclusiveMatrix())
+        matrix_list.append(([value_list[0:3], value_list[4:7], value_list[8:11]], value_list[12:15]))
+    return matrix_list
+
+
+def get_rotation(mat):
+    return [rig_math.vec_normalize(row) for row in mat]
+
+
+def get_mirror_axes(mat, is_jnt=False, parent_axes=None, jnt_mat_list=()):
+    """
+    Return the local axis flips of the mirrored object from its role. Joints, the objects oriented like a joint of
+    their name(jnt_mat_list) and the children of behavior mirrored objects(parent_axes) use the behavior mirror, the
+    other world aligned objects use the orientation mirror.
+    """
+    rot = get_rotation(mat)
+    if is_jnt or parent_axes == rig_math.BEHAVIOR_MIRROR or \
+            [jnt_mat for jnt_mat in jnt_mat_list
+             if rig_math.mat_is_close(rot, get_rotation(jnt_mat), tolerance=TOLERANCE)]:
+        return rig_math.BEHAVIOR_MIRROR
+    if rig_math.mat_is_close(rot, rig_math.IDENTITY_MATRIX, tolerance=TOLERANCE):
+        return rig_math.ORIENTATION_MIRROR
+    return rig_math.BEHAVIOR_MIRROR
+
+
+def get_name_base(node):
+    """
+    Return the short name of a node without its suffix, "char_l_index02" for "|...|char_l_index02_ctr".
+    """
+    return node.split(PATH_SLASH)[-1].rsplit(SEPARATOR, 1)[0]
+
+
+def is_sided(node, prefix=None):
+    leaf_name = node.split(PATH_SLASH)[-1]
+    return get_mirror_name(leaf_name, prefix=prefix) != leaf_name
+
+
+def is_close(value_list_a, value_list_b):
+    return all(abs(value_a - value_b) < TOLERANCE for value_a, value_b in zip(value_list_a, value_list_b))
+
+
+def set_rotation(obj, rot_mat, is_jnt=False, source=None):
+    """
+    Set the local rotation of the object, joints keep the rotate values of the source joint(the left joint) and get the
+    rotation as joint orient. The rotate of a constrained copy follows its joint orient, so it isn't read from the copy.
+    """
+    if is_jnt:
+        rotate_mat = rig_math.euler_xyz_to_matrix(mc.getAttr((source or obj) + ".rotate")[0])
+        joint_orient = rig_math.mat_mult(rig_math.mat_transpose(rotate_mat), rot_mat)
+        mc.setAttr(obj + ".jointOrient", *rig_math.matrix_to_euler_xyz(joint_orient))
+    else:
+        mc.setAttr(obj + ".rotate", *rig_math.matrix_to_euler_xyz(rot_mat))
+
+
+def mirror_nodes(node_uuid_list, prefix=None, shape_mirror_list=None):
+    """
+    Create the right side copy of the left side nodes, return {left node uuid: right node uuid}. The copies are
+    connected like the left nodes, with the right side counterpart of every outside node, and the outside nodes the
+    left nodes drive are driven by the copies on the right side. Constraint offsets are mirrored too.
+    The nodes of SHARED_NODE_TYPE are not copied.
+    """
+    node_list = mc.ls(node_uuid_list, long=True)
+    shared_set = set(mc.ls(node_list, type=SHARED_NODE_TYPE, long=True))
+    left_list = [node for node in node_list if node not in shared_set]
+    if not left_list:
+        return {}
+
+    left_set = set(left_list)
+    shape_set = set(mc.ls(left_list, type="shape", long=True))
+    jnt_set = set(mc.ls(left_list, type="joint", long=True))
+    constraint_list = mc.ls(left_list, type="constraint", long=True)
+    constraint_type_dict = {}
+    for constraint_type in ["parentConstraint", "orientConstraint", "pointConstraint"]:
+        for constraint in mc.ls(constraint_list, type=constraint_type, long=True) if constraint_list else []:
+            constraint_type_dict[constraint] = constraint_type
+    root_list = [node for node in left_list if node.startswith(PATH_SLASH) and node not in shape_set and
+                 get_parent_path(node) not in left_set]
+    dg_list = [node for node in left_list if not node.startswith(PATH_SLASH)]
+
+    # One duplicate for all the nodes, the copied descendants are paired by their order under the copied root,
+    # constraints have no children
+    new_root_list = mc.ls(mc.duplicate(root_list + dg_list, inputConnections=True, returnRootsOnly=True), long=True)
+    copy_dict = dict(zip(root_list + dg_list, new_root_list))
+    for root, new_root in zip(root_list, new_root_list):
+        if root not in constraint_type_dict:
+            copy_dict.update(zip(mc.listRelatives(root, allDescendents=True, fullPath=True) or [],
+                                 mc.listRelatives(new_root, allDescendents=True, fullPath=True) or []))
+
+    left_long_list = list(copy_dict.keys())
+    new_long_list = [copy_dict[node] for node in left_long_list]
+    constraint_set = set(mc.ls(left_long_list, type="constraint", long=True))
+    uuid_dict = dict(zip(mc.ls(left_long_list, uuid=True), mc.ls(new_long_list, uuid=True)))
+    # Connections are listed with the short unique names
+    name_list = mc.ls(left_long_list + new_long_list)
+    left_name_list, new_name_list = name_list[:len(left_long_list)], name_list[len(left_long_list):]
+    left_name_dict = dict(zip(left_name_list, left_long_list))
+    new_name_dict = dict(zip(new_name_list, new_long_list))
+    copy_name_dict = dict(zip(left_name_list, new_name_list))
+    left_of_copy_dict = dict(zip(new_name_list, left_long_list))
+
+    # Mirror axes of every transform from its role, the copied controls match the joints of their name. Outside
+    # nodes are queried when a constraint offset or a copied child needs them.
+    transform_list = [node for node in left_long_list if node.startswith(PATH_SLASH) and node not in shape_set and
+                      node not in constraint_set]
+    world_dict = dict(zip(transform_list, get_world_matrices(transform_list)))
+    name_base_set = set(get_name_base(node) for node in transform_list if node not in jnt_set)
+    match_jnt_list = [jnt for jnt in mc.ls(type="joint", long=True) if get_name_base(jnt) in name_base_set]
+    jnt_mat_dict = {}
+    for jnt, (mat, pos) in zip(match_jnt_list, get_world_matrices(match_jnt_list)):
+        jnt_mat_dict.setdefault(get_name_base(jnt), []).append(mat)
+    axes_dict = {}
+
+    def get_axes(obj):
+        if not obj:
+            return rig_math.MIRROR_PLANE_SCALE
+        if obj not in axes_dict and not obj.startswith(PATH_SLASH):
+            axes_dict[obj] = get_axes(mc.ls(obj, long=True)[0])
+        if obj not in axes_dict:
+            parent = get_parent_path(obj)
+            parent_axes = get_axes(parent) if parent and is_sided(parent, prefix=prefix) else None
+            if obj in world_dict:
+                axes_dict[obj] = get_mirror_axes(world_dict[obj][0], is_jnt=obj in jnt_set, parent_axes=parent_axes,
+                                                 jnt_mat_list=jnt_mat_dict.get(get_name_base(obj), []))
+            else:
+                axes_dict[obj] = get_mirror_axes(get_world_matrices([obj])[0][0],
+                                                 is_jnt=bool(mc.ls(obj, type="joint")), parent_axes=parent_axes)
+        return axes_dict[obj]
+
+    for node in transform_list:
+        get_axes(node)
+
+    # Mirror the curve shapes around their transform before anything moves, the copied controls look like the
+    # mirrored left controls
+    shape_mirror_set = set(mc.ls(shape_mirror_list, long=True)) if shape_mirror_list else set()
+    for shape in mc.ls(left_long_list, type="nurbsCurve", long=True):
+        transform = get_parent_path(shape)
+        if transform in world_dict and transform in shape_mirror_set:
+            axes = axes_dict[transform]
+            mc.scale(axes[0], axes[1], axes[2], copy_dict[shape] + ".cv[*]", pivot=world_dict[transform][1],
+                     relative=True, worldSpace=True)
+
+    counterpart_dict = {}
+    attr_order_dict = {}
+    missing_attr_list = []
+
+    def get_counterpart_plug(plug):
+        """
+        Return the right side plug of an outside plug, None if the plug has no counterpart. Missing dynamic
+        attributes are added to the counterpart later.
+        """
+        node_name, attr_name = plug.split(".", 1)
+        if node_name not in counterpart_dict:
+            mirror_name = get_mirror_name(node_name, prefix=prefix)
+            counterpart_dict[node_name] = mirror_name if mc.objExists(mirror_name) else node_name
+        mirror_attr_name = get_mirror_name(attr_name)
+        mirror_plug = counterpart_dict[node_name] + "." + mirror_attr_name
+        if mirror_plug == plug:
+            return None
+        if not mc.objExists(mirror_plug):
+            if node_name not in attr_order_dict:
+                attr_order_dict[node_name] = mc.listAttr(node_name, userDefined=True) or []
+            if attr_name not in attr_order_dict[node_name]:
+                return None
+            missing_attr_list.append((plug, counterpart_dict[node_name], mirror_attr_name))
+        return mirror_plug
+
+    # Inputs of the copies, the copies of the left nodes and the counterparts of the outside nodes
+    connect_list = []
+    driven_dict = {}
+    target_dict = {}
+    copy_attr_set = set()
+    conn_list = mc.listConnections(new_long_list, source=True, destination=False, connections=True, plugs=True) or []
+    for dest_plug, source_plug in zip(conn_list[::2], conn_list[1::2]):
+        dest_name, dest_attr = dest_plug.split(".", 1)
+        source_name, source_attr = source_plug.split(".", 1)
+        copy_attr_set.add((dest_name, dest_attr))
+        if source_name in new_name_dict:
+            copy_attr_set.add((source_name, source_attr))
+        if dest_attr in TRANSLATE_ATTR_SET:
+            driven_dict.setdefault(new_name_dict[dest_name], set()).add("translate")
+        elif dest_attr in ROTATE_ATTR_SET:
+            driven_dict.setdefault(new_name_dict[dest_name], set()).add("rotate")
+
+        if source_name in new_name_dict:
+            mirror_plug = None
+            left_source = left_of_copy_dict[source_name]
+        elif source_name in left_name_dict:
+            mirror_plug = copy_name_dict[source_name] + "." + source_attr
+            left_source = left_name_dict[source_name]
+        else:
+            mirror_plug = get_counterpart_plug(source_plug)
+            left_source = source_name
+        if dest_attr.endswith("targetParentMatrix"):
+            target_dict.setdefault(left_of_copy_dict[dest_name], []).append((dest_attr, left_source))
+        if mirror_plug is not None:
+            connect_list.append((mirror_plug, dest_plug))
+
+    # Outside nodes driven by the left nodes are driven by the copies on the right side
+    conn_list = mc.listConnections(left_long_list, source=False, destination=True, connections=True, plugs=True) or []
+    for source_plug, dest_plug in zip(conn_list[::2], conn_list[1::2]):
+        dest_name = dest_plug.split(".", 1)[0]
+        if dest_name in left_name_dict or dest_name in new_name_dict:
+            continue
+        mirror_plug = get_counterpart_plug(dest_plug)
+        if mirror_plug is not None:
+            source_name, source_attr = source_plug.split(".", 1)
+            connect_list.append((copy_name_dict[source_name] + "." + source_attr, mirror_plug))
+            copy_attr_set.add((copy_name_dict[source_name], source_attr))
+
+    # Add the missing attributes in the order of the left attributes
+    def get_attr_order(missing_attr_info):
+        node_name, attr_name = missing_attr_info[0].split(".", 1)
+        return missing_attr_info[1], attr_order_dict[node_name].index(attr_name)
+
+    added_set = set()
+    for plug, counterpart, attr_name in sorted(missing_attr_list, key=get_attr_order):
+        if (counterpart, attr_name) not in added_set:
+            added_set.add((counterpart, attr_name))
+            util.copy_attr(plug, counterpart, attr_name=attr_name)
+
+    for source_plug, dest_plug in connect_list:
+        mc.connectAttr(source_plug, dest_plug, force=True)
+
+    # Sided dynamic attributes of the copies, only the connected attributes are found
+    renamed_attr_set = set()
+    for new_name, attr_name in copy_attr_set:
+        attr_name = attr_name.split(".")[0].split("[")[0]
+        mirror_attr_name = get_mirror_name(attr_name)
+        if mirror_attr_name != attr_name and (new_name, attr_name) not in renamed_attr_set:
+            renamed_attr_set.add((new_name, attr_name))
+            mc.renameAttr(new_name + "." + attr_name, mirror_attr_name)
+
+    # Local transforms of the copied children, F(child) * L * F(parent)
+    for node, (mat, pos) in world_dict.items():
+        parent = get_parent_path(node)
+        if parent not in world_dict:
+            continue
+        new_node = copy_dict[node]
+        driven_set = driven_dict.get(new_node, set())
+        child_axes, parent_axes = axes_dict[node], axes_dict[parent]
+        parent_inverse = rig_math.mat_inverse(world_dict[parent][0])
+        local_mat = rig_math.mat_mult(mat, parent_inverse)
+        local_pos = rig_math.vec_mat_mult(rig_math.vec_sub(pos, world_dict[parent][1]), parent_inverse)
+
+        new_pos = [value*axis for value, axis in zip(local_pos, parent_axes)]
+        if "translate" not in driven_set and not is_close(new_pos, local_pos):
+            mc.setAttr(new_node + ".translate", *new_pos)
+        local_rot = get_rotation(local_mat)
+        new_rot = rig_math.scale_matrix_axes(local_rot, child_axes, parent_axes)
+        # Joints get the rotation as joint orient, their rotate can be driven
+        if (node in jnt_set or "rotate" not in driven_set) and \
+                not rig_math.mat_is_close(new_rot, local_rot, tolerance=TOLERANCE):
+            set_rotation(new_node, new_rot, is_jnt=node in jnt_set, source=node)
+
+    # Constraint offsets, the offset is in the target space: F(driven) * O * F(target)
+    for constraint, constraint_type in constraint_type_dict.items():
+        new_constraint = copy_dict[constraint]
+        driven = get_parent_path(constraint)
+        driven_axes = get_axes(driven)
+        target_list = target_dict.get(constraint, [])
+        if constraint_type == "parentConstraint":
+            for target_attr, target in target_list:
+                target_plug = target_attr.rsplit(".", 1)[0]
+                target_axes = get_axes(target)
+                offset_pos = mc.getAttr(constraint + "." + target_plug + ".targetOffsetTranslate")[0]
+                offset_rot = rig_math.euler_xyz_to_matrix(
+                    mc.getAttr(constraint + "." + target_plug + ".targetOffsetRotate")[0])
+                new_pos = [value*axis for value, axis in zip(offset_pos, target_axes)]
+                new_rot = rig_math.scale_matrix_axes(offset_rot, driven_axes, target_axes)
+                if not is_close(new_pos, offset_pos):
+                    mc.setAttr(new_constraint + "." + target_plug + ".targetOffsetTranslate", *new_pos)
+                if not rig_math.mat_is_close(new_rot, offset_rot, tolerance=TOLERANCE):
+                    mc.setAttr(new_constraint + "." + target_plug + ".targetOffsetRotate",
+                               *rig_math.matrix_to_euler_xyz(new_rot))
+        elif constraint_type == "orientConstraint" and target_list:
+            offset_rot = rig_math.euler_xyz_to_matrix(mc.getAttr(constraint + ".offset")[0])
+            new_rot = rig_math.scale_matrix_axes(offset_rot, driven_axes, get_axes(target_list[0][1]))
+            if not rig_math.mat_is_close(new_rot, offset_rot, tolerance=TOLERANCE):
+                mc.setAttr(new_constraint + ".offset", *rig_math.matrix_to_euler_xyz(new_rot))
+        elif constraint_type == "pointConstraint":
+            offset_pos = mc.getAttr(constraint + ".offset")[0]
+            new_pos = [value*axis for value, axis in zip(offset_pos, get_axes(get_parent_path(driven)))]
+            if not is_close(new_pos, offset_pos):
+                mc.setAttr(new_constraint + ".offset", *new_pos)
+
+    # Rename the deepest nodes first, renaming a parent changes the path of its children
+    root_path_dict = {}
+    for node in sorted(left_long_list, key=lambda node: -node.count(PATH_SLASH)):
+        leaf_name = node.split(PATH_SLASH)[-1]
+        mirror_name = get_mirror_name(leaf_name, prefix=prefix)
+        if mirror_name != leaf_name:
+            mirror_name = mc.rename(copy_dict[node], mirror_name, ignoreShape=True)
+        root_path_dict[node] = get_parent_path(copy_dict[node]) + PATH_SLASH + mirror_name.split(PATH_SLASH)[-1]
+
+    # Place the roots under the counterpart of the left parent, the world matrix is F * W * P
+    mirror_parent_dict = {}
+    for root in root_list:
+        parent = get_parent_path(root)
+        mirror_parent = get_mirror_name(parent, prefix=prefix)
+        mirror_parent_dict[root] = mirror_parent if parent and mc.objExists(mirror_parent) else parent
+    parent_list = list(set(parent for parent in mirror_parent_dict.values() if parent))
+    parent_world_dict = dict(zip(parent_list, get_world_matrices(parent_list)))
+
+    for root in root_list:
+        new_root = root_path_dict[root]
+        parent, mirror_parent = get_parent_path(root), mirror_parent_dict[root]
+        if mirror_parent != parent:
+            new_root = mc.parent(new_root, mirror_parent, relative=True)[0]
+        if root in constraint_set:
+            continue
+
+        mat, pos = world_dict[root]
+        new_rot = rig_math.scale_matrix_axes(get_rotation(mat), axes_dict[root], rig_math.MIRROR_PLANE_SCALE)
+        new_pos = rig_math.scale_vectors([pos], rig_math.MIRROR_PLANE_SCALE)[0]
+        if mirror_parent:
+            parent_mat, parent_pos = parent_world_dict[mirror_parent]
+            parent_inverse = rig_math.mat_inverse(parent_mat)
+            new_rot = get_rotation(rig_math.mat_mult(new_rot, parent_inverse))
+            new_pos = rig_math.vec_mat_mult(rig_math.vec_sub(new_pos, parent_pos), parent_inverse)
+            # Under a negatively scaled parent the local matrix is a reflection, it is kept in the X scale
+            if rig_math.vec_dot(rig_math.vec_cross(new_rot[0], new_rot[1]), new_rot[2]) < 0:
+                new_rot = [rig_math.vec_scale(new_rot[0], -1.0), new_rot[1], new_rot[2]]
+                mc.setAttr(new_root + ".scaleX", -mc.getAttr(new_root + ".scaleX"))
+
+        driven_set = driven_dict.get(copy_dict[root], set())
+        if "translate" not in driven_set:
+            mc.setAttr(new_root + ".translate", *new_pos)
+        if root in jnt_set or "rotate" not in driven_set:
+            set_rotation(new_root, new_rot, is_jnt=root in jnt_set, source=root)
+
+    return uuid_dict
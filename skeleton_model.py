@@ -0,0 +1,236 @@
+"""
+Array backed model of the template skeleton. The joints are stored as a key list, a position array and a parent index
+array, with a key to index map, so adding or removing digits works on whole arrays instead of scanning the template
+dictionary, and the topological order(parents before children) is computed once for the scene builder and the
+orientation solver.
+
+Every joint key is a side prefix, a base name and an optional segment number, like "l_thumb01". The base name("thumb")
+identifies the digit chains.
+
+The arrays are NumPy arrays when it is available, python lists otherwise.
+"""
+import re
+import collections
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEPARATOR = "_"
+NO_PARENT = -1
+
+JNT_KEY_PATTERN = re.compile(r"^([a-z]+)_([A-Za-z]+?)(\d*)$")
+
+# Error Msg
+JNT_KEY_ERR = "Invalid joint key: {0}"
+MISSING_PARENT_ERR = "Parent joint {0} of {1} is not in the skeleton."
+
+
+def split_jnt_key(jnt_key):
+    """
+    Return the side prefix, the base name and the segment number string of a joint key.
+    """
+    match = JNT_KEY_PATTERN.match(jnt_key)
+    if match is None:
+        raise ValueError(JNT_KEY_ERR.format(jnt_key))
+    return match.groups()
+
+
+class SkeletonModel(object):
+    def __init__(self, key_list, pos_list, parent_key_list):
+        self.key_list = list(key_list)
+        self.index_dict = dict((jnt_key, i) for i, jnt_key in enumerate(self.key_list))
+        self.base_name_list = [split_jnt_key(jnt_key)[1] for jnt_key in self.key_list]
+
+        parent_index_list = []
+        for jnt_key, parent_key in zip(self.key_list, parent_key_list):
+            if parent_key is not None and parent_key not in self.index_dict:
+                raise ValueError(MISSING_PARENT_ERR.format(parent_key, jnt_key))
+            parent_index_list.append(self.index_dict[parent_key] if parent_key is not None else NO_PARENT)
+
+        if np is not None:
+            self.pos_array = np.asarray(pos_list, dtype=float).reshape(-1, 3)
+            self.parent_array = np.asarray(parent_index_list, dtype=int)
+        else:
+            self.pos_array = [[float(value) for value in pos] for pos in pos_list]
+            self.parent_array = parent_index_list
+
+        self.topological_order = None
+
+    @classmethod
+    def from_template(cls, template_dict):
+        """
+        Build the model from the parsed template skeleton, {joint key: {"parent": parent key, "pos": position}}.
+        """
+        key_list = sorted(template_dict.keys())
+        return cls(key_list, [template_dict[jnt_key]["pos"] for jnt_key in key_list],
+                   [template_dict[jnt_key]["parent"] for jnt_key in key_list])
+
+    def __len__(self):
+        return len(self.key_list)
+
+    def __contains__(self, jnt_key):
+        return jnt_key in self.index_dict
+
+    def get_pos(self, jnt_key):
+        return [float(value) for value in self.pos_array[self.index_dict[jnt_key]]]
+
+    def set_positions(self, jnt_pos_dict):
+        """
+        Set the position of the joints in jnt_pos_dict, the joints that are not in the model are ignored.
+        """
+        for jnt_key, jnt_pos in jnt_pos_dict.items():
+            if jnt_key in self.index_dict:
+                self.pos_array[self.index_dict[jnt_key]] = [float(value) for value in jnt_pos]
+
+    def get_parent_key(self, jnt_key):
+        parent_index = self.parent_array[self.index_dict[jnt_key]]
+        return self.key_list[parent_index] if parent_index != NO_PARENT else None
+
+    def get_base_mask(self, base_name_list):
+        """
+        Return the mask of the joints with one of the base names.
+        """
+        if np is not None:
+            return np.isin(np.asarray(self.base_name_list, dtype=object), list(base_name_list))
+        base_name_set = set(base_name_list)
+        return [base_name in base_name_set for base_name in self.base_name_list]
+
+    def remove_joints(self, remove_mask):
+        """
+        Remove the masked joints, the remaining indices are shifted down in one pass. The children of a removed joint
+        lose their parent. Return the removed joint keys.
+        """
+        if np is not None:
+            keep_mask = ~np.asarray(remove_mask, dtype=bool)
+            new_index_array = np.cumsum(keep_mask) - 1
+            parent_array = self.parent_array[keep_mask]
+            has_parent = parent_array != NO_PARENT
+            parent_kept = np.zeros(len(parent_array), dtype=bool)
+            parent_kept[has_parent] = keep_mask[parent_array[has_parent]]
+            self.parent_array = np.where(parent_kept, new_index_array[np.maximum(parent_array, 0)], NO_PARENT)
+            self.pos_array = self.pos_array[keep_mask]
+            keep_list = keep_mask.tolist()
+        else:
+            keep_list = [not remove for remove in remove_mask]
+            new_index_list = []
+            new_index = 0
+            for keep in keep_list:
+                new_index_list.append(new_index if keep else NO_PARENT)
+                new_index += keep
+            self.parent_array = [new_index_list[parent_index] if parent_index != NO_PARENT else NO_PARENT
+                                 for parent_index, keep in zip(self.parent_array, keep_list) if keep]
+            self.pos_array = [pos for pos, keep in zip(self.pos_array, keep_list) if keep]
+
+        removed_key_list = [jnt_key for jnt_key, keep in zip(self.key_list, keep_list) if not keep]
+        self.key_list = [jnt_key for jnt_key, keep in zip(self.key_list, keep_list) if keep]
+        self.base_name_list = [base_name for base_name, keep in zip(self.base_name_list, keep_list) if keep]
+        self.update_index()
+        return removed_key_list
+
+    def remove_digits(self, base_name_list):
+        """
+        Remove all the joints of the digit base names, on both sides. Return the removed joint keys.
+        """
+        return self.remove_joints(self.get_base_mask(base_name_list))
+
+    def copy_chain(self, chain_key_list, base_name_list, offset_list):
+        """
+        Copy a joint chain once per base name, every copy is moved by its offset and its root has the same parent as
+        the chain root. The copies of "l_pinky01" with the base name "toeA" are named "l_toeA01". Return the key
+        lists of the copied chains.
+        """
+        chain_index_list = [self.index_dict[jnt_key] for jnt_key in chain_key_list]
+        chain_len = len(chain_index_list)
+        copy_count = len(base_name_list)
+        start_index = len(self.key_list)
+
+        new_chain_list = []
+        for base_name in base_name_list:
+            new_chain = []
+            for jnt_key in chain_key_list:
+                side_prefix, old_base_name, segment = split_jnt_key(jnt_key)
+                new_chain.append(side_prefix + SEPARATOR + base_name + segment)
+            new_chain_list.append(new_chain)
+
+        # Chain roots keep the parent of the source root, the other joints are parented to the previous new joint
+        root_parent = self.parent_array[chain_index_list[0]]
+        if np is not None:
+            pos_array = self.pos_array[chain_index_list][None, :, :] + \
+                        np.asarray(offset_list, dtype=float).reshape(copy_count, 1, 3)
+            parent_array = (start_index + np.arange(copy_count * chain_len) - 1).reshape(copy_count, chain_len)
+            parent_array[:, 0] = root_parent
+            self.pos_array = np.concatenate([self.pos_array, pos_array.reshape(-1, 3)])
+            self.parent_array = np.concatenate([self.parent_array, parent_array.reshape(-1)])
+        else:
+            for copy_index, offset in enumerate(offset_list):
+                for i, chain_index in enumerate(chain_index_list):
+                    self.pos_array.append([value + offset_value for value, offset_value
+                                           in zip(self.pos_array[chain_index], offset)])
+                    self.parent_array.append(root_parent if i == 0 else
+                                             start_index + copy_index * chain_len + i - 1)
+
+        for new_chain, base_name in zip(new_chain_list, base_name_list):
+            self.key_list += new_chain
+            self.base_name_list += [base_name] * chain_len
+        self.update_index()
+        return new_chain_list
+
+    def update_index(self):
+        self.index_dict = dict((jnt_key, i) for i, jnt_key in enumerate(self.key_list))
+        self.topological_order = None
+
+    def get_depths(self):
+        """
+        Return the number of ancestors of every joint, all the joints of a level are resolved together.
+        """
+        if np is not None:
+            depth_array = np.zeros(len(self.key_list), dtype=int)
+            has_parent = self.parent_array != NO_PARENT
+            for i in range(len(self.key_list)):
+                new_depth_array = np.where(has_parent, depth_array[np.maximum(self.parent_array, 0)] + 1, 0)
+                if (new_depth_array == depth_array).all():
+                    break
+                depth_array = new_depth_array
+            return depth_array.tolist()
+
+        depth_list = [None] * len(self.key_list)
+        for i in range(len(self.key_list)):
+            chain = []
+            index = i
+            while index != NO_PARENT and depth_list[index] is None:
+                chain.append(index)
+                index = self.parent_array[index]
+            depth = depth_list[index] + 1 if index != NO_PARENT else 0
+            for index in reversed(chain):
+                depth_list[index] = depth
+                depth += 1
+        return depth_list
+
+    def get_topological_order(self):
+        """
+        Return the joint indices sorted by depth, every parent comes before its children. The order is cached until
+        the joints change.
+        """
+        if self.topological_order is None:
+            depth_list = self.get_depths()
+            self.topological_order = sorted(range(len(self.key_list)), key=lambda i: (depth_list[i], self.key_list[i]))
+        return self.topological_order
+
+    def get_topological_keys(self):
+        return [self.key_list[i] for i in self.get_topological_order()]
+
+    def get_jnt_info_dict(self):
+        """
+        Return the joint info dictionary of the placement helper in topological order, {joint key: {"jnt_name",
+        "parent", "pos"}}.
+        """
+        jnt_info_dict = collections.OrderedDict()
+        for i in self.get_topological_order():
+            parent_index = self.parent_array[i]
+            jnt_info_dict[self.key_list[i]] = {"jnt_name": self.key_list[i],
+                                               "parent": self.key_list[parent_index] if parent_index != NO_PARENT
+                                               else None,
+                                               "pos": [float(value) for value in self.pos_array[i]]}
+        return jnt_info_dict
@@ -0,0 +1,160 @@
+"""
+Process wide cache of the parsed template files(template_skeleton, joint_label_cuv_lib). Every file is parsed once
+per process and modification time, callers get a copy-on-write view of the parsed dictionary, so they can change
+their own copy without re-reading the file and without touching the cached data.
+
+The templates can also be compiled to a pickled binary file next to the JSON file, it loads faster than parsing the
+JSON. The binary file is only used while it matches the modification time of the JSON file.
+
+Usage:
+    python template_cache.py template_skeleton joint_label_cuv_lib
+"""
+import os
+import sys
+import json
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+BINARY_EXT = ".pickle"
+PICKLE_PROTOCOL = 2
+
+# file path: [modification time, parsed dictionary]
+CACHE_DICT = {}
+
+
+class TemplateView(MutableMapping):
+    """
+    Copy-on-write dictionary view of a cached template. Nested dictionaries are copied the first time they are
+    accessed, so they can be changed in place. Other values(lists) are shared with the cache and should be replaced
+    instead of changed in place.
+    """
+    def __init__(self, base_dict):
+        self.base_dict = base_dict
+        self.local_dict = {}
+        self.deleted_key_set = set()
+
+    def __getitem__(self, key):
+        if key in self.local_dict:
+            return self.local_dict[key]
+        if key in self.deleted_key_set or key not in self.base_dict:
+            raise KeyError(key)
+
+        value = self.base_dict[key]
+        if isinstance(value, dict):
+            value = dict(value)
+            self.local_dict[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.local_dict[key] = value
+        self.deleted_key_set.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.local_dict.pop(key, None)
+        if key in self.base_dict:
+            self.deleted_key_set.add(key)
+
+    def __contains__(self, key):
+        if key in self.local_dict:
+            return True
+        return key in self.base_dict and key not in self.deleted_key_set
+
+    def __iter__(self):
+        # Iterate over a snapshot, so keys can be removed while looping like a python 2 dictionary keys() list
+        key_list = [key for key in self.base_dict if key not in self.deleted_key_set]
+        key_list += [key for key in self.local_dict if key not in self.base_dict]
+        return iter(key_list)
+
+    def __len__(self):
+        base_count = len(self.base_dict) - len(self.deleted_key_set)
+        return base_count + len([key for key in self.local_dict if key not in self.base_dict])
+
+    def __repr__(self):
+        return "TemplateView({0} keys)".format(len(self))
+
+
+def get_binary_path(file_path):
+    return file_path + BINARY_EXT
+
+
+def load_template(file_path, use_binary=True):
+    """
+    Return the parsed template dictionary, the file is only parsed again if it was modified. The returned dictionary
+    is shared, use get_template_view to get a dictionary which can be changed.
+    """
+    file_path = os.path.abspath(file_path)
+    mtime = os.path.getmtime(file_path)
+
+    cache_info = CACHE_DICT.get(file_path)
+    if cache_info is not None and cache_info[0] == mtime:
+        return cache_info[1]
+
+    data = None
+    if use_binary:
+        data = load_binary(file_path, mtime)
+    if data is None:
+        with open(file_path, "r") as file_obj:
+            data = json.load(file_obj)
+
+    CACHE_DICT[file_path] = [mtime, data]
+    return data
+
+
+def get_template_view(file_path, use_binary=True):
+    """
+    Return a copy-on-write view of the cached template.
+    """
+    return TemplateView(load_template(file_path, use_binary=use_binary))
+
+
+def load_binary(file_path, mtime):
+    """
+    Load the binary form of the template, return None if there is no binary file or it is out of date.
+    """
+    binary_path = get_binary_path(file_path)
+    if not os.path.isfile(binary_path):
+        return None
+
+    try:
+        with open(binary_path, "rb") as file_obj:
+            source_mtime, data = pickle.load(file_obj)
+    except Exception:
+        return None
+
+    if source_mtime != mtime:
+        return None
+    return data
+
+
+def write_binary(file_path):
+    """
+    Compile the JSON template to the binary form, return the binary file path.
+    """
+    file_path = os.path.abspath(file_path)
+    with open(file_path, "r") as file_obj:
+        data = json.load(file_obj)
+
+    binary_path = get_binary_path(file_path)
+    with open(binary_path, "wb") as file_obj:
+        pickle.dump((os.path.getmtime(file_path), data), file_obj, PICKLE_PROTOCOL)
+
+    return binary_path
+
+
+def clear_cache():
+    CACHE_DICT.clear()
+
+
+if __name__ == "__main__":
+    for template_path in sys.argv[1:]:
+        print(write_binary(template_path))
@@ -1,28 +1,37 @@
+import math
 import maya.cmds as mc
 import maya.api.OpenMaya as opm
 import control_cuv_lib as ccl
+import build_backend
+import rig_math
 
 SEPARATOR = "_"
 SUFFIX_CONSTRAINT = "cst"
+CIRCLE_SECTION_COUNT = 8
+# Distance of the cvs of a unit circle from its center
+CIRCLE_CV_RADIUS = 1.1081941875543877
+# ctr type: (cvs, degree, periodic), the cvs of the generated shapes are computed once per process
+CTR_CUV_DATA_CACHE = {}
+CUV_FORM_DICT = {"open": opm.MFnNurbsCurve.kOpen,
+                 "closed": opm.MFnNurbsCurve.kClosed,
+                 "periodic": opm.MFnNurbsCurve.kPeriodic}
 
 
 def create_ctr_cuv(pos=[0,0,0], rot=[0,0,0], match_obj=None, ctr_type="cube",
                    scale_cv=[10,10,10], rotate_cv=[0,0,0], move_cv=[0,0,0], ctr_name=None, space_name=None):
     """
-    A common function to create control curve object, call by other create control function.
+    A common function to create control curve object, call by other create control function. The cv rotation, scale
+    and move are applied to the cv positions before the curve is created, so the curve is created in one command.
     """
-    special_ctr_type = ["circle", "cog", "hip"]
+    cvs, degree, periodic = get_ctr_cuv_data(ctr_type)
+    cvs = rig_math.transform_points(cvs, rotation=rotate_cv, scale=scale_cv, translation=move_cv)
 
-    if ctr_type not in special_ctr_type:
-        cvs = ccl.CUV_DICT[ctr_type]["cvs"]
-        degree = ccl.CUV_DICT[ctr_type]["degree"]
+    if periodic:
+        # Periodic curve, the first degree cvs are repeated at the end
+        knots = range(-degree+1, len(cvs)+degree)
+        ctr = mc.curve(point=cvs+cvs[:degree], degree=degree, periodic=True, knot=knots)
+    else:
         ctr = mc.curve(point=cvs, degree=degree)
-    elif ctr_type == "circle":
-        ctr = mc.circle(normal=(1,0,0))[0]
-    elif ctr_type == "cog":
-        ctr = get_cog_ctr_cuv()
-    elif ctr_type == "hip":
-        ctr = get_hip_ctr_cuv()
 
     ctr_grp = mc.group(ctr)
 
@@ -32,10 +41,6 @@ def create_ctr_cuv(pos=[0,0,0], rot=[0,0,0], match_obj=None, ctr_type="cube",
         mc.move(pos[0], pos[1], pos[2], ctr_grp)
         mc.rotate(rot[0], rot[1], rot[2], ctr_grp)
 
-    rotate_cvs(ctr, x=rotate_cv[0], y=rotate_cv[1], z=rotate_cv[2])
-    scale_cvs(ctr, x=scale_cv[0], y=scale_cv[1], z=scale_cv[2])
-    move_cvs(ctr, x=move_cv[0], y=move_cv[1], z=move_cv[2])
-
     if ctr_name is not None:
         ctr = mc.rename(ctr, ctr_name)
 
@@ -46,28 +51,97 @@ def create_ctr_cuv(pos=[0,0,0], rot=[0,0,0], match_obj=None, ctr_type="cube",
     return ctr_grp, ctr
 
 
-def get_cog_ctr_cuv():
+def get_ctr_cuv_data(ctr_type):
+    """
+    Return the cvs, degree and periodic state of the control curve type, the returned cvs must not be changed.
+    """
+    if ctr_type not in CTR_CUV_DATA_CACHE:
+        if ctr_type == "circle":
+            cuv_data = get_circle_cvs(normal_axis="x"), 3, True
+        elif ctr_type == "cog":
+            cuv_data = get_cog_ctr_cvs(), 3, True
+        elif ctr_type == "hip":
+            cuv_data = get_hip_ctr_cvs(), 3, True
+        else:
+            cuv_data = ccl.CUV_DICT[ctr_type]["cvs"], ccl.CUV_DICT[ctr_type]["degree"], False
+        CTR_CUV_DATA_CACHE[ctr_type] = cuv_data
+    return CTR_CUV_DATA_CACHE[ctr_type]
+
+
+def warm_ctr_cuv_cache():
+    """
+    Compute the cvs of every control curve type, it doesn't touch the scene.
+    """
+    for ctr_type in ["circle", "cog", "hip"] + list(ccl.CUV_DICT.keys()):
+        get_ctr_cuv_data(ctr_type)
+
+
+def get_circle_cvs(normal_axis="y"):
+    """
+    Return the cvs of a unit circle, the same cvs as mc.circle creates(8 sections, degree 3 periodic).
+    """
+    cvs = []
+    for i in range(CIRCLE_SECTION_COUNT):
+        angle = -2*math.pi*(i+1)/CIRCLE_SECTION_COUNT
+        x = CIRCLE_CV_RADIUS*math.cos(angle)
+        z = CIRCLE_CV_RADIUS*math.sin(angle)
+        if normal_axis == "x":
+            cvs.append([0.0, -x, z])
+        else:
+            cvs.append([x, 0.0, z])
+    return cvs
+
+
+def get_cog_ctr_cvs():
+    """
+    Return the cog control cvs, a circle with the even cvs scaled down.
+    """
+    cvs = get_circle_cvs(normal_axis="y")
+    for i in [0, 2, 4, 6]:
+        cvs[i] = [value*0.3 for value in cvs[i]]
+    return cvs
+
+
+def get_hip_ctr_cvs():
     """
-    Create a cog control curve.
+    Return the hip control cvs, a circle with the side cvs moved up.
     """
-    circle_cuv = mc.circle(normal=(0, 1, 0))[0]
-    even_cvs = mc.ls(circle_cuv+".cv[0]", circle_cuv+".cv[2]", circle_cuv+".cv[4]", circle_cuv+".cv[6]")
-    scale_cvs = 0.3
-    mc.scale(scale_cvs, scale_cvs, scale_cvs, even_cvs)
-    return circle_cuv
+    cvs = get_circle_cvs(normal_axis="y")
+    for i in [3, 7]:
+        cvs[i][1] += 1
+    for i in [0, 2, 4, 6]:
+        cvs[i][1] += 0.3
+    return cvs
 
 
-def get_hip_ctr_cuv():
+def create_multi_shape_cuvs(cuv_grp_list):
     """
-    Create a hip control curve.
+    Create one transform with a nurbs curve shape for every curve data(point, knot, degree, form) of its list.
+    cuv_grp_list holds [transform name, curve data list] items, all the nodes are created in one API modifier.
+    Return the new transform names.
     """
-    circle_cuv = mc.circle(normal=(0, 1, 0))[0]
-    cvs = mc.ls(circle_cuv+".cv[3]", circle_cuv+".cv[7]")
-    mc.move(0, 1, 0, cvs, relative=True, worldSpace=True)
+    dag_modifier = opm.MDagModifier()
+    transform_obj_list = []
+
+    for transform_name, cuv_info_list in cuv_grp_list:
+        transform_obj = dag_modifier.createNode("transform")
+        dag_modifier.renameNode(transform_obj, transform_name)
+
+        for i, cuv_info in enumerate(cuv_info_list):
+            cuv_data_obj = opm.MFnNurbsCurveData().create()
+            opm.MFnNurbsCurve().create([opm.MPoint(point) for point in cuv_info["point"]], cuv_info["knot"],
+                                       cuv_info["degree"], CUV_FORM_DICT[cuv_info["form"]], False, False, cuv_data_obj)
+
+            shape_obj = dag_modifier.createNode("nurbsCurve", transform_obj)
+            dag_modifier.renameNode(shape_obj, transform_name + "Shape" + str(i+1))
+            dag_modifier.newPlugValue(opm.MFnDependencyNode(shape_obj).findPlug("create", False), cuv_data_obj)
+
+        transform_obj_list.append(transform_obj)
+
+    build_backend.commit_modifier(dag_modifier)
+
+    return [opm.MDagPath.getAPathTo(transform_obj).partialPathName() for transform_obj in transform_obj_list]
 
-    cvs = mc.ls(circle_cuv + ".cv[2]", circle_cuv + ".cv[0]", circle_cuv + ".cv[4]", circle_cuv + ".cv[6]")
-    mc.move(0, 0.3, 0, cvs, relative=True, worldSpace=True)
-    return circle_cuv
 
 def rotate_obj(obj_name, x=0, y=0, z=0):
     """
@@ -136,6 +210,16 @@ def set_jnt_orient(original_jnt, target_jnt=None, add_rot=[0,0,0], affect_child=
     return original_jnt
 
 
+def set_jnt_transforms(jnt_list, translate_list, orient_list):
+    """
+    Write the translate and joint orient values back to the joints in one pass, zero out the rotation.
+    """
+    for jnt, translate, orient in zip(jnt_list, translate_list, orient_list):
+        mc.setAttr(jnt + ".translate", translate[0], translate[1], translate[2])
+        mc.setAttr(jnt + ".rotate", 0, 0, 0)
+        mc.setAttr(jnt + ".jointOrient", orient[0], orient[1], orient[2])
+
+
 def get_distance(start_point, end_point):
     """
     Return the distance between 2 specific points
@@ -186,38 +270,21 @@ def connect_with_md_node(driver, driven, connect_attr, x_value=None, y_value=Non
     return md_node
 
 
-def vec_abs(vector):
+def get_world_positions(obj_list):
     """
-    get the absolute value of a vector
+    Get the world positions of all the objects with one query.
     """
-    return opm.MVector((abs(vector[0]), abs(vector[1]), abs(vector[2])))
+    if not obj_list:
+        return []
+    value_list = mc.xform(obj_list, query=True, translation=True, worldSpace=True)
+    return [value_list[i:i+3] for i in range(0, len(value_list), 3)]
 
 
-def get_pole_vec_pos(start_point, mid_point, end_point):
+def get_pole_vec_pos(start_point, mid_point, end_point, fallback_vec=None):
     """
-    Find the pole vector position
+    Find the pole vector position, a straight chain gets its pole on the fallback_vec side.
     """
-    start_vec = opm.MVector(start_point)
-    mid_vec = opm.MVector(mid_point)
-    end_vec = opm.MVector(end_point)
-
-    start_to_mid_vec = mid_vec - start_vec
-    start_to_end_vec = end_vec - start_vec
-
-    projection_vec = ((start_to_mid_vec*start_to_end_vec) / (vec_abs(start_to_end_vec)*vec_abs(start_to_end_vec))) * start_to_end_vec
-
-    pole_vec = start_to_mid_vec - projection_vec
-
-    pole_vec_len = pole_vec.length()
-
-    if pole_vec_len > 0:
-        scale_rate = start_to_mid_vec.length()/pole_vec.length()
-    else:
-        scale_rate = 1
-
-    pole_vec = start_vec + projection_vec + pole_vec*scale_rate
-
-    return [pole_vec[0], pole_vec[1], pole_vec[2]]
+    return rig_math.pole_vec_position(start_point, mid_point, end_point, fallback_vec=fallback_vec)
 
 
 def move_to_obj(original_obj, target_obj, maintain_rot=False):
@@ -288,23 +355,23 @@ def freeze_jnt_rot(jnt_name):
 def create_ik_limb(root_jnt, mid_jnt, end_jnt, ik_ctr_type="square", pv_ctr_type="square",
                    constraint_ik_ctr=True, constraint_pv_ctr=True, ik_ctr_rotate=[0,0,0],
                    pv_ctr_rotate=[90,0,0], ik_ctr_scale =[10,10,10], pv_ctr_scale =[10,10,10],
-                   match_jnt_orient=False):
+                   match_jnt_orient=False, pole_vec_pos=None):
     """
-    Create ik joints, ik control, pole vector control for the input joints.
+    Create ik joints, ik control, pole vector control for the input joints. pole_vec_pos can be given if it was
+    already solved with the other limbs by rig_math.pole_vec_positions.
     """
     root_ik = mc.duplicate(root_jnt, name="root_ik", parentOnly=True)[0]
     mid_ik = mc.duplicate(mid_jnt, name="mid_ik", parentOnly=True)[0]
     end_ik = mc.duplicate(end_jnt, name="end_ik", parentOnly=True)[0]
 
-    root_ik_pos = mc.xform(root_ik, query=True, translation=True, worldSpace=True)
-    mid_ik_pos = mc.xform(mid_ik, query=True, translation=True, worldSpace=True)
-    end_ik_pos = mc.xform(end_ik, query=True, translation=True, worldSpace=True)
+    if pole_vec_pos is None:
+        root_ik_pos, mid_ik_pos, end_ik_pos = get_world_positions([root_ik, mid_ik, end_ik])
+        pole_vec_pos = get_pole_vec_pos(start_point=root_ik_pos, mid_point=mid_ik_pos, end_point=end_ik_pos)
 
     end_ik = mc.parent(end_ik, mid_ik)[0]
     mid_ik = mc.parent(mid_ik, root_ik)[0]
 
     ik_hdl = mc.ikHandle(startJoint=root_ik, endEffector=end_ik)[0]
-    pole_vec_pos = get_pole_vec_pos(start_point=root_ik_pos, mid_point=mid_ik_pos, end_point=end_ik_pos)
 
     end_jnt_pos = mc.xform(end_ik, query=True, translation=True, worldSpace=True)
     if match_jnt_orient is True:
@@ -399,51 +466,71 @@ def hide_attr(obj, attrs=["translate", "rotate", "scale", "visibility"], lock_at
                 mc.setAttr(obj+"."+obj_attr, keyable=False, lock=lock_attr)
 
 
-def create_stretch_limb(ik_ctr, end_jnt, stretch_jnt_list, switch_ctr, switch_attr_name, global_ctr):
+def copy_attr(source_plug, target_obj, attr_name=None):
     """
-    Create stretch limb based on the input stretch jnt list,
+    Add the dynamic attribute of source_plug to target_obj with the same type, keyable state and range, attr_name is
+    the source attribute name by default.
     """
-    ik_ctr_pos = mc.xform(ik_ctr, query=True, translation=True, worldSpace=True)
-    end_jnt_pos = mc.xform(end_jnt, query=True, translation=True, worldSpace=True)
-
-    end_loc = mc.spaceLocator()
-    move_to_obj(end_loc, target_obj=ik_ctr, maintain_rot=True)
-
-    distance_dimen_shape = mc.distanceDimension(startPoint=ik_ctr_pos, endPoint=end_jnt_pos)
-    start_loc, end_loc = mc.listConnections(distance_dimen_shape)
+    source_obj, source_attr = source_plug.split(".", 1)
+    attr_kwargs = {"longName": attr_name or source_attr,
+                   "attributeType": mc.getAttr(source_plug, type=True),
+                   "keyable": mc.getAttr(source_plug, keyable=True)}
+    if mc.attributeQuery(source_attr, node=source_obj, minExists=True):
+        attr_kwargs["minValue"] = mc.attributeQuery(source_attr, node=source_obj, minimum=True)[0]
+    if mc.attributeQuery(source_attr, node=source_obj, maxExists=True):
+        attr_kwargs["maxValue"] = mc.attributeQuery(source_attr, node=source_obj, maximum=True)[0]
+    mc.addAttr(target_obj, **attr_kwargs)
 
-    mc.pointConstraint(ik_ctr, start_loc)
-    mc.pointConstraint(end_jnt, end_loc)
 
-    distance = mc.getAttr(distance_dimen_shape+".distance")
-
-    md_node = mc.createNode("multiplyDivide", name=switch_attr_name+SEPARATOR+"md")
-    mc.setAttr(md_node+".operation", 2)
-    mc.connectAttr(distance_dimen_shape+".distance", md_node+".input1X")
-
-    global_scale_md = mc.createNode("multiplyDivide", name=switch_attr_name+"Scale"+SEPARATOR+"md")
-    mc.setAttr(global_scale_md + ".operation", 1)
-    mc.connectAttr(global_ctr + ".scaleX", global_scale_md + ".input1X")
-    mc.setAttr(global_scale_md + ".input2X", distance)
-    mc.connectAttr(global_scale_md + ".outputX", md_node + ".input2X")
+def create_stretch_limb(ik_ctr, end_jnt, stretch_jnt_list, switch_ctr, switch_attr_name, global_ctr, backend=None,
+                        prefix=None):
+    """
+    Create stretch limb based on the input stretch jnt list, the utility nodes are created through the input build
+    backend(maya.cmds by default). The limb length is read from the world positions of the ik control and the end
+    joint by a distance between node, no locator or constraint is needed. The node names start with the prefix if one
+    is given. Return the distance between node.
+    """
+    if backend is None:
+        backend = build_backend.CmdsBackend()
+    node_name = SEPARATOR.join([prefix, switch_attr_name]) if prefix else switch_attr_name
 
-    stretch_condi_node = mc.createNode("condition", name=switch_attr_name+"Trigger"+SEPARATOR+"condi")
-    mc.setAttr(stretch_condi_node + ".operation", 2)
-    mc.setAttr(stretch_condi_node + ".secondTerm", 1)
-    mc.connectAttr(md_node + ".outputX", stretch_condi_node+".firstTerm")
-    mc.connectAttr(md_node + ".outputX", stretch_condi_node + ".colorIfTrueR")
+    ik_ctr_pos = mc.xform(ik_ctr, query=True, translation=True, worldSpace=True)
+    end_jnt_pos = mc.xform(end_jnt, query=True, translation=True, worldSpace=True)
+    distance = rig_math.vec_length(rig_math.vec_sub(ik_ctr_pos, end_jnt_pos))
+
+    distance_node = backend.create_node("distanceBetween", name=node_name+SEPARATOR+"dist")
+    backend.connect_attr(ik_ctr+".worldMatrix[0]", distance_node+".inMatrix1")
+    # The end joint position is its translate in the parent space, its world matrix would include the stretch scale
+    backend.connect_attr(end_jnt+".translate", distance_node+".point2")
+    backend.connect_attr(end_jnt+".parentMatrix[0]", distance_node+".inMatrix2")
+
+    md_node = backend.create_node("multiplyDivide", name=node_name+SEPARATOR+"md")
+    backend.set_attr(md_node+".operation", 2)
+    backend.connect_attr(distance_node+".distance", md_node+".input1X")
+
+    global_scale_md = backend.create_node("multiplyDivide", name=node_name+"Scale"+SEPARATOR+"md")
+    backend.set_attr(global_scale_md + ".operation", 1)
+    backend.connect_attr(global_ctr + ".scaleX", global_scale_md + ".input1X")
+    backend.set_attr(global_scale_md + ".input2X", distance)
+    backend.connect_attr(global_scale_md + ".outputX", md_node + ".input2X")
+
+    stretch_condi_node = backend.create_node("condition", name=node_name+"Trigger"+SEPARATOR+"condi")
+    backend.set_attr(stretch_condi_node + ".operation", 2)
+    backend.set_attr(stretch_condi_node + ".secondTerm", 1)
+    backend.connect_attr(md_node + ".outputX", stretch_condi_node+".firstTerm")
+    backend.connect_attr(md_node + ".outputX", stretch_condi_node + ".colorIfTrueR")
 
     mc.addAttr(switch_ctr, longName=switch_attr_name, attributeType='short', keyable=True, maxValue=1, minValue=0)
-    switch_condi_node = mc.createNode("condition", name=switch_attr_name+"Switch"+SEPARATOR+"condi")
-    mc.setAttr(switch_condi_node + ".operation", 0)
-    mc.setAttr(switch_condi_node + ".secondTerm", 1)
-    mc.connectAttr(switch_ctr + "." + switch_attr_name, switch_condi_node+".firstTerm")
-    mc.connectAttr(stretch_condi_node + ".outColorR", switch_condi_node + ".colorIfTrueR")
+    switch_condi_node = backend.create_node("condition", name=node_name+"Switch"+SEPARATOR+"condi")
+    backend.set_attr(switch_condi_node + ".operation", 0)
+    backend.set_attr(switch_condi_node + ".secondTerm", 1)
+    backend.connect_attr(switch_ctr + "." + switch_attr_name, switch_condi_node+".firstTerm")
+    backend.connect_attr(stretch_condi_node + ".outColorR", switch_condi_node + ".colorIfTrueR")
 
     for stretch_jnt in stretch_jnt_list:
-        mc.connectAttr(switch_condi_node + ".outColorR", stretch_jnt + ".scaleX")
+        backend.connect_attr(switch_condi_node + ".outColorR", stretch_jnt + ".scaleX")
 
-    return mc.listRelatives(distance_dimen_shape, parent=True), start_loc, end_loc
+    return distance_node
 
 
 def clear_path(obj_name):